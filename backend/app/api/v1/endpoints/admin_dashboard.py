@@ -16,6 +16,7 @@ from loguru import logger
 
 from app.core.security import get_current_user
 from app.core.supabase import get_supabase_client
+from app.services.support_history import count_messages
 
 router = APIRouter(prefix="/admin", tags=["Admin Dashboard"])
 bearer_scheme = HTTPBearer()
@@ -344,8 +345,11 @@ async def admin_respond(
             "action_taken": "admin_response",
         }).execute()
 
-        # Update chat
+        # Update chat. messages_count is recounted from the rows rather than
+        # read and incremented, which would race the chatbot's own writes.
+        messages_count = await count_messages(supabase, chat_id)
         supabase.table("ai_support_chats").update({
+            "messages_count": messages_count,
             "updated_at": datetime.utcnow().isoformat(),
         }).eq("id", chat_id).execute()
 
@@ -8,6 +8,7 @@ from fastapi.security import HTTPBearer
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from loguru import logger
+import os
 import uuid
 
 from app.core.security import get_current_user
@@ -16,6 +17,9 @@ from app.services.ai_chatbot_service import chatbot_service
 router = APIRouter(prefix="/ai-chat", tags=["AI Chat"])
 bearer_scheme = HTTPBearer()
 
+# Each attached image costs a fetch and a vision call.
+SUPPORT_CHAT_MAX_IMAGES = int(os.getenv("SUPPORT_CHAT_MAX_IMAGES", "4"))
+
 
 class StartChatRequest(BaseModel):
     website_id: Optional[str] = None
@@ -24,7 +28,7 @@ class StartChatRequest(BaseModel):
 
 class SendMessageRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000)
-    image_urls: Optional[List[str]] = None
+    image_urls: Optional[List[str]] = Field(default=None, max_length=SUPPORT_CHAT_MAX_IMAGES)
 
 
 class RateChatRequest(BaseModel):
@@ -3,10 +3,14 @@ BinaApp Chat System - Real-time messaging for delivery orders
 Supports WebSocket for instant messaging between customers, owners, and riders
 """
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Depends
-from typing import Dict, List, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
+import hashlib
 import json
 import uuid
 import os
@@ -15,6 +19,15 @@ import cloudinary
 import cloudinary.uploader
 
 from app.core.security import get_current_user
+from app.services.chat_inbox import (
+    INBOX_MAX_LIMIT,
+    INBOX_MESSAGES,
+    InboxPage,
+    build_page,
+    chat_inbox,
+    decode_cursor,
+)
+from app.services.ws_fanout import DROPPABLE_TYPES, SocketReaper, SocketSender, encode
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -37,53 +50,82 @@ if CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET:
 # =====================================================
 
 class ConnectionManager:
-    """Manages WebSocket connections for real-time chat"""
+    """Manages WebSocket connections for real-time chat.
+
+    Sends go through one SocketSender (bounded queue + writer task) per
+    socket, so broadcasting never waits on a client's network; see
+    app.services.ws_fanout for the slow-consumer and idle policies.
+    """
 
     def __init__(self):
-        # {conversation_id: {user_key: WebSocket}}
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {}
+        # {conversation_id: {user_key: SocketSender}}
+        self.active_connections: Dict[str, Dict[str, SocketSender]] = {}
+        self.reaper = SocketReaper(self._all_senders)
+
+    def _all_senders(self) -> List[SocketSender]:
+        return [s for conv in self.active_connections.values() for s in conv.values()]
 
     async def connect(self, websocket: WebSocket, conversation_id: str, user_key: str):
         """Accept WebSocket connection and add to active connections"""
         await websocket.accept()
-        if conversation_id not in self.active_connections:
-            self.active_connections[conversation_id] = {}
-        self.active_connections[conversation_id][user_key] = websocket
+        conversation = self.active_connections.setdefault(conversation_id, {})
+        previous = conversation.get(user_key)
+        conversation[user_key] = SocketSender(
+            websocket,
+            f"{conversation_id}/{user_key}",
+            on_close=lambda sender: self._forget(conversation_id, user_key, sender),
+        )
+        if previous is not None:
+            previous.close()  # same user reconnected; drop the stale socket
+        self.reaper.ensure_running()
         logger.info(f"[Chat] {user_key} connected to conversation {conversation_id}")
 
-    def disconnect(self, conversation_id: str, user_key: str):
-        """Remove WebSocket connection"""
-        if conversation_id in self.active_connections:
-            self.active_connections[conversation_id].pop(user_key, None)
-            if not self.active_connections[conversation_id]:
+    def _forget(self, conversation_id: str, user_key: str, sender: SocketSender):
+        conversation = self.active_connections.get(conversation_id)
+        if conversation is not None and conversation.get(user_key) is sender:
+            del conversation[user_key]
+            if not conversation:
                 del self.active_connections[conversation_id]
+
+    def disconnect(self, conversation_id: str, user_key: str, websocket: WebSocket) -> bool:
+        """Remove `websocket` if it is still the one registered for user_key.
+
+        A handler whose socket was already replaced by a reconnect must not
+        close the new one. Returns True if the registration was dropped.
+        """
+        sender = self.active_connections.get(conversation_id, {}).get(user_key)
+        if sender is None or sender.websocket is not websocket:
+            return False
+        sender.close()
         logger.info(f"[Chat] {user_key} disconnected from conversation {conversation_id}")
+        return True
+
+    def touch(self, conversation_id: str, user_key: str):
+        """Record that the client sent a frame (idle reaper input)."""
+        sender = self.active_connections.get(conversation_id, {}).get(user_key)
+        if sender is not None:
+            sender.touch()
 
     async def send_to_conversation(self, conversation_id: str, message: dict, exclude_user: str = None):
-        """Broadcast message to all users in a conversation"""
-        if conversation_id in self.active_connections:
-            disconnected = []
-            for user_key, websocket in self.active_connections[conversation_id].items():
-                if user_key != exclude_user:
-                    try:
-                        await websocket.send_json(message)
-                    except Exception as e:
-                        logger.warning(f"[Chat] Failed to send to {user_key}: {e}")
-                        disconnected.append(user_key)
-
-            # Clean up disconnected users
-            for user_key in disconnected:
-                self.active_connections[conversation_id].pop(user_key, None)
+        """Broadcast message to all users in a conversation.
+
+        Serializes once and queues to every socket; returns without
+        waiting for any client.
+        """
+        conversation = self.active_connections.get(conversation_id)
+        if not conversation:
+            return
+        text = encode(message)
+        droppable = message.get("type") in DROPPABLE_TYPES
+        for user_key, sender in list(conversation.items()):
+            if user_key != exclude_user:
+                sender.offer(text, droppable)
 
     async def send_to_user(self, conversation_id: str, user_key: str, message: dict):
         """Send message to a specific user in a conversation"""
-        if conversation_id in self.active_connections:
-            websocket = self.active_connections[conversation_id].get(user_key)
-            if websocket:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.warning(f"[Chat] Failed to send to {user_key}: {e}")
+        sender = self.active_connections.get(conversation_id, {}).get(user_key)
+        if sender is not None:
+            sender.offer(encode(message), message.get("type") in DROPPABLE_TYPES)
 
     def get_online_users(self, conversation_id: str) -> List[str]:
         """Get list of online users in a conversation"""
@@ -173,6 +215,14 @@ def get_supabase():
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
 def _extract_missing_column(err: object) -> Optional[str]:
     """
     Best-effort parsing for PostgREST missing-column errors.
@@ -292,14 +342,31 @@ def _normalize_message_row(row: dict) -> dict:
     return row
 
 
+# (created_at, id) of a message; id None means "any message at that instant".
+MessageAnchor = Tuple[str, Optional[str]]
+
+
+def _keyset_filter(op: str, anchor: MessageAnchor) -> str:
+    """PostgREST or= filter for messages strictly before (lt) / after (gt)
+    an anchor in (created_at, id) order."""
+    created_at, message_id = anchor
+    if message_id is None:
+        return f'created_at.{op}."{created_at}"'
+    return f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}.{message_id})'
+
+
 def _fetch_chat_messages(
     supabase,
     conversation_id: str,
     order_desc: bool = False,
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    before: Optional[MessageAnchor] = None,
+    after: Optional[MessageAnchor] = None,
 ) -> List[dict]:
     """
     Fetch chat messages with schema-aware column fallback.
+    `before` / `after` restrict to messages strictly older / newer than a
+    (created_at, id) anchor; id breaks ties between equal timestamps.
     """
     columns = [col for col in CHAT_MESSAGE_COLUMNS if col not in CHAT_MESSAGE_MISSING_COLUMNS]
     if not columns:
@@ -310,7 +377,16 @@ def _fetch_chat_messages(
         select_cols = ", ".join(columns)
         query = supabase.table("chat_messages").select(select_cols).eq(
             "conversation_id", conversation_id
-        ).order("created_at", desc=order_desc)
+        )
+        if before is not None:
+            query = query.or_(_keyset_filter("lt", before))
+        if after is not None:
+            query = query.or_(_keyset_filter("gt", after))
+        query = query.order("created_at", desc=order_desc)
+        if limit is not None or before is not None or after is not None:
+            # A page's edge row is the next cursor: ties must sort the same
+            # way the keyset filter compares them.
+            query = query.order("id", desc=order_desc)
         if limit is not None:
             query = query.limit(limit)
 
@@ -473,6 +549,7 @@ async def create_conversation(request: CreateConversationRequest):
         except Exception as msg_err:
             logger.warning(f"[Chat] Welcome message insert failed (non-critical): {msg_err}")
 
+        chat_inbox.invalidate_website(request.website_id)
         logger.info(f"[Chat] Created conversation {conversation_id} for website {request.website_id}")
 
         return {
@@ -539,73 +616,125 @@ async def get_conversation(conversation_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _load_inbox_legacy(
+    supabase,
+    user_id: str,
+    website_ids: Optional[List[str]],
+    status: Optional[str],
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> InboxPage:
+    """Inbox page without list_chat_inbox (migration 057 not applied):
+    owned websites, one conversations query, one messages query per
+    conversation on the page and one unread query for the page."""
+    user_websites = supabase.table("websites").select("id").eq("user_id", user_id).execute()
+    owned_website_ids = [str(w["id"]) for w in (user_websites.data or [])]
+    allowed_ids = [wid for wid in website_ids if wid in owned_website_ids] if website_ids else owned_website_ids
+    if not allowed_ids:
+        return InboxPage([])
+
+    query = supabase.table("chat_conversations").select("*").in_("website_id", allowed_ids)
+    if status:
+        query = query.eq("status", status)
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query = query.or_(
+            f'updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",id.lt.{conversation_id})'
+        )
+    query = query.order("updated_at", desc=True).order("id", desc=True)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    page = build_page(query.execute().data or [], limit)
+
+    for conv in page.conversations:
+        try:
+            messages = _fetch_chat_messages(supabase, conv["id"], order_desc=True, limit=INBOX_MESSAGES)
+            # Reverse to get chronological order
+            conv["chat_messages"] = list(reversed(messages))
+        except Exception as msg_err:
+            logger.warning(f"[Chat] Failed to fetch messages for conversation {conv['id']}: {msg_err}")
+            conv["chat_messages"] = []
+
+    # Unread as list_chat_inbox counts it: messages not sent by the owner
+    # and not yet read.
+    unread: Dict[str, int] = {}
+    if page.conversations:
+        try:
+            unread_res = supabase.table("chat_messages").select("conversation_id").in_(
+                "conversation_id", [conv["id"] for conv in page.conversations]
+            ).neq("sender_type", "owner").or_("is_read.is.null,is_read.eq.false").execute()
+            for row in unread_res.data or []:
+                unread[row["conversation_id"]] = unread.get(row["conversation_id"], 0) + 1
+        except Exception as unread_err:
+            logger.warning(f"[Chat] Failed to count unread messages: {unread_err}")
+    for conv in page.conversations:
+        conv["unread_count"] = unread.get(conv["id"], 0)
+    return page
+
+
+async def _inbox_page(
+    user_id: str,
+    website_ids: Optional[List[str]],
+    status: Optional[str],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    """Owner inbox page: cached, else one list_chat_inbox call."""
+    key = (tuple(sorted(website_ids or ())), status, cursor, limit)
+    page = chat_inbox.get(user_id, key)
+    if page is None:
+        supabase = get_supabase()
+        try:
+            page = await chat_inbox.load(
+                supabase, user_id, website_ids, status, cursor, limit, _normalize_message_row
+            )
+            if page is None:
+                page = await run_in_threadpool(
+                    _load_inbox_legacy, supabase, user_id, website_ids, status, cursor, limit
+                )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        chat_inbox.put(user_id, key, page)
+    return page.snapshot()
+
+
 @router.get("/conversations")
 async def get_conversations(
     website_ids: str = None,
     status: str = None,
+    cursor: str = None,
+    limit: int = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get conversations filtered by website_ids (comma-separated) or all if none provided"""
-    try:
-        supabase = get_supabase()
+    """Get conversations filtered by website_ids (comma-separated) or all if none provided.
 
+    Each conversation carries its last messages (`chat_messages`) and
+    `unread_count`. Pass `limit` to page; `next_cursor` in the response
+    fetches the following page.
+    """
+    try:
         # SECURITY: Extract user_id from authenticated token
         user_id = current_user.get("sub") or current_user.get("id")
         if not user_id:
             raise HTTPException(status_code=401, detail="User ID not found in token")
 
-        # SECURITY: Get only websites owned by this user
-        user_websites = supabase.table("websites").select("id").eq("user_id", user_id).execute()
-        if not user_websites.data:
-            return {"conversations": []}
-
-        owned_website_ids = [str(w["id"]) for w in user_websites.data]
-
-        # Get conversations without nested query to avoid JOIN issues
-        query = supabase.table("chat_conversations").select("*")
-
-        # Filter by multiple website_ids if provided, but ONLY if user owns them
+        ids_list = None
         if website_ids:
-            ids_list = [id.strip() for id in website_ids.split(',') if id.strip()]
-            # SECURITY: Filter to only websites owned by user
-            allowed_ids = [wid for wid in ids_list if wid in owned_website_ids]
-            if allowed_ids:
-                query = query.in_("website_id", allowed_ids)
-                logger.info(f"[Chat] Filtering conversations by website_ids: {allowed_ids}")
-            else:
-                # User tried to access websites they don't own
-                logger.warning(f"[Chat] User {user_id} attempted to access unauthorized websites: {ids_list}")
-                return {"conversations": []}
-        else:
-            # SECURITY: If no filter specified, only show user's websites
-            query = query.in_("website_id", owned_website_ids)
-
-        if status:
-            query = query.eq("status", status)
-
-        result = query.order("updated_at", desc=True).execute()
-        conversations = result.data or []
-
-        # Fetch last message for each conversation separately
-        for conv in conversations:
-            try:
-                # Use canonical message_text for previews
-                messages = _fetch_chat_messages(
-                    supabase,
-                    conv["id"],
-                    order_desc=True,
-                    limit=10
-                )
-
-                # Reverse to get chronological order
-                conv["chat_messages"] = list(reversed(messages))
-            except Exception as msg_err:
-                logger.warning(f"[Chat] Failed to fetch messages for conversation {conv['id']}: {msg_err}")
-                conv["chat_messages"] = []
+            requested = [id.strip() for id in website_ids.split(',') if id.strip()]
+            # Ownership is enforced by the inbox query; drop ids that can't be website ids.
+            ids_list = [wid for wid in requested if _is_uuid(wid)]
+            if not ids_list:
+                logger.warning(f"[Chat] User {user_id} requested invalid website_ids: {requested}")
+                return {"conversations": [], "next_cursor": None}
+        if limit is not None:
+            limit = max(1, min(limit, INBOX_MAX_LIMIT))
 
-        logger.info(f"[Chat] Retrieved {len(conversations)} conversations")
-        return {"conversations": conversations}
+        body = await _inbox_page(user_id, ids_list, status, cursor, limit)
+        logger.info(f"[Chat] Retrieved {len(body['conversations'])} conversations")
+        return body
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[Chat] Failed to get conversations: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to load conversations: {str(e)}")
@@ -635,35 +764,12 @@ async def get_website_conversations(
                 detail="Access denied: You don't own this website"
             )
 
-        # Get conversations without nested query to avoid JOIN issues
-        query = supabase.table("chat_conversations").select("*").eq("website_id", website_id)
-
-        if status:
-            query = query.eq("status", status)
-
-        result = query.order("updated_at", desc=True).execute()
-        conversations = result.data or []
-
-        # Fetch last message for each conversation separately
-        for conv in conversations:
-            try:
-                # Use canonical message_text for previews
-                messages = _fetch_chat_messages(
-                    supabase,
-                    conv["id"],
-                    order_desc=True,
-                    limit=10
-                )
-
-                # Reverse to get chronological order
-                conv["chat_messages"] = list(reversed(messages))
-            except Exception as msg_err:
-                logger.warning(f"[Chat] Failed to fetch messages for conversation {conv['id']}: {msg_err}")
-                conv["chat_messages"] = []
-
-        logger.info(f"[Chat] Retrieved {len(conversations)} conversations for website {website_id}")
-        return {"conversations": conversations}
+        body = await _inbox_page(user_id, [website_id], status)
+        logger.info(f"[Chat] Retrieved {len(body['conversations'])} conversations for website {website_id}")
+        return {"conversations": body["conversations"]}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[Chat] Failed to get website conversations: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to load conversations: {str(e)}")
@@ -731,10 +837,13 @@ async def send_message(request: SendMessageRequest):
             raise HTTPException(status_code=500, detail="Failed to send message")
 
         # Best-effort: bump conversation updated_at (some schemas have trigger; some don't)
+        website_id = None
         try:
-            supabase.table("chat_conversations").update({
+            conv_update = supabase.table("chat_conversations").update({
                 "updated_at": datetime.utcnow().isoformat()
             }).eq("id", request.conversation_id).execute()
+            if conv_update.data:
+                website_id = conv_update.data[0].get("website_id")
         except Exception:
             pass
 
@@ -753,6 +862,8 @@ async def send_message(request: SendMessageRequest):
             "created_at": datetime.utcnow().isoformat()
         }
 
+        chat_inbox.record_message(message_data, website_id)
+
         # Broadcast to WebSocket clients
         await manager.send_to_conversation(
             request.conversation_id,
@@ -966,6 +1077,8 @@ async def mark_messages_read(request: MarkReadRequest):
             except Exception as conv_upd_err:
                 logger.warning(f"[Chat] unread reset skipped/failed: {conv_upd_err}")
 
+        chat_inbox.mark_read(request.conversation_id, request.user_type)
+
         # Notify other users
         await manager.send_to_conversation(
             request.conversation_id,
@@ -1060,6 +1173,7 @@ async def verify_payment(
         }
         try:
             _insert_with_column_fallback(supabase, "chat_messages", sys_row)
+            chat_inbox.record_message(_normalize_message_row(dict(sys_row)), website_id)
         except Exception as sys_err:
             # Verification still succeeded; the chat just lacks a system message.
             logger.warning(f"[Chat] verify-payment: system message insert failed: {sys_err}")
@@ -1182,6 +1296,8 @@ async def close_conversation(conversation_id: str):
         except Exception as msg_err:
             logger.warning(f"[Chat] Close message insert failed: {msg_err}")
 
+        chat_inbox.invalidate_conversation(conversation_id)
+
         # Notify via WebSocket
         await manager.send_to_conversation(
             conversation_id,
@@ -1216,16 +1332,18 @@ async def add_rider_to_conversation(conversation_id: str, rider_id: str, rider_n
 
         # Send system message
         system_text = f"Rider {rider_name} telah ditugaskan untuk penghantaran ini."
+        system_row = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "sender_type": "system",
+            "message_text": system_text,
+            "message_type": "text",
+            "is_read": False,
+            "created_at": datetime.utcnow().isoformat()
+        }
         try:
-            supabase.table("chat_messages").insert({
-                "id": str(uuid.uuid4()),
-                "conversation_id": conversation_id,
-                "sender_type": "system",
-                "message_text": system_text,
-                "message_type": "text",
-                "is_read": False,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
+            supabase.table("chat_messages").insert(system_row).execute()
+            chat_inbox.record_message(_normalize_message_row(dict(system_row)))
         except Exception as msg_err:
             logger.warning(f"[Chat] Rider message insert failed: {msg_err}")
 
@@ -1304,6 +1422,7 @@ async def create_or_get_phone_conversation(data: ConversationCreate):
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create conversation")
 
+        chat_inbox.invalidate_website(data.website_id)
         logger.info(f"[Chat] Created new conversation {conversation_id} for phone {data.customer_phone}")
         conv = result.data[0]
         # Return consistent format expected by frontend widget
@@ -1353,6 +1472,7 @@ async def send_chat_message(message: MessageCreate):
             raise HTTPException(status_code=500, detail="Failed to send message")
 
         response_data = result.data[0]
+        chat_inbox.record_message(_normalize_message_row(dict(response_data)))
 
         # Broadcast to WebSocket clients if they're connected
         await manager.send_to_conversation(
@@ -1373,19 +1493,100 @@ async def send_chat_message(message: MessageCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+MESSAGE_PAGE_MAX = 200
+
+
+def _message_anchor(supabase, conversation_id: str, ref: str, allow_timestamp: bool = False) -> MessageAnchor:
+    """Resolve a `before` / `after` / `since` reference to a keyset anchor.
+    A message id is looked up (it must belong to the conversation); with
+    allow_timestamp an ISO timestamp is used as-is."""
+    if _is_uuid(ref):
+        result = supabase.table("chat_messages").select("id, created_at").eq(
+            "id", ref
+        ).eq("conversation_id", conversation_id).limit(1).execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Message not found in this conversation")
+        return result.data[0]["created_at"], str(result.data[0]["id"])
+    if allow_timestamp:
+        try:
+            datetime.fromisoformat(ref.replace("Z", "+00:00"))
+            return ref, None
+        except ValueError:
+            pass
+    raise HTTPException(status_code=400, detail="Expected a message id" + (" or ISO timestamp" if allow_timestamp else ""))
+
+
+def _messages_etag(messages: List[dict]) -> str:
+    body = json.dumps(messages, sort_keys=True, default=str).encode()
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
 @router.get("/conversations/{conversation_id}/messages")
-async def get_chat_messages(conversation_id: str):
+async def get_chat_messages(
+    conversation_id: str,
+    request: Request,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[str] = None,
+):
     """
-    Get all messages for a conversation
+    Get messages for a conversation, oldest first.
+
+    Without parameters the whole history is returned (existing clients).
+    - `limit`: page size (max 200); alone it returns the latest page
+    - `before=<message id>`: the page just older than that message
+    - `after=<message id>`: the page just newer than that message
+    - `since=<message id | ISO timestamp>`: delta sync, everything newer
+    `X-Has-More: true` means another page exists in that direction. The
+    response carries an ETag; a matching If-None-Match gets 304.
     """
     try:
+        if sum(ref is not None for ref in (before, after, since)) > 1:
+            raise HTTPException(status_code=400, detail="Use only one of before, after, since")
+        if limit is not None:
+            limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+        elif before is not None or after is not None:
+            limit = MESSAGE_PAGE_MAX
+
         supabase = get_supabase()
+        fetch_limit = limit + 1 if limit is not None else None
+
+        if before is not None:
+            anchor = _message_anchor(supabase, conversation_id, before)
+            messages = _fetch_chat_messages(
+                supabase, conversation_id, order_desc=True, limit=fetch_limit, before=anchor
+            )
+        elif after is not None or since is not None:
+            anchor = (
+                _message_anchor(supabase, conversation_id, after) if after is not None
+                else _message_anchor(supabase, conversation_id, since, allow_timestamp=True)
+            )
+            messages = _fetch_chat_messages(
+                supabase, conversation_id, order_desc=False, limit=fetch_limit, after=anchor
+            )
+        else:
+            messages = _fetch_chat_messages(
+                supabase, conversation_id, order_desc=limit is not None, limit=fetch_limit
+            )
 
-        messages = _fetch_chat_messages(supabase, conversation_id, order_desc=False)
+        has_more = fetch_limit is not None and len(messages) > limit
+        if has_more:
+            messages = messages[:limit]
+        if before is not None or (limit is not None and after is None and since is None):
+            messages.reverse()  # fetched newest first
+
+        etag = _messages_etag(messages)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Has-More": str(has_more).lower()}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
 
         logger.info(f"[Chat] Retrieved {len(messages)} messages for conversation {conversation_id}")
-        return messages
+        return JSONResponse(content=jsonable_encoder(messages), headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[Chat] Error getting messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1425,6 +1626,7 @@ async def websocket_endpoint(
     try:
         while True:
             data = await websocket.receive_json()
+            manager.touch(conversation_id, user_key)
 
             # Handle different message types
             if data.get("type") == "message":
@@ -1478,10 +1680,11 @@ async def websocket_endpoint(
 
             elif data.get("type") == "ping":
                 # Respond to ping (keep-alive)
-                await websocket.send_json({"type": "pong"})
+                await manager.send_to_user(conversation_id, user_key, {"type": "pong"})
 
     except WebSocketDisconnect:
-        manager.disconnect(conversation_id, user_key)
+        if not manager.disconnect(conversation_id, user_key, websocket):
+            return  # replaced by a newer connection; the user is still here
         logger.info(f"[Chat] User {user_type}:{user_id} disconnected from conversation {conversation_id}")
 
         # Notify others that user left
@@ -1497,4 +1700,4 @@ async def websocket_endpoint(
 
     except Exception as e:
         logger.error(f"[Chat] WebSocket error: {e}")
-        manager.disconnect(conversation_id, user_key)
+        manager.disconnect(conversation_id, user_key, websocket)
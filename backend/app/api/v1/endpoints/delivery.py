@@ -3,7 +3,7 @@ BinaApp Delivery System API Endpoints
 Handles real-time food delivery and order tracking
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import Client
@@ -15,6 +15,7 @@ from datetime import datetime, timezone
 from pydantic import BaseModel
 import os
 from supabase import create_client
+from postgrest.exceptions import APIError as PostgrestAPIError
 import bcrypt
 
 from app.core.geocoder import (
@@ -26,7 +27,13 @@ from app.core.geocoder import (
 from app.core.supabase import get_supabase_client
 from app.core.security import get_current_user, create_access_token, decode_access_token
 from app.middleware.subscription_guard import SubscriptionGuard
+from app.production.instrumentation import instrument_supabase_client
+from app.production.rate_limiter import rate_limit
+from app.services.assistant_context import assistant_context
+from app.services.chat_inbox import chat_inbox
+from app.services.order_side_effects import ensure_order_conversation, process_order_side_effects
 from app.services.subscription_service import subscription_service
+from app.services.zone_coverage import zone_coverage
 from app.models.delivery_schemas import (
     # Zones
     ZonesWithSettingsResponse,
@@ -168,7 +175,7 @@ def get_supabase_rls_client(
             detail="Supabase not configured for authenticated requests (missing SUPABASE_URL / SUPABASE_ANON_KEY)",
         )
 
-    client: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    client: Client = instrument_supabase_client(create_client(SUPABASE_URL, SUPABASE_ANON_KEY))
 
     # Apply JWT for PostgREST calls (enforces RLS)
     client.postgrest.auth(credentials.credentials)
@@ -362,14 +369,16 @@ async def send_system_message(supabase: Client, conversation_id: str, content: s
     try:
         import uuid
         # Use canonical message_text for chat_messages
-        await _db(supabase.table("chat_messages").insert({
+        row = {
             "id": str(uuid.uuid4()),
             "conversation_id": conversation_id,
             "sender_type": "system",
             "message_text": content,
             "content": content,
             "is_read": False
-        }))
+        }
+        result = await _db(supabase.table("chat_messages").insert(row))
+        chat_inbox.record_message(result.data[0] if result.data else row)
     except Exception as e:
         logger.error(f"[Chat] Error sending system message: {e}")
 
@@ -549,8 +558,12 @@ async def get_ring_coverage(
     ring the delivery address falls into. No ownership check: the lookup is
     keyed by the website_id from the public ordering URL, and the underlying
     delivery_zones.find_zone_for_point RPC is granted to `anon`.
+
+    Answered from the in-process zone index (services/zone_coverage.py) —
+    the map pin fires this on every drag, so only the first lookup per
+    website per TTL touches the database.
     """
-    # Validate website_id before hitting the RPC — a malformed UUID from a
+    # Validate website_id before any lookup — a malformed UUID from a
     # bad ordering URL should 400, not bubble up as an opaque 500.
     try:
         UUID(website_id)
@@ -558,19 +571,9 @@ async def get_ring_coverage(
         raise HTTPException(status_code=400, detail="Invalid website id")
 
     try:
-        res = await _db(supabase.rpc(
-            "find_zone_for_point",
-            {
-                "p_website_id": website_id,
-                "p_lat": lat,
-                "p_lng": lng,
-                "p_only_active": True,
-            },
-        ))
-        rows = res.data or []
-        if not rows:
+        r = await zone_coverage.find_zone(supabase, website_id, lat, lng)
+        if r is None:
             return ZoneCoverageResponse(covered=False, zone=None)
-        r = rows[0]
         return ZoneCoverageResponse(
             covered=True,
             zone=CoveredZone(
@@ -710,54 +713,71 @@ async def get_menu_item(
 # ORDER ENDPOINTS
 # =====================================================
 
-@router.post("/orders", response_model=OrderResponse)
-async def create_order(
-    order: OrderCreate,
-    supabase: Client = Depends(get_supabase_client)
-):
-    """
-    Create a new delivery order
+def _require_coordinates(order: OrderCreate) -> tuple:
+    """(lat, lng) of the delivery point, or 400 MISSING_COORDINATES.
 
-    **Public endpoint** - Customers can place orders without authentication
+    Delivery is the only flow supported — coordinates are required
+    unconditionally. Pickup is a separately scoped feature for later.
     """
-    import re
+    if order.delivery_latitude is None or order.delivery_longitude is None:
+        logger.warning(
+            f"[Order] REJECTED: missing coordinates for website {order.website_id}"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "MISSING_COORDINATES",
+                "message": "Lokasi penghantaran diperlukan",
+            },
+        )
+    return float(order.delivery_latitude), float(order.delivery_longitude)
 
-    try:
-        # =====================================================
-        # CRITICAL: VALIDATE WEBSITE ID (Single Source of Truth)
-        # =====================================================
-        # GUARD 1: Reject null/empty website IDs
-        if not order.website_id or not order.website_id.strip():
-            logger.warning("[Order] REJECTED: Order creation with empty website_id")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={
-                    "error": "MISSING_WEBSITE_ID",
-                    "message": "Website ID is required for order creation"
-                }
-            )
 
-        # GUARD 2: Validate UUID format (fail fast on malformed IDs)
-        uuid_pattern = re.compile(
-            r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-            re.IGNORECASE
-        )
-        if not uuid_pattern.match(order.website_id.strip()):
-            logger.warning(f"[Order] REJECTED: Invalid UUID format for website_id: {order.website_id[:50]}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={
-                    "error": "INVALID_UUID_FORMAT",
-                    "message": "Website ID must be a valid UUID"
-                }
-            )
+# Flipped off the first time PostgREST reports create_delivery_order missing
+# (migration 056 not applied yet); re-probed after the next restart.
+_ORDER_RPC_STATE = {"available": True}
 
-        # GUARD 3: Verify website exists in database (AUTHORITATIVE CHECK)
-        website_check = await _db(supabase.table("websites").select("id, business_name, user_id").eq(
-            "id", order.website_id.strip()
-        ))
 
-        if not website_check.data:
+async def _place_order_rpc(order: OrderCreate, lat: float, lng: float, supabase: Client) -> Optional[dict]:
+    """Validate, price and write the order in one round trip.
+
+    create_delivery_order (migration 056) checks the website, prices the
+    items from menu_items, resolves the zone with find_zone_for_point,
+    enforces the ring's minimum, inserts the order + items, upserts the
+    customer, creates the chat conversation (migration 061) and queues the
+    post-commit side effects — all in one transaction. Returns the response
+    dict, or None when the function is not deployed (caller falls back to
+    the multi-call path).
+    """
+    try:
+        res = await _db(supabase.rpc("create_delivery_order", {
+            "p_website_id": order.website_id.strip(),
+            "p_lat": lat,
+            "p_lng": lng,
+            "p_order": {
+                "customer_name": order.customer_name,
+                "customer_phone": order.customer_phone,
+                "customer_email": order.customer_email,
+                "delivery_address": order.delivery_address,
+                "delivery_notes": order.delivery_notes,
+                "payment_method": order.payment_method.value,
+            },
+            "p_items": [
+                {
+                    "menu_item_id": item.menu_item_id,
+                    "quantity": item.quantity,
+                    "options": item.options,
+                    "notes": item.notes,
+                }
+                for item in order.items
+            ],
+        }))
+    except PostgrestAPIError as e:
+        if e.code == "PGRST202":
+            logger.warning("[Order] create_delivery_order RPC missing — using multi-call path (apply migration 056)")
+            _ORDER_RPC_STATE["available"] = False
+            return None
+        if e.message == "WEBSITE_NOT_FOUND":
             logger.warning(f"[Order] REJECTED: Website not found in database: {order.website_id}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -766,71 +786,12 @@ async def create_order(
                     "message": "No website found with this ID. Cannot create order for non-existent website."
                 }
             )
-
-        # Use the CANONICAL ID from database (not user-provided)
-        canonical_website_id = website_check.data[0]["id"]
-        website_owner_id = website_check.data[0].get("user_id")
-        logger.info(f"[Order] Website validated: {canonical_website_id}")
-
-        # Replace order website_id with canonical value
-        # This ensures referential integrity even if client sent slightly different ID
-        order.website_id = canonical_website_id
-
-        # 1. Fetch menu items to calculate prices
-        menu_item_ids = [item.menu_item_id for item in order.items]
-        items_response = await _db(supabase.table("menu_items").select("*").in_(
-            "id", menu_item_ids
-        ))
-
-        if len(items_response.data) != len(menu_item_ids):
+        if e.message == "MENU_ITEMS_NOT_FOUND" or e.code == "22P02":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Some menu items not found"
             )
-
-        # Create menu items lookup
-        menu_items_map = {item['id']: item for item in items_response.data}
-
-        # 2. Resolve delivery zone server-side from the customer's
-        #    coordinates. The client-submitted order.delivery_zone_id is
-        #    IGNORED — the canonical ring is whichever one covers the
-        #    delivery point per find_zone_for_point. Two reasons:
-        #      a) Closes a fee-spoofing hole: customer could otherwise
-        #         submit any ring's id and inherit its (lower) fee.
-        #      b) Avoids reading the legacy column names (delivery_fee,
-        #         minimum_order, estimated_time_min) that migration 026
-        #         dropped from delivery_zones.
-        #
-        #    Delivery is the only flow supported in this PR — coordinates
-        #    are required unconditionally. Pickup is a separately scoped
-        #    feature for later.
-        if order.delivery_latitude is None or order.delivery_longitude is None:
-            logger.warning(
-                f"[Order] REJECTED: missing coordinates for website {order.website_id}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={
-                    "error": "MISSING_COORDINATES",
-                    "message": "Lokasi penghantaran diperlukan",
-                },
-            )
-
-        lat = float(order.delivery_latitude)
-        lng = float(order.delivery_longitude)
-
-        zone_lookup = await _db(supabase.rpc(
-            "find_zone_for_point",
-            {
-                "p_website_id": order.website_id,
-                "p_lat": lat,
-                "p_lng": lng,
-                "p_only_active": True,
-            },
-        ))
-        zone_rows = zone_lookup.data or []
-
-        if not zone_rows:
+        if e.message == "OUT_OF_COVERAGE":
             logger.info(
                 f"[Order] OUT_OF_COVERAGE for website {order.website_id} "
                 f"at ({lat}, {lng})"
@@ -842,213 +803,406 @@ async def create_order(
                     "message": "Maaf, lokasi anda di luar kawasan penghantaran",
                 },
             )
-
-        zone = zone_rows[0]
-        zone_id = str(zone["id"])
-        delivery_fee = Decimal(zone["fee_cents"]) / Decimal(100)
-        min_order_rm = Decimal(zone["min_order_cents"]) / Decimal(100)
-        estimated_delivery_min = zone.get("estimated_delivery_min")
-
-        # Telemetry only: warn if the client submitted a zone_id and it
-        # doesn't match what the server resolved. Helps detect stale
-        # frontend caches or tampering. We ignore the submission either way.
-        if order.delivery_zone_id and order.delivery_zone_id != zone_id:
-            logger.warning(
-                f"[Order] delivery_zone_id mismatch: client submitted "
-                f"{order.delivery_zone_id}, server resolved {zone_id} for "
-                f"website {order.website_id} at ({lat}, {lng})"
-            )
-
-        # 3. Calculate order totals
-        subtotal = Decimal("0")
-        order_items_data = []
-
-        for item_create in order.items:
-            menu_item = menu_items_map[item_create.menu_item_id]
-            unit_price = Decimal(str(menu_item['price']))
-
-            # TODO: Add price modifiers from options
-            total_price = unit_price * item_create.quantity
-            subtotal += total_price
-
-            order_items_data.append({
-                "menu_item_id": item_create.menu_item_id,
-                "item_name": menu_item['name'],
-                "quantity": item_create.quantity,
-                "unit_price": float(unit_price),
-                "total_price": float(total_price),
-                "options": item_create.options,
-                "notes": item_create.notes
-            })
-
-        # Minimum-order check against the server-resolved ring (in RM).
-        if subtotal < min_order_rm:
+        if e.message == "BELOW_MINIMUM":
+            min_order_rm = Decimal(e.details or 0) / Decimal(100)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Minimum pesanan untuk zon ini ialah RM{min_order_rm:.2f}",
             )
+        raise
 
-        total_amount = subtotal + delivery_fee
-
-        # 4. Create order record (order_number auto-generated by trigger).
-        #    delivery_zone_id, delivery_fee, estimated_delivery_time all
-        #    come from the server-resolved ring above — not the client.
-        order_data = {
-            "website_id": order.website_id,
-            "customer_name": order.customer_name,
-            "customer_phone": order.customer_phone,
-            "customer_email": order.customer_email,
-            "delivery_address": order.delivery_address,
-            "delivery_latitude": lat,
-            "delivery_longitude": lng,
-            "delivery_notes": order.delivery_notes,
-            "delivery_zone_id": zone_id,
-            "delivery_fee": float(delivery_fee),
-            "subtotal": float(subtotal),
-            "total_amount": float(total_amount),
-            "payment_method": order.payment_method.value,
-            "payment_status": "pending",
-            "status": "pending",
-            "estimated_prep_time": 30,  # Default 30 minutes
-            "estimated_delivery_time": estimated_delivery_min,
-        }
+    placed = res.data or {}
+    created_order = placed.get("order")
+    if not created_order:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create order"
+        )
 
-        order_response = await _db(supabase.table("delivery_orders").insert(order_data))
+    zone_id = created_order.get("delivery_zone_id")
+    if order.delivery_zone_id and order.delivery_zone_id != zone_id:
+        logger.warning(
+            f"[Order] delivery_zone_id mismatch: client submitted "
+            f"{order.delivery_zone_id}, server resolved {zone_id} for "
+            f"website {created_order.get('website_id')} at ({lat}, {lng})"
+        )
+    logger.info(
+        f"✅ Order created: {created_order['order_number']} - Total: RM{created_order['total_amount']}"
+    )
 
-        if not order_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create order"
+    conversation_id = placed.get("conversation_id")
+    if conversation_id and not placed.get("conversation_created"):
+        # Migration 056 without 061: the conversation would only appear once
+        # the order_chat job runs, so write it before handing out its id.
+        error = await ensure_order_conversation({
+            "conversation_id": conversation_id,
+            "order_id": created_order["id"],
+            "website_id": created_order["website_id"],
+            "customer_name": created_order.get("customer_name"),
+            "customer_phone": created_order.get("customer_phone"),
+        })
+        if error:
+            logger.warning(
+                f"[Order] conversation for {created_order['order_number']} not created yet: {error}"
             )
+            conversation_id = None
 
-        created_order = order_response.data[0]
-        order_id = created_order['id']
+    result = convert_db_row_to_dict(created_order)
+    result["conversation_id"] = conversation_id
+    result["customer_id"] = placed.get("customer_id")
+    return result
 
-        # 5. Create order items
-        for item_data in order_items_data:
-            item_data['order_id'] = order_id
 
-        try:
-            items_result = await _db(supabase.table("order_items").insert(order_items_data))
-            if not items_result.data:
-                logger.error(f"❌ Failed to insert order items for order {order_id}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to save order items. Please try again."
-                )
-            logger.info(f"✅ Saved {len(items_result.data)} order items")
-        except HTTPException:
-            raise
-        except Exception as items_error:
-            logger.error(f"❌ Error inserting order items: {items_error}")
-            # Try to rollback - delete the order if items failed
-            try:
-                await _db(supabase.table("delivery_orders").delete().eq("id", order_id))
-                logger.info(f"🔄 Rolled back order {order_id} due to items failure")
-            except Exception as rollback_error:
-                logger.error(f"❌ Rollback failed: {rollback_error}")
+async def _create_order_legacy(order: OrderCreate, supabase: Client) -> dict:
+    """Multi-call order creation, used until migration 056 is applied.
+
+    Sequential PostgREST round trips with a compensating delete when the
+    items insert fails; side effects run inline.
+    """
+    # GUARD 3: Verify website exists in database (AUTHORITATIVE CHECK)
+    website_check = await _db(supabase.table("websites").select("id, business_name, user_id").eq(
+        "id", order.website_id.strip()
+    ))
+
+    if not website_check.data:
+        logger.warning(f"[Order] REJECTED: Website not found in database: {order.website_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "WEBSITE_NOT_FOUND",
+                "message": "No website found with this ID. Cannot create order for non-existent website."
+            }
+        )
+
+    # Use the CANONICAL ID from database (not user-provided)
+    canonical_website_id = website_check.data[0]["id"]
+    website_owner_id = website_check.data[0].get("user_id")
+    logger.info(f"[Order] Website validated: {canonical_website_id}")
+
+    # Replace order website_id with canonical value
+    # This ensures referential integrity even if client sent slightly different ID
+    order.website_id = canonical_website_id
+
+    # 1. Fetch menu items to calculate prices
+    menu_item_ids = [item.menu_item_id for item in order.items]
+    items_response = await _db(supabase.table("menu_items").select("*").in_(
+        "id", menu_item_ids
+    ))
+
+    if len(items_response.data) != len(menu_item_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Some menu items not found"
+        )
+
+    # Create menu items lookup
+    menu_items_map = {item['id']: item for item in items_response.data}
+
+    # 2. Resolve delivery zone server-side from the customer's
+    #    coordinates. The client-submitted order.delivery_zone_id is
+    #    IGNORED — the canonical ring is whichever one covers the
+    #    delivery point per find_zone_for_point. Two reasons:
+    #      a) Closes a fee-spoofing hole: customer could otherwise
+    #         submit any ring's id and inherit its (lower) fee.
+    #      b) Avoids reading the legacy column names (delivery_fee,
+    #         minimum_order, estimated_time_min) that migration 026
+    #         dropped from delivery_zones.
+    #
+    #    Delivery is the only flow supported in this PR — coordinates
+    #    are required unconditionally. Pickup is a separately scoped
+    #    feature for later.
+    lat, lng = _require_coordinates(order)
+
+    zone_lookup = await _db(supabase.rpc(
+        "find_zone_for_point",
+        {
+            "p_website_id": order.website_id,
+            "p_lat": lat,
+            "p_lng": lng,
+            "p_only_active": True,
+        },
+    ))
+    zone_rows = zone_lookup.data or []
+
+    if not zone_rows:
+        logger.info(
+            f"[Order] OUT_OF_COVERAGE for website {order.website_id} "
+            f"at ({lat}, {lng})"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "OUT_OF_COVERAGE",
+                "message": "Maaf, lokasi anda di luar kawasan penghantaran",
+            },
+        )
+
+    zone = zone_rows[0]
+    zone_id = str(zone["id"])
+    delivery_fee = Decimal(zone["fee_cents"]) / Decimal(100)
+    min_order_rm = Decimal(zone["min_order_cents"]) / Decimal(100)
+    estimated_delivery_min = zone.get("estimated_delivery_min")
+
+    # Telemetry only: warn if the client submitted a zone_id and it
+    # doesn't match what the server resolved. Helps detect stale
+    # frontend caches or tampering. We ignore the submission either way.
+    if order.delivery_zone_id and order.delivery_zone_id != zone_id:
+        logger.warning(
+            f"[Order] delivery_zone_id mismatch: client submitted "
+            f"{order.delivery_zone_id}, server resolved {zone_id} for "
+            f"website {order.website_id} at ({lat}, {lng})"
+        )
+
+    # 3. Calculate order totals
+    subtotal = Decimal("0")
+    order_items_data = []
+
+    for item_create in order.items:
+        menu_item = menu_items_map[item_create.menu_item_id]
+        unit_price = Decimal(str(menu_item['price']))
+
+        # TODO: Add price modifiers from options
+        total_price = unit_price * item_create.quantity
+        subtotal += total_price
+
+        order_items_data.append({
+            "menu_item_id": item_create.menu_item_id,
+            "item_name": menu_item['name'],
+            "quantity": item_create.quantity,
+            "unit_price": float(unit_price),
+            "total_price": float(total_price),
+            "options": item_create.options,
+            "notes": item_create.notes
+        })
+
+    # Minimum-order check against the server-resolved ring (in RM).
+    if subtotal < min_order_rm:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Minimum pesanan untuk zon ini ialah RM{min_order_rm:.2f}",
+        )
+
+    total_amount = subtotal + delivery_fee
+
+    # 4. Create order record (order_number auto-generated by trigger).
+    #    delivery_zone_id, delivery_fee, estimated_delivery_time all
+    #    come from the server-resolved ring above — not the client.
+    order_data = {
+        "website_id": order.website_id,
+        "customer_name": order.customer_name,
+        "customer_phone": order.customer_phone,
+        "customer_email": order.customer_email,
+        "delivery_address": order.delivery_address,
+        "delivery_latitude": lat,
+        "delivery_longitude": lng,
+        "delivery_notes": order.delivery_notes,
+        "delivery_zone_id": zone_id,
+        "delivery_fee": float(delivery_fee),
+        "subtotal": float(subtotal),
+        "total_amount": float(total_amount),
+        "payment_method": order.payment_method.value,
+        "payment_status": "pending",
+        "status": "pending",
+        "estimated_prep_time": 30,  # Default 30 minutes
+        "estimated_delivery_time": estimated_delivery_min,
+    }
+
+    order_response = await _db(supabase.table("delivery_orders").insert(order_data))
+
+    if not order_response.data:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create order"
+        )
+
+    created_order = order_response.data[0]
+    order_id = created_order['id']
+
+    # 5. Create order items
+    for item_data in order_items_data:
+        item_data['order_id'] = order_id
+
+    try:
+        items_result = await _db(supabase.table("order_items").insert(order_items_data))
+        if not items_result.data:
+            logger.error(f"❌ Failed to insert order items for order {order_id}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to save order items: {str(items_error)}"
+                detail="Failed to save order items. Please try again."
             )
+        logger.info(f"✅ Saved {len(items_result.data)} order items")
+    except HTTPException:
+        raise
+    except Exception as items_error:
+        logger.error(f"❌ Error inserting order items: {items_error}")
+        # Try to rollback - delete the order if items failed
+        try:
+            await _db(supabase.table("delivery_orders").delete().eq("id", order_id))
+            logger.info(f"🔄 Rolled back order {order_id} due to items failure")
+        except Exception as rollback_error:
+            logger.error(f"❌ Rollback failed: {rollback_error}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save order items: {str(items_error)}"
+        )
 
-        # 6. Register/Get customer
-        customer = await get_or_create_customer(
+    # 6. Register/Get customer
+    customer = await get_or_create_customer(
+        supabase=supabase,
+        website_id=order.website_id,
+        phone=order.customer_phone,
+        name=order.customer_name,
+        address=order.delivery_address
+    )
+    customer_id = customer["id"] if customer else None
+
+    # 7. Create chat conversation for this order
+    conversation = None
+    conversation_id = None
+    if customer_id:
+        conversation = await create_order_conversation(
             supabase=supabase,
+            order_id=order_id,
+            order_number=created_order['order_number'],
             website_id=order.website_id,
-            phone=order.customer_phone,
-            name=order.customer_name,
-            address=order.delivery_address
+            customer_id=customer_id,
+            customer_name=order.customer_name,
+            customer_phone=order.customer_phone
         )
-        customer_id = customer["id"] if customer else None
+        conversation_id = conversation["id"] if conversation else None
 
-        # 7. Create chat conversation for this order
-        conversation = None
-        conversation_id = None
-        if customer_id:
-            conversation = await create_order_conversation(
-                supabase=supabase,
-                order_id=order_id,
-                order_number=created_order['order_number'],
-                website_id=order.website_id,
-                customer_id=customer_id,
-                customer_name=order.customer_name,
-                customer_phone=order.customer_phone
-            )
-            conversation_id = conversation["id"] if conversation else None
+        # Note: delivery_orders table does NOT have customer_id or conversation_id columns
+        # These relationships are maintained through:
+        # - website_customers table (customer by phone)
+        # - chat_conversations table (conversation by order_id)
+        # Skipping update as columns don't exist
 
-            # Note: delivery_orders table does NOT have customer_id or conversation_id columns
-            # These relationships are maintained through:
-            # - website_customers table (customer by phone)
-            # - chat_conversations table (conversation by order_id)
-            # Skipping update as columns don't exist
+        # Send system message to conversation
+        await send_system_message(
+            supabase=supabase,
+            conversation_id=conversation_id,
+            content=f"Pesanan baru #{created_order['order_number']}\n"
+                    f"{order.customer_name}\n"
+                    f"{order.delivery_address}\n"
+                    f"RM{total_amount:.2f}"
+        )
+
+    # 8. Create notification for owner
+    website_result = await _db(supabase.table("websites").select("user_id, business_name").eq("id", order.website_id).single())
+    if website_result.data:
+        owner_id = website_result.data["user_id"]
+        await create_notification(
+            supabase=supabase,
+            user_type="owner",
+            user_id=owner_id,
+            website_id=order.website_id,
+            order_id=order_id,
+            conversation_id=conversation_id,
+            notif_type="new_order",
+            title="Pesanan Baru!",
+            body=f"{order.customer_name} - RM{total_amount:.2f}"
+        )
 
-            # Send system message to conversation
-            await send_system_message(
-                supabase=supabase,
-                conversation_id=conversation_id,
-                content=f"Pesanan baru #{created_order['order_number']}\n"
-                        f"{order.customer_name}\n"
-                        f"{order.delivery_address}\n"
-                        f"RM{total_amount:.2f}"
-            )
+        # NEW: Send WhatsApp notification to owner
+        try:
+            # Get owner's phone number
+            owner_profile = await _db(supabase.table("profiles").select("phone").eq("id", owner_id).single())
+            if owner_profile.data and owner_profile.data.get("phone"):
+                notify_owner_new_order(
+                    owner_phone=owner_profile.data["phone"],
+                    order_number=created_order['order_number'],
+                    customer_name=order.customer_name,
+                    customer_phone=order.customer_phone,
+                    total_amount=float(total_amount),
+                    items=order_items_data,
+                    delivery_address=order.delivery_address
+                )
+                logger.info(f"📱 WhatsApp notification sent to owner for order {created_order['order_number']}")
+        except Exception as wa_error:
+            logger.warning(f"⚠️ Failed to send WhatsApp to owner: {wa_error}")
+            # Don't fail the order creation if WhatsApp fails
 
-        # 8. Create notification for owner
-        website_result = await _db(supabase.table("websites").select("user_id, business_name").eq("id", order.website_id).single())
-        if website_result.data:
-            owner_id = website_result.data["user_id"]
-            await create_notification(
-                supabase=supabase,
-                user_type="owner",
-                user_id=owner_id,
-                website_id=order.website_id,
-                order_id=order_id,
-                conversation_id=conversation_id,
-                notif_type="new_order",
-                title="Pesanan Baru!",
-                body=f"{order.customer_name} - RM{total_amount:.2f}"
+    # 8b. Send WhatsApp confirmation to customer with tracking link
+    try:
+        restaurant_name = website_result.data.get("business_name", "Restoran") if website_result.data else "Restoran"
+        notify_customer_order_placed(
+            customer_phone=order.customer_phone,
+            order_number=created_order['order_number'],
+            restaurant_name=restaurant_name,
+            total_amount=float(total_amount),
+        )
+        logger.info(f"📱 WhatsApp confirmation sent to customer for order {created_order['order_number']}")
+    except Exception as wa_error:
+        logger.warning(f"⚠️ Failed to send WhatsApp to customer: {wa_error}")
+        # Don't fail the order creation if WhatsApp fails
+
+    logger.info(f"✅ Order created: {created_order['order_number']} - Total: RM{total_amount}")
+
+    # 9. Return created order with conversation_id and customer_id
+    result = convert_db_row_to_dict(created_order)
+    result["conversation_id"] = conversation_id
+    result["customer_id"] = customer_id
+    return result
+
+
+
+
+@router.post("/orders", response_model=OrderResponse, dependencies=[Depends(rate_limit())])
+async def create_order(
+    order: OrderCreate,
+    background_tasks: BackgroundTasks,
+    supabase: Client = Depends(get_supabase_client)
+):
+    """
+    Create a new delivery order
+
+    **Public endpoint** - Customers can place orders without authentication
+    """
+    import re
+
+    try:
+        # =====================================================
+        # CRITICAL: VALIDATE WEBSITE ID (Single Source of Truth)
+        # =====================================================
+        # GUARD 1: Reject null/empty website IDs
+        if not order.website_id or not order.website_id.strip():
+            logger.warning("[Order] REJECTED: Order creation with empty website_id")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": "MISSING_WEBSITE_ID",
+                    "message": "Website ID is required for order creation"
+                }
             )
 
-            # NEW: Send WhatsApp notification to owner
-            try:
-                # Get owner's phone number
-                owner_profile = await _db(supabase.table("profiles").select("phone").eq("id", owner_id).single())
-                if owner_profile.data and owner_profile.data.get("phone"):
-                    notify_owner_new_order(
-                        owner_phone=owner_profile.data["phone"],
-                        order_number=created_order['order_number'],
-                        customer_name=order.customer_name,
-                        customer_phone=order.customer_phone,
-                        total_amount=float(total_amount),
-                        items=order_items_data,
-                        delivery_address=order.delivery_address
-                    )
-                    logger.info(f"📱 WhatsApp notification sent to owner for order {created_order['order_number']}")
-            except Exception as wa_error:
-                logger.warning(f"⚠️ Failed to send WhatsApp to owner: {wa_error}")
-                # Don't fail the order creation if WhatsApp fails
+        # GUARD 2: Validate UUID format (fail fast on malformed IDs)
+        uuid_pattern = re.compile(
+            r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+            re.IGNORECASE
+        )
+        if not uuid_pattern.match(order.website_id.strip()):
+            logger.warning(f"[Order] REJECTED: Invalid UUID format for website_id: {order.website_id[:50]}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": "INVALID_UUID_FORMAT",
+                    "message": "Website ID must be a valid UUID"
+                }
+            )
 
-        # 8b. Send WhatsApp confirmation to customer with tracking link
-        try:
-            restaurant_name = website_result.data.get("business_name", "Restoran") if website_result.data else "Restoran"
-            notify_customer_order_placed(
-                customer_phone=order.customer_phone,
-                order_number=created_order['order_number'],
-                restaurant_name=restaurant_name,
-                total_amount=float(total_amount),
-            )
-            logger.info(f"📱 WhatsApp confirmation sent to customer for order {created_order['order_number']}")
-        except Exception as wa_error:
-            logger.warning(f"⚠️ Failed to send WhatsApp to customer: {wa_error}")
-            # Don't fail the order creation if WhatsApp fails
+        # Delivery only — coordinates are required unconditionally (see the
+        # zone-resolution notes in _create_order_legacy).
+        lat, lng = _require_coordinates(order)
 
-        logger.info(f"✅ Order created: {created_order['order_number']} - Total: RM{total_amount}")
+        if _ORDER_RPC_STATE["available"]:
+            placed = await _place_order_rpc(order, lat, lng, supabase)
+            if placed is not None:
+                # Chat, notifications and WhatsApp were queued in the same
+                # transaction; run this order's jobs once the response is out.
+                background_tasks.add_task(process_order_side_effects, order_id=placed["id"])
+                return placed
 
-        # 9. Return created order with conversation_id and customer_id
-        result = convert_db_row_to_dict(created_order)
-        result["conversation_id"] = conversation_id
-        result["customer_id"] = customer_id
-        return result
+        return await _create_order_legacy(order, supabase)
 
     except HTTPException:
         raise
@@ -2093,6 +2247,7 @@ async def update_delivery_settings_admin(
         updated = supabase.table("delivery_settings").update(payload).eq("website_id", website_id).execute()
         if not updated.data:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update delivery settings")
+        assistant_context.website_changed(website_id)
         return convert_db_row_to_dict(updated.data[0])
     except HTTPException:
         raise
@@ -32,6 +32,7 @@ from app.core.geocoder import (
 )
 from app.core.security import get_current_user
 from app.core.supabase import get_supabase_client
+from app.services.zone_coverage import zone_coverage
 
 router = APIRouter(prefix="/zones", tags=["Delivery Zones (Owner)"])
 
@@ -224,6 +225,7 @@ async def create_zone(
         new_id = res.data
         if not new_id:
             raise HTTPException(status_code=500, detail="Insert returned no id")
+        zone_coverage.invalidate(website_id)
 
         # Fetch back via list RPC, filter client-side
         rows = supabase.rpc(
@@ -279,6 +281,7 @@ async def update_zone(
             "p_outer_radius_m": patch.outer_radius_m,
         }
         supabase.rpc("update_delivery_zone", rpc_args).execute()
+        zone_coverage.invalidate(website_id)
 
         rows = supabase.rpc(
             "list_delivery_zones", {"p_website_id": website_id}
@@ -309,9 +312,10 @@ async def delete_zone(
     # data list even on success depending on PostgREST Prefer header
     # handling, which previously caused the API to 404 after a successful
     # delete and left the UI list out of sync.
-    _verify_zone_ownership(supabase, zone_id, current_user["sub"])
+    website_id = _verify_zone_ownership(supabase, zone_id, current_user["sub"])
     try:
         supabase.table("delivery_zones").delete().eq("id", zone_id).execute()
+        zone_coverage.invalidate(website_id)
     except HTTPException:
         raise
     except Exception as e:
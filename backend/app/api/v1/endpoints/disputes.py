@@ -6,15 +6,20 @@ Handles dispute creation, AI analysis, resolution workflow, and messaging.
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import Client
-from typing import Optional
+from postgrest.exceptions import APIError as PostgrestAPIError
+from typing import Optional, Tuple
 from loguru import logger
 from datetime import datetime
+import base64
+import binascii
+import json
 import os
 import traceback
 from supabase import create_client
 
 from app.core.supabase import get_supabase_client
 from app.core.security import get_current_user
+from app.production.instrumentation import instrument_supabase_client
 from app.models.dispute_schemas import (
     DisputeCreate,
     DisputeResponse,
@@ -52,7 +57,7 @@ def get_supabase_rls_client(
             detail="Supabase not configured",
         )
 
-    client: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    client: Client = instrument_supabase_client(create_client(SUPABASE_URL, SUPABASE_ANON_KEY))
     client.postgrest.auth(credentials.credentials)
     return client
 
@@ -551,6 +556,23 @@ async def create_customer_dispute(dispute: DisputeCreate):
 # BUSINESS OWNER ENDPOINTS (Auth required)
 # =====================================================
 
+# (created_at, id) of the last dispute on the previous owner list page.
+def _encode_list_cursor(dispute: dict) -> str:
+    raw = json.dumps([dispute.get("created_at"), str(dispute["id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_list_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, dispute_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+    if not isinstance(created_at, str) or not isinstance(dispute_id, str):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return created_at, dispute_id
+
+
 @router.get("/owner/list", response_model=DisputeListResponse)
 async def list_owner_disputes(
     current_user: dict = Depends(get_current_user),
@@ -559,14 +581,29 @@ async def list_owner_disputes(
     priority: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
 ):
     """
-    List all disputes for the business owner's websites.
+    List all disputes for the business owner's websites, newest first.
     Requires authentication.
+
+    Without a cursor this is page/per_page as before, with an exact total.
+    With one, the page starts after the dispute it points at (keyset on
+    created_at, id) and the count is skipped: total is null.
     """
     supabase = get_supabase_client()
     user_id = current_user.get("sub")
 
+    anchor = None
+    if cursor:
+        try:
+            anchor = _decode_list_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
     try:
         # Get owner's website IDs
         websites = supabase.table("websites").select("id").eq(
@@ -582,7 +619,7 @@ async def list_owner_disputes(
 
         # Build query
         query = supabase.table("ai_disputes").select(
-            "*", count="exact"
+            "*", count=None if anchor else "exact"
         ).in_("website_id", website_ids)
 
         if status_filter:
@@ -592,21 +629,35 @@ async def list_owner_disputes(
         if priority:
             query = query.eq("priority", priority)
 
-        # Pagination
-        offset = (page - 1) * per_page
-        query = query.order("created_at", desc=True).range(
-            offset, offset + per_page - 1
-        )
+        # Pagination: one extra row tells us whether there is a next page
+        query = query.order("created_at", desc=True).order("id", desc=True)
+        if anchor:
+            created_at, dispute_id = anchor
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{dispute_id})'
+            ).limit(per_page + 1)
+        else:
+            offset = (page - 1) * per_page
+            query = query.range(offset, offset + per_page)
 
         result = query.execute()
 
-        total = result.count if result.count is not None else len(result.data or [])
+        rows = result.data or []
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if anchor:
+            total = None
+        else:
+            total = result.count if result.count is not None else len(rows)
 
         return DisputeListResponse(
-            disputes=[DisputeResponse(**d) for d in (result.data or [])],
+            disputes=[DisputeResponse(**d) for d in rows],
             total=total,
             page=page,
             per_page=per_page,
+            next_cursor=_encode_list_cursor(rows[-1]) if has_more else None,
         )
 
     except Exception as e:
@@ -618,6 +669,78 @@ async def list_owner_disputes(
         )
 
 
+# PostgREST has no dispute_owner_summary until migration 059 is applied.
+_SUMMARY_RPC_STATE = {"available": True}
+
+
+def _summarize_disputes(all_disputes: list) -> dict:
+    """Python fallback for dispute_owner_summary (migration 059)."""
+    # Calculate average resolution time
+    resolution_times = []
+    for d in all_disputes:
+        if d.get("resolved_at") and d.get("created_at"):
+            try:
+                created = datetime.fromisoformat(
+                    d["created_at"].replace("Z", "+00:00")
+                )
+                resolved = datetime.fromisoformat(
+                    d["resolved_at"].replace("Z", "+00:00")
+                )
+                hours = (resolved - created).total_seconds() / 3600
+                resolution_times.append(hours)
+            except (ValueError, TypeError):
+                pass
+
+    # Count by category / priority
+    by_category = {}
+    by_priority = {}
+    for d in all_disputes:
+        cat = d.get("category") or "other"
+        by_category[cat] = by_category.get(cat, 0) + 1
+        pri = d.get("priority") or "medium"
+        by_priority[pri] = by_priority.get(pri, 0) + 1
+
+    return {
+        "total": len(all_disputes),
+        "open": sum(
+            1
+            for d in all_disputes
+            if d["status"] in ("open", "under_review", "awaiting_response")
+        ),
+        "resolved": sum(
+            1 for d in all_disputes if d["status"] in ("resolved", "closed")
+        ),
+        "escalated": sum(
+            1 for d in all_disputes if d["status"] == "escalated"
+        ),
+        "total_refunded": sum(
+            float(d.get("refund_amount") or 0) for d in all_disputes
+        ),
+        "avg_resolution_hours": (
+            sum(resolution_times) / len(resolution_times)
+            if resolution_times
+            else None
+        ),
+        "by_category": by_category,
+        "by_priority": by_priority,
+    }
+
+
+def _owner_summary_rpc(supabase: Client, user_id: str) -> Optional[dict]:
+    """Aggregates from dispute_owner_summary, or None if the RPC is missing."""
+    try:
+        result = supabase.rpc(
+            "dispute_owner_summary", {"p_user_id": user_id}
+        ).execute()
+    except PostgrestAPIError as e:
+        if e.code == "PGRST202":
+            logger.warning("[Disputes] dispute_owner_summary RPC missing — summarising in Python (apply migration 059)")
+            _SUMMARY_RPC_STATE["available"] = False
+            return None
+        raise
+    return result.data or {}
+
+
 @router.get("/owner/summary", response_model=DisputeSummary)
 async def get_dispute_summary(
     current_user: dict = Depends(get_current_user),
@@ -629,90 +752,46 @@ async def get_dispute_summary(
     user_id = current_user.get("sub")
 
     try:
-        # Get owner's website IDs
-        websites = supabase.table("websites").select("id").eq(
-            "user_id", user_id
-        ).execute()
-
-        if not websites.data:
-            return DisputeSummary()
+        stats = None
+        if _SUMMARY_RPC_STATE["available"]:
+            stats = _owner_summary_rpc(supabase, user_id)
 
-        website_ids = [w["id"] for w in websites.data]
-
-        # Get all disputes for these websites
-        disputes = supabase.table("ai_disputes").select("*").in_(
-            "website_id", website_ids
-        ).execute()
-
-        all_disputes = disputes.data or []
-
-        if not all_disputes:
-            return DisputeSummary()
-
-        # Calculate summary
-        total = len(all_disputes)
-        open_count = sum(
-            1
-            for d in all_disputes
-            if d["status"] in ("open", "under_review", "awaiting_response")
-        )
-        resolved_count = sum(
-            1 for d in all_disputes if d["status"] in ("resolved", "closed")
-        )
-        escalated_count = sum(
-            1 for d in all_disputes if d["status"] == "escalated"
-        )
+        if stats is None:
+            # Get owner's website IDs
+            websites = supabase.table("websites").select("id").eq(
+                "user_id", user_id
+            ).execute()
 
-        total_refunded = sum(
-            float(d.get("refund_amount") or 0) for d in all_disputes
-        )
+            if not websites.data:
+                return DisputeSummary()
 
-        resolution_rate = (resolved_count / total * 100) if total > 0 else 0
+            website_ids = [w["id"] for w in websites.data]
 
-        # Count by category
-        by_category = {}
-        for d in all_disputes:
-            cat = d.get("category", "other")
-            by_category[cat] = by_category.get(cat, 0) + 1
+            # Get all disputes for these websites
+            disputes = supabase.table("ai_disputes").select(
+                "status, category, priority, refund_amount, created_at, resolved_at"
+            ).in_("website_id", website_ids).execute()
 
-        # Count by priority
-        by_priority = {}
-        for d in all_disputes:
-            pri = d.get("priority", "medium")
-            by_priority[pri] = by_priority.get(pri, 0) + 1
+            stats = _summarize_disputes(disputes.data or [])
 
-        # Calculate average resolution time
-        resolution_times = []
-        for d in all_disputes:
-            if d.get("resolved_at") and d.get("created_at"):
-                try:
-                    created = datetime.fromisoformat(
-                        d["created_at"].replace("Z", "+00:00")
-                    )
-                    resolved = datetime.fromisoformat(
-                        d["resolved_at"].replace("Z", "+00:00")
-                    )
-                    hours = (resolved - created).total_seconds() / 3600
-                    resolution_times.append(hours)
-                except (ValueError, TypeError):
-                    pass
+        total = int(stats.get("total") or 0)
+        if not total:
+            return DisputeSummary()
 
-        avg_time = (
-            sum(resolution_times) / len(resolution_times)
-            if resolution_times
-            else None
-        )
+        resolved_count = int(stats.get("resolved") or 0)
+        resolution_rate = resolved_count / total * 100
+        avg_time = stats.get("avg_resolution_hours")
 
         return DisputeSummary(
             total_disputes=total,
-            open_disputes=open_count,
+            open_disputes=int(stats.get("open") or 0),
             resolved_disputes=resolved_count,
-            escalated_disputes=escalated_count,
-            avg_resolution_time_hours=round(avg_time, 1) if avg_time else None,
-            total_refunded=total_refunded,
+            escalated_disputes=int(stats.get("escalated") or 0),
+            avg_resolution_time_hours=round(float(avg_time), 1) if avg_time else None,
+            total_refunded=float(stats.get("total_refunded") or 0),
             resolution_rate=round(resolution_rate, 1),
-            by_category=by_category,
-            by_priority=by_priority,
+            by_category=stats.get("by_category") or {},
+            by_priority=stats.get("by_priority") or {},
         )
 
     except Exception as e:
@@ -13,6 +13,7 @@ from loguru import logger
 
 from app.core.security import get_current_user
 from app.core.config import settings
+from app.production.instrumentation import supabase_event_hooks
 
 router = APIRouter(prefix="/founder", tags=["Founder Dashboard"])
 
@@ -34,7 +35,7 @@ async def _db_count(table: str, filters: dict = None) -> int:
         if filters:
             params.update(filters)
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
             response = await client.get(
                 f"{settings.SUPABASE_URL}/rest/v1/{table}",
                 headers={
@@ -60,7 +61,7 @@ async def _db_count(table: str, filters: dict = None) -> int:
 async def _db_query(table: str, params: dict) -> list:
     """Query records from a table."""
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
             response = await client.get(
                 f"{settings.SUPABASE_URL}/rest/v1/{table}",
                 headers={
@@ -16,7 +16,9 @@ from app.models.schemas import (
 from app.core.supabase import get_supabase_client
 from app.core.security import get_current_user
 from app.services.ai_service import ai_service
+from app.services.assistant_context import assistant_context
 from app.services.subscription_service import subscription_service
+from app.services.zone_coverage import zone_coverage
 
 router = APIRouter()
 
@@ -315,6 +317,7 @@ async def create_menu_item(
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create item")
+        assistant_context.website_changed(website_id)
 
         return {
             **result.data[0],
@@ -380,6 +383,7 @@ async def update_menu_item(
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+        assistant_context.website_changed(website_id)
 
         return result.data[0]
     except HTTPException:
@@ -413,6 +417,7 @@ async def toggle_menu_item_availability(
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+        assistant_context.website_changed(website_id)
 
         return result.data[0]
     except HTTPException:
@@ -445,6 +450,7 @@ async def delete_menu_item(
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+        assistant_context.website_changed(website_id)
 
         return None
     except HTTPException:
@@ -475,6 +481,7 @@ async def create_delivery_zone(
         # Create zone
         zone.website_id = website_id
         result = supabase.table("delivery_zones").insert(zone.dict()).execute()
+        zone_coverage.invalidate(website_id)
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create zone")
@@ -532,6 +539,7 @@ async def update_delivery_zone(
             .eq("id", zone_id)\
             .eq("website_id", website_id)\
             .execute()
+        zone_coverage.invalidate(website_id)
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Zone not found")
@@ -564,6 +572,7 @@ async def delete_delivery_zone(
             .eq("id", zone_id)\
             .eq("website_id", website_id)\
             .execute()
+        zone_coverage.invalidate(website_id)
 
         if not result.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Zone not found")
@@ -601,6 +610,7 @@ async def reorder_delivery_zones(
 
             if result.data:
                 updated_zones.extend(result.data)
+        zone_coverage.invalidate(website_id)
 
         return updated_zones
     except HTTPException:
@@ -212,6 +212,15 @@ class Settings(BaseSettings):
     EMAIL_POLLING_INTERVAL_SECONDS: int = Field(default=120, env="EMAIL_POLLING_INTERVAL_SECONDS")
     IMAP_SERVER: str = Field(default="imap.zoho.com", env="IMAP_SERVER")
     IMAP_PORT: int = Field(default=993, env="IMAP_PORT")
+    # Keep one IMAP session open and wait for new mail with IDLE instead of
+    # logging in every EMAIL_POLLING_INTERVAL_SECONDS. IDLE is re-issued
+    # every EMAIL_IMAP_IDLE_SECONDS (RFC 2177: under 29 minutes).
+    EMAIL_IMAP_IDLE_ENABLED: bool = Field(default=True, env="EMAIL_IMAP_IDLE_ENABLED")
+    EMAIL_IMAP_IDLE_SECONDS: int = Field(default=540, env="EMAIL_IMAP_IDLE_SECONDS")
+    # Inbound emails processed at once per poll, and the time one email may
+    # take (AI + DB + reply) before it is abandoned for this poll.
+    EMAIL_PROCESSING_CONCURRENCY: int = Field(default=4, env="EMAIL_PROCESSING_CONCURRENCY")
+    EMAIL_PROCESSING_TIMEOUT_SECONDS: int = Field(default=90, env="EMAIL_PROCESSING_TIMEOUT_SECONDS")
     
     # WhatsApp
     WHATSAPP_BUSINESS_PHONE: Optional[str] = Field(None, env="WHATSAPP_BUSINESS_PHONE")
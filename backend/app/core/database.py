@@ -10,6 +10,8 @@ from typing import Optional
 from loguru import logger
 from supabase import create_client, Client
 
+from app.production.instrumentation import instrument_supabase_client
+
 
 _supabase_client: Optional[Client] = None
 
@@ -51,7 +53,7 @@ def get_supabase() -> Client:
         )
 
     try:
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        _supabase_client = instrument_supabase_client(create_client(SUPABASE_URL, SUPABASE_KEY))
         logger.info("Supabase client created via database module")
         return _supabase_client
     except Exception as e:
@@ -0,0 +1,492 @@
+"""Offline Malaysian gazetteer — postcode / locality / street lookups.
+
+The geocoder (app.core.geocoder) asks this module first and only falls
+back to Nominatim when the bundled index has no confident answer. That
+takes a rate-limited third-party service off the checkout path for the
+common cases: a bare postcode, "Shah Alam", "40000 Shah Alam, Selangor",
+"Jalan Alor, KL".
+
+Index layout (little-endian, built by scripts/build_gazetteer.py from
+app/data/gazetteer/my_places.tsv):
+
+    header    magic b"MYGZ", version, n_postcodes, n_places, strings_len
+    postcodes n_postcodes fixed-width records, sorted by postcode
+    places    n_places fixed-width records, sorted by normalized name
+    strings   UTF-8 string pool referenced by (offset, length) pairs
+
+The file is opened with mmap so every worker shares the same page-cache
+copy and a postcode lookup is a binary search over the mapped records —
+nothing is parsed up front. Place names are decoded lazily on the first
+address query, when the trigram index used for fuzzy matching is built.
+
+Address matching is deliberately conservative: a street-level hit whose
+query names no other town, or a locality hit whose query carries no extra
+address detail, is answered locally. "12 Jalan Mawar 3, Shah Alam" is NOT collapsed to the Shah Alam
+centroid — that goes to Nominatim, which can place the street.
+"""
+from __future__ import annotations
+
+import difflib
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+_DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "gazetteer"
+DEFAULT_SOURCE_PATH = _DATA_DIR / "my_places.tsv"
+DEFAULT_INDEX_PATH = _DATA_DIR / "my_gazetteer.bin"
+
+_MAGIC = b"MYGZ"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHxxIII")
+# postcode, label_len, lat_e6, lng_e6, label_off
+_POSTCODE_REC = struct.Struct("<5sxHiiI")
+# postcode, kind, lat_e6, lng_e6, name_off, name_len, label_off, label_len
+_PLACE_REC = struct.Struct("<5sBiiIHIH")
+
+KIND_LOCALITY = 1
+KIND_STREET = 2
+_KIND_BY_NAME = {"locality": KIND_LOCALITY, "street": KIND_STREET}
+
+# Minimum SequenceMatcher ratio for a fuzzy name match. 0.86 lets
+# "Jln Bukit Bintan" and "Shah Alm" through but keeps "Kajang" from
+# matching "Kampar".
+MATCH_THRESHOLD = 0.86
+
+
+# =====================================================
+# Normalization
+# =====================================================
+# Common Malaysian address abbreviations → the spelling stored in the index.
+_ABBREVIATIONS: Dict[str, str] = {
+    "jln": "jalan",
+    "jl": "jalan",
+    "lrg": "lorong",
+    "tmn": "taman",
+    "kg": "kampung",
+    "kpg": "kampung",
+    "kampong": "kampung",
+    "bdr": "bandar",
+    "bkt": "bukit",
+    "sg": "sungai",
+    "psn": "persiaran",
+    "lbh": "lebuh",
+    "kl": "kuala lumpur",
+    "pj": "petaling jaya",
+    "jb": "johor bahru",
+    "kk": "kota kinabalu",
+    "seri": "sri",
+}
+
+# Tokens that never carry location detail on their own. A locality match
+# whose query leaves only these behind is answered from the index.
+_NOISE_TOKENS = frozenset({
+    "malaysia", "my", "wilayah", "persekutuan", "wp", "federal", "territory",
+    "selangor", "johor", "kedah", "kelantan", "terengganu", "pahang", "perak",
+    "perlis", "pulau", "pinang", "penang", "sabah", "sarawak", "melaka",
+    "malacca", "negeri", "sembilan", "labuan", "darul", "ehsan", "takzim",
+    "aman", "naim", "makmur", "ridzuan", "khusus",
+})
+
+# Tokens that only pad out a street address: unit / lot markers and state
+# titles. House numbers and postcodes (any token with a digit) count too.
+_ADDRESS_DETAIL_TOKENS = frozenset({
+    "no", "lot", "unit", "blok", "block", "aras", "tingkat", "level",
+    "malaysia", "my", "wilayah", "persekutuan", "wp", "federal", "territory",
+    "darul", "ehsan", "takzim", "aman", "naim", "makmur", "ridzuan", "khusus",
+})
+
+# Other ways people write a state, beyond its normalized name.
+_STATE_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "wilayah persekutuan kuala lumpur": ("kuala lumpur",),
+    "wilayah persekutuan labuan": ("labuan",),
+    "wilayah persekutuan putrajaya": ("putrajaya",),
+    "pulau pinang": ("penang", "pinang"),
+    "melaka": ("malacca",),
+}
+
+# A street hit may name a locality whose centroid is this close to the
+# street ("Jalan Alor, Bukit Bintang"); anything further is another town.
+STREET_LOCALITY_RADIUS_KM = 25.0
+
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+_POSTCODE_IN_TEXT_RE = re.compile(r"(?<!\d)(\d{5})(?!\d)")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents/punctuation and expand address abbreviations."""
+    folded = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(c for c in folded if not unicodedata.combining(c)).lower()
+    tokens = _NON_ALNUM_RE.sub(" ", folded).split()
+    return " ".join(_ABBREVIATIONS.get(t, t) for t in tokens)
+
+
+def _distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# =====================================================
+# Lookup result
+# =====================================================
+@dataclass(frozen=True)
+class GazetteerHit:
+    lat: float
+    lng: float
+    display_name: str
+    postcode: str
+    kind: str  # "postcode" | "locality" | "street"
+    score: float = 1.0
+
+    def as_result(self) -> dict:
+        """Shape expected by geocoder.GeocodeResult."""
+        return {
+            "found": True,
+            "lat": self.lat,
+            "lng": self.lng,
+            "display_name": self.display_name,
+        }
+
+
+@dataclass(frozen=True)
+class GazetteerRow:
+    kind: str
+    name: str
+    postcode: str
+    state: str
+    lat: float
+    lng: float
+
+
+# =====================================================
+# Build
+# =====================================================
+def _label(row: GazetteerRow) -> str:
+    parts = [p for p in (row.name, row.postcode, row.state, "Malaysia") if p]
+    return ", ".join(parts)
+
+
+def read_source(path: Path = DEFAULT_SOURCE_PATH) -> List[GazetteerRow]:
+    """Parse the TSV source table (see the header of my_places.tsv)."""
+    rows: List[GazetteerRow] = []
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, start=1):
+            line = line.rstrip("\n")
+            if not line or line.startswith("#") or line.startswith("kind\t"):
+                continue
+            cols = line.split("\t")
+            if len(cols) != 6:
+                raise ValueError(f"{path}:{lineno}: expected 6 columns, got {len(cols)}")
+            kind, name, postcode, state, lat, lng = cols
+            if kind not in ("postcode", "locality", "street"):
+                raise ValueError(f"{path}:{lineno}: unknown kind {kind!r}")
+            if not re.fullmatch(r"\d{5}", postcode):
+                raise ValueError(f"{path}:{lineno}: bad postcode {postcode!r}")
+            rows.append(GazetteerRow(kind, name.strip(), postcode, state.strip(), float(lat), float(lng)))
+    return rows
+
+
+def build_index(rows: Iterable[GazetteerRow]) -> bytes:
+    """Serialize rows into the mmap-able index format. Deterministic."""
+    strings = bytearray()
+    string_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def intern(s: str) -> Tuple[int, int]:
+        if s not in string_offsets:
+            raw = s.encode("utf-8")
+            string_offsets[s] = (len(strings), len(raw))
+            strings.extend(raw)
+        return string_offsets[s]
+
+    postcodes: Dict[str, GazetteerRow] = {}
+    places: List[Tuple[str, GazetteerRow]] = []
+    for row in rows:
+        if row.kind == "postcode":
+            postcodes.setdefault(row.postcode, row)
+        else:
+            places.append((normalize(row.name), row))
+
+    pc_blob = bytearray()
+    for pc in sorted(postcodes):
+        row = postcodes[pc]
+        label_off, label_len = intern(_label(row))
+        pc_blob += _POSTCODE_REC.pack(
+            pc.encode("ascii"), label_len, round(row.lat * 1e6), round(row.lng * 1e6), label_off
+        )
+
+    place_blob = bytearray()
+    for norm, row in sorted(places, key=lambda p: (p[0], p[1].postcode, p[1].kind)):
+        name_off, name_len = intern(norm)
+        label_off, label_len = intern(_label(row))
+        place_blob += _PLACE_REC.pack(
+            row.postcode.encode("ascii"),
+            _KIND_BY_NAME[row.kind],
+            round(row.lat * 1e6),
+            round(row.lng * 1e6),
+            name_off,
+            name_len,
+            label_off,
+            label_len,
+        )
+
+    header = _HEADER.pack(_MAGIC, _VERSION, len(postcodes), len(places), len(strings))
+    return header + bytes(pc_blob) + bytes(place_blob) + bytes(strings)
+
+
+# =====================================================
+# Read
+# =====================================================
+class Gazetteer:
+    """Read-only view over a built index. Thread-safe."""
+
+    def __init__(self, buf: Sequence[int] | bytes | mmap.mmap):
+        self._buf = buf
+        magic, version, n_pc, n_places, n_strings = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a BinaApp gazetteer index (bad magic/version)")
+        self._n_pc = n_pc
+        self._n_places = n_places
+        self._pc_base = _HEADER.size
+        self._place_base = self._pc_base + n_pc * _POSTCODE_REC.size
+        self._str_base = self._place_base + n_places * _PLACE_REC.size
+        if len(buf) < self._str_base + n_strings:
+            raise ValueError("Truncated gazetteer index")
+
+        # Fuzzy-match state, built on first address query.
+        self._names: Optional[List[str]] = None
+        self._by_trigram: Dict[str, List[int]] = {}
+        self._localities: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Path = DEFAULT_INDEX_PATH) -> "Gazetteer":
+        with open(path, "rb") as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped)
+
+    def __len__(self) -> int:
+        return self._n_pc + self._n_places
+
+    # -- raw record access -------------------------------------------------
+
+    def _string(self, off: int, length: int) -> str:
+        start = self._str_base + off
+        return bytes(self._buf[start:start + length]).decode("utf-8")
+
+    def _postcode_at(self, i: int) -> bytes:
+        start = self._pc_base + i * _POSTCODE_REC.size
+        return bytes(self._buf[start:start + 5])
+
+    def _place(self, i: int) -> Tuple[str, int, float, float, int, int, int, int]:
+        pc, kind, lat, lng, name_off, name_len, label_off, label_len = _PLACE_REC.unpack_from(
+            self._buf, self._place_base + i * _PLACE_REC.size
+        )
+        return pc.decode("ascii"), kind, lat / 1e6, lng / 1e6, name_off, name_len, label_off, label_len
+
+    # -- postcode ----------------------------------------------------------
+
+    def lookup_postcode(self, postcode: str) -> Optional[GazetteerHit]:
+        """Exact 5-digit postcode → centroid, via binary search over the mmap."""
+        key = postcode.strip().encode("ascii", "ignore")
+        if len(key) != 5:
+            return None
+        lo, hi = 0, self._n_pc
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._postcode_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self._n_pc or self._postcode_at(lo) != key:
+            return None
+        pc, label_len, lat, lng, label_off = _POSTCODE_REC.unpack_from(
+            self._buf, self._pc_base + lo * _POSTCODE_REC.size
+        )
+        return GazetteerHit(
+            lat=lat / 1e6,
+            lng=lng / 1e6,
+            display_name=self._string(label_off, label_len),
+            postcode=pc.decode("ascii"),
+            kind="postcode",
+        )
+
+    # -- address -----------------------------------------------------------
+
+    def _ensure_name_index(self) -> List[str]:
+        if self._names is not None:
+            return self._names
+        with self._lock:
+            if self._names is None:
+                names: List[str] = []
+                by_trigram: Dict[str, List[int]] = {}
+                localities: List[Tuple[str, float, float]] = []
+                for i in range(self._n_places):
+                    _, kind, lat, lng, name_off, name_len, _, _ = self._place(i)
+                    name = self._string(name_off, name_len)
+                    names.append(name)
+                    if kind == KIND_LOCALITY:
+                        localities.append((name, lat, lng))
+                    for tg in _trigrams(name):
+                        by_trigram.setdefault(tg, []).append(i)
+                self._by_trigram = by_trigram
+                self._localities = localities
+                self._names = names
+        return self._names
+
+    def _candidates(self, query: str, limit: int = 40) -> List[int]:
+        counts: Dict[int, int] = {}
+        for tg in _trigrams(query):
+            for i in self._by_trigram.get(tg, ()):
+                counts[i] = counts.get(i, 0) + 1
+        ranked = sorted(counts.items(), key=lambda kv: -kv[1])
+        return [i for i, _ in ranked[:limit]]
+
+    def match_address(self, query: str) -> Optional[GazetteerHit]:
+        """Fuzzy-match a free-text address. None when not confident.
+
+        Returns a street hit when a street name matches and the rest of the
+        query agrees with it (postcode region, and only house numbers or
+        the street's own locality / state besides), a locality hit only
+        when the rest of the query is noise (state / country / postcode),
+        or the postcode centroid when the query is just a postcode plus
+        noise.
+        """
+        names = self._ensure_name_index()
+        norm = normalize(query)
+        if not norm:
+            return None
+        postcode_match = _POSTCODE_IN_TEXT_RE.search(norm)
+        postcode = postcode_match.group(1) if postcode_match else None
+        tokens = [t for t in norm.split() if t != postcode]
+
+        # Streets win ties over localities: a street hit is more precise.
+        best_rank = best_score = 0.0
+        best_idx = -1
+        best_window: Tuple[int, int] = (0, 0)
+        for i in self._candidates(" ".join(tokens)):
+            name = names[i]
+            width = len(name.split())
+            pc, kind, *_ = self._place(i)
+            if postcode and pc[:2] != postcode[:2]:
+                continue  # same name, different postal region
+            for start in range(max(1, len(tokens) - width + 1)):
+                window = " ".join(tokens[start:start + width])
+                score = difflib.SequenceMatcher(None, window, name).ratio()
+                if score < MATCH_THRESHOLD:
+                    continue
+                rank = score + (0.05 if kind == KIND_STREET else 0.0)
+                if rank > best_rank:
+                    best_rank, best_score, best_idx, best_window = rank, score, i, (start, width)
+
+        if best_idx >= 0:
+            pc, kind, lat, lng, _, _, label_off, label_len = self._place(best_idx)
+            start, width = best_window
+            residual = tokens[:start] + tokens[start + width:]
+            label = self._string(label_off, label_len)
+            if (
+                self._street_fits(residual, lat, lng, label)
+                if kind == KIND_STREET
+                else _only_noise(residual)
+            ):
+                return GazetteerHit(
+                    lat=lat,
+                    lng=lng,
+                    display_name=label,
+                    postcode=pc,
+                    kind="street" if kind == KIND_STREET else "locality",
+                    score=round(best_score, 3),
+                )
+            return None
+
+        if postcode and _only_noise(tokens):
+            return self.lookup_postcode(postcode)
+        return None
+
+
+    def _street_fits(self, residual: Sequence[str], lat: float, lng: float, label: str) -> bool:
+        """Whether the query around a street name places it where the index does.
+
+        "Jalan Gaya, Kuala Lumpur" or "Jalan Penang, Ipoh" name a street the
+        index only knows in another town; those go to Nominatim.
+        """
+        rest = [
+            t for t in residual
+            if t not in _ADDRESS_DETAIL_TOKENS and not any(c.isdigit() for c in t)
+        ]
+        if not rest:
+            return True
+        state = normalize(label.rsplit(", ", 2)[-2])
+        phrases = {state, *_STATE_ALIASES.get(state, ())}
+        phrases.update(
+            name for name, llat, llng in self._localities
+            if _distance_km(lat, lng, llat, llng) <= STREET_LOCALITY_RADIUS_KM
+        )
+        text = f" {' '.join(rest)} "
+        for phrase in sorted(phrases, key=len, reverse=True):
+            text = text.replace(f" {phrase} ", " ")
+        return not text.strip()
+
+
+def _only_noise(tokens: Sequence[str]) -> bool:
+    return all(t in _NOISE_TOKENS for t in tokens)
+
+
+# =====================================================
+# Process-wide instance
+# =====================================================
+_instance: Optional[Gazetteer] = None
+_instance_loaded = False
+_instance_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Lazily mmap the bundled index. None when disabled or missing.
+
+    Set GEOCODER_OFFLINE_INDEX=off to bypass the index (pure Nominatim),
+    or to a path to load a larger, locally built index instead of the
+    bundled one.
+    """
+    global _instance, _instance_loaded
+    if _instance_loaded:
+        return _instance
+    with _instance_lock:
+        if _instance_loaded:
+            return _instance
+        setting = os.getenv("GEOCODER_OFFLINE_INDEX", "").strip()
+        if setting.lower() in ("off", "0", "false", "disabled"):
+            _instance = None
+        else:
+            path = Path(setting) if setting else DEFAULT_INDEX_PATH
+            try:
+                _instance = Gazetteer.open(path)
+                logger.info(f"[geocoder] offline gazetteer loaded: {len(_instance)} entries from {path.name}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"[geocoder] offline gazetteer unavailable ({e}); using Nominatim only")
+                _instance = None
+        _instance_loaded = True
+        return _instance
+
+
+def reset_gazetteer() -> None:
+    """Forget the cached instance (tests / index hot-swap)."""
+    global _instance, _instance_loaded
+    with _instance_lock:
+        _instance = None
+        _instance_loaded = False
@@ -1,20 +1,33 @@
-"""Shared Nominatim geocoder helpers.
+"""Shared geocoder helpers: offline gazetteer first, Nominatim fallback.
 
 Both owner-facing routes (in delivery_zones.py) and the public customer
-route (in delivery.py) call into here. Keeping the cache + Nominatim
-client in one place means a single shared User-Agent + in-process cache
-across the whole process — friendlier to Nominatim's per-IP rate limit
-than letting browsers hit the API directly.
-
-Behavior is lifted as-is from the previous in-route implementation:
-  - In-process dict cache, 7-day TTL, 5000-entry cap, oldest-10% evict.
-  - 5-digit postcode regex pre-check before hitting Nominatim.
-  - 10s timeout, surfaces 504 on timeout / 502 on other errors.
+route (in delivery.py) call into here. Lookup order:
+
+  1. Offline gazetteer (app.core.gazetteer) — bundled mmap index of
+     Malaysian postcodes, localities and streets. Answers instantly and
+     needs no network. The bundled table covers only the main town
+     postcodes (see my_places.tsv); point GEOCODER_OFFLINE_INDEX at an
+     index built with --geonames to answer all of them offline.
+  2. In-process LRU cache of previous Nominatim answers.
+  3. Shared `geocode_cache` table (migration 055) — persistent across
+     restarts and shared by every worker/instance, so one Nominatim call
+     serves the whole fleet for the TTL. Read and written over the
+     pooled Supabase REST client.
+  4. Nominatim, with a single shared User-Agent — friendlier to its per-IP
+     rate limit than letting browsers hit the API directly. Answers are
+     written back to both caches.
+
+Kept from the previous in-route implementation:
+  - 7-day TTL, 5000-entry in-process cap.
+  - 5-digit postcode regex pre-check before any lookup.
+  - 10s Nominatim timeout, surfaces 504 on timeout / 502 on other errors.
 """
 from __future__ import annotations
 
 import re
 import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import Dict, Optional
 
 import httpx
@@ -22,6 +35,9 @@ from fastapi import HTTPException
 from loguru import logger
 from pydantic import BaseModel
 
+from app.core.gazetteer import get_gazetteer
+from app.production.instrumentation import record_cache
+
 
 # =====================================================
 # Pydantic shape returned by every geocode call.
@@ -49,10 +65,10 @@ ADDRESS_MAX_LEN = 300
 
 
 # =====================================================
-# In-process cache. Process-wide; resets on restart. Adequate for our
-# scale and avoids the operational cost of adding Redis just for this.
+# In-process cache. Process-wide LRU; resets on restart. Sits in front of
+# the shared geocode_cache table so repeat lookups skip the DB round trip.
 # =====================================================
-_GEOCODE_CACHE: Dict[str, tuple[float, dict]] = {}
+_GEOCODE_CACHE: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
 _GEOCODE_TTL = 60 * 60 * 24 * 7  # 7 days
 _GEOCODE_CACHE_MAX = 5000
 
@@ -65,16 +81,115 @@ def _cache_get(key: str) -> Optional[dict]:
     if time.time() - ts >= _GEOCODE_TTL:
         _GEOCODE_CACHE.pop(key, None)
         return None
+    _GEOCODE_CACHE.move_to_end(key)
     return data
 
 
-def _cache_put(key: str, data: dict) -> None:
-    if len(_GEOCODE_CACHE) >= _GEOCODE_CACHE_MAX:
-        # Evict oldest 10% to keep amortized cost low.
-        items = sorted(_GEOCODE_CACHE.items(), key=lambda kv: kv[1][0])
-        for k, _ in items[: max(1, _GEOCODE_CACHE_MAX // 10)]:
-            _GEOCODE_CACHE.pop(k, None)
-    _GEOCODE_CACHE[key] = (time.time(), data)
+def _cache_put(key: str, data: dict, ts: Optional[float] = None) -> None:
+    _GEOCODE_CACHE[key] = (time.time() if ts is None else ts, data)
+    _GEOCODE_CACHE.move_to_end(key)
+    while len(_GEOCODE_CACHE) > _GEOCODE_CACHE_MAX:
+        _GEOCODE_CACHE.popitem(last=False)
+
+
+# =====================================================
+# Shared persistent cache (Supabase `geocode_cache`, migration 055).
+# Best-effort: a missing table or DB blip degrades to a Nominatim call,
+# never to a geocode failure.
+# =====================================================
+_SHARED_CACHE_TABLE = "geocode_cache"
+_SHARED_CACHE_TIMEOUT_SEC = 2.0
+
+
+async def _shared_cache_get(key: str) -> Optional[tuple[float, dict]]:
+    from app.services.supabase_client import supabase_service
+
+    if not supabase_service.url:
+        return None
+    params = {
+        "cache_key": f"eq.{key}",
+        "select": "found,lat,lng,display_name,updated_at",
+        "limit": "1",
+    }
+    try:
+        async with supabase_service._client() as http:
+            resp = await http.get(
+                f"{supabase_service.url}/rest/v1/{_SHARED_CACHE_TABLE}",
+                timeout=_SHARED_CACHE_TIMEOUT_SEC,
+                params=params,
+                headers=supabase_service.service_headers,
+            )
+            resp.raise_for_status()
+            rows = resp.json()
+    except Exception as e:
+        logger.debug(f"geocode_cache read skipped: {type(e).__name__}")
+        return None
+    if not rows:
+        return None
+    row = rows[0]
+    try:
+        ts = datetime.fromisoformat(str(row["updated_at"]).replace("Z", "+00:00")).timestamp()
+    except (KeyError, ValueError):
+        return None
+    if time.time() - ts >= _GEOCODE_TTL:
+        return None
+    data = {
+        "found": bool(row.get("found")),
+        "lat": row.get("lat"),
+        "lng": row.get("lng"),
+        "display_name": row.get("display_name"),
+    }
+    return ts, data
+
+
+async def _shared_cache_put(key: str, data: dict) -> None:
+    from app.services.supabase_client import supabase_service
+
+    if not supabase_service.url:
+        return
+    # updated_at is sent explicitly: a merge-duplicates upsert only writes
+    # the columns in the payload, so the column default would not refresh
+    # the TTL when an expired row is overwritten.
+    payload = {
+        "cache_key": key,
+        **data,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        async with supabase_service._client() as http:
+            resp = await http.post(
+                f"{supabase_service.url}/rest/v1/{_SHARED_CACHE_TABLE}",
+                timeout=_SHARED_CACHE_TIMEOUT_SEC,
+                json=payload,
+                headers={
+                    **supabase_service.service_headers,
+                    "Prefer": "return=minimal,resolution=merge-duplicates",
+                },
+            )
+            resp.raise_for_status()
+    except Exception as e:
+        logger.debug(f"geocode_cache write skipped: {type(e).__name__}")
+
+
+async def _cached_lookup(key: str) -> Optional[dict]:
+    """In-process LRU, then the shared table (promoting hits into the LRU)."""
+    cached = _cache_get(key)
+    if cached is not None:
+        record_cache("geocoder", "lru")
+        return cached
+    shared = await _shared_cache_get(key)
+    if shared is None:
+        record_cache("geocoder", "miss")
+        return None
+    record_cache("geocoder", "shared")
+    ts, data = shared
+    _cache_put(key, data, ts=ts)
+    return data
+
+
+async def _remember(key: str, data: dict) -> None:
+    _cache_put(key, data)
+    await _shared_cache_put(key, data)
 
 
 async def _nominatim_fetch(params: Dict[str, str]) -> list:
@@ -112,18 +227,26 @@ def _to_result(data: list) -> dict:
 # Public helpers used by route handlers
 # =====================================================
 async def geocode_postcode(postcode: str, country: str = "MY") -> GeocodeResult:
-    """Resolve a 5-digit postcode → lat/lng. Cached for 7 days.
+    """Resolve a 5-digit postcode → lat/lng.
 
-    Postcode format is validated against /^\\d{5}$/ before hitting Nominatim
-    to defend the User-Agent's IP against rate-limiting from spammy / nonsense
-    inputs (e.g. ?postcode=KFC).
+    Postcode format is validated against /^\\d{5}$/ before any lookup to
+    defend the User-Agent's IP against rate-limiting from spammy / nonsense
+    inputs (e.g. ?postcode=KFC). Malaysian postcodes in the offline index
+    never reach Nominatim.
     """
     pc = postcode.strip()
     if not _MY_POSTCODE_RE.match(pc):
         raise HTTPException(status_code=400, detail="Postcode mesti 5 digit")
 
+    if country.upper() == "MY":
+        gazetteer = get_gazetteer()
+        hit = gazetteer.lookup_postcode(pc) if gazetteer else None
+        if hit is not None:
+            record_cache("geocoder", "gazetteer")
+            return GeocodeResult(**hit.as_result())
+
     key = f"PC:{country.upper()}:{pc}"
-    cached = _cache_get(key)
+    cached = await _cached_lookup(key)
     if cached is not None:
         return GeocodeResult(**cached)
 
@@ -131,18 +254,29 @@ async def geocode_postcode(postcode: str, country: str = "MY") -> GeocodeResult:
         {"postalcode": pc, "country": country, "format": "json", "limit": "1"}
     )
     result = _to_result(data)
-    _cache_put(key, result)
+    await _remember(key, result)
     return GeocodeResult(**result)
 
 
 async def geocode_address(q: str, country: str = "MY") -> GeocodeResult:
-    """Resolve a free-text address → lat/lng. Cached for 7 days."""
+    """Resolve a free-text address → lat/lng.
+
+    The offline index answers street-level matches and bare locality /
+    postcode queries; anything more specific goes to Nominatim (cached).
+    """
     query = q.strip()
     if len(query) < ADDRESS_MIN_LEN:
         raise HTTPException(status_code=400, detail="Alamat terlalu pendek")
 
+    if country.upper() == "MY":
+        gazetteer = get_gazetteer()
+        hit = gazetteer.match_address(query) if gazetteer else None
+        if hit is not None:
+            record_cache("geocoder", "gazetteer")
+            return GeocodeResult(**hit.as_result())
+
     key = f"ADDR:{country.upper()}:{query.lower()}"
-    cached = _cache_get(key)
+    cached = await _cached_lookup(key)
     if cached is not None:
         return GeocodeResult(**cached)
 
@@ -155,5 +289,5 @@ async def geocode_address(q: str, country: str = "MY") -> GeocodeResult:
         }
     )
     result = _to_result(data)
-    _cache_put(key, result)
+    await _remember(key, result)
     return GeocodeResult(**result)
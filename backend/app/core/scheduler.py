@@ -20,8 +20,8 @@ except ImportError:
 
 from app.core.config import settings
 
-# Maximum time (seconds) a single poll cycle is allowed to run before being cancelled
-POLL_TIMEOUT_SECONDS = 180
+# A single poll cycle is cancelled after email_polling_service.poll_timeout_seconds
+# (sized for the processing budget; each email also has its own timeout).
 
 
 class EmailPollingScheduler:
@@ -95,7 +95,7 @@ class EmailPollingScheduler:
             # Wrap the poll in a timeout so a hanging IMAP/AI call can't block forever
             result = await asyncio.wait_for(
                 email_polling_service.poll_inbox(),
-                timeout=POLL_TIMEOUT_SECONDS
+                timeout=email_polling_service.poll_timeout_seconds
             )
 
             if result.get("success"):
@@ -114,7 +114,7 @@ class EmailPollingScheduler:
         except asyncio.TimeoutError:
             self._consecutive_failures += 1
             logger.error(
-                f"Polling job #{self._job_run_count} TIMED OUT after {POLL_TIMEOUT_SECONDS}s "
+                f"Polling job #{self._job_run_count} TIMED OUT after {email_polling_service.poll_timeout_seconds}s "
                 f"(consecutive failures: {self._consecutive_failures})"
             )
         except Exception as e:
@@ -127,6 +127,19 @@ class EmailPollingScheduler:
             from app.services.email_polling_service import email_polling_service
             email_polling_service.is_running = False
 
+    async def _watchdog_job(self):
+        """IDLE mode: restart the inbox watcher if it has died. The watcher
+        itself reconnects after IMAP errors; this only covers the task
+        ending (e.g. an unexpected exception)."""
+        from app.services.email_polling_service import email_polling_service
+
+        self._last_job_run = datetime.utcnow()
+        self._job_run_count += 1
+        if not email_polling_service.is_watching:
+            self._consecutive_failures += 1
+            logger.warning("Email inbox watcher not running - restarting")
+            email_polling_service.start_watching()
+
     def start(self) -> bool:
         """Start the email polling scheduler"""
         if not APSCHEDULER_AVAILABLE:
@@ -151,13 +164,18 @@ class EmailPollingScheduler:
             return False
 
         try:
+            from app.services.email_polling_service import email_polling_service
+
             interval_seconds = settings.EMAIL_POLLING_INTERVAL_SECONDS
+            # IDLE mode: the watcher task holds one IMAP session and reacts
+            # to new mail itself; the interval job only keeps it alive.
+            idle_mode = settings.EMAIL_IMAP_IDLE_ENABLED
 
             self.scheduler.add_job(
-                self._poll_job,
+                self._watchdog_job if idle_mode else self._poll_job,
                 trigger=IntervalTrigger(seconds=interval_seconds),
                 id=self.JOB_ID,
-                name="Email Polling Job",
+                name="Email Inbox Watchdog" if idle_mode else "Email Polling Job",
                 replace_existing=True
             )
 
@@ -166,7 +184,11 @@ class EmailPollingScheduler:
             self._started_at = datetime.utcnow()
             self._consecutive_failures = 0
 
-            logger.info(f"Email polling scheduler started (interval: {interval_seconds}s)")
+            if idle_mode:
+                email_polling_service.start_watching()
+                logger.info(f"Email inbox watcher started (IMAP IDLE, watchdog every {interval_seconds}s)")
+            else:
+                logger.info(f"Email polling scheduler started (interval: {interval_seconds}s)")
             return True
 
         except Exception as e:
@@ -186,6 +208,9 @@ class EmailPollingScheduler:
             return True
 
         try:
+            from app.services.email_polling_service import email_polling_service
+            email_polling_service.stop_watching()
+
             try:
                 self.scheduler.remove_job(self.JOB_ID)
             except Exception:
@@ -247,7 +272,7 @@ class EmailPollingScheduler:
         try:
             result = await asyncio.wait_for(
                 email_polling_service.poll_inbox(),
-                timeout=POLL_TIMEOUT_SECONDS
+                timeout=email_polling_service.poll_timeout_seconds
             )
             return {
                 "success": True,
@@ -255,10 +280,10 @@ class EmailPollingScheduler:
                 "result": result
             }
         except asyncio.TimeoutError:
-            logger.error(f"Manual poll timed out after {POLL_TIMEOUT_SECONDS}s")
+            logger.error(f"Manual poll timed out after {email_polling_service.poll_timeout_seconds}s")
             return {
                 "success": False,
-                "message": f"Manual poll timed out after {POLL_TIMEOUT_SECONDS}s",
+                "message": f"Manual poll timed out after {email_polling_service.poll_timeout_seconds}s",
                 "error": "timeout"
             }
         except Exception as e:
@@ -294,11 +319,14 @@ class EmailPollingScheduler:
             "consecutive_failures": self._consecutive_failures,
             "next_run_time": next_run_time,
             "polling_interval_seconds": settings.EMAIL_POLLING_INTERVAL_SECONDS,
+            "mode": "idle" if settings.EMAIL_IMAP_IDLE_ENABLED else "interval",
             "job_info": job_info
         }
 
     def shutdown(self):
         """Gracefully shutdown the scheduler"""
+        from app.services.email_polling_service import email_polling_service
+        email_polling_service.stop_watching()
         if self.scheduler and self.scheduler.running:
             try:
                 self.scheduler.shutdown(wait=False)
@@ -658,3 +686,262 @@ def start_analytics_cleanup() -> bool:
 def stop_analytics_cleanup() -> None:
     """Shutdown helper — mirrors stop_stuck_generation_sweeper."""
     analytics_cleanup_scheduler.shutdown()
+
+
+# ============================================================
+# Order side-effect queue sweeper
+# ============================================================
+#
+# create_delivery_order (migration 056) queues each order's chat /
+# notification / WhatsApp work in order_side_effects. create_order runs an
+# order's jobs right after its response; this sweep catches whatever that
+# missed (worker restart, failed attempt waiting out its backoff). Mirrors
+# AnalyticsCleanupScheduler's lifecycle so main.py can start/stop it the
+# same way.
+
+_ORDER_SIDE_EFFECT_INTERVAL_DEFAULT_SECONDS = 30
+
+
+def _order_side_effect_interval_seconds() -> int:
+    """Resolve the sweep interval from env, with a 5-second floor."""
+    raw = os.getenv("ORDER_SIDE_EFFECT_INTERVAL_SECONDS")
+    if not raw:
+        return _ORDER_SIDE_EFFECT_INTERVAL_DEFAULT_SECONDS
+    try:
+        value = int(float(raw))
+    except (TypeError, ValueError):
+        return _ORDER_SIDE_EFFECT_INTERVAL_DEFAULT_SECONDS
+    return max(5, value)
+
+
+class OrderSideEffectScheduler:
+    """APScheduler wrapper around `process_order_side_effects`."""
+
+    JOB_ID = "order_side_effect_sweep_job"
+
+    def __init__(self) -> None:
+        self.scheduler: Optional[Any] = None
+        self._is_running = False
+        self._last_job_run: Optional[datetime] = None
+        self._job_run_count = 0
+        self._last_result: Dict[str, int] = {}
+        self._create_scheduler()
+
+    def _create_scheduler(self) -> None:
+        if not APSCHEDULER_AVAILABLE:
+            return
+        try:
+            self.scheduler = AsyncIOScheduler(
+                jobstores={"default": MemoryJobStore()},
+                executors={"default": AsyncIOExecutor()},
+                job_defaults={
+                    "coalesce": True,
+                    "max_instances": 1,
+                    "misfire_grace_time": 30,
+                },
+                timezone="UTC",
+            )
+        except Exception as e:
+            logger.error(f"Failed to create order-side-effect scheduler: {e}")
+            self.scheduler = None
+
+    def is_available(self) -> bool:
+        return APSCHEDULER_AVAILABLE and self.scheduler is not None
+
+    @property
+    def is_running(self) -> bool:
+        return (
+            self._is_running
+            and self.scheduler is not None
+            and self.scheduler.running
+        )
+
+    async def _sweep_job(self) -> None:
+        from app.services.order_side_effects import process_order_side_effects
+
+        self._last_job_run = datetime.utcnow()
+        self._job_run_count += 1
+        # process_order_side_effects never raises.
+        self._last_result = await process_order_side_effects()
+
+    def start(self) -> bool:
+        if not APSCHEDULER_AVAILABLE:
+            logger.warning(
+                "[order-side-effects] APScheduler not installed — sweeper disabled"
+            )
+            return False
+        if self.is_running:
+            return True
+        if self.scheduler is None:
+            self._create_scheduler()
+        if not self.is_available():
+            return False
+        try:
+            interval = _order_side_effect_interval_seconds()
+            self.scheduler.add_job(
+                self._sweep_job,
+                trigger=IntervalTrigger(seconds=interval),
+                id=self.JOB_ID,
+                name="Order Side-Effect Sweep",
+                replace_existing=True,
+            )
+            self.scheduler.start()
+            self._is_running = True
+            logger.info(
+                f"[order-side-effects] scheduler started (interval: {interval}s)"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"[order-side-effects] failed to start: {e}")
+            self._create_scheduler()
+            return False
+
+    def shutdown(self) -> None:
+        if self.scheduler and self.scheduler.running:
+            try:
+                self.scheduler.shutdown(wait=False)
+                logger.info("[order-side-effects] scheduler shutdown complete")
+            except Exception as e:
+                logger.error(f"[order-side-effects] error during shutdown: {e}")
+        self._is_running = False
+
+
+order_side_effect_scheduler = OrderSideEffectScheduler()
+
+
+def start_order_side_effect_sweeper() -> bool:
+    """Startup helper — mirrors start_analytics_cleanup."""
+    return order_side_effect_scheduler.start()
+
+
+def stop_order_side_effect_sweeper() -> None:
+    """Shutdown helper — mirrors stop_analytics_cleanup."""
+    order_side_effect_scheduler.shutdown()
+
+
+# ============================================================
+# Email outbox flusher
+# ============================================================
+#
+# EmailService.queue_email (migration 058) puts bulk email on email_outbox;
+# this job sends what is due over pooled SMTP connections and retries
+# failures with backoff. Same lifecycle as OrderSideEffectScheduler.
+
+_EMAIL_OUTBOX_INTERVAL_DEFAULT_SECONDS = 60
+
+
+def _email_outbox_interval_seconds() -> int:
+    """Resolve the flush interval from env, with a 10-second floor."""
+    raw = os.getenv("EMAIL_OUTBOX_INTERVAL_SECONDS")
+    if not raw:
+        return _EMAIL_OUTBOX_INTERVAL_DEFAULT_SECONDS
+    try:
+        value = int(float(raw))
+    except (TypeError, ValueError):
+        return _EMAIL_OUTBOX_INTERVAL_DEFAULT_SECONDS
+    return max(10, value)
+
+
+class EmailOutboxScheduler:
+    """APScheduler wrapper around `flush_email_outbox`."""
+
+    JOB_ID = "email_outbox_flush_job"
+
+    def __init__(self) -> None:
+        self.scheduler: Optional[Any] = None
+        self._is_running = False
+        self._last_job_run: Optional[datetime] = None
+        self._job_run_count = 0
+        self._last_result: Dict[str, int] = {}
+        self._create_scheduler()
+
+    def _create_scheduler(self) -> None:
+        if not APSCHEDULER_AVAILABLE:
+            return
+        try:
+            self.scheduler = AsyncIOScheduler(
+                jobstores={"default": MemoryJobStore()},
+                executors={"default": AsyncIOExecutor()},
+                job_defaults={
+                    "coalesce": True,
+                    "max_instances": 1,
+                    "misfire_grace_time": 60,
+                },
+                timezone="UTC",
+            )
+        except Exception as e:
+            logger.error(f"Failed to create email-outbox scheduler: {e}")
+            self.scheduler = None
+
+    def is_available(self) -> bool:
+        return APSCHEDULER_AVAILABLE and self.scheduler is not None
+
+    @property
+    def is_running(self) -> bool:
+        return (
+            self._is_running
+            and self.scheduler is not None
+            and self.scheduler.running
+        )
+
+    async def _flush_job(self) -> None:
+        from app.services.email_outbox import flush_email_outbox
+
+        self._last_job_run = datetime.utcnow()
+        self._job_run_count += 1
+        # flush_email_outbox never raises.
+        self._last_result = await flush_email_outbox()
+
+    def start(self) -> bool:
+        if not APSCHEDULER_AVAILABLE:
+            logger.warning(
+                "[email-outbox] APScheduler not installed — flusher disabled"
+            )
+            return False
+        if self.is_running:
+            return True
+        if self.scheduler is None:
+            self._create_scheduler()
+        if not self.is_available():
+            return False
+        try:
+            interval = _email_outbox_interval_seconds()
+            self.scheduler.add_job(
+                self._flush_job,
+                trigger=IntervalTrigger(seconds=interval),
+                id=self.JOB_ID,
+                name="Email Outbox Flush",
+                replace_existing=True,
+            )
+            self.scheduler.start()
+            self._is_running = True
+            logger.info(
+                f"[email-outbox] scheduler started (interval: {interval}s)"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"[email-outbox] failed to start: {e}")
+            self._create_scheduler()
+            return False
+
+    def shutdown(self) -> None:
+        if self.scheduler and self.scheduler.running:
+            try:
+                self.scheduler.shutdown(wait=False)
+                logger.info("[email-outbox] scheduler shutdown complete")
+            except Exception as e:
+                logger.error(f"[email-outbox] error during shutdown: {e}")
+        self._is_running = False
+
+
+email_outbox_scheduler = EmailOutboxScheduler()
+
+
+def start_email_outbox_flusher() -> bool:
+    """Startup helper — mirrors start_order_side_effect_sweeper."""
+    return email_outbox_scheduler.start()
+
+
+def stop_email_outbox_flusher() -> None:
+    """Shutdown helper — mirrors stop_order_side_effect_sweeper."""
+    email_outbox_scheduler.shutdown()
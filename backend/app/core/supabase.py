@@ -7,6 +7,8 @@ from supabase import create_client, Client
 from typing import Optional
 from loguru import logger
 
+from app.production.instrumentation import instrument_supabase_client
+
 
 # Global Supabase client instance
 _supabase_client: Optional[Client] = None
@@ -45,7 +47,7 @@ def get_supabase_client() -> Client:
         raise RuntimeError("Supabase not configured. Please set SUPABASE_URL and SUPABASE_SERVICE_KEY")
 
     try:
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        _supabase_client = instrument_supabase_client(create_client(SUPABASE_URL, SUPABASE_KEY))
         logger.info("✅ Supabase client created for API endpoints")
         return _supabase_client
     except Exception as e:
@@ -344,11 +344,15 @@ class SubscriptionCronJob:
                 f"to={to_email} subject={subject!r}"
             )
             return True
-        return await email_service._send_email(
+        # Queued, sent in batches over pooled SMTP at the end of run().
+        # The key keeps a same-day re-run from queuing the email twice.
+        return await email_service.queue_email(
             to_email=to_email,
             subject=subject,
             html_content=html_content,
             text_content=text_content,
+            kind=f"subscription_{email_type or 'unknown'}",
+            dedupe_key=f"subscription:{email_type or 'unknown'}:{to_email}:{datetime.utcnow().date()}",
         )
 
     def _get_user_info(self, subscription: Dict[str, Any]) -> tuple:
@@ -785,6 +789,14 @@ class SubscriptionCronJob:
             results["success"] = False
             results["error"] = str(e)
 
+        # Send what the steps queued (also what an earlier failed run left).
+        if not self.dry_run:
+            from app.services.email_outbox import flush_email_outbox
+            from app.services.smtp_pool import close_smtp_pools
+
+            results["email_outbox"] = await flush_email_outbox()
+            await close_smtp_pools()
+
         end_time = datetime.utcnow()
         results["end_time"] = end_time.isoformat()
         results["duration_seconds"] = (end_time - start_time).total_seconds()
@@ -12,8 +12,8 @@ import re
 import cloudinary
 import cloudinary.uploader
 from datetime import datetime, timedelta
-from collections import defaultdict
 import hashlib
+import hmac
 import time
 import uuid
 import asyncio
@@ -32,6 +32,9 @@ from app.api.chatbot import router as chatbot_router
 from app.api.menu_designer import router as menu_designer_router
 from app.services.templates import template_service
 from app.services.edit_guards import apply_edit_guards
+from app.services.assistant_context import assistant_context
+from app.services.chat_inbox import chat_inbox
+from app.services.zone_coverage import zone_coverage
 from app.core.security import get_current_user
 from app.core.config import settings
 
@@ -55,6 +58,16 @@ from app.services.analytics_tracking import (
 # Email polling system
 from app.api.v1.endpoints.email_polling import router as email_polling_router
 from app.utils.html_inject import insert_before_body
+from app.production.instrumentation import instrument_supabase_client, observe_request
+from app.production.metrics import get_metrics
+from app.production.query_profiler import query_profile_middleware
+from app.production.rate_limiter import (
+    SLIDING_WINDOW,
+    RateLimitRule,
+    client_identifier,
+    get_rate_limiter,
+    rate_limit,
+)
 
 # Initialize AI service
 ai_service = AIService()
@@ -98,7 +111,7 @@ def init_supabase():
 
     try:
         from supabase import create_client, Client
-        client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        client: Client = instrument_supabase_client(create_client(SUPABASE_URL, SUPABASE_KEY))
         logger.info("✅ Supabase client created successfully!")
 
         # Test connection by making a simple query
@@ -258,20 +271,31 @@ async def add_security_headers(request: Request, call_next):
 from app.middleware.subdomain import subdomain_middleware as _subdomain_middleware
 app.middleware("http")(_subdomain_middleware)
 
+# ============================================
+# SUPABASE QUERY PROFILER (N+1 detection)
+# ============================================
+# Off unless the request carries X-Query-Profile: $QUERY_PROFILE_TOKEN or is
+# picked by QUERY_PROFILE_SAMPLE_RATE. Wraps subdomain serving too, so the
+# public-site path is profiled like any API route.
+app.middleware("http")(query_profile_middleware)
+
 # ============================================
 # REQUEST TIMING (performance visibility)
 # ============================================
 # Registered last so it is the outermost middleware and measures the full
 # request, including subdomain serving. Every response gets an
 # X-Process-Time-Ms header; anything slower than the threshold is logged so
-# slow endpoints show up in Render logs without extra tooling.
+# slow endpoints show up in Render logs without extra tooling. The same
+# measurement feeds the per-route latency histogram served on /metrics.
 SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "500"))
 
 @app.middleware("http")
 async def request_timing(request: Request, call_next):
     start = time.perf_counter()
     response = await call_next(request)
-    duration_ms = (time.perf_counter() - start) * 1000
+    elapsed = time.perf_counter() - start
+    observe_request(request, response.status_code, elapsed)
+    duration_ms = elapsed * 1000
     response.headers["X-Process-Time-Ms"] = f"{duration_ms:.0f}"
     if duration_ms >= SLOW_REQUEST_THRESHOLD_MS:
         logger.warning(
@@ -341,6 +365,34 @@ async def startup_event():
     except Exception as e:
         logger.error(f"📊 Failed to start analytics cleanup: {e}")
 
+    # Order side-effect queue sweep (migration 056): retries chat /
+    # notification / WhatsApp jobs that did not run right after checkout.
+    try:
+        from app.core.scheduler import start_order_side_effect_sweeper
+
+        if start_order_side_effect_sweeper():
+            logger.info("📦 Order side-effect sweeper started")
+        else:
+            logger.warning(
+                "📦 Order side-effect sweeper not started (APScheduler unavailable?)"
+            )
+    except Exception as e:
+        logger.error(f"📦 Failed to start order side-effect sweeper: {e}")
+
+    # Email outbox flush (migration 058): sends queued email over pooled
+    # SMTP connections and retries failures.
+    try:
+        from app.core.scheduler import start_email_outbox_flusher
+
+        if start_email_outbox_flusher():
+            logger.info("✉️ Email outbox flusher started")
+        else:
+            logger.warning(
+                "✉️ Email outbox flusher not started (APScheduler unavailable?)"
+            )
+    except Exception as e:
+        logger.error(f"✉️ Failed to start email outbox flusher: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -371,6 +423,24 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"📊 Error stopping analytics cleanup: {e}")
 
+    # Stop order side-effect sweeper
+    try:
+        from app.core.scheduler import stop_order_side_effect_sweeper
+        stop_order_side_effect_sweeper()
+        logger.info("📦 Order side-effect sweeper stopped")
+    except Exception as e:
+        logger.error(f"📦 Error stopping order side-effect sweeper: {e}")
+
+    # Stop email outbox flusher and QUIT pooled SMTP connections
+    try:
+        from app.core.scheduler import stop_email_outbox_flusher
+        from app.services.smtp_pool import close_smtp_pools
+        stop_email_outbox_flusher()
+        await close_smtp_pools()
+        logger.info("✉️ Email outbox flusher stopped, SMTP connections closed")
+    except Exception as e:
+        logger.error(f"✉️ Error stopping email outbox flusher: {e}")
+
     # Close the pooled Supabase REST client
     try:
         from app.services.supabase_client import supabase_service
@@ -401,9 +471,11 @@ if CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET:
 else:
     logger.warning("☁️ Cloudinary not configured - will use base64 fallback")
 
-# Rate limiting
-user_usage = defaultdict(lambda: {"count": 0, "reset_time": datetime.now()})
+# Rate limiting — free-tier daily quota, shared across workers when
+# RATE_LIMIT_REDIS_URL is set (see app/production/rate_limiter.py)
 FREE_LIMIT = 3  # 3 generations per day
+GENERATION_QUOTA = "generation_daily"
+GENERATION_QUOTA_RULE = RateLimitRule(FREE_LIMIT, 86400, SLIDING_WINDOW)
 
 # Founder/Admin emails with unlimited access — set via UNLIMITED_ACCESS_EMAILS env var
 UNLIMITED_ACCESS_EMAILS = settings.UNLIMITED_ACCESS_EMAILS
@@ -442,6 +514,21 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint, behind `Authorization: Bearer
+    <METRICS_TOKEN>`. Without METRICS_TOKEN the endpoint is disabled."""
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+    return Response(
+        content=get_metrics().export(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.options("/{path:path}")
 async def options_handler(path: str):
     """Handle preflight OPTIONS requests for all paths"""
@@ -467,9 +554,9 @@ async def check_keys():
 
 
 @app.get("/api/usage")
-async def get_usage(user_id: str = "anonymous"):
+async def get_usage(request: Request, user_id: str = "anonymous"):
     """Get user's current usage"""
-    return check_rate_limit(user_id)
+    return await check_rate_limit(free_quota_key(user_id, request))
 
 
 @app.get("/api/generate/progress/{session_id}")
@@ -483,7 +570,16 @@ async def get_progress(session_id: str):
     return progress
 
 
-def check_rate_limit(user_id: str = "anonymous", user_email: Optional[str] = None) -> dict:
+def free_quota_key(user_id: Optional[str], request: Request) -> str:
+    """Key of the free-tier generation quota: the account, or for guests
+    their client address — never one bucket shared by every visitor."""
+    if not user_id or user_id in ("anonymous", "demo-user", "guest"):
+        trusted = get_rate_limiter().config.trusted_proxy_count
+        return f"guest:{client_identifier(request, trusted)}"
+    return user_id
+
+
+async def check_rate_limit(user_id: str = "anonymous", user_email: Optional[str] = None) -> dict:
     """Check if user has exceeded daily limit"""
 
     # Founders have unlimited access - bypass limit check
@@ -497,32 +593,28 @@ def check_rate_limit(user_id: str = "anonymous", user_email: Optional[str] = Non
             "is_founder": True
         }
 
-    # Regular users have daily limit
-    now = datetime.now()
-    user = user_usage[user_id]
-
-    if now - user["reset_time"] > timedelta(days=1):
-        user["count"] = 0
-        user["reset_time"] = now
-
-    remaining = FREE_LIMIT - user["count"]
+    # Regular users have a rolling 24h limit
+    quota = await get_rate_limiter().peek(GENERATION_QUOTA, user_id, rule=GENERATION_QUOTA_RULE)
+    # Denied: when the oldest generation ages out. Allowed: when the newest
+    # does (or a day from now if there is none yet).
+    reset_in = quota.retry_after if not quota.allowed else (quota.reset_after or 86400)
 
     return {
-        "allowed": remaining > 0,
-        "remaining": max(0, remaining),
+        "allowed": quota.allowed,
+        "remaining": max(0, quota.remaining),
         "limit": FREE_LIMIT,
-        "reset_time": (user["reset_time"] + timedelta(days=1)).isoformat()
+        "reset_time": (datetime.now() + timedelta(seconds=reset_in)).isoformat()
     }
 
 
-def increment_usage(user_id: str = "anonymous", user_email: Optional[str] = None):
+async def increment_usage(user_id: str = "anonymous", user_email: Optional[str] = None):
     """Increment usage count for non-founder users"""
     # Don't increment for founders (they have unlimited access)
     if user_email and user_email.lower() in [e.lower() for e in UNLIMITED_ACCESS_EMAILS]:
         logger.info(f"🔓 Founder {user_email} - not incrementing usage count")
         return
 
-    user_usage[user_id]["count"] += 1
+    await get_rate_limiter().hit(GENERATION_QUOTA, user_id, rule=GENERATION_QUOTA_RULE)
 
 
 # ==================== ASYNC JOB MANAGEMENT (SUPABASE) ====================
@@ -678,8 +770,8 @@ def _strip_analytics_block(html: str) -> str:
     """Remove the BinaApp analytics <script> block from generated HTML.
 
     Idempotent — returns the input unchanged when the block is absent.
-    Matches the marker comment injected by run_website_generation,
-    generate_simple, and generate_style_variation.
+    Matches the marker comment injected by generate_simple and
+    generate_style_variation.
     """
     if not html or "BinaApp Analytics" not in html:
         return html
@@ -713,203 +805,6 @@ def _website_analytics_enabled(website_id: Optional[str]) -> bool:
         return True
 
 
-async def run_website_generation(job_id: str, description: str, language: str, user_id: str):
-    """Background task to generate website - runs async"""
-    try:
-        logger.info(f"🚀 Starting background generation for job {job_id[:8]}")
-
-        # Update progress: 10%
-        await save_job_to_supabase(job_id, {
-            "status": "processing",
-            "progress": 10,
-            "description": description,
-            "language": language,
-            "user_id": user_id
-        })
-
-        # Detect business type
-        business_type = detect_business_type(description)
-        logger.info(f"📋 Detected: {business_type}")
-
-        # Get stock images
-        stock_images = get_stock_images(description)
-
-        # Update progress: 20%
-        await save_job_to_supabase(job_id, {
-            "status": "processing",
-            "progress": 20
-        })
-
-        # STEP 1: Generate AI Images (if available)
-        logger.info("🎨 STEP 1: Generating images...")
-        ai_images = None
-
-        if STABILITY_API_KEY:
-            ai_images = await generate_all_images(description)
-
-        hero_img = ai_images['hero'] if ai_images else stock_images['hero']
-        gallery_imgs = ai_images['gallery'] if ai_images else stock_images['gallery']
-
-        # Update progress: 30%
-        await save_job_to_supabase(job_id, {
-            "status": "processing",
-            "progress": 30
-        })
-
-        # Define 3 style variations
-        styles_config = [
-            {
-                "name": "modern",
-                "display_name": "Modern",
-                "description": "Vibrant gradients (purple to blue), glassmorphism effects, rounded corners",
-                "colors": "purple-600, blue-500, gradient backgrounds",
-                "font": "bold, modern sans-serif",
-                "progress_percent": 40
-            },
-            {
-                "name": "minimal",
-                "display_name": "Minimal",
-                "description": "Clean white background, lots of whitespace, simple black text",
-                "colors": "white, black, gray-100, one accent color",
-                "font": "thin, elegant, light weight",
-                "progress_percent": 65
-            },
-            {
-                "name": "bold",
-                "display_name": "Bold",
-                "description": "Dark theme with black/dark gray background, large impactful typography",
-                "colors": "black, dark gray, neon cyan/pink accents",
-                "font": "extra bold, uppercase headings",
-                "progress_percent": 90
-            }
-        ]
-
-        generated_styles = []
-
-        # STEP 2 & 3: Generate each style variation
-        for style in styles_config:
-            logger.info(f"🎨 Generating {style['display_name']} style...")
-
-            # Update progress
-            await save_job_to_supabase(job_id, {
-                "status": "processing",
-                "progress": style["progress_percent"]
-            })
-
-            gallery_urls = gallery_imgs if isinstance(gallery_imgs, list) else [gallery_imgs] * 4
-
-            # DeepSeek generates HTML structure
-            deepseek_prompt = f"""Create a stunning {style['display_name']} website for: {description}
-
-DESIGN STYLE: {style['description']}
-COLORS: {style['colors']}
-TYPOGRAPHY: {style['font']}
-
-Business Type: {business_type}
-
-Use these placeholders:
-- [BUSINESS_NAME], [BUSINESS_TAGLINE], [ABOUT_TEXT]
-- [SERVICE_1_TITLE], [SERVICE_1_DESC]
-- [SERVICE_2_TITLE], [SERVICE_2_DESC]
-- [SERVICE_3_TITLE], [SERVICE_3_DESC]
-- [CTA_TEXT], [FOOTER_TEXT]
-
-IMAGES (use these EXACT URLs - each gallery image is DIFFERENT):
-- Hero: {hero_img}
-- Gallery 1: {gallery_urls[0] if len(gallery_urls) > 0 else hero_img}
-- Gallery 2: {gallery_urls[1] if len(gallery_urls) > 1 else hero_img}
-- Gallery 3: {gallery_urls[2] if len(gallery_urls) > 2 else hero_img}
-- Gallery 4: {gallery_urls[3] if len(gallery_urls) > 3 else hero_img}
-
-Requirements:
-1. <!DOCTYPE html> with <script src="https://cdn.tailwindcss.com"></script>
-2. Mobile responsive
-3. Sections: Header, Hero, About, Services (3 cards), Gallery (4 DIFFERENT images), Contact, Footer
-4. WhatsApp button: <a href="https://wa.me/60123456789">WhatsApp</a>
-
-Output ONLY complete HTML."""
-
-            html_structure = await call_deepseek(deepseek_prompt)
-
-            if not html_structure:
-                logger.warning(f"🔷 DeepSeek failed for {style['name']}, skipping...")
-                continue
-
-            html_structure = extract_html(html_structure)
-
-            # Qwen improves content
-            qwen_prompt = f"""Replace ALL placeholders with {'Malaysian-friendly' if language == 'ms' else 'English'} content.
-
-Business: {description}
-Style: {style['display_name']}
-
-REPLACE:
-- [BUSINESS_NAME] → Business name
-- [BUSINESS_TAGLINE] → Catchy tagline
-- [ABOUT_TEXT] → About us (2-3 sentences)
-- [SERVICE_1_TITLE], [SERVICE_1_DESC] → Service 1
-- [SERVICE_2_TITLE], [SERVICE_2_DESC] → Service 2
-- [SERVICE_3_TITLE], [SERVICE_3_DESC] → Service 3
-- [CTA_TEXT] → Call to action
-- [FOOTER_TEXT] → Footer tagline
-
-DO NOT change image URLs. Keep them exactly as they are.
-
-HTML:
-{html_structure}
-
-Output ONLY improved HTML."""
-
-            final_html = await call_qwen(qwen_prompt)
-
-            if final_html:
-                final_html = extract_html(final_html)
-            else:
-                final_html = html_structure
-
-            # Add analytics script (cookieless, DNT-aware — shared constant)
-            if '</body>' in final_html:
-                final_html = insert_before_body(final_html, f'{ANALYTICS_TRACKING_SNIPPET}')
-
-            # Inject attribution footer for non-white-label merchants
-            final_html = _inject_attribution_footer(
-                final_html, white_label=await _has_white_label(user_id)
-            )
-
-            generated_styles.append({
-                "style": style['name'],
-                "name": style['display_name'],
-                "description": style['description'],
-                "html": final_html
-            })
-
-            logger.info(f"✅ {style['display_name']} style complete!")
-
-        # Save completed job
-        await save_job_to_supabase(job_id, {
-            "status": "completed",
-            "progress": 100,
-            "html": generated_styles[0]["html"] if generated_styles else None,
-            "styles": json.dumps(generated_styles)  # Store as JSON
-        })
-
-        # Increment usage
-        increment_usage(user_id)
-
-        logger.info(f"✅ Job {job_id[:8]} COMPLETE! {len(generated_styles)} styles")
-
-    except Exception as e:
-        logger.error(f"❌ Job {job_id[:8]} FAILED: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-        # Save error to Supabase
-        await save_job_to_supabase(job_id, {
-            "status": "failed",
-            "error": str(e)
-        })
-
-
 @app.get("/api/generate/status/{job_id}")
 async def get_generation_status(job_id: str):
     """Check job status - called by frontend polling"""
@@ -1484,8 +1379,8 @@ def extract_html(text: str) -> str:
     return text
 
 
-@app.post("/api/generate-simple")
-async def generate_simple(request: GenerateRequest):
+@app.post("/api/generate-simple", dependencies=[Depends(rate_limit())])
+async def generate_simple(request: GenerateRequest, http_request: Request):
     """3-Step AI Pipeline with 3 Style Variations"""
 
     session_id = str(uuid.uuid4())[:8]
@@ -1493,6 +1388,7 @@ async def generate_simple(request: GenerateRequest):
     desc = request.business_description or request.description or ""
     user_id = request.user_id or "anonymous"
     user_email = request.email
+    quota_key = free_quota_key(user_id, http_request)
 
     if not desc:
         return JSONResponse(status_code=400, content={"success": False, "error": "Description required"})
@@ -1502,15 +1398,15 @@ async def generate_simple(request: GenerateRequest):
     # bypass), which /api/v1/subscription/check-limit already reports on; a
     # paying user must never be 429'd by the free-tier counter.
     if not user_id or user_id in ("anonymous", "demo-user", "guest"):
-        rate_limit = check_rate_limit(user_id, user_email)
-        if not rate_limit["allowed"]:
+        usage = await check_rate_limit(quota_key, user_email)
+        if not usage["allowed"]:
             return JSONResponse(
                 status_code=429,
                 content={
                     "success": False,
                     "error": "Daily limit reached",
                     "message": f"You've used all {FREE_LIMIT} free generations today!",
-                    "usage": rate_limit
+                    "usage": usage
                 }
             )
 
@@ -1716,7 +1612,7 @@ Output ONLY improved HTML."""
         }
 
         # Increment usage (founders bypass)
-        increment_usage(user_id, user_email)
+        await increment_usage(quota_key, user_email)
 
         # Clean up progress after a delay
         async def cleanup_progress():
@@ -1735,7 +1631,7 @@ Output ONLY improved HTML."""
             "session_id": session_id,
             "html": generated_styles[0]["html"],
             "styles": generated_styles,
-            "usage": check_rate_limit(user_id, user_email),
+            "usage": await check_rate_limit(quota_key, user_email),
             "business_type": business_type
         }
 
@@ -1863,6 +1759,7 @@ async def run_generation_task(
     color_mode: str = "light",
     template_id: Optional[str] = None,
     design_style: Optional[str] = None,
+    quota_key: Optional[str] = None,
 ):
     """Generate website - SIMPLE VERSION with guaranteed completion"""
 
@@ -2232,7 +2129,7 @@ async def run_generation_task(
             logger.info(f"📊 Progress 95% update: {len(result_95.data) if result_95.data else 0} rows affected")
 
         # Increment usage (founders bypass - rate limiter)
-        increment_usage(user_id, user_email)
+        await increment_usage(quota_key or user_id, user_email)
 
         # CRITICAL: Track subscription usage in usage_tracking table
         # This updates the "Penggunaan Anda" counters on the billing dashboard
@@ -2392,7 +2289,7 @@ async def run_generation_task(
     logger.info(f"🏁 TASK END: {job_id}")
 
 
-@app.post("/api/generate/start")
+@app.post("/api/generate/start", dependencies=[Depends(rate_limit())])
 async def start_generation(request: Request):
     """Start async generation using asyncio.create_task"""
 
@@ -2510,16 +2407,17 @@ MANDATORY REQUIREMENTS:
     # users fall through to the subscription website-limit check below
     # (source of truth, with admin bypass); a paying user must never be
     # 429'd by the free-tier counter while their plan still allows builds.
+    quota_key = free_quota_key(user_id, request)
     if not user_id or user_id in ("anonymous", "demo-user", "guest"):
-        rate_limit = check_rate_limit(user_id, user_email)
-        if not rate_limit["allowed"]:
+        usage = await check_rate_limit(quota_key, user_email)
+        if not usage["allowed"]:
             return JSONResponse(
                 status_code=429,
                 content={
                     "success": False,
                     "error": "Daily limit reached",
                     "message": f"You've used all {FREE_LIMIT} free generations today!",
-                    "usage": rate_limit
+                    "usage": usage
                 }
             )
 
@@ -2724,6 +2622,7 @@ MANDATORY REQUIREMENTS:
         color_mode=color_mode,
         template_id=template_id,
         design_style=design_style,
+        quota_key=quota_key,
     ))
 
     logger.info(f"🚀 Job started: {job_id}")
@@ -3624,6 +3523,7 @@ async def publish_website(
                             "is_active": True,
                             "sort_order": 0
                         }).execute()
+                        zone_coverage.invalidate(website_id)
 
                     # Ensure delivery settings exist
                     supabase.table("delivery_settings").upsert({
@@ -3634,6 +3534,7 @@ async def publish_website(
                         "updated_at": datetime.now().isoformat()
                     }, on_conflict="website_id").execute()
 
+                assistant_context.website_changed(website_id)
                 logger.info(f"✅ Delivery widget + data prepared for website {website_id}")
             except Exception as delivery_err:
                 logger.warning(f"⚠️ Delivery publish enhancements failed (continuing publish): {delivery_err}")
@@ -3927,8 +3828,8 @@ def safe_float(value, default: float = 0.0) -> float:
         return default
 
 
-@app.post("/api/delivery/orders")
-@app.post("/api/orders")
+@app.post("/api/delivery/orders", dependencies=[Depends(rate_limit())])
+@app.post("/api/orders", dependencies=[Depends(rate_limit())])
 async def create_delivery_order(request: Request):
     """
     Create a new delivery order - handles mobile browser data format differences
@@ -4260,6 +4161,8 @@ async def create_chat_conversation(request: Request):
                 supabase.table("chat_messages").insert(message_data).execute()
                 logger.info("✅ [Chat] Initial message added")
 
+            chat_inbox.invalidate_website(conversation_data["website_id"])
+
             return {
                 "success": True,
                 "conversation_id": conversation_id,
@@ -4369,11 +4272,13 @@ async def send_message(conversation_id: str, request: Request):
         result = supabase.table("chat_messages").insert(message_data).execute()
 
         # Update conversation timestamp
-        supabase.table("chat_conversations").update({
+        conv_update = supabase.table("chat_conversations").update({
             "updated_at": datetime.now().isoformat()
         }).eq("id", conversation_id).execute()
 
         if result.data:
+            website_id = conv_update.data[0].get("website_id") if conv_update.data else None
+            chat_inbox.record_message(result.data[0], website_id)
             return {"success": True, "message": result.data[0]}
         else:
             return JSONResponse(
@@ -20,6 +20,7 @@ from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
 from app.core.config import settings
+from app.production.instrumentation import record_cache
 from app.services.plan_features import can_publish_subdomain
 from app.utils.html_inject import insert_before_body
 
@@ -53,14 +54,19 @@ _website_lookup_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 _storage_html_cache: Dict[str, Tuple[float, str]] = {}
 
 
-def _cache_get(cache: Dict[str, Tuple[float, Any]], key: str) -> Optional[Any]:
+def _cache_get(
+    cache: Dict[str, Tuple[float, Any]], key: str, name: str = "subdomain"
+) -> Optional[Any]:
     entry = cache.get(key)
     if entry is None:
+        record_cache(name, "miss")
         return None
     stored_at, value = entry
     if (time.monotonic() - stored_at) >= _SUBDOMAIN_CACHE_TTL_SECONDS:
         cache.pop(key, None)
+        record_cache(name, "miss")
         return None
+    record_cache(name, "hit")
     return value
 
 
@@ -247,7 +253,7 @@ async def _fetch_html_from_storage(subdomain: str) -> Optional[str]:
     Returns HTML string or None if not found.
     """
     # Serve from the in-process cache when fresh (positive results only)
-    cached_html = _cache_get(_storage_html_cache, subdomain)
+    cached_html = _cache_get(_storage_html_cache, subdomain, "subdomain_html")
     if cached_html is not None:
         return cached_html
 
@@ -318,7 +324,7 @@ def _share_card_response(subdomain: str, business_name: str, html: str):
     404: crawlers treat that as "no preview image", which is exactly the
     pre-feature behaviour.
     """
-    png = _cache_get(_share_card_cache, subdomain)
+    png = _cache_get(_share_card_cache, subdomain, "subdomain_share_card")
     if png is None:
         try:
             from app.services.promo_kit import extract_tagline
@@ -891,7 +897,7 @@ async def subdomain_middleware(request: Request, call_next):
         should_try_recovery = False
         supabase = None
 
-        cached_site = _cache_get(_website_lookup_cache, subdomain)
+        cached_site = _cache_get(_website_lookup_cache, subdomain, "subdomain_site")
         if cached_site is not None:
             website_id = cached_site["id"]
             owner_id = cached_site.get("user_id")
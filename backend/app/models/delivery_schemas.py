@@ -337,6 +337,8 @@ class OrderResponse(BaseModel):
     estimated_prep_time: Optional[int]
     estimated_delivery_time: Optional[int]
     actual_delivery_time: Optional[int]
+    # Only on POST /orders, and only once the conversation row exists.
+    conversation_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -133,9 +133,10 @@ class DisputeResponse(BaseModel):
 class DisputeListResponse(BaseModel):
     """Schema for listing disputes"""
     disputes: List[DisputeResponse]
-    total: int
+    total: Optional[int] = None  # not counted on cursor pages
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
 
 
 class DisputeStatusUpdate(BaseModel):
@@ -0,0 +1,206 @@
+"""
+Application instrumentation on top of app.production.metrics.
+
+Everything here is a synchronous counter/histogram update on a metric
+object resolved once at import — no awaits, no locks, no label-dict
+sorting on the hot path — so it is cheap enough to sit on every request.
+
+What is recorded (all prefixed `binaapp_`):
+
+  http_requests_total{method,endpoint,status}
+  http_request_duration_seconds{method,endpoint}
+      By route *template* ("/api/v1/orders/{order_id}"), so ids never
+      explode cardinality. Requests that never reached the router
+      (subdomain pages served by middleware, 404s) share
+      endpoint="unmatched".
+  supabase_requests_total{table,method,status}
+  supabase_request_duration_seconds{table,method}
+      One sample per PostgREST/Storage round trip, via httpx event hooks
+      on the Supabase clients (see `instrument_supabase_client`). `table`
+      is the REST table, "rpc:<function>" for RPCs, or the API root
+      (storage, auth) otherwise. The same hook feeds the per-request
+      query profiler (app.production.query_profiler).
+  llm_requests_total{provider,model,outcome}
+  llm_request_duration_seconds{provider,model}
+  llm_tokens_total{provider,model,kind}
+      From AIService's provider calls; kind is prompt or completion.
+  cache_lookups_total{cache,result}
+      Hit/miss per in-process cache. Hit rate in PromQL:
+      sum by (cache) (rate(...{result!="miss"}[5m])) / sum by (cache) (rate(...[5m]))
+
+Exposed in Prometheus text format by GET /metrics (main.py).
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import Request
+
+from app.production.metrics import get_metrics, route_template
+from app.production.query_profiler import record_query
+
+_metrics = get_metrics()
+
+# Registered by MetricsCollector's defaults; labelled by route template here.
+_http_requests = _metrics.get_counter("http_requests_total")
+_http_duration = _metrics.get_histogram("http_request_duration_seconds")
+_supabase_requests = _metrics.register_counter(
+    "supabase_requests_total",
+    "Supabase REST round trips",
+    labels=["table", "method", "status"],
+)
+_supabase_duration = _metrics.register_histogram(
+    "supabase_request_duration_seconds",
+    "Supabase REST round-trip time in seconds (until response headers)",
+    labels=["table", "method"],
+)
+_llm_requests = _metrics.register_counter(
+    "llm_requests_total",
+    "LLM provider calls",
+    labels=["provider", "model", "outcome"],
+)
+_llm_duration = _metrics.register_histogram(
+    "llm_request_duration_seconds",
+    "LLM provider call latency in seconds",
+    labels=["provider", "model"],
+    buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 90.0, 120.0, 180.0, 300.0, float("inf")),
+)
+_llm_tokens = _metrics.register_counter(
+    "llm_tokens_total",
+    "LLM tokens reported by the provider",
+    labels=["provider", "model", "kind"],
+)
+_cache_lookups = _metrics.register_counter(
+    "cache_lookups_total",
+    "In-process cache lookups by result",
+    labels=["cache", "result"],
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+# =====================================================
+# HTTP
+# =====================================================
+def observe_request(request: Request, status_code: int, seconds: float) -> None:
+    """Record one finished request. Call after `call_next` returns."""
+    endpoint = route_template(request) or UNMATCHED_ROUTE
+    method = request.method
+    _http_requests.inc_sync(
+        (("endpoint", endpoint), ("method", method), ("status", str(status_code)))
+    )
+    _http_duration.observe_sync(seconds, (("endpoint", endpoint), ("method", method)))
+
+
+# =====================================================
+# Supabase REST
+# =====================================================
+_START_KEY = "binaapp_metrics_start"
+
+
+def supabase_target(path: str) -> str:
+    """'/rest/v1/orders' → 'orders', '/rest/v1/rpc/fn' → 'rpc:fn',
+    '/storage/v1/object/...' → 'storage'."""
+    parts = [p for p in path.split("/") if p]
+    if len(parts) >= 3 and parts[0] == "rest":
+        if parts[2] == "rpc" and len(parts) >= 4:
+            return f"rpc:{parts[3]}"
+        return parts[2]
+    return parts[0] if parts else "unknown"
+
+
+def _mark_start(request: httpx.Request) -> None:
+    request.extensions[_START_KEY] = time.perf_counter()
+
+
+def _record_response(response: httpx.Response) -> None:
+    request = response.request
+    started = request.extensions.get(_START_KEY)
+    table = supabase_target(request.url.path)
+    method = request.method
+    _supabase_requests.inc_sync(
+        (("method", method), ("status", str(response.status_code)), ("table", table))
+    )
+    elapsed = time.perf_counter() - started if started is not None else None
+    if elapsed is not None:
+        _supabase_duration.observe_sync(elapsed, (("method", method), ("table", table)))
+    record_query(table, response, elapsed)
+
+
+async def _mark_start_async(request: httpx.Request) -> None:
+    _mark_start(request)
+
+
+async def _record_response_async(response: httpx.Response) -> None:
+    _record_response(response)
+
+
+def supabase_event_hooks(async_client: bool = True) -> Dict[str, list]:
+    """`event_hooks=` for an ad-hoc httpx client talking to Supabase."""
+    if async_client:
+        return {"request": [_mark_start_async], "response": [_record_response_async]}
+    return {"request": [_mark_start], "response": [_record_response]}
+
+
+def instrument_httpx_client(client: Any) -> Any:
+    """Add the Supabase hooks to an existing httpx client (idempotent)."""
+    is_async = isinstance(client, httpx.AsyncClient)
+    hooks = supabase_event_hooks(async_client=is_async)
+    current = client.event_hooks
+    for kind, fns in hooks.items():
+        existing = current.get(kind, [])
+        current[kind] = existing + [fn for fn in fns if fn not in existing]
+    client.event_hooks = current
+    return client
+
+
+def instrument_supabase_client(client: Any) -> Any:
+    """Hook the PostgREST and Storage sessions of a supabase-py client.
+
+    supabase-py rebuilds its PostgREST client when the client's own auth
+    session changes; server-side service-role clients never sign in, so
+    the hooks stay attached. Failures are swallowed — metrics must never
+    break client creation.
+    """
+    try:
+        instrument_httpx_client(client.postgrest.session)
+    except Exception:
+        pass
+    try:
+        instrument_httpx_client(client.storage._client)
+    except Exception:
+        pass
+    return client
+
+
+# =====================================================
+# LLM providers
+# =====================================================
+def record_llm_call(
+    provider: str,
+    model: str,
+    seconds: float,
+    outcome: str,
+    usage: Optional[Dict[str, Any]] = None,
+) -> None:
+    """outcome: ok | empty | truncated | http_<status> | timeout | error."""
+    _llm_requests.inc_sync(
+        (("model", model), ("outcome", outcome), ("provider", provider))
+    )
+    _llm_duration.observe_sync(seconds, (("model", model), ("provider", provider)))
+    if usage:
+        for kind in ("prompt", "completion"):
+            tokens = usage.get(f"{kind}_tokens")
+            if isinstance(tokens, (int, float)) and tokens > 0:
+                _llm_tokens.inc_sync(
+                    (("kind", kind), ("model", model), ("provider", provider)), tokens
+                )
+
+
+# =====================================================
+# Caches
+# =====================================================
+def record_cache(cache: str, result: str) -> None:
+    """result: "hit", "miss", or a tier name for layered caches."""
+    _cache_lookups.inc_sync((("cache", cache), ("result", result)))
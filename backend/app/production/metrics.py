@@ -4,6 +4,11 @@ Prometheus-compatible metrics collection.
 Provides application metrics for monitoring, alerting, and observability.
 Exposes metrics in Prometheus text format for scraping.
 
+Updates are plain dict/list writes with no lock: on the event loop nothing
+can interleave inside them, and from threadpool workers (sync Supabase
+hooks) a racing `+=` can at worst drop an increment — fine for monitoring
+data, and far cheaper than taking a lock on every request.
+
 Usage:
     from app.production.metrics import MetricsCollector, get_metrics
 
@@ -20,11 +25,11 @@ Usage:
         )
 """
 
-import asyncio
 import time
+from bisect import bisect_left
 from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -42,66 +47,69 @@ class MetricDefinition:
     labels: List[str] = field(default_factory=list)
 
 
+LabelsArg = Union[None, Dict[str, str], Tuple[Tuple[str, str], ...]]
+
+
+def labels_key(labels: LabelsArg) -> Tuple:
+    """Dict → sorted tuple key. Pre-built tuple keys pass through, so hot
+    paths can build the key once instead of sorting a dict per update."""
+    if not labels:
+        return ()
+    if isinstance(labels, tuple):
+        return labels
+    return tuple(sorted(labels.items()))
+
+
 class Counter:
-    """Thread-safe counter metric."""
+    """Lock-free counter metric."""
 
     def __init__(self):
         self._values: Dict[Tuple, float] = defaultdict(float)
-        self._lock = asyncio.Lock()
 
-    async def inc(self, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+    async def inc(self, labels: LabelsArg = None, value: float = 1.0):
         """Increment counter."""
-        key = self._labels_to_key(labels)
-        async with self._lock:
-            self._values[key] += value
+        self._values[labels_key(labels)] += value
 
-    def inc_sync(self, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+    def inc_sync(self, labels: LabelsArg = None, value: float = 1.0):
         """Synchronous increment (for non-async contexts)."""
-        key = self._labels_to_key(labels)
-        self._values[key] += value
+        self._values[labels_key(labels)] += value
 
-    def _labels_to_key(self, labels: Optional[Dict[str, str]]) -> Tuple:
-        if not labels:
-            return ()
-        return tuple(sorted(labels.items()))
+    def _labels_to_key(self, labels: LabelsArg) -> Tuple:
+        return labels_key(labels)
 
     def get_values(self) -> Dict[Tuple, float]:
         return dict(self._values)
 
 
 class Gauge:
-    """Thread-safe gauge metric."""
+    """Lock-free gauge metric."""
 
     def __init__(self):
         self._values: Dict[Tuple, float] = defaultdict(float)
-        self._lock = asyncio.Lock()
 
-    async def set(self, value: float, labels: Optional[Dict[str, str]] = None):
+    async def set(self, value: float, labels: LabelsArg = None):
         """Set gauge value."""
-        key = self._labels_to_key(labels)
-        async with self._lock:
-            self._values[key] = value
+        self._values[labels_key(labels)] = value
 
-    async def inc(self, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+    async def inc(self, labels: LabelsArg = None, value: float = 1.0):
         """Increment gauge."""
-        key = self._labels_to_key(labels)
-        async with self._lock:
-            self._values[key] += value
+        self._values[labels_key(labels)] += value
 
-    async def dec(self, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+    async def dec(self, labels: LabelsArg = None, value: float = 1.0):
         """Decrement gauge."""
-        key = self._labels_to_key(labels)
-        async with self._lock:
-            self._values[key] -= value
+        self._values[labels_key(labels)] -= value
 
-    def set_sync(self, value: float, labels: Optional[Dict[str, str]] = None):
-        key = self._labels_to_key(labels)
-        self._values[key] = value
+    def set_sync(self, value: float, labels: LabelsArg = None):
+        self._values[labels_key(labels)] = value
 
-    def _labels_to_key(self, labels: Optional[Dict[str, str]]) -> Tuple:
-        if not labels:
-            return ()
-        return tuple(sorted(labels.items()))
+    def inc_sync(self, labels: LabelsArg = None, value: float = 1.0):
+        self._values[labels_key(labels)] += value
+
+    def dec_sync(self, labels: LabelsArg = None, value: float = 1.0):
+        self._values[labels_key(labels)] -= value
+
+    def _labels_to_key(self, labels: LabelsArg) -> Tuple:
+        return labels_key(labels)
 
     def get_values(self) -> Dict[Tuple, float]:
         return dict(self._values)
@@ -109,9 +117,11 @@ class Gauge:
 
 class Histogram:
     """
-    Thread-safe histogram metric.
+    Lock-free histogram metric.
 
-    Default buckets are suitable for HTTP request latencies.
+    Default buckets are suitable for HTTP request latencies. Each
+    observation bumps one bucket (found by bisection); counts are made
+    cumulative only at export time.
     """
 
     DEFAULT_BUCKETS = (
@@ -120,40 +130,42 @@ class Histogram:
     )
 
     def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
-        self.buckets = buckets or self.DEFAULT_BUCKETS
-        self._bucket_counts: Dict[Tuple, Dict[float, int]] = defaultdict(
-            lambda: {b: 0 for b in self.buckets}
-        )
+        buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        if buckets[-1] != float("inf"):
+            buckets += (float("inf"),)
+        self.buckets = buckets
+        self._bucket_counts: Dict[Tuple, List[int]] = {}
         self._sums: Dict[Tuple, float] = defaultdict(float)
         self._counts: Dict[Tuple, int] = defaultdict(int)
-        self._lock = asyncio.Lock()
 
-    async def observe(self, value: float, labels: Optional[Dict[str, str]] = None):
+    async def observe(self, value: float, labels: LabelsArg = None):
         """Record an observation."""
-        key = self._labels_to_key(labels)
-        async with self._lock:
-            for bucket in self.buckets:
-                if value <= bucket:
-                    self._bucket_counts[key][bucket] += 1
-            self._sums[key] += value
-            self._counts[key] += 1
-
-    def observe_sync(self, value: float, labels: Optional[Dict[str, str]] = None):
-        key = self._labels_to_key(labels)
-        for bucket in self.buckets:
-            if value <= bucket:
-                self._bucket_counts[key][bucket] += 1
+        self.observe_sync(value, labels)
+
+    def observe_sync(self, value: float, labels: LabelsArg = None):
+        key = labels_key(labels)
+        counts = self._bucket_counts.get(key)
+        if counts is None:
+            counts = self._bucket_counts.setdefault(key, [0] * len(self.buckets))
+        counts[bisect_left(self.buckets, value)] += 1
         self._sums[key] += value
         self._counts[key] += 1
 
-    def _labels_to_key(self, labels: Optional[Dict[str, str]]) -> Tuple:
-        if not labels:
-            return ()
-        return tuple(sorted(labels.items()))
+    def _labels_to_key(self, labels: LabelsArg) -> Tuple:
+        return labels_key(labels)
 
     def get_values(self) -> Dict[str, Any]:
+        """Cumulative bucket counts per label set (Prometheus `le` semantics)."""
+        buckets = {}
+        for key, counts in list(self._bucket_counts.items()):
+            running = 0
+            cumulative = {}
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                cumulative[bound] = running
+            buckets[key] = cumulative
         return {
-            "buckets": dict(self._bucket_counts),
+            "buckets": buckets,
             "sums": dict(self._sums),
             "counts": dict(self._counts),
         }
@@ -226,8 +238,10 @@ class MetricsCollector:
         help_text: str,
         labels: Optional[List[str]] = None
     ) -> Counter:
-        """Register a new counter metric."""
+        """Register a new counter metric (returns the existing one if already registered)."""
         full_name = f"{self.prefix}_{name}"
+        if full_name in self._counters:
+            return self._counters[full_name]
         self._definitions[full_name] = MetricDefinition(
             name=full_name,
             metric_type="counter",
@@ -243,8 +257,10 @@ class MetricsCollector:
         help_text: str,
         labels: Optional[List[str]] = None
     ) -> Gauge:
-        """Register a new gauge metric."""
+        """Register a new gauge metric (returns the existing one if already registered)."""
         full_name = f"{self.prefix}_{name}"
+        if full_name in self._gauges:
+            return self._gauges[full_name]
         self._definitions[full_name] = MetricDefinition(
             name=full_name,
             metric_type="gauge",
@@ -261,8 +277,10 @@ class MetricsCollector:
         labels: Optional[List[str]] = None,
         buckets: Optional[Tuple[float, ...]] = None
     ) -> Histogram:
-        """Register a new histogram metric."""
+        """Register a new histogram metric (returns the existing one if already registered)."""
         full_name = f"{self.prefix}_{name}"
+        if full_name in self._histograms:
+            return self._histograms[full_name]
         self._definitions[full_name] = MetricDefinition(
             name=full_name,
             metric_type="histogram",
@@ -309,9 +327,18 @@ class MetricsCollector:
         """Format labels tuple as Prometheus label string."""
         if not labels:
             return ""
-        parts = [f'{k}="{v}"' for k, v in labels]
+        parts = [f'{k}="{_escape_label_value(v)}"' for k, v in labels]
         return "{" + ",".join(parts) + "}"
 
+    def get_counter(self, name: str) -> Optional[Counter]:
+        return self._counters.get(f"{self.prefix}_{name}")
+
+    def get_gauge(self, name: str) -> Optional[Gauge]:
+        return self._gauges.get(f"{self.prefix}_{name}")
+
+    def get_histogram(self, name: str) -> Optional[Histogram]:
+        return self._histograms.get(f"{self.prefix}_{name}")
+
     def export(self) -> str:
         """Export all metrics in Prometheus text format."""
         lines = []
@@ -348,9 +375,7 @@ class MetricsCollector:
             values = histogram.get_values()
             for labels, buckets in values["buckets"].items():
                 label_str = self._format_labels(labels)
-                cumulative = 0
-                for bucket, count in sorted(buckets.items()):
-                    cumulative += count
+                for bucket, cumulative in buckets.items():
                     bucket_label = '+Inf' if bucket == float("inf") else str(bucket)
                     if labels:
                         full_labels = label_str[:-1] + f',le="{bucket_label}"' + "}"
@@ -364,6 +389,10 @@ class MetricsCollector:
         return "\n".join(lines) + "\n"
 
 
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
 # Global metrics instance
 _metrics: Optional[MetricsCollector] = None
 
@@ -411,18 +440,13 @@ class MetricsMiddleware(BaseHTTPMiddleware):
         call_next: Callable
     ) -> Response:
         method = request.method
-        path = self._normalize_path(request.url.path)
 
         # Skip metrics endpoint to avoid recursion
-        if path == "/metrics":
+        if request.url.path == "/metrics":
             return await call_next(request)
 
         # Track in-progress requests
-        await self.metrics.set_gauge(
-            "http_requests_in_progress",
-            1,
-            labels={"method": method}
-        )
+        await self.metrics.get_gauge("http_requests_in_progress").inc(labels={"method": method})
 
         start_time = time.perf_counter()
 
@@ -434,6 +458,7 @@ class MetricsMiddleware(BaseHTTPMiddleware):
             raise
         finally:
             duration = time.perf_counter() - start_time
+            path = route_template(request) or self._normalize_path(request.url.path)
 
             # Record request count
             await self.metrics.inc_counter(
@@ -449,13 +474,22 @@ class MetricsMiddleware(BaseHTTPMiddleware):
             )
 
             # Decrement in-progress
-            gauge = self.metrics._gauges.get(f"{self.metrics.prefix}_http_requests_in_progress")
-            if gauge:
-                await gauge.dec(labels={"method": method})
+            await self.metrics.get_gauge("http_requests_in_progress").dec(labels={"method": method})
 
         return response
 
 
+def route_template(request: Request) -> Optional[str]:
+    """Matched route's path template ("/api/v1/orders/{order_id}"), or None
+    if routing never matched (404s, responses served by middleware).
+
+    Only known after the request has been through the router — read it
+    once `call_next` has returned.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) if route is not None else None
+
+
 # Context manager for timing operations
 class Timer:
     """
@@ -0,0 +1,433 @@
+"""
+Provider-wide concurrency and request spacing, shared by every worker.
+
+The Z.ai image endpoint rejects concurrent requests (HTTP 429, code 1302).
+AIService used to serialize its calls with an asyncio.Lock and a
+last-request timestamp on the service instance, which only holds within
+one event loop: two workers, two nodes, or even the two AIService
+instances one process creates, each had their own lock and hit Z.ai at the
+same time. The 429s that followed were retried with backoff or fell
+through to Stability. This governor replaces that lock:
+
+    async with get_provider_governor().lease(
+        "zai", holder=build_id, limit=1, spacing=1.0, lease_seconds=270
+    ) as lease:
+        ...  # the provider call; lease.waited is the time spent queued
+
+Guarantees per provider:
+  limit     at most `limit` leases held at once
+  spacing   a lease is granted at least `spacing` seconds after the last
+            grant or release
+  fairness  waiters are served in rounds per holder (a build id): a build
+            queueing its 5th image does not go ahead of another build's
+            1st. Builds take turns instead of being served first come,
+            first served, so one large build cannot starve the rest.
+
+Backends:
+  - RedisProviderGovernor: grant/release are Lua scripts, so they are atomic
+    across processes and use the Redis clock. Leases expire after
+    `lease_seconds`, so a worker that dies mid-call cannot wedge the
+    provider. Waiters poll and refresh a heartbeat; a waiter that stops
+    polling is dropped from the queue. Enabled when
+    PROVIDER_GOVERNOR_REDIS_URL (or else RATE_LIMIT_REDIS_URL) is set. If
+    Redis is unreachable, leases come from process memory for
+    GOVERNOR_RETRY_SECONDS. Calls are then governed per worker, never
+    ungoverned.
+  - LocalProviderGovernor: the same rules for one process. No awaits
+    between read and write, so no lock is needed. It is the default and
+    the stand-in used by the tests.
+
+Time spent waiting for a lease is observed as
+provider_queue_wait_seconds{provider,backend}. A build's Z.ai phase budget
+is charged only for time inside the call, not time in the queue.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from loguru import logger
+
+from app.production.metrics import get_metrics
+
+GOVERNOR_POLL_SECONDS = float(os.getenv("GOVERNOR_POLL_SECONDS", "0.25"))
+GOVERNOR_RETRY_SECONDS = float(os.getenv("GOVERNOR_RETRY_SECONDS", "30"))
+# A Redis waiter that has not polled for this long is dropped from the queue.
+GOVERNOR_STALE_WAITER_SECONDS = float(os.getenv("GOVERNOR_STALE_WAITER_SECONDS", "10"))
+
+_metrics = get_metrics()
+_queue_wait = _metrics.register_histogram(
+    "provider_queue_wait_seconds",
+    "Time spent waiting for a provider lease",
+    labels=["provider", "backend"],
+    buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float("inf")),
+)
+
+
+@dataclass
+class ProviderLease:
+    """One granted slot on a provider."""
+
+    provider: str
+    holder: str
+    token: str
+    backend: str
+    limit: int = 1
+    waited: float = 0.0
+    granted_at: float = field(default_factory=time.monotonic)
+
+
+class ProviderGovernor(ABC):
+    """Grants provider leases; see module docstring."""
+
+    name = "abstract"
+
+    def __init__(self):
+        # Leases held or awaited through this governor, per provider. The
+        # image scheduler reads it to decide whether to overflow to Stability.
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+    @abstractmethod
+    async def acquire(
+        self, provider: str, holder: str, limit: int, spacing: float, lease_seconds: float
+    ) -> ProviderLease:
+        """Wait for a slot; cancellation leaves the queue cleanly."""
+
+    @abstractmethod
+    async def release(self, lease: ProviderLease) -> None:
+        """Give the slot back and restart the spacing clock."""
+
+    def busy(self, provider: str) -> bool:
+        """True while any lease on `provider` is held or awaited here."""
+        return self._in_flight.get(provider, 0) > 0
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        provider: str,
+        holder: str = "",
+        limit: int = 1,
+        spacing: float = 0.0,
+        lease_seconds: float = 300.0,
+    ) -> AsyncIterator[ProviderLease]:
+        self._in_flight[provider] += 1
+        try:
+            lease = await self.acquire(provider, holder or "-", max(1, limit), max(0.0, spacing), lease_seconds)
+            _queue_wait.observe_sync(
+                lease.waited, (("backend", lease.backend), ("provider", provider))
+            )
+            try:
+                yield lease
+            finally:
+                await self.release(lease)
+        finally:
+            self._in_flight[provider] -= 1
+
+    async def close(self) -> None:
+        pass
+
+
+@dataclass
+class _LocalQueue:
+    active: int = 0
+    last: float = 0.0
+    # Round of the most recent grant ("virtual time"); new holders join here.
+    round: int = 0
+    holder_rounds: Dict[str, int] = field(default_factory=dict)
+    waiters: List[list] = field(default_factory=list)  # heap of [round, seq, future]
+    seq: "itertools.count" = field(default_factory=itertools.count)
+
+
+class LocalProviderGovernor(ProviderGovernor):
+    """Per-process leases with the same limit / spacing / fairness rules."""
+
+    name = "local"
+
+    def __init__(self):
+        super().__init__()
+        self._queues: Dict[str, _LocalQueue] = defaultdict(_LocalQueue)
+
+    @staticmethod
+    def _next_round(queue: _LocalQueue, holder: str) -> int:
+        round_ = max(queue.holder_rounds.get(holder, queue.round - 1) + 1, queue.round)
+        queue.holder_rounds[holder] = round_
+        return round_
+
+    def _grant(self, queue: _LocalQueue, round_: int) -> None:
+        queue.active += 1
+        queue.round = max(queue.round, round_)
+        if len(queue.holder_rounds) > 256:
+            queue.holder_rounds = {
+                h: r for h, r in queue.holder_rounds.items() if r >= queue.round
+            }
+
+    def _wake(self, queue: _LocalQueue, limit: int) -> None:
+        while queue.waiters and queue.active < limit:
+            round_, _, future = heapq.heappop(queue.waiters)
+            if future.done():  # cancelled while waiting
+                continue
+            self._grant(queue, round_)
+            future.set_result(limit)
+
+    async def acquire(
+        self, provider: str, holder: str, limit: int, spacing: float, lease_seconds: float
+    ) -> ProviderLease:
+        queue = self._queues[provider]
+        started = time.monotonic()
+        round_ = self._next_round(queue, holder)
+        if queue.active < limit and not queue.waiters:
+            self._grant(queue, round_)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(queue.waiters, [round_, next(queue.seq), future])
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted in the same tick we were cancelled: hand it on.
+                    queue.active -= 1
+                    self._wake(queue, limit)
+                raise
+        try:
+            wait = queue.last + spacing - time.monotonic() if queue.last else 0.0
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            queue.active -= 1
+            self._wake(queue, limit)
+            raise
+        queue.last = time.monotonic()
+        lease = ProviderLease(provider, holder, uuid.uuid4().hex, self.name, limit)
+        lease.waited = lease.granted_at - started
+        return lease
+
+    async def release(self, lease: ProviderLease) -> None:
+        queue = self._queues[lease.provider]
+        queue.active -= 1
+        queue.last = time.monotonic()
+        self._wake(queue, lease.limit)
+
+
+# KEYS: leases (zset token -> expiry ms), queue (zset token -> round),
+#       seen (zset token -> last poll ms), rounds (hash holder -> round),
+#       state (hash: round, last)
+# ARGV: token, holder, limit, lease_ms, spacing_ms, stale_ms
+# Returns {1, 0} when granted, else {0, ms to wait} (-1: until a release).
+GOVERNOR_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local token, holder = ARGV[1], ARGV[2]
+local limit, lease_ms = tonumber(ARGV[3]), tonumber(ARGV[4])
+local spacing, stale = tonumber(ARGV[5]), tonumber(ARGV[6])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local gone = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now - stale)
+for _, w in ipairs(gone) do
+  redis.call('ZREM', KEYS[2], w)
+  redis.call('ZREM', KEYS[3], w)
+end
+
+local vt = tonumber(redis.call('HGET', KEYS[5], 'round') or '0')
+local round = tonumber(redis.call('ZSCORE', KEYS[2], token) or '-1')
+if round < 0 then
+  local prev = tonumber(redis.call('HGET', KEYS[4], holder) or tostring(vt - 1))
+  round = math.max(prev + 1, vt)
+  redis.call('HSET', KEYS[4], holder, round)
+  redis.call('ZADD', KEYS[2], round, token)
+end
+redis.call('ZADD', KEYS[3], now, token)
+for i = 1, 5 do
+  redis.call('PEXPIRE', KEYS[i], lease_ms + 3600000)
+end
+
+local free = limit - redis.call('ZCARD', KEYS[1])
+if free <= 0 or redis.call('ZRANK', KEYS[2], token) >= free then
+  return {0, -1}
+end
+local last = tonumber(redis.call('HGET', KEYS[5], 'last') or '0')
+if last + spacing > now then
+  return {0, last + spacing - now}
+end
+redis.call('ZREM', KEYS[2], token)
+redis.call('ZREM', KEYS[3], token)
+redis.call('ZADD', KEYS[1], now + lease_ms, token)
+redis.call('HSET', KEYS[5], 'round', math.max(vt, round), 'last', now)
+return {1, 0}
+"""
+
+# KEYS: leases, state   ARGV: token
+GOVERNOR_RELEASE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('HSET', KEYS[2], 'last', now)
+return redis.call('ZREM', KEYS[1], ARGV[1])
+"""
+
+# KEYS: queue, seen   ARGV: token
+GOVERNOR_LEAVE_LUA = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+return redis.call('ZREM', KEYS[1], ARGV[1])
+"""
+
+
+class RedisProviderGovernor(ProviderGovernor):
+    """
+    Cluster-wide leases via atomic Lua scripts.
+
+    Requires the `redis` package. Falls back to `fallback` (process memory)
+    when the package is missing or a call fails, and retries Redis after
+    `retry_interval` seconds.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "binaapp:gov:",
+        timeout: float = 0.5,
+        fallback: Optional[LocalProviderGovernor] = None,
+        client=None,
+        retry_interval: float = GOVERNOR_RETRY_SECONDS,
+        poll_interval: float = GOVERNOR_POLL_SECONDS,
+    ):
+        super().__init__()
+        self._redis_url = redis_url
+        self._key_prefix = key_prefix
+        self._timeout = timeout
+        self._client = client
+        self._scripts: Dict[str, object] = {}
+        self.fallback = fallback or LocalProviderGovernor()
+        self._retry_interval = retry_interval
+        self._poll_interval = poll_interval
+        self._down_until = 0.0
+
+    def _get_client(self):
+        """Lazy initialization of the Redis client."""
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+                self._client = redis.from_url(
+                    self._redis_url,
+                    socket_timeout=self._timeout,
+                    socket_connect_timeout=self._timeout,
+                )
+                logger.info(f"Provider governor using Redis: {self._redis_url}")
+            except ImportError:
+                logger.warning("redis package not installed, provider leases are per process")
+                self._down_until = float("inf")
+                return None
+        return self._client
+
+    def _script(self, client, name: str, source: str):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = client.register_script(source)
+        return script
+
+    def _keys(self, provider: str, *names: str) -> List[str]:
+        return [f"{self._key_prefix}{provider}:{name}" for name in names]
+
+    def _mark_down(self, action: str, error: Exception) -> None:
+        logger.warning(
+            f"Provider governor Redis {action} failed, using in-process leases for "
+            f"{self._retry_interval:.0f}s: {error}"
+        )
+        self._down_until = time.monotonic() + self._retry_interval
+
+    async def acquire(
+        self, provider: str, holder: str, limit: int, spacing: float, lease_seconds: float
+    ) -> ProviderLease:
+        started = time.monotonic()
+        client = None if time.monotonic() < self._down_until else self._get_client()
+        if client is None:
+            return await self.fallback.acquire(provider, holder, limit, spacing, lease_seconds)
+
+        # Zero-padded start time first: equal rounds are served in arrival order.
+        token = f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}"
+        script = self._script(client, "acquire", GOVERNOR_ACQUIRE_LUA)
+        keys = self._keys(provider, "leases", "queue", "seen", "rounds", "state")
+        args = [
+            token, holder, limit, int(lease_seconds * 1000), int(spacing * 1000),
+            int(GOVERNOR_STALE_WAITER_SECONDS * 1000),
+        ]
+        try:
+            while True:
+                try:
+                    granted, wait_ms = await script(keys=keys, args=args)
+                except Exception as e:
+                    self._mark_down("acquire", e)
+                    lease = await self.fallback.acquire(provider, holder, limit, spacing, lease_seconds)
+                    lease.waited = time.monotonic() - started
+                    return lease
+                if int(granted):
+                    break
+                wait_ms = int(wait_ms)
+                await asyncio.sleep(
+                    self._poll_interval if wait_ms < 0 else min(wait_ms / 1000.0, self._poll_interval)
+                )
+        except asyncio.CancelledError:
+            await self._leave(client, provider, token)
+            raise
+
+        lease = ProviderLease(provider, holder, token, self.name, limit)
+        lease.waited = lease.granted_at - started
+        return lease
+
+    async def _leave(self, client, provider: str, token: str) -> None:
+        try:
+            script = self._script(client, "leave", GOVERNOR_LEAVE_LUA)
+            await script(keys=self._keys(provider, "queue", "seen"), args=[token])
+        except Exception as e:
+            # The stale-waiter sweep removes it once its heartbeat lapses.
+            logger.debug(f"Provider governor could not leave the queue: {e}")
+
+    async def release(self, lease: ProviderLease) -> None:
+        if lease.backend != self.name:
+            await self.fallback.release(lease)
+            return
+        client = self._get_client()
+        try:
+            script = self._script(client, "release", GOVERNOR_RELEASE_LUA)
+            await script(keys=self._keys(lease.provider, "leases", "state"), args=[lease.token])
+        except Exception as e:
+            # The lease expires on its own after lease_seconds.
+            self._mark_down("release", e)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._scripts.clear()
+
+
+def create_governor_from_env() -> ProviderGovernor:
+    """Redis-backed when PROVIDER_GOVERNOR_REDIS_URL or RATE_LIMIT_REDIS_URL is set."""
+    redis_url = os.getenv("PROVIDER_GOVERNOR_REDIS_URL") or os.getenv("RATE_LIMIT_REDIS_URL") or None
+    if redis_url:
+        return RedisProviderGovernor(redis_url)
+    return LocalProviderGovernor()
+
+
+_governor: Optional[ProviderGovernor] = None
+
+
+def get_provider_governor() -> ProviderGovernor:
+    global _governor
+    if _governor is None:
+        _governor = create_governor_from_env()
+    return _governor
+
+
+def set_provider_governor(governor: Optional[ProviderGovernor]) -> None:
+    """Swap the process-wide governor (tests; None re-reads the env)."""
+    global _governor
+    _governor = governor
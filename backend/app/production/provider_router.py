@@ -0,0 +1,276 @@
+"""
+Health-aware, optionally hedged routing across interchangeable providers.
+
+Built for website HTML generation (GLM and DeepSeek produce the same
+artefact), but provider-agnostic: a provider is a name plus an async
+callable returning a result, or None for "no usable result".
+
+Health — per provider, over the last ROUTER_WINDOW calls:
+  - latency percentiles (p50/p90) of successful calls
+  - error rate (None results, exceptions and timeouts)
+  - a CircuitBreaker (app.production.circuit_breaker): after
+    ROUTER_FAILURE_THRESHOLD consecutive failures the provider is skipped
+    for ROUTER_RECOVERY_SECONDS, then probed again (half-open)
+
+Routing — once every provider has ROUTER_MIN_SAMPLES calls on record, they
+are tried in order of expected time to a usable result, p50 / success
+rate; until then the configured order is kept (only open circuits are
+demoted), so a cold process behaves exactly like the fixed fallback chain.
+
+Hedging — with hedge=True, if the first provider has not answered after
+its p90 latency (ROUTER_HEDGE_DELAY_SECONDS until it has a p90), the second
+is started too and whichever usable result arrives first wins; the other
+call is cancelled. Hedge requests are counted as
+llm_hedge_requests_total{provider,result=won|lost|cancelled}, so hedge
+spend and win rate are visible on /metrics next to llm_requests_total.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.production.circuit_breaker import CircuitBreaker, CircuitBreakerConfig, CircuitOpenError
+from app.production.metrics import get_metrics
+
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_RECOVERY_SECONDS = float(os.getenv("ROUTER_RECOVERY_SECONDS", "120"))
+ROUTER_HEDGE_DELAY_SECONDS = float(os.getenv("ROUTER_HEDGE_DELAY_SECONDS", "120"))
+
+_metrics = get_metrics()
+_routes = _metrics.register_counter(
+    "llm_route_total",
+    "Provider chosen first by the router",
+    labels=["provider"],
+)
+_hedges = _metrics.register_counter(
+    "llm_hedge_requests_total",
+    "Hedged (second, concurrent) provider requests by outcome",
+    labels=["provider", "result"],
+)
+
+ProviderCall = Callable[[], Awaitable[Optional[Any]]]
+
+
+class AllProvidersFailed(Exception):
+    """No provider produced a usable result."""
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        super().__init__(f"all providers failed: {sorted(errors) or 'no usable result'}")
+
+
+class _NoResult(Exception):
+    """A provider returned None — counted as a failure by its breaker."""
+
+
+def _percentile(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+@dataclass
+class ProviderHealth:
+    name: str
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    outcomes: Deque[bool] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    breaker: CircuitBreaker = None  # type: ignore[assignment]
+
+    def __post_init__(self) -> None:
+        if self.breaker is None:
+            self.breaker = CircuitBreaker(
+                name=f"llm:{self.name}",
+                config=CircuitBreakerConfig(
+                    failure_threshold=ROUTER_FAILURE_THRESHOLD,
+                    recovery_timeout=ROUTER_RECOVERY_SECONDS,
+                    failure_window=ROUTER_RECOVERY_SECONDS * 5,
+                    success_threshold=1,
+                    call_timeout=0,
+                    # A hedge loser is cancelled, not failed.
+                    excluded_exceptions=(KeyboardInterrupt, SystemExit, asyncio.CancelledError),
+                ),
+            )
+
+    def record(self, ok: bool, seconds: float) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def p50(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.5)
+
+    def p90(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.9)
+
+    def expected_seconds(self) -> float:
+        """Expected time to a usable result (p50 inflated by the error rate)."""
+        p50 = self.p50()
+        if p50 is None:
+            return float("inf")
+        return p50 / max(1.0 - self.error_rate, 0.05)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "error_rate": round(self.error_rate, 3),
+            "p50": self.p50(),
+            "p90": self.p90(),
+            "circuit": self.breaker.state.value,
+        }
+
+
+@dataclass
+class RouteResult:
+    provider: str
+    value: Any
+    hedged: bool = False
+    # Per-provider exception for calls that raised (timeouts included).
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+
+class ProviderRouter:
+    """Routes calls across `providers` (configured preference order)."""
+
+    def __init__(self, providers: Sequence[str]):
+        self.providers: Tuple[str, ...] = tuple(providers)
+        self.health: Dict[str, ProviderHealth] = {p: ProviderHealth(p) for p in self.providers}
+
+    def rank(self, available: Sequence[str]) -> List[str]:
+        candidates = [p for p in self.providers if p in available]
+        if all(self.health[p].samples >= ROUTER_MIN_SAMPLES for p in candidates):
+            candidates.sort(key=lambda p: self.health[p].expected_seconds())
+        # Stable: an open circuit goes last but keeps its relative order.
+        candidates.sort(key=lambda p: self.health[p].breaker.is_open)
+        return candidates
+
+    def hedge_delay(self, provider: str) -> float:
+        health = self.health[provider]
+        p90 = health.p90() if health.samples >= ROUTER_MIN_SAMPLES else None
+        return p90 if p90 is not None else ROUTER_HEDGE_DELAY_SECONDS
+
+    async def _attempt(self, provider: str, call: ProviderCall, budget: Optional[float]) -> Any:
+        """One provider call with health bookkeeping. Returns the value, or
+        raises (_NoResult, CircuitOpenError, TimeoutError, ...)."""
+        health = self.health[provider]
+        started = time.monotonic()
+        try:
+            async with health.breaker:
+                value = await (asyncio.wait_for(call(), budget) if budget else call())
+                if value is None:
+                    raise _NoResult(provider)
+        except CircuitOpenError:
+            raise
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            health.record(False, time.monotonic() - started)
+            raise
+        health.record(True, time.monotonic() - started)
+        return value
+
+    async def run(
+        self,
+        calls: Dict[str, ProviderCall],
+        budgets: Optional[Dict[str, float]] = None,
+        hedge: bool = False,
+    ) -> RouteResult:
+        """First usable result across `calls`.
+
+        `budgets` caps each provider's call (asyncio.wait_for). Raises
+        AllProvidersFailed, carrying the per-provider exceptions (timeouts
+        included), when none of them produced a result.
+        """
+        budgets = budgets or {}
+        order = self.rank(list(calls))
+        if order:
+            _routes.inc_sync((("provider", order[0]),))
+        errors: Dict[str, BaseException] = {}
+
+        def attempt(provider: str) -> "asyncio.Future":
+            return asyncio.ensure_future(
+                self._attempt(provider, calls[provider], budgets.get(provider))
+            )
+
+        def usable(provider: str, task: "asyncio.Future") -> bool:
+            exc = task.exception()
+            if exc is None:
+                return True
+            if not isinstance(exc, (_NoResult, CircuitOpenError)):
+                errors[provider] = exc
+            logger.warning(f"[router] {provider} gave no usable result: {exc!r}")
+            return False
+
+        queue = list(order)
+        task: Optional["asyncio.Future"] = None
+        try:
+            while queue:
+                primary = queue.pop(0)
+                task = attempt(primary)
+                if hedge and queue:
+                    delay = self.hedge_delay(primary)
+                    done, _ = await asyncio.wait({task}, timeout=delay)
+                    if not done:
+                        secondary = queue.pop(0)
+                        logger.info(f"[router] {primary} past {delay:.0f}s — hedging with {secondary}")
+                        result = await self._race(primary, task, secondary, attempt(secondary), usable)
+                        if result is not None:
+                            result.errors = errors
+                            return result
+                        continue
+                await asyncio.wait({task})
+                if usable(primary, task):
+                    return RouteResult(primary, task.result(), errors=errors)
+            raise AllProvidersFailed(errors)
+        finally:
+            # The caller was cancelled mid-attempt: don't leave it running.
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _race(
+        self,
+        primary: str,
+        primary_task: "asyncio.Future",
+        secondary: str,
+        hedge_task: "asyncio.Future",
+        usable: Callable[[str, "asyncio.Future"], bool],
+    ) -> Optional[RouteResult]:
+        """First usable result of primary vs hedge; the other is cancelled."""
+        names = {primary_task: primary, hedge_task: secondary}
+        pending = {primary_task, hedge_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not usable(names[task], task):
+                        continue
+                    hedge_result = "won" if task is hedge_task else "cancelled" if pending else "lost"
+                    _hedges.inc_sync((("provider", secondary), ("result", hedge_result)))
+                    return RouteResult(names[task], task.result(), hedged=True)
+            _hedges.inc_sync((("provider", secondary), ("result", "lost")))
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {p: h.snapshot() for p, h in self.health.items()}
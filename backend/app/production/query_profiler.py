@@ -0,0 +1,213 @@
+"""
+Request-scoped Supabase query profiler.
+
+Every Supabase REST round trip made through an instrumented client (see
+app.production.instrumentation) is appended to the current request's
+profile: table, method, filter *shape*, duration and row count. When the
+request finishes the profile is summarised into
+
+  - a structured log line (`[query_profile] ...`, fields bound under
+    `query_profile`), and
+  - an `X-Query-Profile` response header — only when the caller asked for
+    it with the profiling token, so table names never leak to the public.
+
+A query's shape is method + table + filter columns/operators with the
+values stripped, e.g. `GET menu_items?id=eq&select=id,name`. The same
+shape issued QUERY_PROFILE_REPEAT_THRESHOLD (default 3) or more times in
+one request is flagged as an N+1 candidate: a loop that should be one
+`in.(...)` query or an RPC.
+
+Enabling:
+  - `X-Query-Profile: <QUERY_PROFILE_TOKEN>` request header (token must be
+    configured; header is ignored otherwise), or
+  - QUERY_PROFILE_SAMPLE_RATE (0..1, default 0) — sampled requests are
+    logged only.
+
+The profile lives in a ContextVar, so calls made from run_in_threadpool /
+asyncio.to_thread workers and from tasks spawned during the request land
+in the same profile. Calls that finish after the response was summarised
+(background tasks) are dropped.
+"""
+
+import hmac
+import os
+import random
+import time
+from collections import Counter as TallyCounter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import Request
+from loguru import logger
+
+from app.production.metrics import route_template
+
+PROFILE_HEADER = "X-Query-Profile"
+
+# Query-string keys that are part of the query's structure, not filters.
+_STRUCTURAL_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass(frozen=True)
+class QueryRecord:
+    table: str
+    method: str
+    shape: str
+    ms: float
+    status: int
+    rows: Optional[int]
+
+
+@dataclass
+class QueryProfile:
+    started: float = field(default_factory=time.perf_counter)
+    records: List[QueryRecord] = field(default_factory=list)
+    closed: bool = False
+
+    def add(self, record: QueryRecord) -> None:
+        if not self.closed:
+            self.records.append(record)
+
+    def summary(self, repeat_threshold: int = 3) -> Dict[str, Any]:
+        shapes = TallyCounter(r.shape for r in self.records)
+        shape_ms: Dict[str, float] = {}
+        for r in self.records:
+            shape_ms[r.shape] = shape_ms.get(r.shape, 0.0) + r.ms
+        repeated = [
+            {"shape": shape, "count": count, "ms": round(shape_ms[shape], 1)}
+            for shape, count in shapes.most_common()
+            if count >= repeat_threshold
+        ]
+        return {
+            "calls": len(self.records),
+            "db_ms": round(sum(r.ms for r in self.records), 1),
+            "wall_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "rows": sum(r.rows for r in self.records if r.rows is not None),
+            "tables": dict(TallyCounter(r.table for r in self.records)),
+            "n_plus_1": repeated,
+        }
+
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("supabase_query_profile", default=None)
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current.get()
+
+
+def query_shape(request: httpx.Request, table: str) -> str:
+    """`GET orders?status=eq&website_id=eq&select=id,total` — values stripped."""
+    parts = []
+    for key, value in sorted(request.url.params.multi_items()):
+        if key in _STRUCTURAL_PARAMS:
+            if key in ("select", "order", "on_conflict", "columns"):
+                parts.append(f"{key}={value[:80]}")
+            else:
+                parts.append(key)
+        else:
+            op = value.split(".", 1)[0] if "." in value else value
+            # not.eq / not.in keep both words; anything else is one operator
+            if op == "not" and value.count(".") >= 2:
+                op = "not." + value.split(".", 2)[1]
+            parts.append(f"{key}={op}")
+    query = "&".join(parts)
+    return f"{request.method} {table}" + (f"?{query}" if query else "")
+
+
+def rows_from_content_range(value: Optional[str]) -> Optional[int]:
+    """PostgREST `Content-Range: 0-24/*` → 25; `*/0` → 0."""
+    if not value:
+        return None
+    span = value.split("/", 1)[0].strip()
+    if span == "*":
+        return 0
+    try:
+        first, last = span.split("-", 1)
+        return int(last) - int(first) + 1
+    except ValueError:
+        return None
+
+
+def record_query(table: str, response: httpx.Response, seconds: Optional[float]) -> None:
+    """Called from the Supabase httpx response hook."""
+    profile = _current.get()
+    if profile is None:
+        return
+    request = response.request
+    profile.add(QueryRecord(
+        table=table,
+        method=request.method,
+        shape=query_shape(request, table),
+        ms=round((seconds or 0.0) * 1000, 2),
+        status=response.status_code,
+        rows=rows_from_content_range(response.headers.get("content-range")),
+    ))
+
+
+def _wants_profile(request: Request) -> tuple:
+    """(profile?, expose header?)"""
+    token = os.getenv("QUERY_PROFILE_TOKEN")
+    supplied = request.headers.get(PROFILE_HEADER)
+    if token and supplied and hmac.compare_digest(supplied.encode(), token.encode()):
+        return True, True
+    rate = _env_float("QUERY_PROFILE_SAMPLE_RATE", 0.0)
+    if rate > 0 and random.random() < rate:
+        return True, False
+    return False, False
+
+
+def format_header(summary: Dict[str, Any]) -> str:
+    """Compact one-line form, e.g.
+    `calls=7; db_ms=182.4; rows=31; n+1=GET menu_items?id=eq x5`."""
+    value = f"calls={summary['calls']}; db_ms={summary['db_ms']}; rows={summary['rows']}"
+    if summary["n_plus_1"]:
+        worst = summary["n_plus_1"][0]
+        value += f"; n+1={worst['shape']} x{worst['count']}"
+    # Header values must be latin-1; shapes are ASCII, but be safe.
+    return value.encode("latin-1", "replace").decode("latin-1")[:512]
+
+
+async def query_profile_middleware(request: Request, call_next):
+    """`app.middleware("http")` entry point. Near-zero cost when disabled:
+    one header lookup and, with sampling on, one random()."""
+    enabled, expose = _wants_profile(request)
+    if not enabled:
+        return await call_next(request)
+
+    profile = QueryProfile()
+    token = _current.set(profile)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+        profile.closed = True
+
+    threshold = int(_env_float("QUERY_PROFILE_REPEAT_THRESHOLD", 3))
+    summary = profile.summary(threshold)
+    route = route_template(request) or request.url.path
+    log = logger.bind(query_profile={**summary, "route": route, "method": request.method})
+    message = (
+        f"[query_profile] {request.method} {route} calls={summary['calls']} "
+        f"db_ms={summary['db_ms']} wall_ms={summary['wall_ms']}"
+    )
+    if summary["n_plus_1"]:
+        worst = summary["n_plus_1"][0]
+        log.warning(f"{message} N+1: {worst['shape']} x{worst['count']}")
+    else:
+        log.info(message)
+
+    if expose:
+        response.headers[PROFILE_HEADER] = format_header(summary)
+    return response
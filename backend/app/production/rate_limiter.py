@@ -1,26 +1,49 @@
 """
-Production-grade rate limiting middleware using token bucket algorithm.
+Production-grade rate limiting: token bucket and sliding window, backed by
+Redis (shared by every worker/instance) or by process memory.
 
-This middleware provides configurable rate limiting per client IP,
-with support for different limits per endpoint category.
+Three ways to use it:
 
-Usage (additive - register in main.py after existing middleware):
-    from app.production.rate_limiter import RateLimitMiddleware, RateLimitConfig
+  * Per-route dependency — the limit category comes from `_categorize_path`
+    (auth / generation / upload / orders / health / api):
 
-    config = RateLimitConfig(
-        default_requests_per_minute=60,
-        burst_size=10
-    )
-    app.add_middleware(RateLimitMiddleware, config=config)
+        from app.production.rate_limiter import rate_limit
+
+        @app.post("/api/generate/start", dependencies=[Depends(rate_limit())])
+
+  * Whole-app middleware (additive - register in main.py after existing
+    middleware):
+
+        from app.production.rate_limiter import RateLimitMiddleware, RateLimitConfig
+
+        app.add_middleware(RateLimitMiddleware, config=RateLimitConfig())
+
+  * Named quotas (e.g. the free-tier daily generation count in main.py):
+
+        daily = RateLimitRule(3, 86400, SLIDING_WINDOW)
+        decision = await get_rate_limiter().hit("generation_daily", user_id, rule=daily)
+
+Backends:
+  - RedisRateLimitBackend: each decision is one Lua script (EVALSHA), so
+    check-and-consume is atomic across processes and uses the Redis clock.
+    Enabled when RATE_LIMIT_REDIS_URL is set. If Redis is unreachable the
+    backend answers from process memory until it comes back — limits are
+    then per worker, never switched off.
+  - LocalRateLimitBackend: plain dict/deque updates with no awaits between
+    read and write, so the event loop already serialises them and no lock
+    is needed. Also the stand-in used by the tests.
 """
 
-import asyncio
+import os
 import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Callable, Dict, Optional, Set
 from functools import lru_cache
+from typing import Callable, Deque, Dict, Optional, Set, Tuple, Union
 
-from fastapi import Request, Response
+from fastapi import HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
@@ -28,6 +51,10 @@ from starlette.types import ASGIApp
 from loguru import logger
 
 
+TOKEN_BUCKET = "token_bucket"
+SLIDING_WINDOW = "sliding_window"
+
+
 @dataclass
 class RateLimitConfig:
     """Configuration for rate limiting behavior."""
@@ -40,9 +67,13 @@ class RateLimitConfig:
     auth_limit: int = 10  # Login/register - strict to prevent brute force
     generation_limit: int = 5  # AI generation - expensive operation
     upload_limit: int = 20  # File uploads
+    orders_limit: int = 10  # Public order placement from published sites
     api_limit: int = 100  # General API calls
     health_limit: int = 300  # Health checks - allow frequent monitoring
 
+    # Per-category algorithm override (default: token bucket)
+    category_algorithms: Dict[str, str] = field(default_factory=dict)
+
     # Paths exempt from rate limiting
     exempt_paths: Set[str] = field(default_factory=lambda: {
         "/health",
@@ -52,35 +83,85 @@ class RateLimitConfig:
         "/redoc",
     })
 
-    # Headers to extract client identifier
-    client_id_headers: tuple = (
-        "X-Forwarded-For",
-        "X-Real-IP",
-        "CF-Connecting-IP",  # Cloudflare
+    # Reverse proxies in front of the app that append the peer address to
+    # X-Forwarded-For (Render's load balancer: 1). The client is the hop the
+    # outermost trusted proxy appended; entries left of it come from the
+    # client and are ignored. 0 = use the socket peer address.
+    trusted_proxy_count: int = field(
+        default_factory=lambda: int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
     )
 
     # Response customization
     retry_after_header: bool = True
     include_limit_headers: bool = True
 
-    # Cleanup interval for expired buckets (seconds)
+    # Cleanup interval for expired in-memory entries (seconds)
     cleanup_interval: int = 300
 
     # Redis URL for distributed rate limiting (None = in-memory)
     redis_url: Optional[str] = None
+    redis_key_prefix: str = "binaapp:rl:"
+    redis_timeout: float = 0.5
+
 
+@dataclass(frozen=True)
+class RateLimitRule:
+    """`limit` requests per `window_seconds`.
 
+    Token bucket: refills limit/window tokens per second and holds at most
+    `burst` (default `limit`). Sliding window: at most `limit` hits in any
+    trailing window — exact, so it suits small quotas like 3 per day.
+    """
+
+    limit: int
+    window_seconds: float = 60.0
+    algorithm: str = TOKEN_BUCKET
+    burst: Optional[int] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.burst or self.limit
+
+    @property
+    def refill_rate(self) -> float:
+        """Tokens per second."""
+        return self.limit / self.window_seconds
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until a denied hit would succeed (0 if allowed)
+    reset_after: float  # seconds until the key is back to full allowance
+
+    def headers(self, retry_after_header: bool = True) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.remaining)),
+            "X-RateLimit-Reset": str(int(time.time() + self.reset_after)),
+        }
+        if retry_after_header and not self.allowed:
+            headers["Retry-After"] = str(int(self.retry_after) + 1)
+        return headers
+
+
+# =====================================================
+# In-process algorithms
+# =====================================================
 class TokenBucket:
     """
     Token bucket implementation for rate limiting.
 
-    Allows burst traffic while maintaining average rate limit.
-    Thread-safe for concurrent access.
+    Allows burst traffic while maintaining average rate limit. There is no
+    await between reading and updating `tokens`, so concurrent coroutines on
+    one event loop cannot interleave inside `try_consume`.
     """
 
-    __slots__ = ('capacity', 'tokens', 'refill_rate', 'last_refill', '_lock')
+    __slots__ = ('capacity', 'tokens', 'refill_rate', 'last_refill')
 
-    def __init__(self, capacity: int, refill_rate: float):
+    def __init__(self, capacity: int, refill_rate: float, now: Optional[float] = None):
         """
         Initialize token bucket.
 
@@ -91,35 +172,35 @@ class TokenBucket:
         self.capacity = capacity
         self.tokens = float(capacity)
         self.refill_rate = refill_rate
-        self.last_refill = time.monotonic()
-        self._lock = asyncio.Lock()
+        self.last_refill = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.last_refill)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.last_refill = now
 
-    async def consume(self, tokens: int = 1) -> tuple[bool, float]:
+    def try_consume(
+        self, tokens: int = 1, now: Optional[float] = None, peek: bool = False
+    ) -> Tuple[bool, float]:
         """
         Attempt to consume tokens from bucket.
 
         Returns:
             Tuple of (success, wait_time_if_failed)
         """
-        async with self._lock:
-            now = time.monotonic()
-
-            # Refill tokens based on elapsed time
-            elapsed = now - self.last_refill
-            self.tokens = min(
-                self.capacity,
-                self.tokens + elapsed * self.refill_rate
-            )
-            self.last_refill = now
-
-            if self.tokens >= tokens:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            if not peek:
                 self.tokens -= tokens
-                return True, 0.0
+            return True, 0.0
+        return False, (tokens - self.tokens) / self.refill_rate
 
-            # Calculate wait time until enough tokens available
-            tokens_needed = tokens - self.tokens
-            wait_time = tokens_needed / self.refill_rate
-            return False, wait_time
+    async def consume(self, tokens: int = 1) -> Tuple[bool, float]:
+        """Async form of `try_consume`, kept for existing callers."""
+        return self.try_consume(tokens)
+
+    def seconds_until_full(self) -> float:
+        return (self.capacity - self.tokens) / self.refill_rate
 
     @property
     def available_tokens(self) -> int:
@@ -127,56 +208,306 @@ class TokenBucket:
         return int(self.tokens)
 
 
-class RateLimitStore:
+class SlidingWindowLog:
+    """Timestamps of accepted hits within the trailing window."""
+
+    __slots__ = ('hits',)
+
+    def __init__(self):
+        self.hits: Deque[float] = deque()
+
+    def try_hit(
+        self, limit: int, window: float, now: float, cost: int = 1, peek: bool = False
+    ) -> Tuple[bool, int, float, float]:
+        """Returns (allowed, remaining, retry_after, reset_after)."""
+        hits = self.hits
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+
+        allowed = len(hits) + cost <= limit
+        if allowed and not peek:
+            hits.extend([now] * cost)
+
+        retry_after = 0.0
+        if not allowed:
+            # Enough of the oldest hits must age out to make room for `cost`.
+            need = len(hits) + cost - limit
+            retry_after = hits[need - 1] + window - now if need <= len(hits) else window
+        reset_after = hits[-1] + window - now if hits else 0.0
+        return allowed, limit - len(hits), retry_after, reset_after
+
+
+# =====================================================
+# Backends
+# =====================================================
+class RateLimitBackend(ABC):
+    """Decides one hit against one key under one rule."""
+
+    @abstractmethod
+    async def hit(
+        self, key: str, rule: RateLimitRule, cost: int = 1, peek: bool = False
+    ) -> RateLimitDecision:
+        """Consume `cost` from `key` (or only report, when `peek`)."""
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalRateLimitBackend(RateLimitBackend):
     """
-    In-memory store for rate limit buckets with automatic cleanup.
+    Per-process state. Limits are per worker — use Redis for shared limits.
 
-    For production with multiple instances, use Redis-backed store.
+    `decide` is synchronous and lock-free; `clock` is injectable for tests.
     """
 
-    def __init__(self, cleanup_interval: int = 300):
-        self._buckets: Dict[str, TokenBucket] = {}
+    def __init__(
+        self,
+        cleanup_interval: int = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._entries: Dict[str, Union[TokenBucket, SlidingWindowLog]] = {}
         self._last_access: Dict[str, float] = {}
-        self._lock = asyncio.Lock()
         self._cleanup_interval = cleanup_interval
-        self._last_cleanup = time.monotonic()
+        self._clock = clock
+        self._last_cleanup = clock()
+
+    def decide(
+        self, key: str, rule: RateLimitRule, cost: int = 1, peek: bool = False
+    ) -> RateLimitDecision:
+        now = self._clock()
+        if now - self._last_cleanup > self._cleanup_interval:
+            self._cleanup_stale_entries(now)
+
+        entry_key = f"{rule.algorithm}:{key}"
+        entry = self._entries.get(entry_key)
+        self._last_access[entry_key] = now
+
+        if rule.algorithm == SLIDING_WINDOW:
+            if entry is None:
+                entry = self._entries[entry_key] = SlidingWindowLog()
+            allowed, remaining, retry_after, reset_after = entry.try_hit(
+                rule.limit, rule.window_seconds, now, cost, peek
+            )
+            return RateLimitDecision(allowed, rule.limit, remaining, retry_after, reset_after)
 
-    async def get_bucket(
-        self,
-        key: str,
-        capacity: int,
-        refill_rate: float
-    ) -> TokenBucket:
-        """Get or create a token bucket for the given key."""
-        async with self._lock:
-            now = time.monotonic()
-
-            # Periodic cleanup of stale buckets
-            if now - self._last_cleanup > self._cleanup_interval:
-                await self._cleanup_stale_buckets(now)
-
-            if key not in self._buckets:
-                self._buckets[key] = TokenBucket(capacity, refill_rate)
-
-            self._last_access[key] = now
-            return self._buckets[key]
-
-    async def _cleanup_stale_buckets(self, now: float) -> None:
-        """Remove buckets not accessed in cleanup_interval."""
+        if entry is None:
+            entry = self._entries[entry_key] = TokenBucket(rule.capacity, rule.refill_rate, now)
+        allowed, retry_after = entry.try_consume(cost, now, peek)
+        return RateLimitDecision(
+            allowed, rule.limit, entry.available_tokens, retry_after, entry.seconds_until_full()
+        )
+
+    async def hit(
+        self, key: str, rule: RateLimitRule, cost: int = 1, peek: bool = False
+    ) -> RateLimitDecision:
+        return self.decide(key, rule, cost, peek)
+
+    def _cleanup_stale_entries(self, now: float) -> None:
+        """Remove entries not accessed in cleanup_interval.
+
+        Safe for sliding windows too: a window longer than cleanup_interval
+        keeps its key alive as long as it is being checked.
+        """
         stale_keys = [
             key for key, last_access in self._last_access.items()
             if now - last_access > self._cleanup_interval
         ]
         for key in stale_keys:
-            del self._buckets[key]
+            entry = self._entries.get(key)
+            if isinstance(entry, SlidingWindowLog) and entry.hits:
+                continue
+            self._entries.pop(key, None)
             del self._last_access[key]
 
         self._last_cleanup = now
 
         if stale_keys:
-            logger.debug(f"Rate limiter cleaned up {len(stale_keys)} stale buckets")
+            logger.debug(f"Rate limiter cleaned up {len(stale_keys)} stale entries")
+
+    def reset(self) -> None:
+        self._entries.clear()
+        self._last_access.clear()
+
+
+# KEYS[1] = bucket hash; ARGV = capacity, tokens per ms, cost, peek
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local peek = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  allowed = 1
+  if peek == 0 then
+    tokens = tokens - cost
+  end
+else
+  retry = math.ceil((cost - tokens) / rate)
+end
+
+local full_in = math.ceil((capacity - tokens) / rate)
+if peek == 0 then
+  redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+  redis.call('PEXPIRE', KEYS[1], full_in + 1000)
+end
+return {allowed, math.floor(tokens), retry, full_in}
+"""
+
+# KEYS[1] = sorted set of hits scored by ms; ARGV = limit, window ms, cost,
+# peek, member nonce
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local peek = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+
+local allowed = 0
+if count + cost <= limit then
+  allowed = 1
+  if peek == 0 then
+    for i = 1, cost do
+      redis.call('ZADD', KEYS[1], now, ARGV[5] .. ':' .. i)
+    end
+    count = count + cost
+    redis.call('PEXPIRE', KEYS[1], window)
+  end
+end
+
+local retry = 0
+if allowed == 0 then
+  local need = count + cost - limit
+  if need <= count then
+    local oldest = redis.call('ZRANGE', KEYS[1], need - 1, need - 1, 'WITHSCORES')
+    retry = tonumber(oldest[2]) + window - now
+  else
+    retry = window
+  end
+end
+
+local reset = 0
+local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+if newest[2] then
+  reset = tonumber(newest[2]) + window - now
+end
+return {allowed, limit - count, retry, reset}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Shared limits via atomic Lua scripts.
+
+    Requires the `redis` package. Falls back to `fallback` (process memory)
+    when the package is missing or a call fails, and retries Redis after
+    `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "binaapp:rl:",
+        timeout: float = 0.5,
+        fallback: Optional[LocalRateLimitBackend] = None,
+        client=None,
+        retry_interval: float = 30.0,
+    ):
+        self._redis_url = redis_url
+        self._key_prefix = key_prefix
+        self._timeout = timeout
+        self._client = client
+        self._scripts: Dict[str, object] = {}
+        self.fallback = fallback or LocalRateLimitBackend()
+        self._retry_interval = retry_interval
+        self._down_until = 0.0
+
+    def _get_client(self):
+        """Lazy initialization of the Redis client."""
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+                self._client = redis.from_url(
+                    self._redis_url,
+                    socket_timeout=self._timeout,
+                    socket_connect_timeout=self._timeout,
+                )
+                logger.info(f"Rate limiter using Redis: {self._redis_url}")
+            except ImportError:
+                logger.warning("redis package not installed, rate limits are per process")
+                self._down_until = float("inf")
+                return None
+        return self._client
+
+    def _script(self, client, algorithm: str):
+        script = self._scripts.get(algorithm)
+        if script is None:
+            source = SLIDING_WINDOW_LUA if algorithm == SLIDING_WINDOW else TOKEN_BUCKET_LUA
+            script = self._scripts[algorithm] = client.register_script(source)
+        return script
+
+    async def hit(
+        self, key: str, rule: RateLimitRule, cost: int = 1, peek: bool = False
+    ) -> RateLimitDecision:
+        if time.monotonic() < self._down_until:
+            return self.fallback.decide(key, rule, cost, peek)
+        client = self._get_client()
+        if client is None:
+            return self.fallback.decide(key, rule, cost, peek)
+
+        script = self._script(client, rule.algorithm)
+        if rule.algorithm == SLIDING_WINDOW:
+            redis_key = f"{self._key_prefix}sw:{key}"
+            args = [rule.limit, int(rule.window_seconds * 1000), cost, int(peek), uuid.uuid4().hex]
+        else:
+            redis_key = f"{self._key_prefix}tb:{key}"
+            args = [rule.capacity, repr(rule.refill_rate / 1000.0), cost, int(peek)]
+
+        try:
+            allowed, remaining, retry_ms, reset_ms = await script(keys=[redis_key], args=args)
+        except Exception as e:
+            logger.warning(
+                f"Rate limiter Redis call failed, using in-process limits for "
+                f"{self._retry_interval:.0f}s: {e}"
+            )
+            self._down_until = time.monotonic() + self._retry_interval
+            return self.fallback.decide(key, rule, cost, peek)
+
+        return RateLimitDecision(
+            allowed=bool(int(allowed)),
+            limit=rule.limit,
+            remaining=int(remaining),
+            retry_after=int(retry_ms) / 1000.0,
+            reset_after=int(reset_ms) / 1000.0,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._scripts.clear()
 
 
+# =====================================================
+# Limiter
+# =====================================================
 @lru_cache(maxsize=128)
 def _categorize_path(path: str) -> str:
     """
@@ -187,6 +518,7 @@ def _categorize_path(path: str) -> str:
     - generation: AI/website generation
     - upload: File upload endpoints
     - health: Health check endpoints
+    - orders: Order placement (collection path ending in /orders)
     - api: Default API endpoints
     """
     path_lower = path.lower()
@@ -203,37 +535,178 @@ def _categorize_path(path: str) -> str:
     if '/health' in path_lower:
         return 'health'
 
+    if path_lower.rstrip('/').endswith('/orders'):
+        return 'orders'
+
     return 'api'
 
 
+def rules_from_config(config: RateLimitConfig) -> Dict[str, RateLimitRule]:
+    """Per-category rules, in requests per minute."""
+    limits = {
+        'auth': (config.auth_limit, config.burst_size),
+        'generation': (config.generation_limit, max(2, config.burst_size // 5)),
+        'upload': (config.upload_limit, config.burst_size),
+        'orders': (config.orders_limit, max(2, config.burst_size // 2)),
+        'health': (config.health_limit, config.burst_size * 3),
+        'api': (config.api_limit, config.burst_size),
+        'default': (config.default_requests_per_minute, config.burst_size),
+    }
+    rules = {}
+    for category, (per_minute, burst) in limits.items():
+        algorithm = config.category_algorithms.get(category, TOKEN_BUCKET)
+        rules[category] = RateLimitRule(
+            limit=per_minute,
+            window_seconds=60.0,
+            algorithm=algorithm,
+            burst=burst if algorithm == TOKEN_BUCKET else None,
+        )
+    return rules
+
+
+def client_identifier(request: Request, trusted_proxies: Optional[int] = None) -> str:
+    """
+    Extract client identifier from request.
+
+    The X-Forwarded-For hop appended by the outermost of `trusted_proxies`
+    proxies (default: RateLimitConfig.trusted_proxy_count), else the socket
+    peer. The leftmost entries are whatever the client sent and are never
+    used, so rotating the header doesn't buy a fresh bucket.
+    """
+    if trusted_proxies is None:
+        trusted_proxies = RateLimitConfig().trusted_proxy_count
+    if trusted_proxies > 0:
+        hops = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+
+    # Fallback to direct client IP
+    if request.client:
+        return request.client.host
+
+    return "unknown"
+
+
+class RateLimiter:
+    """Named rules over one backend."""
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        config: Optional[RateLimitConfig] = None,
+    ):
+        self.config = config or RateLimitConfig()
+        self.backend = backend or LocalRateLimitBackend(self.config.cleanup_interval)
+        self.rules: Dict[str, RateLimitRule] = rules_from_config(self.config)
+
+    def register(self, name: str, rule: RateLimitRule) -> None:
+        self.rules[name] = rule
+
+    def rule_for(self, name: str) -> RateLimitRule:
+        return self.rules.get(name) or self.rules['default']
+
+    async def hit(
+        self, name: str, identity: str, cost: int = 1, rule: Optional[RateLimitRule] = None
+    ) -> RateLimitDecision:
+        """Consume from `identity`'s allowance under `rule` (default: rule `name`)."""
+        return await self.backend.hit(f"{name}:{identity}", rule or self.rule_for(name), cost)
+
+    async def peek(
+        self, name: str, identity: str, cost: int = 1, rule: Optional[RateLimitRule] = None
+    ) -> RateLimitDecision:
+        """Would a hit be allowed? Consumes nothing."""
+        return await self.backend.hit(
+            f"{name}:{identity}", rule or self.rule_for(name), cost, peek=True
+        )
+
+
+def create_limiter_from_env(config: Optional[RateLimitConfig] = None) -> RateLimiter:
+    """Redis-backed when RATE_LIMIT_REDIS_URL (or config.redis_url) is set."""
+    config = config or RateLimitConfig()
+    redis_url = config.redis_url or os.getenv("RATE_LIMIT_REDIS_URL") or None
+    if redis_url:
+        backend: RateLimitBackend = RedisRateLimitBackend(
+            redis_url,
+            key_prefix=config.redis_key_prefix,
+            timeout=config.redis_timeout,
+            fallback=LocalRateLimitBackend(config.cleanup_interval),
+        )
+    else:
+        backend = LocalRateLimitBackend(config.cleanup_interval)
+    return RateLimiter(backend, config)
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = create_limiter_from_env()
+    return _limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """Swap the process-wide limiter (tests); None rebuilds it from env."""
+    global _limiter
+    _limiter = limiter
+
+
+def rate_limit(category: Optional[str] = None, cost: int = 1):
+    """
+    FastAPI dependency limiting the calling client (by IP).
+
+    The category defaults to `_categorize_path(request.url.path)`. Raises 429
+    with Retry-After when the client is over its limit; a limiter failure
+    lets the request through.
+    """
+
+    async def _dependency(request: Request) -> None:
+        name = category or _categorize_path(request.url.path)
+        limiter = get_rate_limiter()
+        client_id = client_identifier(request, limiter.config.trusted_proxy_count)
+        try:
+            decision = await limiter.hit(name, client_id, cost)
+        except Exception as e:
+            logger.error(f"Rate limiter error (allowing request): {e}")
+            return
+        if not decision.allowed:
+            logger.warning(
+                f"Rate limit exceeded: client={client_id}, path={request.url.path}, "
+                f"category={name}, retry_after={decision.retry_after:.1f}s"
+            )
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please slow down.",
+                headers=decision.headers(limiter.config.retry_after_header),
+            )
+
+    return _dependency
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
     Production-grade rate limiting middleware.
 
     Features:
-    - Token bucket algorithm for burst handling
-    - Per-endpoint category limits
-    - Client identification via headers
-    - Automatic stale bucket cleanup
+    - Token bucket (or sliding window) per endpoint category
+    - Client identification via X-Forwarded-For (trusted proxy hop)
+    - Redis-backed when configured, in-process otherwise
     - Rate limit headers in response
     - Graceful degradation on errors
 
     This middleware is additive and does not modify existing code.
     """
 
-    def __init__(self, app: ASGIApp, config: Optional[RateLimitConfig] = None):
+    def __init__(
+        self,
+        app: ASGIApp,
+        config: Optional[RateLimitConfig] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
         super().__init__(app)
         self.config = config or RateLimitConfig()
-        self.store = RateLimitStore(self.config.cleanup_interval)
-
-        # Pre-compute category limits
-        self._category_limits = {
-            'auth': (self.config.auth_limit, self.config.burst_size),
-            'generation': (self.config.generation_limit, max(2, self.config.burst_size // 5)),
-            'upload': (self.config.upload_limit, self.config.burst_size),
-            'health': (self.config.health_limit, self.config.burst_size * 3),
-            'api': (self.config.api_limit, self.config.burst_size),
-        }
+        self.limiter = limiter or create_limiter_from_env(self.config)
 
         logger.info(
             f"Rate limiter initialized: default={self.config.default_requests_per_minute}/min, "
@@ -241,30 +714,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         )
 
     def _get_client_id(self, request: Request) -> str:
-        """
-        Extract client identifier from request.
-
-        Priority: Proxy headers → Direct IP
-        """
-        for header in self.config.client_id_headers:
-            value = request.headers.get(header)
-            if value:
-                # Handle comma-separated IPs (take first/original)
-                return value.split(',')[0].strip()
-
-        # Fallback to direct client IP
-        if request.client:
-            return request.client.host
-
-        return "unknown"
-
-    def _get_limits_for_path(self, path: str) -> tuple[int, int]:
-        """Get (requests_per_minute, burst_size) for path."""
-        category = _categorize_path(path)
-        return self._category_limits.get(
-            category,
-            (self.config.default_requests_per_minute, self.config.burst_size)
-        )
+        return client_identifier(request, self.config.trusted_proxy_count)
 
     async def dispatch(
         self,
@@ -284,63 +734,35 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 
         try:
             client_id = self._get_client_id(request)
-            requests_per_minute, burst_size = self._get_limits_for_path(path)
-
-            # Create bucket key combining client and endpoint category
             category = _categorize_path(path)
-            bucket_key = f"{client_id}:{category}"
+            decision = await self.limiter.hit(category, client_id)
+        except Exception as e:
+            # Graceful degradation: allow request on rate limiter failure
+            logger.error(f"Rate limiter error (allowing request): {e}")
+            return await call_next(request)
 
-            # Get or create bucket
-            bucket = await self.store.get_bucket(
-                key=bucket_key,
-                capacity=burst_size,
-                refill_rate=requests_per_minute / 60.0  # Convert to per-second
+        if not decision.allowed:
+            logger.warning(
+                f"Rate limit exceeded: client={client_id}, "
+                f"path={path}, category={category}, retry_after={decision.retry_after:.1f}s"
+            )
+            return JSONResponse(
+                status_code=429,
+                content={
+                    "detail": "Rate limit exceeded. Please slow down.",
+                    "retry_after_seconds": int(decision.retry_after) + 1
+                },
+                headers=decision.headers(self.config.retry_after_header)
             )
 
-            # Attempt to consume token
-            allowed, retry_after = await bucket.consume()
-
-            if not allowed:
-                logger.warning(
-                    f"Rate limit exceeded: client={client_id}, "
-                    f"path={path}, category={category}, retry_after={retry_after:.1f}s"
-                )
-
-                headers = {
-                    "X-RateLimit-Limit": str(requests_per_minute),
-                    "X-RateLimit-Remaining": "0",
-                    "X-RateLimit-Reset": str(int(time.time() + retry_after)),
-                }
-
-                if self.config.retry_after_header:
-                    headers["Retry-After"] = str(int(retry_after) + 1)
-
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "detail": "Rate limit exceeded. Please slow down.",
-                        "retry_after_seconds": int(retry_after) + 1
-                    },
-                    headers=headers
-                )
-
-            # Process request
-            response = await call_next(request)
-
-            # Add rate limit headers to successful responses
-            if self.config.include_limit_headers:
-                response.headers["X-RateLimit-Limit"] = str(requests_per_minute)
-                response.headers["X-RateLimit-Remaining"] = str(bucket.available_tokens)
-                response.headers["X-RateLimit-Reset"] = str(
-                    int(time.time() + 60)  # Reset in 1 minute
-                )
+        response = await call_next(request)
 
-            return response
+        # Add rate limit headers to successful responses
+        if self.config.include_limit_headers:
+            for name, value in decision.headers(False).items():
+                response.headers[name] = value
 
-        except Exception as e:
-            # Graceful degradation: allow request on rate limiter failure
-            logger.error(f"Rate limiter error (allowing request): {e}")
-            return await call_next(request)
+        return response
 
 
 # Convenience function for creating configured middleware
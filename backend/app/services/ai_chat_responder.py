@@ -10,6 +10,9 @@ from typing import Dict, Any, Optional, List
 from loguru import logger
 
 from app.core.config import settings
+from app.production.instrumentation import supabase_event_hooks
+from app.services.assistant_context import assistant_context, render_website_document
+from app.services.chat_inbox import chat_inbox
 
 
 class AIChatResponder:
@@ -28,7 +31,7 @@ class AIChatResponder:
     async def get_chat_settings(self, website_id: str) -> Optional[Dict[str, Any]]:
         """Get AI chat settings for a website."""
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
                 response = await client.get(
                     f"{self.supabase_url}/rest/v1/ai_chat_settings",
                     headers=self.headers,
@@ -46,7 +49,7 @@ class AIChatResponder:
         """Update or create AI chat settings."""
         try:
             existing = await self.get_chat_settings(website_id)
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
                 if existing:
                     update_data["updated_at"] = datetime.utcnow().isoformat()
                     response = await client.patch(
@@ -77,7 +80,7 @@ class AIChatResponder:
     async def get_response_history(self, website_id: str, limit: int = 50) -> List[Dict]:
         """Get AI response history for a website."""
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
                 response = await client.get(
                     f"{self.supabase_url}/rest/v1/ai_chat_responses",
                     headers=self.headers,
@@ -96,59 +99,13 @@ class AIChatResponder:
             return []
 
     async def _load_restaurant_context(self, website_id: str) -> Dict[str, Any]:
-        """Load restaurant context data for AI."""
-        context = {"menu_items": [], "delivery_settings": None, "website_info": None}
-        try:
-            async with httpx.AsyncClient() as client:
-                # Get menu items
-                menu_resp = await client.get(
-                    f"{self.supabase_url}/rest/v1/menu_items",
-                    headers=self.headers,
-                    params={"website_id": f"eq.{website_id}", "select": "name,description,price,is_available"}
-                )
-                if menu_resp.status_code == 200:
-                    context["menu_items"] = menu_resp.json()
-
-                # Get delivery settings
-                delivery_resp = await client.get(
-                    f"{self.supabase_url}/rest/v1/delivery_settings",
-                    headers=self.headers,
-                    params={"website_id": f"eq.{website_id}", "select": "*"}
-                )
-                if delivery_resp.status_code == 200 and delivery_resp.json():
-                    context["delivery_settings"] = delivery_resp.json()[0]
-
-                # Get website info (only select columns that exist)
-                web_resp = await client.get(
-                    f"{self.supabase_url}/rest/v1/websites",
-                    headers=self.headers,
-                    params={"id": f"eq.{website_id}", "select": "business_name,subdomain"}
-                )
-                if web_resp.status_code == 200 and web_resp.json():
-                    context["website_info"] = web_resp.json()[0]
-
-        except Exception as e:
-            logger.error(f"Error loading restaurant context: {e}")
-        return context
+        """Load restaurant context data for AI (shared assistant snapshot)."""
+        return await assistant_context.for_website(website_id)
 
     async def _generate_ai_response(self, customer_message: str, context: Dict, personality: str = "friendly") -> str:
         """Generate AI response using DeepSeek."""
         try:
-            business_name = context.get("website_info", {}).get("business_name", "kedai ini")
-
-            # Build menu text
-            menu_text = ""
-            for item in context.get("menu_items", [])[:20]:
-                avail = "Ada" if item.get("is_available", True) else "Habis"
-                menu_text += f"- {item['name']}: RM{item.get('price', 0):.2f} ({avail})\n"
-
-            # Build delivery info
-            delivery_info = ""
-            ds = context.get("delivery_settings")
-            if ds:
-                delivery_info = f"Penghantaran: {'Ya' if ds.get('is_delivery_enabled') else 'Tidak'}. "
-                if ds.get("min_order_amount"):
-                    delivery_info += f"Minimum order: RM{ds['min_order_amount']}. "
+            business_name = (context.get("website_info") or {}).get("business_name") or "kedai ini"
 
             personality_prompt = {
                 "friendly": "Jawab dengan mesra, gunakan emoji sesekali, dan sentiasa membantu.",
@@ -160,10 +117,7 @@ class AIChatResponder:
 {personality_prompt}
 
 Maklumat kedai:
-Menu:
-{menu_text if menu_text else 'Tiada menu tersedia.'}
-
-{delivery_info}
+{context.get("document") or render_website_document(context)}
 
 Peraturan:
 1. Sentiasa kenal pasti diri anda sebagai "BinaBot" jika ditanya.
@@ -207,7 +161,7 @@ Peraturan:
 
         try:
             # Get all enabled AI chat settings
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
                 settings_resp = await client.get(
                     f"{self.supabase_url}/rest/v1/ai_chat_settings",
                     headers=self.headers,
@@ -225,7 +179,7 @@ Peraturan:
                 cutoff = (datetime.utcnow() - timedelta(seconds=delay)).isoformat()
 
                 try:
-                    async with httpx.AsyncClient() as client:
+                    async with httpx.AsyncClient(event_hooks=supabase_event_hooks()) as client:
                         # Get conversations for this website
                         conv_resp = await client.get(
                             f"{self.supabase_url}/rest/v1/chat_conversations",
@@ -308,7 +262,12 @@ Peraturan:
 
                             if insert_resp.status_code in [200, 201]:
                                 ai_msg = insert_resp.json()
-                                ai_msg_id = ai_msg[0]["id"] if isinstance(ai_msg, list) else ai_msg.get("id")
+                                saved = ai_msg[0] if isinstance(ai_msg, list) else ai_msg
+                                ai_msg_id = saved.get("id")
+                                chat_inbox.record_message(
+                                    {**saved, "message_text": saved.get("message_text") or ai_text},
+                                    website_id,
+                                )
 
                                 # Log the AI response
                                 await client.post(
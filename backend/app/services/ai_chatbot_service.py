@@ -5,17 +5,25 @@ Conversational AI support agent using:
 - Qwen VL API only for image analysis when user uploads photos
 """
 
+import asyncio
 import json
 import re
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 
 from loguru import logger
 from openai import AsyncOpenAI
 
 from app.core.config import settings
 from app.core.supabase import get_supabase_client
+from app.services.assistant_context import assistant_context
+from app.services.support_history import (
+    build_history_messages,
+    history_summarizer,
+    load_tail,
+)
+from app.services.vision_analysis import analyze_images
 
 
 SYSTEM_PROMPT = """You are BinaBot, the AI support assistant for BinaApp, a Malaysian food delivery and restaurant website platform. You communicate in Bahasa Melayu (primary) and English.
@@ -121,28 +129,20 @@ class AIChatbotService:
         if chat["status"] not in ("active", "escalated"):
             raise ValueError("Chat is closed")
 
-        # 1. Load conversation history
-        history_result = supabase.table("ai_support_messages").select(
-            "role, content"
-        ).eq("chat_id", chat_id).order("created_at").execute()
-
-        history = history_result.data or []
-
-        # 2. Load user context
-        user_context = await self._get_user_context(user_id)
+        # 1-3. History tail, user context and image analysis (Qwen VL)
+        # don't depend on each other: run them together.
+        (history, total), user_context, analyses = await asyncio.gather(
+            load_tail(supabase, chat),
+            self._get_user_context(user_id),
+            self.analyze_images_with_qwen(image_urls or [], user_message),
+        )
 
-        # 3. Analyze images with Qwen VL if present
         image_analysis_text = ""
         image_analyses = []
-        if image_urls:
-            for url in image_urls:
-                try:
-                    analysis = await self.analyze_image_with_qwen(url, user_message)
-                    image_analyses.append({"url": url, "analysis": analysis})
-                    image_analysis_text += f"\n[IMAGE ANALYSIS: {analysis}]"
-                except Exception as e:
-                    logger.warning(f"Image analysis failed for {url}: {e}")
-                    image_analyses.append({"url": url, "analysis": "Image analysis unavailable"})
+        for url, analysis in zip(image_urls or [], analyses):
+            image_analyses.append({"url": url, "analysis": analysis or "Image analysis unavailable"})
+            if analysis:
+                image_analysis_text += f"\n[IMAGE ANALYSIS: {analysis}]"
 
         # 4. Build message with image context
         full_user_message = user_message
@@ -160,9 +160,8 @@ class AIChatbotService:
 - Wallet balance: RM{user_context.get('wallet_balance', 0):.2f}"""
         messages.append({"role": "system", "content": context_msg})
 
-        # Add conversation history (limit to last 20 messages to avoid token limit)
-        for msg in history[-20:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
+        # Add conversation history: summary of older turns + newest messages, to the token budget
+        messages.extend(build_history_messages(chat.get("history_summary"), history))
 
         messages.append({"role": "user", "content": full_user_message})
 
@@ -210,8 +209,10 @@ class AIChatbotService:
         }
         supabase.table("ai_support_messages").insert(ai_msg_data).execute()
 
-        # 11. Update chat metadata
-        new_count = (chat.get("messages_count", 0) or 0) + 2
+        # 11. Update chat metadata. The count comes from the rows counted in
+        # step 1, not from messages_count, so a concurrent writer can't make
+        # it drift.
+        new_count = total + 2
         update_data = {
             "messages_count": new_count,
             "updated_at": datetime.utcnow().isoformat(),
@@ -235,6 +236,9 @@ class AIChatbotService:
 
         supabase.table("ai_support_chats").update(update_data).eq("id", chat_id).execute()
 
+        # 12. Fold turns that left the tail into the summary, in the background
+        history_summarizer.schedule(supabase, self.deepseek_client, chat, new_count)
+
         return {
             "message": ai_message,
             "action": action,
@@ -246,16 +250,26 @@ class AIChatbotService:
         """
         Send image to Qwen VL for analysis. Returns text description.
         """
+        analysis = (await self.analyze_images_with_qwen([image_url], context))[0]
+        return analysis or "Unable to analyze image"
+
+    async def analyze_images_with_qwen(self, image_urls: List[str], context: str = "") -> List[Optional[str]]:
+        """
+        Analyze all images of one message concurrently (shared vision
+        service, cached by image content). None for an image that failed.
+        """
+        if not image_urls:
+            return []
         if not self.qwen_client:
-            return "Image analysis not available (Qwen VL not configured)"
+            return ["Image analysis not available (Qwen VL not configured)"] * len(image_urls)
 
-        try:
-            prompt = "Describe this image in detail. "
-            if context:
-                prompt += f"The user is reporting: '{context}'. Focus on issues visible in the image related to their complaint."
-            else:
-                prompt += "If this is food, describe its condition. If this is a screenshot, describe what you see."
+        prompt = "Describe this image in detail. "
+        if context:
+            prompt += f"The user is reporting: '{context}'. Focus on issues visible in the image related to their complaint."
+        else:
+            prompt += "If this is food, describe its condition. If this is a screenshot, describe what you see."
 
+        async def describe(image_url: str) -> Optional[str]:
             response = await self.qwen_client.chat.completions.create(
                 model="qwen-vl-max",
                 messages=[
@@ -269,11 +283,11 @@ class AIChatbotService:
                 ],
                 max_tokens=500,
             )
+            return response.choices[0].message.content or None
 
-            return response.choices[0].message.content or "Unable to analyze image"
-        except Exception as e:
-            logger.error(f"Qwen VL analysis failed: {e}")
-            return f"Image analysis failed: {str(e)}"
+        return await analyze_images(
+            image_urls, describe, function="chatbot_image_analysis", prompt=prompt
+        )
 
     async def _call_deepseek(self, messages: list) -> dict:
         """Send chat messages to DeepSeek API. Returns parsed response."""
@@ -471,36 +485,8 @@ class AIChatbotService:
         return {"status": "escalated", "reason": reason}
 
     async def _get_user_context(self, user_id: str) -> dict:
-        """Load user context for AI."""
-        supabase = get_supabase_client()
-        context: dict = {}
-
-        try:
-            # Recent orders
-            orders_result = supabase.table("delivery_orders").select(
-                "id, status, total_amount, created_at"
-            ).eq("customer_phone", user_id).order("created_at", desc=True).limit(5).execute()
-            context["recent_orders"] = orders_result.data or []
-        except Exception:
-            context["recent_orders"] = []
-
-        try:
-            # User's websites
-            websites_result = supabase.table("websites").select(
-                "id, business_name, subdomain"
-            ).eq("user_id", user_id).execute()
-            context["websites"] = websites_result.data or []
-        except Exception:
-            context["websites"] = []
-
-        try:
-            # Wallet balance
-            wallet_result = supabase.table("bina_credits").select("balance").eq("user_id", user_id).execute()
-            context["wallet_balance"] = float(wallet_result.data[0]["balance"]) if wallet_result.data else 0.0
-        except Exception:
-            context["wallet_balance"] = 0.0
-
-        return context
+        """Load user context for AI (shared assistant snapshot)."""
+        return await assistant_context.for_user(user_id)
 
     def _detect_category(self, message: str) -> Optional[str]:
         """Detect support category from message text."""
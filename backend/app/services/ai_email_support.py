@@ -4,10 +4,11 @@ Uses Claude AI to automatically respond to customer support emails
 """
 import re
 import json
+import asyncio
 import hashlib
 import httpx
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Callable, Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 
@@ -39,6 +40,7 @@ except ImportError:
 
 from app.core.config import settings
 from app.services.email_service import email_service
+from app.services.assistant_context import assistant_context
 
 
 class AIEmailSupportService:
@@ -337,10 +339,12 @@ Respond ONLY with valid JSON, no other text."""
         subject: str,
         sender_name: str,
         analysis: Dict[str, Any],
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        account_context: Optional[str] = None
     ) -> Tuple[str, float]:
         """
-        Generate an AI response to the customer email
+        Generate an AI response to the customer email.
+        account_context is the sender's BinaApp account summary, if any.
 
         Returns:
             Tuple of (response_text, confidence_score)
@@ -356,6 +360,9 @@ Respond ONLY with valid JSON, no other text."""
                 sender = "Customer" if msg.get("sender_type") == "customer" else "Support"
                 history_context += f"{sender}: {msg.get('content', '')[:500]}\n"
 
+        if account_context:
+            history_context += f"\n\nSender's BinaApp account:\n{account_context}\n"
+
         system_prompt = f"""You are a helpful, professional, and friendly customer support agent for BinaApp, a digital restaurant platform in Malaysia.
 
 Your role is to:
@@ -413,11 +420,16 @@ Write a helpful, professional response in the same language the customer used (E
     async def should_escalate(
         self,
         analysis: Dict[str, Any],
-        thread_id: Optional[str] = None
+        thread_id: Optional[str] = None,
+        pending_messages: int = 0
     ) -> Tuple[bool, List[str]]:
         """
         Determine if the email should be escalated to human support
 
+        Args:
+            pending_messages: customer messages not yet stored in the thread
+                (1 when checking in parallel with storing the current email)
+
         Returns:
             Tuple of (should_escalate, reasons)
         """
@@ -429,29 +441,29 @@ Write a helpful, professional response in the same language the customer used (E
             try:
                 one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
 
-                # Count customer messages in the last hour
-                messages = await self._db_select(
-                    "email_messages",
-                    filters={
-                        "thread_id": f"eq.{thread_id}",
-                        "sender_type": "eq.customer",
-                        "created_at": f"gte.{one_hour_ago}"
-                    }
+                # Customer messages in the last hour, and open escalations
+                messages, escalations = await asyncio.gather(
+                    self._db_select(
+                        "email_messages",
+                        filters={
+                            "thread_id": f"eq.{thread_id}",
+                            "sender_type": "eq.customer",
+                            "created_at": f"gte.{one_hour_ago}"
+                        }
+                    ),
+                    self._db_select(
+                        "ai_escalations",
+                        filters={
+                            "thread_id": f"eq.{thread_id}",
+                            "resolved_at": "is.null"
+                        }
+                    ),
                 )
 
-                if len(messages) >= 3:
+                if len(messages) + pending_messages >= 3:
                     reasons.append("Multiple emails in short time (3+ in 1 hour)")
                     should_escalate = True
 
-                # Check if already escalated
-                escalations = await self._db_select(
-                    "ai_escalations",
-                    filters={
-                        "thread_id": f"eq.{thread_id}",
-                        "resolved_at": "is.null"
-                    }
-                )
-
                 if escalations:
                     reasons.append("Thread already escalated")
                     should_escalate = True
@@ -805,6 +817,19 @@ Pasukan BinaApp"""
             logger.error(f"Error sending business inquiry auto-reply: {e}")
             return False
 
+    async def _find_open_thread(self, customer_email: str) -> Optional[str]:
+        """Id of the customer's latest open / in-progress thread, if any."""
+        existing = await self._db_select(
+            "email_threads",
+            filters={
+                "customer_email": f"eq.{customer_email}",
+                "status": "in.(open,in_progress)"
+            },
+            order_by="created_at.desc",
+            limit=1
+        )
+        return existing[0]["id"] if existing else None
+
     async def track_conversation(
         self,
         customer_email: str,
@@ -827,19 +852,8 @@ Pasukan BinaApp"""
             # Create or get thread
             if not thread_id:
                 # Check for existing open thread from this email
-                existing = await self._db_select(
-                    "email_threads",
-                    filters={
-                        "customer_email": f"eq.{customer_email}",
-                        "status": "in.(open,in_progress)"
-                    },
-                    order_by="created_at.desc",
-                    limit=1
-                )
-
-                if existing:
-                    thread_id = existing[0]["id"]
-                else:
+                thread_id = await self._find_open_thread(customer_email)
+                if not thread_id:
                     # Create new thread
                     priority = "normal"
                     category = "general"
@@ -921,17 +935,91 @@ Pasukan BinaApp"""
             logger.error(f"Error tracking conversation: {e}")
             raise
 
+    async def _reply_with_ai(
+        self,
+        thread_id: str,
+        sender_email: str,
+        sender_name: Optional[str],
+        subject: str,
+        email_content: str,
+        analysis: Dict[str, Any],
+        footer: str = "",
+        on_reply_sent: Optional[Callable[[], None]] = None
+    ) -> bool:
+        """Generate an AI reply from the thread history, send it if confident
+        enough, and track it. Returns True if a reply was sent."""
+        if not self.is_available():
+            return False
+
+        conversation_history, account = await asyncio.gather(
+            self._db_select(
+                "email_messages",
+                filters={"thread_id": f"eq.{thread_id}"},
+                order_by="created_at.asc",
+                limit=10
+            ),
+            assistant_context.for_owner_email(sender_email),
+            return_exceptions=True
+        )
+        if isinstance(conversation_history, Exception):
+            logger.error(f"Error loading thread history: {conversation_history}")
+            conversation_history = []
+        if isinstance(account, Exception):
+            logger.warning(f"Account context unavailable for {sender_email}: {account}")
+            account = None
+
+        ai_response, confidence = await self.generate_response(
+            email_content=email_content,
+            subject=subject,
+            sender_name=sender_name or "Customer",
+            analysis=analysis,
+            conversation_history=conversation_history,
+            account_context=account["document"] if account else None
+        )
+
+        if not ai_response or confidence < 0.5:
+            return False
+        ai_response += footer
+
+        sent = await self.send_reply(
+            to_email=sender_email,
+            to_name=sender_name or "Customer",
+            subject=subject,
+            content=ai_response,
+            thread_id=thread_id
+        )
+
+        if sent:
+            if on_reply_sent:
+                on_reply_sent()
+            await self.track_conversation(
+                customer_email=sender_email,
+                customer_name=sender_name,
+                subject=subject,
+                message_content=ai_response,
+                sender_type="ai",
+                ai_generated=True,
+                ai_confidence=confidence,
+                thread_id=thread_id
+            )
+        return sent
+
     async def process_incoming_email(
         self,
         sender_email: str,
         sender_name: Optional[str],
         subject: str,
         body: str,
-        html_body: Optional[str] = None
+        html_body: Optional[str] = None,
+        on_reply_sent: Optional[Callable[[], None]] = None
     ) -> Dict[str, Any]:
         """
         Process an incoming support email end-to-end
 
+        Args:
+            on_reply_sent: called as soon as a reply has gone out to the
+                sender, before the remaining bookkeeping
+
         Returns:
             Dict with processing results
         """
@@ -952,25 +1040,38 @@ Pasukan BinaApp"""
                 email_content = re.sub(r'<[^>]+>', '', html_body)
                 email_content = re.sub(r'\s+', ' ', email_content).strip()
 
-            # Step 1: Analyze the email
-            analysis = await self.analyze_email(email_content, subject, sender_email)
+            # Step 1: Analyze the email while looking up the customer's
+            # open thread (independent: one LLM call, one DB read)
+            analysis, open_thread_id = await asyncio.gather(
+                self.analyze_email(email_content, subject, sender_email),
+                self._find_open_thread(sender_email),
+            )
             logger.info(f"Email analysis: {analysis}")
 
-            # Step 2: Track the incoming email
-            thread_id, message_id = await self.track_conversation(
+            # Steps 2 + 3: Track the incoming email and check escalation
+            # history. On an existing thread these run side by side; the
+            # email being stored counts towards the repeated-contact check.
+            track = self.track_conversation(
                 customer_email=sender_email,
                 customer_name=sender_name,
                 subject=subject,
                 message_content=email_content,
                 sender_type="customer",
+                thread_id=open_thread_id,
                 analysis=analysis
             )
+            if open_thread_id:
+                (thread_id, message_id), (should_escalate, escalation_reasons) = await asyncio.gather(
+                    track,
+                    self.should_escalate(analysis, open_thread_id, pending_messages=1),
+                )
+            else:
+                # New thread: it has no history beyond this email
+                thread_id, message_id = await track
+                should_escalate, escalation_reasons = await self.should_escalate(analysis)
             result["thread_id"] = thread_id
             result["message_id"] = message_id
 
-            # Step 3: Check if should escalate
-            should_escalate, escalation_reasons = await self.should_escalate(analysis, thread_id)
-
             # Check if this is a business inquiry (partnership, investment, media)
             is_business_inquiry = analysis.get("is_business_inquiry", False)
             category = analysis.get("category", "general")
@@ -980,27 +1081,30 @@ Pasukan BinaApp"""
                 result["escalated"] = True
                 result["business_inquiry"] = True
 
-                # Forward to admin with business inquiry template
-                await self.forward_business_inquiry(
-                    thread_id=thread_id,
-                    customer_email=sender_email,
-                    customer_name=sender_name or "Customer",
-                    subject=subject,
-                    email_content=email_content,
-                    category=category
-                )
-
-                # Send auto-reply to customer
-                sent = await self.send_business_inquiry_auto_reply(
-                    to_email=sender_email,
-                    to_name=sender_name or "Customer",
-                    subject=subject,
-                    thread_id=thread_id,
-                    category=category
+                # Forward to admin with business inquiry template, and send
+                # the auto-reply to the customer at the same time
+                _, sent = await asyncio.gather(
+                    self.forward_business_inquiry(
+                        thread_id=thread_id,
+                        customer_email=sender_email,
+                        customer_name=sender_name or "Customer",
+                        subject=subject,
+                        email_content=email_content,
+                        category=category
+                    ),
+                    self.send_business_inquiry_auto_reply(
+                        to_email=sender_email,
+                        to_name=sender_name or "Customer",
+                        subject=subject,
+                        thread_id=thread_id,
+                        category=category
+                    ),
                 )
 
                 if sent:
                     result["ai_response_sent"] = True
+                    if on_reply_sent:
+                        on_reply_sent()
                     # Track the auto-reply
                     auto_reply_content = f"Thank you for your interest in BinaApp. We have received your {category} inquiry and our team will contact you within 1-2 business days."
                     await self.track_conversation(
@@ -1018,97 +1122,42 @@ Pasukan BinaApp"""
 
             elif should_escalate:
                 result["escalated"] = True
-                # Notify admin for regular escalations
-                await self.notify_admin(
-                    thread_id=thread_id,
-                    customer_email=sender_email,
-                    customer_name=sender_name or "Customer",
-                    subject=subject,
-                    escalation_reasons=escalation_reasons,
-                    email_content=email_content
-                )
-                logger.info(f"Email escalated to human support: {escalation_reasons}")
-
-                # Still send AI response for regular escalations
-                if self.is_available():
-                    conversation_history = await self._db_select(
-                        "email_messages",
-                        filters={"thread_id": f"eq.{thread_id}"},
-                        order_by="created_at.asc",
-                        limit=10
-                    )
-
-                    ai_response, confidence = await self.generate_response(
-                        email_content=email_content,
+                # Notify admin for regular escalations, and still send the
+                # AI response meanwhile
+                _, sent = await asyncio.gather(
+                    self.notify_admin(
+                        thread_id=thread_id,
+                        customer_email=sender_email,
+                        customer_name=sender_name or "Customer",
                         subject=subject,
-                        sender_name=sender_name or "Customer",
+                        escalation_reasons=escalation_reasons,
+                        email_content=email_content
+                    ),
+                    self._reply_with_ai(
+                        thread_id=thread_id,
+                        sender_email=sender_email,
+                        sender_name=sender_name,
+                        subject=subject,
+                        email_content=email_content,
                         analysis=analysis,
-                        conversation_history=conversation_history
-                    )
-
-                    if ai_response and confidence >= 0.5:
-                        ai_response += "\n\n---\nNota: Mesej anda telah dimaklumkan kepada pasukan sokongan kami dan mereka akan menghubungi anda secepat mungkin.\n(Note: Your message has been forwarded to our support team and they will contact you as soon as possible.)"
-
-                        sent = await self.send_reply(
-                            to_email=sender_email,
-                            to_name=sender_name or "Customer",
-                            subject=subject,
-                            content=ai_response,
-                            thread_id=thread_id
-                        )
-
-                        if sent:
-                            result["ai_response_sent"] = True
-                            await self.track_conversation(
-                                customer_email=sender_email,
-                                customer_name=sender_name,
-                                subject=subject,
-                                message_content=ai_response,
-                                sender_type="ai",
-                                ai_generated=True,
-                                ai_confidence=confidence,
-                                thread_id=thread_id
-                            )
+                        footer="\n\n---\nNota: Mesej anda telah dimaklumkan kepada pasukan sokongan kami dan mereka akan menghubungi anda secepat mungkin.\n(Note: Your message has been forwarded to our support team and they will contact you as soon as possible.)",
+                        on_reply_sent=on_reply_sent
+                    ),
+                )
+                logger.info(f"Email escalated to human support: {escalation_reasons}")
+                result["ai_response_sent"] = sent
 
             else:
                 # Normal flow - generate and send AI response
-                if self.is_available():
-                    conversation_history = await self._db_select(
-                        "email_messages",
-                        filters={"thread_id": f"eq.{thread_id}"},
-                        order_by="created_at.asc",
-                        limit=10
-                    )
-
-                    ai_response, confidence = await self.generate_response(
-                        email_content=email_content,
-                        subject=subject,
-                        sender_name=sender_name or "Customer",
-                        analysis=analysis,
-                        conversation_history=conversation_history
-                    )
-
-                    if ai_response and confidence >= 0.5:
-                        sent = await self.send_reply(
-                            to_email=sender_email,
-                            to_name=sender_name or "Customer",
-                            subject=subject,
-                            content=ai_response,
-                            thread_id=thread_id
-                        )
-
-                        if sent:
-                            result["ai_response_sent"] = True
-                            await self.track_conversation(
-                                customer_email=sender_email,
-                                customer_name=sender_name,
-                                subject=subject,
-                                message_content=ai_response,
-                                sender_type="ai",
-                                ai_generated=True,
-                                ai_confidence=confidence,
-                                thread_id=thread_id
-                            )
+                result["ai_response_sent"] = await self._reply_with_ai(
+                    thread_id=thread_id,
+                    sender_email=sender_email,
+                    sender_name=sender_name,
+                    subject=subject,
+                    email_content=email_content,
+                    analysis=analysis,
+                    on_reply_sent=on_reply_sent
+                )
 
             result["success"] = True
             return result
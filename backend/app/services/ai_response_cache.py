@@ -0,0 +1,209 @@
+"""Content-addressed cache for small, repeatable AI sub-calls.
+
+Menu/category/service name extraction, food descriptions, smart image
+prompts and uploaded-image analysis each make one short chat completion
+whose answer depends only on the request body. Regenerations, multi-style
+builds and rebuilds send the same body again, so the answer is cached:
+
+  key      sha256 of (function, model, normalized request body). The body
+           carries the full prompt, so editing a prompt template changes
+           the key and old answers simply age out — no manual invalidation.
+           Normalizing collapses whitespace in message text, so a
+           description that differs only in spacing/newlines still hits.
+  tiers    1. in-process LRU (AI_RESPONSE_CACHE_MEMORY_ENTRIES)
+           2. local SQLite file (AI_RESPONSE_CACHE_PATH) — survives
+              restarts and is shared by every worker on the host. Capped at
+              AI_RESPONSE_CACHE_MAX_ENTRIES; least recently used rows are
+              evicted past the cap.
+  ttl      AI_RESPONSE_CACHE_TTL_SECONDS (7 days) on both tiers.
+
+Only successful (HTTP 200, non-empty) answers are stored — callers decide
+that, see AIService._cached_chat. Lookups are reported through
+record_cache("ai_response:<function>", "memory" | "disk" | "miss"), so the
+hit rate per call site shows on /metrics as cache_lookups_total.
+
+The SQLite tier is best-effort: any error there is logged at debug and the
+call proceeds as a miss.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from app.production.instrumentation import record_cache
+
+AI_RESPONSE_CACHE_PATH = os.getenv(
+    "AI_RESPONSE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "binaapp-ai-cache.sqlite3")
+)
+AI_RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 7)))
+AI_RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("AI_RESPONSE_CACHE_MEMORY_ENTRIES", "512"))
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return _WHITESPACE_RE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(function: str, model: str, body: Dict[str, Any]) -> str:
+    """Stable key for one call: function + model + normalized body."""
+    payload = json.dumps([function, model, _normalize(body)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    """Two-tier (memory LRU → SQLite) cache of AI response text."""
+
+    def __init__(
+        self,
+        path: Optional[str] = AI_RESPONSE_CACHE_PATH,
+        ttl: float = AI_RESPONSE_CACHE_TTL_SECONDS,
+        memory_entries: int = AI_RESPONSE_CACHE_MEMORY_ENTRIES,
+        max_entries: int = AI_RESPONSE_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._db_failed = False
+
+    # ---- memory tier -------------------------------------------------
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at >= self.ttl:
+            self._memory.pop(key, None)
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str, stored_at: Optional[float] = None) -> None:
+        self._memory[key] = (stored_at or time.time(), value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # ---- disk tier (runs in a worker thread) -------------------------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None or self._db_failed or not self.path:
+            return self._db
+        try:
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses ("
+                " key TEXT PRIMARY KEY, function TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS ai_responses_accessed ON ai_responses (accessed_at)")
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            logger.warning(f"AI response cache disabled on disk ({self.path}): {e}")
+            self._db_failed = True
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT stored_at, value FROM ai_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[0] >= self.ttl:
+                db.execute("DELETE FROM ai_responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE ai_responses SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+            return row[0], row[1]
+
+    def _disk_put(self, key: str, function: str, value: str) -> None:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return
+            now = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO ai_responses (key, function, value, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, function, value, now, now),
+            )
+            (count,) = db.execute("SELECT COUNT(*) FROM ai_responses").fetchone()
+            if count > self.max_entries:
+                # Trim to 90% so eviction runs once per batch of inserts,
+                # not on every insert at the cap.
+                db.execute(
+                    "DELETE FROM ai_responses WHERE key IN ("
+                    " SELECT key FROM ai_responses ORDER BY accessed_at LIMIT ?)",
+                    (count - int(self.max_entries * 0.9),),
+                )
+            db.commit()
+
+    # ---- public API --------------------------------------------------
+
+    async def get(self, function: str, key: str) -> Optional[str]:
+        value = self._memory_get(key)
+        if value is not None:
+            record_cache(f"ai_response:{function}", "memory")
+            return value
+        try:
+            hit = await asyncio.to_thread(self._disk_get, key)
+        except sqlite3.Error as e:
+            logger.debug(f"AI response cache read skipped: {e}")
+            hit = None
+        if hit is None:
+            record_cache(f"ai_response:{function}", "miss")
+            return None
+        record_cache(f"ai_response:{function}", "disk")
+        stored_at, value = hit
+        self._memory_put(key, value, stored_at=stored_at)
+        return value
+
+    async def put(self, function: str, key: str, value: str) -> None:
+        self._memory_put(key, value)
+        try:
+            await asyncio.to_thread(self._disk_put, key, function, value)
+        except sqlite3.Error as e:
+            logger.debug(f"AI response cache write skipped: {e}")
+
+    def clear_memory(self) -> None:
+        self._memory.clear()
+
+
+_cache: Optional[AIResponseCache] = None
+
+
+def get_ai_response_cache() -> AIResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = AIResponseCache()
+    return _cache
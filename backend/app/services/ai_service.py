@@ -13,7 +13,7 @@ import json
 import re
 from urllib.parse import quote, urlsplit
 from collections import Counter
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from loguru import logger
 from typing import Optional, List, Dict, Tuple, Callable, Awaitable
 from app.models.schemas import WebsiteGenerationRequest, AIGenerationResponse
@@ -29,6 +29,7 @@ from app.services.claim_sanitizer import (
     sensitive_claim_patterns,
 )
 from app.services.seo_metadata import SeoMeta, inject_seo_metadata
+from app.services.vision_analysis import analyze_images
 from app.services.layout_guard_audit import firing_guards
 from app.services.generation_validator import (
     ValidationResult,
@@ -39,6 +40,21 @@ from difflib import SequenceMatcher
 import cloudinary
 import cloudinary.uploader
 from app.utils.html_inject import insert_before_body
+from app.utils.keyword_matcher import KeywordMatcher, has_any_word
+from app.services.ai_response_cache import cache_key, get_ai_response_cache
+from app.services.generation_context import GenerationContext, current_generation, generation_scope
+from app.services.generation_linter import WA_PHONE_RE, wa_digits_repl
+from app.services.image_scheduler import ImageScheduler, PendingImages
+from app.services.llm_stream import (
+    DEADLINE,
+    STREAM_EXPECTED_CHARS,
+    ChatCompletion,
+    StreamProgress,
+    post_chat_completion,
+)
+from app.production.instrumentation import record_llm_call
+from app.production.provider_governor import get_provider_governor
+from app.production.provider_router import AllProvidersFailed, ProviderRouter
 
 
 # Per-call timeout for the DeepSeek primary generation in
@@ -74,6 +90,36 @@ AI_GLM_TIMEOUT_SECONDS = float(os.getenv("AI_GLM_TIMEOUT_SECONDS", "240"))
 # instant rollback to pure DeepSeek — no code change or rollback deploy needed.
 USE_GLM_FOR_HTML = os.getenv("USE_GLM_FOR_HTML", "false").strip().lower() in ("1", "true", "yes", "on")
 
+# Feature flag: stream provider responses (app.services.llm_stream) so a
+# build reports real HTML progress, stops reading at '</html>', and gives up
+# on a provider that clearly cannot finish inside its budget instead of
+# waiting for the timeout. Ships dark (default off): with it off every
+# provider call is the single non-streaming POST it has always been.
+AI_STREAM_RESPONSES = os.getenv("AI_STREAM_RESPONSES", "false").strip().lower() in ("1", "true", "yes", "on")
+
+# Feature flags: pick the HTML provider (GLM / DeepSeek) by observed health
+# instead of the fixed GLM-then-DeepSeek chain (app.production.provider_router),
+# and optionally hedge — start the second provider once the first is past its
+# p90 latency and keep whichever valid page lands first. Both ship dark and
+# only apply when USE_GLM_FOR_HTML is on (otherwise there is one provider).
+AI_PROVIDER_ROUTING = os.getenv("AI_PROVIDER_ROUTING", "false").strip().lower() in ("1", "true", "yes", "on")
+AI_PROVIDER_HEDGING = os.getenv("AI_PROVIDER_HEDGING", "false").strip().lower() in ("1", "true", "yes", "on")
+# Process-wide: provider health is learned across builds.
+_HTML_ROUTER = ProviderRouter(("glm", "deepseek"))
+
+# Feature flag: answer repeat small AI sub-calls (name extraction, food
+# descriptions, smart image prompts, uploaded-image analysis) from the
+# content-addressed cache in app.services.ai_response_cache. Ships dark: with
+# it off every call goes to the provider as before.
+AI_RESPONSE_CACHE = os.getenv("AI_RESPONSE_CACHE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+# Feature flag: one build-wide image scheduler (app.services.image_scheduler)
+# for the auto-fill and food-image passes — provider-aware lanes, Stability
+# overflow while the Z.ai queue is busy, and auto-fill images generating
+# WHILE the HTML is written instead of before it. Ships dark: with it off the
+# two passes run exactly as before.
+AI_IMAGE_SCHEDULER = os.getenv("AI_IMAGE_SCHEDULER", "false").strip().lower() in ("1", "true", "yes", "on")
+
 # AI image provider selection: 'stability' (default — existing behaviour,
 # byte-for-byte) or 'zai' (CogView / GLM-Image via the Z.ai images API, with
 # the Stability path as automatic fallback when STABILITY_API_KEY is set).
@@ -91,7 +137,8 @@ ZAI_IMAGE_TIMEOUT_SECONDS = float(os.getenv("ZAI_IMAGE_TIMEOUT_SECONDS", "120"))
 # The Z.ai image endpoint tolerates far less concurrency than Stability:
 # parallel requests trip its rate limiter (HTTP 429, code 1302). When
 # IMAGE_PROVIDER=zai, image requests are therefore SERIALIZED (concurrency 1)
-# with a small spacing delay between requests, 429s are retried with the
+# across every worker by the provider governor, with a small spacing delay
+# between requests (app.production.provider_governor), 429s are retried with the
 # backoff below, and the total Z.ai image time per build is bounded by the
 # phase budget — once spent, remaining images go straight to Stability.
 # The Stability path keeps its original parallel behaviour.
@@ -130,6 +177,28 @@ def zai_image_request_delay_seconds() -> float:
         return 1.0
 
 
+def zai_image_concurrency() -> int:
+    """Z.ai image requests allowed in flight at once across ALL workers
+    (enforced by the provider governor). 1 — the endpoint 429s on any
+    concurrency. Read at call time."""
+    try:
+        return max(1, int(os.getenv("ZAI_IMAGE_CONCURRENCY", "1")))
+    except (TypeError, ValueError):
+        return 1
+
+
+def zai_image_lease_seconds() -> float:
+    """How long a Z.ai provider lease may be held before the governor
+    reclaims it (a worker that died mid-call). Covers the longest single
+    call: generation + download timeouts, 429 backoffs and download-404
+    retries."""
+    return (
+        2 * ZAI_IMAGE_TIMEOUT_SECONDS
+        + sum(ZAI_IMAGE_RETRY_BACKOFF_SECONDS)
+        + sum(ZAI_IMAGE_DOWNLOAD_RETRY_DELAYS_SECONDS)
+    )
+
+
 def zai_image_phase_budget_seconds() -> float:
     """Cap on the CUMULATIVE time a single build may spend inside Z.ai image
     calls (auto-fill + food-image pass combined). Once exceeded, remaining
@@ -241,6 +310,27 @@ def _timed_step(step_name: str, timings: Dict[str, float]):
         logger.info(f"⏱️  {step_name}: {elapsed:.2f}s")
 
 
+# analyze_uploaded_image's answer when no model could analyse the image.
+_IMAGE_ANALYSIS_FALLBACK = {
+    "suggested_name": None,
+    "category": "unknown",
+    "description": "Unable to analyze image",
+    "confidence": "low",
+    "is_food": False
+}
+
+
+@contextmanager
+def _stream_progress(ctx: GenerationContext, callback):
+    """Report the build's provider stream progress to `callback` for the
+    duration of a block; cleared on the way out, error or not."""
+    ctx.on_stream_progress = callback
+    try:
+        yield
+    finally:
+        ctx.on_stream_progress = None
+
+
 # Patterns for extracting theme tokens out of the generated HTML, so the
 # injected widgets can inherit the site's palette via CSS variables. We
 # look in three places (in order): explicit --primary / --primary-color
@@ -663,6 +753,13 @@ class AIService:
         "servis": "services",
     }
 
+    # Compiled once: image selection runs per menu item / gallery card, and
+    # scanning these vocabularies one re.search per key dominated it.
+    _ALL_IMAGES = {**FOOD_IMAGES, **BUSINESS_IMAGES}
+    _FOOD_IMAGE_MATCHER = KeywordMatcher(k for k in FOOD_IMAGES if k != "default")
+    _ALL_IMAGE_MATCHER = KeywordMatcher(k for k in _ALL_IMAGES if k != "default")
+    _MALAY_POOL_MATCHER = KeywordMatcher(list(MALAY_KEYWORD_TO_POOL))
+
     # MALAYSIAN FOOD PROMPTS - 60+ Authentic Malaysian Dishes
     MALAYSIAN_FOOD_PROMPTS = {
         # Rice Dishes
@@ -762,11 +859,6 @@ class AIService:
         self.qwen_base_url = os.getenv("QWEN_BASE_URL", "https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
         self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
         self.deepseek_base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
-        # Sanitizer trace from the most recent generation — consumed by the
-        # post-generation validator (a bare deletion is a blocking error).
-        self._last_sanitizer_trace: List[Dict[str, str]] = []
-        # Structured operating hours from the template copywriting pass.
-        self._last_template_hours: list = []
         self.deepseek_model = os.getenv("DEEPSEEK_MODEL", "deepseek-v4-flash")
         self.deepseek_model_pro = os.getenv("DEEPSEEK_MODEL_PRO", "deepseek-v4-pro")
         # GLM / Z.ai — primary HTML generator when USE_GLM_FOR_HTML is on.
@@ -784,27 +876,14 @@ class AIService:
         # endpoint are 'glm-image' (default) and 'cogview-4-250304'; plain
         # 'cogview-4' is rejected by the API (error 1211 "Unknown Model").
         self.zai_image_model = os.getenv("ZAI_IMAGE_MODEL", "glm-image")
-        # Z.ai image serialization state (its endpoint rejects concurrent
-        # requests with 429/1302): a lock enforcing concurrency 1, created
-        # lazily inside the event loop, plus the last-request timestamp used
-        # to space consecutive requests. The Stability path never touches it.
-        self._zai_image_lock: Optional[asyncio.Lock] = None
-        self._zai_last_request_at: float = 0.0
         self.stability_api_key = os.getenv("STABILITY_API_KEY")
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_ANON_KEY")
 
-        # Per-call API-boundary state: set by every _call_<provider> method so
-        # generate_website / _call_qwen_with_truncation_retry can see whether
-        # the model hit its output cap (finish_reason ∈ {length, max_tokens}).
-        # Mirrors the _last_extract_info pattern below. NOT thread-safe — but
-        # neither is _last_extract_info; the service is awaited serially per
-        # request from FastAPI.
-        self._last_api_call: Dict = {
-            "provider": None,
-            "finish_reason": None,
-            "truncated": False,
-        }
+        # Per-build state (_last_api_call, _last_extract_info, ...) lives on
+        # the active GenerationContext; this one only backs calls made
+        # outside a build. See app.services.generation_context.
+        self._fallback_generation = GenerationContext()
 
         logger.info("=" * 80)
         logger.info("🚀 AI SERVICE - STRICT NO-PLACEHOLDER MODE")
@@ -824,6 +903,55 @@ class AIService:
         logger.info("   Mode: Real images only, no placeholders allowed")
         logger.info("=" * 80)
 
+    # ── Per-build state ──────────────────────────────────────────────────
+    # Read and written through the active GenerationContext so concurrent
+    # builds on one event loop never see each other's values.
+    def _generation(self) -> GenerationContext:
+        ctx = current_generation()
+        if ctx is not None:
+            return ctx
+        fallback = self.__dict__.get("_fallback_generation")
+        if fallback is None:
+            fallback = self._fallback_generation = GenerationContext()
+        return fallback
+
+    @property
+    def _last_api_call(self) -> Dict:
+        """finish_reason/truncation of this build's most recent provider call."""
+        return self._generation().api_call
+
+    @_last_api_call.setter
+    def _last_api_call(self, value: Dict) -> None:
+        self._generation().api_call = value
+
+    @property
+    def _last_extract_info(self) -> Dict:
+        """Truncation diagnostics from this build's most recent HTML extraction."""
+        return self._generation().extract_info
+
+    @_last_extract_info.setter
+    def _last_extract_info(self, value: Dict) -> None:
+        self._generation().extract_info = value
+
+    @property
+    def _last_sanitizer_trace(self) -> List[Dict[str, str]]:
+        """Sensitive-claim sanitizer trace — consumed by the post-generation
+        validator (a bare deletion is a blocking error)."""
+        return self._generation().sanitizer_trace
+
+    @_last_sanitizer_trace.setter
+    def _last_sanitizer_trace(self, value: List[Dict[str, str]]) -> None:
+        self._generation().sanitizer_trace = value
+
+    @property
+    def _last_template_hours(self) -> list:
+        """Structured operating hours from the template copywriting pass."""
+        return self._generation().template_hours
+
+    @_last_template_hours.setter
+    def _last_template_hours(self, value: list) -> None:
+        self._generation().template_hours = value
+
     @staticmethod
     def _has_word(text: str, word: str) -> bool:
         """Word-boundary containment check for keyword matching.
@@ -839,10 +967,29 @@ class AIService:
             return False
         return bool(re.search(rf"\b{re.escape(word)}\b", text))
 
-    @classmethod
-    def _has_any_word(cls, text: str, words) -> bool:
+    @staticmethod
+    def _has_any_word(text: str, words) -> bool:
         """True if any of the keywords appears as a whole word in text."""
-        return any(cls._has_word(text, w) for w in words)
+        return has_any_word(text, words)
+
+    @staticmethod
+    def _best_image_key(text_lower: str, images: Dict[str, str], matcher: KeywordMatcher) -> Tuple[Optional[str], float]:
+        """Fuzzy image-key match: the key that best covers text, or that text
+        best covers, as whole words. Returns (key, score); ties go to the
+        earlier key, as in the original per-key loop."""
+        forward = matcher.matched(text_lower)
+        reverse = re.compile(rf"\b{re.escape(text_lower)}\b")
+        best_key, best_score = None, 0.0
+        for key in images:
+            if key in forward:
+                score = len(key) / len(text_lower)
+            elif text_lower in key and reverse.search(key):
+                score = len(text_lower) / len(key)
+            else:
+                continue
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
 
     def get_food_image(self, dish_name: str) -> str:
         """
@@ -862,27 +1009,9 @@ class AIService:
 
         # Fuzzy matching - check if dish name contains any key (whole words
         # only — 'ikan' must not match "kecantikan", 'kopi' not "fotokopi")
-        best_match = None
-        best_score = 0.0
-
-        for key, url in self.FOOD_IMAGES.items():
-            if key == "default":
-                continue
-
-            # Check if key is in dish name or vice versa
-            if self._has_word(dish_lower, key):
-                score = len(key) / len(dish_lower)
-                if score > best_score:
-                    best_score = score
-                    best_match = url
-            elif self._has_word(key, dish_lower):
-                score = len(dish_lower) / len(key)
-                if score > best_score:
-                    best_score = score
-                    best_match = url
-
-        if best_match and best_score >= 0.3:
-            return best_match
+        best_key, best_score = self._best_image_key(dish_lower, self.FOOD_IMAGES, self._FOOD_IMAGE_MATCHER)
+        if best_key and best_score >= 0.3:
+            return self.FOOD_IMAGES[best_key]
 
         # Keyword fallback (whole-word matches only)
         if "nasi kandar" in dish_lower:
@@ -944,10 +1073,8 @@ class AIService:
 
     def _malay_pool_for(self, text_lower: str) -> Optional[str]:
         """Check if the text contains any Malay keyword (whole word) and return its pool category."""
-        for keyword, pool in self.MALAY_KEYWORD_TO_POOL.items():
-            if self._has_word(text_lower, keyword):
-                return pool
-        return None
+        keyword = self._MALAY_POOL_MATCHER.first(text_lower)
+        return self.MALAY_KEYWORD_TO_POOL[keyword] if keyword else None
 
     def get_matching_image(self, text: str, category: str = "all", business_type: str = "", used_urls: Optional[set] = None) -> str:
         """
@@ -971,8 +1098,8 @@ class AIService:
 
         text_lower = text.lower().strip()
 
-        # Combine food and business images for comprehensive matching
-        all_images = {**self.FOOD_IMAGES, **self.BUSINESS_IMAGES}
+        # Combined food and business images for comprehensive matching
+        all_images = self._ALL_IMAGES
 
         # Direct exact match
         if text_lower in all_images:
@@ -981,32 +1108,12 @@ class AIService:
 
         # Fuzzy matching - check if text contains any key or vice versa
         # (whole words only — 'ikan' must not match "kecantikan")
-        best_match = None
-        best_score = 0.0
-        best_url = None
-
-        for key, url in all_images.items():
-            if key == "default":
-                continue
-
-            # Check if key is in text or vice versa
-            if self._has_word(text_lower, key):
-                score = len(key) / len(text_lower)
-                if score > best_score:
-                    best_score = score
-                    best_match = key
-                    best_url = url
-            elif self._has_word(key, text_lower):
-                score = len(text_lower) / len(key)
-                if score > best_score:
-                    best_score = score
-                    best_match = key
-                    best_url = url
+        best_match, best_score = self._best_image_key(text_lower, all_images, self._ALL_IMAGE_MATCHER)
 
         # Return if we have a good match (30% similarity or higher)
-        if best_url and best_score >= 0.3:
+        if best_match and best_score >= 0.3:
             logger.info(f"🎯 Fuzzy match for '{text}' → '{best_match}' (score: {best_score:.2f})")
-            return best_url
+            return all_images[best_match]
 
         # Malay keyword → rotating pool (runs before English keyword fallbacks so
         # terms like "upacara", "perkahwinan", "jaringan" don't slip through).
@@ -1268,39 +1375,30 @@ class AIService:
         """
         logger.info(f"🔍 Analyzing uploaded image: {image_url[:60]}...")
         
-        default_result = {
-            "suggested_name": None,
-            "category": "unknown",
-            "description": "Unable to analyze image",
-            "confidence": "low",
-            "is_food": False
-        }
+        default_result = dict(_IMAGE_ANALYSIS_FALLBACK)
         
         try:
             # Use Qwen VL (Vision-Language) for image analysis
             # Qwen-VL-Max supports image input via URL
             if self.qwen_api_key:
                 logger.info("🟡 Using Qwen-VL for image analysis...")
-                async with httpx.AsyncClient(timeout=60.0) as client:
-                    response = await client.post(
-                        f"{self.qwen_base_url}/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {self.qwen_api_key}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": "qwen-vl-max",
-                            "messages": [
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "image_url",
-                                            "image_url": {"url": image_url}
-                                        },
-                                        {
-                                            "type": "text",
-                                            "text": """Analyze this image and respond in JSON format:
+                response = await self._cached_chat(
+                    "analyze_uploaded_image",
+                    f"{self.qwen_base_url}/chat/completions",
+                    self.qwen_api_key,
+                    {
+                        "model": "qwen-vl-max",
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": [
+                                    {
+                                        "type": "image_url",
+                                        "image_url": {"url": image_url}
+                                    },
+                                    {
+                                        "type": "text",
+                                        "text": """Analyze this image and respond in JSON format:
 {
   "suggested_name": "Item name in Malay or English (e.g., 'Nasi Lemak Special', 'Haircut Men')",
   "category": "food|salon|clothing|product|other",
@@ -1312,39 +1410,39 @@ class AIService:
 If it's Malaysian food, suggest authentic Malay names.
 If it's a service (haircut, treatment), describe the service.
 Respond ONLY with valid JSON, no other text."""
-                                        }
-                                    ]
-                                }
-                            ],
-                            "temperature": 0.3,
-                            "max_tokens": 200
-                        }
-                    )
+                                    }
+                                ]
+                            }
+                        ],
+                        "temperature": 0.3,
+                        "max_tokens": 200
+                    },
+                    timeout=60.0,
+                )
+
+                if response.status_code == 200:
+                    content = response.content.strip()
+                    logger.info(f"🟡 Qwen-VL response: {content[:100]}...")
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        content = result["choices"][0]["message"]["content"].strip()
-                        logger.info(f"🟡 Qwen-VL response: {content[:100]}...")
+                    # Parse JSON response
+                    import json as json_module
+                    try:
+                        # Clean up response - remove markdown code blocks if present
+                        if content.startswith("```"):
+                            content = content.split("```")[1]
+                            if content.startswith("json"):
+                                content = content[4:]
+                        content = content.strip()
                         
-                        # Parse JSON response
-                        import json as json_module
-                        try:
-                            # Clean up response - remove markdown code blocks if present
-                            if content.startswith("```"):
-                                content = content.split("```")[1]
-                                if content.startswith("json"):
-                                    content = content[4:]
-                            content = content.strip()
-                            
-                            analysis = json_module.loads(content)
-                            analysis["confidence"] = "high"
-                            logger.info(f"✅ Image analyzed: {analysis.get('suggested_name')} - {analysis.get('category')}")
-                            return analysis
-                        except json_module.JSONDecodeError:
-                            logger.warning("⚠️ Could not parse Qwen-VL response as JSON")
-                    else:
-                        logger.warning(f"⚠️ Qwen-VL failed: {response.status_code}")
-            
+                        analysis = json_module.loads(content)
+                        analysis["confidence"] = "high"
+                        logger.info(f"✅ Image analyzed: {analysis.get('suggested_name')} - {analysis.get('category')}")
+                        return analysis
+                    except json_module.JSONDecodeError:
+                        logger.warning("⚠️ Could not parse Qwen-VL response as JSON")
+                else:
+                    logger.warning(f"⚠️ Qwen-VL failed: {response.status_code}")
+
             # Fallback to DeepSeek (if it supports vision)
             if self.deepseek_api_key:
                 logger.info("🔷 Trying DeepSeek for image analysis...")
@@ -1360,23 +1458,41 @@ Respond ONLY with valid JSON, no other text."""
     async def analyze_images_batch(self, images: List[Dict]) -> List[Dict]:
         """
         Analyze a batch of uploaded images.
-        
+
+        Images without a user-provided name are analyzed concurrently
+        through the shared vision service (bounded, cached by image content).
+
         Args:
             images: List of image dicts with 'url' and optional 'name'
-            
+
         Returns:
             List of analysis results with suggested names and categories
         """
-        results = []
+        entries = []
         for img in images:
             url = img.get('url', '') if isinstance(img, dict) else str(img)
             existing_name = img.get('name', '') if isinstance(img, dict) else ''
-            
-            if not url:
-                continue
-                
-            # Skip if user already provided a valid name
-            if existing_name and existing_name.strip() and existing_name != 'Hero Image':
+            if url:
+                # Skip if user already provided a valid name
+                named = bool(existing_name and existing_name.strip() and existing_name != 'Hero Image')
+                entries.append((url, existing_name, named))
+
+        to_analyze = [url for url, _, named in entries if not named]
+
+        async def analyze(url: str) -> Optional[str]:
+            analysis = await self.analyze_uploaded_image(url)
+            # Only real answers are cached; the default result is retried.
+            return json.dumps(analysis) if analysis.get("confidence") == "high" else None
+
+        answers = await analyze_images(to_analyze, analyze, function="analyze_uploaded_image")
+        analyses = {
+            url: json.loads(answer) if answer else _IMAGE_ANALYSIS_FALLBACK
+            for url, answer in zip(to_analyze, answers)
+        }
+
+        results = []
+        for url, existing_name, named in entries:
+            if named:
                 results.append({
                     "url": url,
                     "user_name": existing_name,
@@ -1385,9 +1501,7 @@ Respond ONLY with valid JSON, no other text."""
                     "analyzed": False
                 })
                 continue
-            
-            # Analyze the image
-            analysis = await self.analyze_uploaded_image(url)
+            analysis = analyses[url]
             results.append({
                 "url": url,
                 "user_name": existing_name,
@@ -1397,10 +1511,7 @@ Respond ONLY with valid JSON, no other text."""
                 "is_food": analysis.get("is_food", False),
                 "analyzed": True
             })
-            
-            # Small delay between API calls
-            await asyncio.sleep(0.5)
-        
+
         return results
 
     async def test_api_connectivity(self) -> Dict[str, any]:
@@ -1698,7 +1809,11 @@ Respond ONLY with valid JSON, no other text."""
         return {"hero": hero, "gallery": gallery}
 
     async def generate_food_image(
-        self, food_name: str, zai_phase: Optional[Dict] = None, doodle: bool = False
+        self,
+        food_name: str,
+        zai_phase: Optional[Dict] = None,
+        doodle: bool = False,
+        scheduler: Optional[ImageScheduler] = None,
     ) -> Optional[str]:
         """
         Generate AI image for a food item using the full pipeline:
@@ -1737,9 +1852,12 @@ Respond ONLY with valid JSON, no other text."""
             # Step 2: Generate image with the selected provider (IMAGE_PROVIDER:
             # Z.ai with Stability fallback, or Stability directly) using the
             # detailed description
-            image_url = await self._generate_image(
-                detailed_description, zai_phase=zai_phase, doodle=doodle
-            )
+            if scheduler is not None:
+                image_url = await scheduler.generate(detailed_description, doodle=doodle)
+            else:
+                image_url = await self._generate_image(
+                    detailed_description, zai_phase=zai_phase, doodle=doodle
+                )
 
             if image_url:
                 logger.info(f"✅ Generated image: {image_url[:60]}...")
@@ -1793,31 +1911,28 @@ Format: Just the image description, no explanations."""
             if self.deepseek_api_key:
                 logger.info(f"🔷 Using DeepSeek to generate description for: {food_name}")
                 try:
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.post(
-                            f"{self.deepseek_base_url}/chat/completions",
-                            headers={
-                                "Authorization": f"Bearer {self.deepseek_api_key}",
-                                "Content-Type": "application/json"
-                            },
-                            json={
-                                "model": self.deepseek_model,
-                                "messages": [
-                                    {"role": "system", "content": system_prompt},
-                                    {"role": "user", "content": user_prompt}
-                                ],
-                                "temperature": 0.7,
-                                "max_tokens": 200
-                            }
-                        )
+                    response = await self._cached_chat(
+                        "_generate_food_description",
+                        f"{self.deepseek_base_url}/chat/completions",
+                        self.deepseek_api_key,
+                        {
+                            "model": self.deepseek_model,
+                            "messages": [
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_prompt}
+                            ],
+                            "temperature": 0.7,
+                            "max_tokens": 200
+                        },
+                        timeout=30,
+                    )
 
-                        if response.status_code == 200:
-                            result = response.json()
-                            description = result["choices"][0]["message"]["content"].strip()
-                            logger.info("✅ DeepSeek generated description")
-                            return description
-                        else:
-                            logger.warning(f"DeepSeek failed: {response.status_code}")
+                    if response.status_code == 200:
+                        description = response.content.strip()
+                        logger.info("✅ DeepSeek generated description")
+                        return description
+                    else:
+                        logger.warning(f"DeepSeek failed: {response.status_code}")
                 except Exception as e:
                     logger.warning(f"DeepSeek error: {e}")
 
@@ -1825,31 +1940,28 @@ Format: Just the image description, no explanations."""
             if self.qwen_api_key:
                 logger.info(f"🟡 Using Qwen to generate description for: {food_name}")
                 try:
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.post(
-                            f"{self.qwen_base_url}/chat/completions",
-                            headers={
-                                "Authorization": f"Bearer {self.qwen_api_key}",
-                                "Content-Type": "application/json"
-                            },
-                            json={
-                                "model": "qwen-max",
-                                "messages": [
-                                    {"role": "system", "content": system_prompt},
-                                    {"role": "user", "content": user_prompt}
-                                ],
-                                "temperature": 0.7,
-                                "max_tokens": 200
-                            }
-                        )
+                    response = await self._cached_chat(
+                        "_generate_food_description",
+                        f"{self.qwen_base_url}/chat/completions",
+                        self.qwen_api_key,
+                        {
+                            "model": "qwen-max",
+                            "messages": [
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_prompt}
+                            ],
+                            "temperature": 0.7,
+                            "max_tokens": 200
+                        },
+                        timeout=30,
+                    )
 
-                        if response.status_code == 200:
-                            result = response.json()
-                            description = result["choices"][0]["message"]["content"].strip()
-                            logger.info("✅ Qwen generated description")
-                            return description
-                        else:
-                            logger.warning(f"Qwen failed: {response.status_code}")
+                    if response.status_code == 200:
+                        description = response.content.strip()
+                        logger.info("✅ Qwen generated description")
+                        return description
+                    else:
+                        logger.warning(f"Qwen failed: {response.status_code}")
                 except Exception as e:
                     logger.warning(f"Qwen error: {e}")
 
@@ -2100,12 +2212,6 @@ Format: Just the image description, no explanations."""
             logger.error(f"🎨 Z.ai image error: {e}")
             return None
 
-    def _get_zai_image_lock(self) -> asyncio.Lock:
-        """Lazily create the Z.ai serialization lock inside the event loop."""
-        if self._zai_image_lock is None:
-            self._zai_image_lock = asyncio.Lock()
-        return self._zai_image_lock
-
     @staticmethod
     def _new_zai_image_phase() -> Dict:
         """Per-build Z.ai image phase state, threaded through every image call
@@ -2135,15 +2241,39 @@ Format: Just the image description, no explanations."""
             return True
         return False
 
-    async def _pace_zai_image_request(self) -> None:
-        """Sleep so consecutive Z.ai requests are at least
-        ZAI_IMAGE_REQUEST_DELAY_SECONDS apart. Called under the lock."""
-        delay = zai_image_request_delay_seconds()
-        if delay <= 0 or not self._zai_last_request_at:
-            return
-        wait = delay - (time.monotonic() - self._zai_last_request_at)
-        if wait > 0:
-            await asyncio.sleep(wait)
+    async def _generate_zai_image_serialized(
+        self, zai_prompt: str, zai_phase: Optional[Dict]
+    ) -> Optional[str]:
+        """One Z.ai image under a provider-wide lease (see
+        app.production.provider_governor): concurrency, request spacing and
+        fair turns between builds hold across every worker. Charged to the
+        build's phase budget for time INSIDE the call only — queueing for
+        the lease is not. None when the budget is spent or Z.ai fails — the
+        caller decides on the Stability fallback."""
+        if self._zai_phase_exhausted(zai_phase):
+            return None
+        ctx = current_generation()
+        async with get_provider_governor().lease(
+            "zai",
+            holder=ctx.build_id if ctx else "",
+            limit=zai_image_concurrency(),
+            spacing=zai_image_request_delay_seconds(),
+            lease_seconds=zai_image_lease_seconds(),
+        ) as lease:
+            if lease.waited >= 1.0:
+                logger.info(f"🎨 Z.ai image waited {lease.waited:.1f}s for a provider slot")
+            if zai_phase is not None:
+                zai_phase["queued"] = zai_phase.get("queued", 0.0) + lease.waited
+            # Re-check after queueing: images ahead of us in the queue may
+            # have spent the remaining budget.
+            if self._zai_phase_exhausted(zai_phase):
+                return None
+            _zai_started = time.monotonic()
+            try:
+                return await self._generate_image_zai(zai_prompt)
+            finally:
+                if zai_phase is not None:
+                    zai_phase["spent"] += time.monotonic() - _zai_started
 
     async def _generate_image(
         self,
@@ -2157,10 +2287,10 @@ Format: Just the image description, no explanations."""
         IMAGE_PROVIDER=zai routes through Z.ai first and falls back to the
         untouched Stability path when STABILITY_API_KEY is set; the default
         'stability' keeps the existing path exactly as before. Z.ai requests
-        are SERIALIZED (its endpoint 429s on concurrency) with a spacing
-        delay, and honour the per-build phase budget in `zai_phase` — once
+        are SERIALIZED across workers (its endpoint 429s on concurrency)
+        with a spacing delay, and honour the per-build phase budget in `zai_phase` — once
         spent, the image goes straight to Stability. The Stability fallback
-        itself runs OUTSIDE the lock, so fallback images keep their original
+        itself runs OUTSIDE the Z.ai lease, so fallback images keep their original
         concurrency. Logs which provider actually served each image. Returns
         a Cloudinary URL, or None when every configured provider fails
         (existing no-image behaviour applies downstream).
@@ -2171,21 +2301,9 @@ Format: Just the image description, no explanations."""
             # Non-food prompts get the (idempotent) no-text suffix here for
             # the same reason the Stability path does. doodle=True restyles
             # the result into a cartoon illustration.
-            zai_prompt = self._shape_image_prompt(prompt, food, doodle)
-            url = None
-            if not self._zai_phase_exhausted(zai_phase):
-                async with self._get_zai_image_lock():
-                    # Re-check after queueing: images ahead of us in the lock
-                    # queue may have spent the remaining budget.
-                    if not self._zai_phase_exhausted(zai_phase):
-                        await self._pace_zai_image_request()
-                        _zai_started = time.monotonic()
-                        try:
-                            url = await self._generate_image_zai(zai_prompt)
-                        finally:
-                            self._zai_last_request_at = time.monotonic()
-                            if zai_phase is not None:
-                                zai_phase["spent"] += time.monotonic() - _zai_started
+            url = await self._generate_zai_image_serialized(
+                self._shape_image_prompt(prompt, food, doodle), zai_phase
+            )
             if url:
                 logger.info(f"🖼️ Image served by provider=zai: {url[:60]}...")
                 return url
@@ -2558,34 +2676,31 @@ Generate prompts now:"""
                 logger.warning("🧠 No DEEPSEEK_API_KEY, using fallback prompts")
                 return self._get_fallback_prompts(description)
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.deepseek_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 1000,
-                        "temperature": 0.3
-                    }
-                )
+            response = await self._cached_chat(
+                "generate_smart_image_prompts",
+                "https://api.deepseek.com/v1/chat/completions",
+                api_key,
+                {
+                    "model": self.deepseek_model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": 1000,
+                    "temperature": 0.3
+                },
+                timeout=30.0,
+            )
 
-                if response.status_code == 200:
-                    data = response.json()
-                    content = data["choices"][0]["message"]["content"]
-
-                    # Parse JSON from response - extract JSON from response
-                    json_match = re.search(r'\{[\s\S]*\}', content)
-                    if json_match:
-                        prompts = json.loads(json_match.group())
-                        logger.info(f"🧠 AI Generated prompts for: {description[:50]}")
-                        logger.info(f"🧠 Hero: {prompts.get('hero', '')[:50]}...")
-                        return prompts
-                else:
-                    logger.error(f"🧠 DeepSeek API failed: {response.status_code}")
+            if response.status_code == 200:
+                content = response.content
+
+                # Parse JSON from response - extract JSON from response
+                json_match = re.search(r'\{[\s\S]*\}', content)
+                if json_match:
+                    prompts = json.loads(json_match.group())
+                    logger.info(f"🧠 AI Generated prompts for: {description[:50]}")
+                    logger.info(f"🧠 Hero: {prompts.get('hero', '')[:50]}...")
+                    return prompts
+            else:
+                logger.error(f"🧠 DeepSeek API failed: {response.status_code}")
 
         except Exception as e:
             logger.error(f"🧠 Smart prompt generation failed: {e}")
@@ -2593,6 +2708,24 @@ Generate prompts now:"""
         # Fallback - use specific prompts based on business type
         return self._get_fallback_prompts(description)
 
+    _FOOD_BUSINESS_KEYWORDS = (
+        'nasi', 'mee', 'ayam', 'ikan', 'restoran', 'restaurant',
+        'kedai makan', 'warung', 'mamak', 'kandar', 'lemak', 'goreng',
+        'makanan', 'cafe', 'kafe', 'seafood', 'udang', 'ketam', 'sotong',
+        'food', 'masakan', 'catering', 'bakery', 'roti', 'kuih',
+        # Bakery / cake / dessert / drinks — a cake shop IS a food
+        # business, but a savoury-only keyword list classified it as
+        # non-food and gave it retail product cards, while a savoury
+        # keyword that happened to appear ("kuih") sent it down the
+        # generic Malaysian-dish path (nasi-lemak hero, kuih menu).
+        'kek', 'cake', 'cupcake', 'cupcakes', 'kek harijadi',
+        'kek hari jadi', 'bakeri', 'brownies', 'brownie', 'cheesecake',
+        'pastri', 'pastry', 'donut', 'donat', 'muffin', 'tart',
+        'dessert', 'desserts', 'pencuci mulut', 'minuman', 'drinks',
+        'beverage', 'beverages', 'juice', 'jus', 'smoothie', 'kopi',
+    )
+    _FOOD_BUSINESS_MATCHER = KeywordMatcher(_FOOD_BUSINESS_KEYWORDS)
+
     def _is_food_business(self, description: str) -> bool:
         """True if the description looks like a food / restaurant business.
 
@@ -2600,26 +2733,7 @@ Generate prompts now:"""
         substring of 'kecantikan' (beauty), which classified beauty salons
         as food businesses and gave them dish-based gallery prompts.
         """
-        desc_lower = description.lower()
-        return any(
-            re.search(rf"\b{re.escape(word)}\b", desc_lower)
-            for word in [
-                'nasi', 'mee', 'ayam', 'ikan', 'restoran', 'restaurant',
-                'kedai makan', 'warung', 'mamak', 'kandar', 'lemak', 'goreng',
-                'makanan', 'cafe', 'kafe', 'seafood', 'udang', 'ketam', 'sotong',
-                'food', 'masakan', 'catering', 'bakery', 'roti', 'kuih',
-                # Bakery / cake / dessert / drinks — a cake shop IS a food
-                # business, but a savoury-only keyword list classified it as
-                # non-food and gave it retail product cards, while a savoury
-                # keyword that happened to appear ("kuih") sent it down the
-                # generic Malaysian-dish path (nasi-lemak hero, kuih menu).
-                'kek', 'cake', 'cupcake', 'cupcakes', 'kek harijadi',
-                'kek hari jadi', 'bakeri', 'brownies', 'brownie', 'cheesecake',
-                'pastri', 'pastry', 'donut', 'donat', 'muffin', 'tart',
-                'dessert', 'desserts', 'pencuci mulut', 'minuman', 'drinks',
-                'beverage', 'beverages', 'juice', 'jus', 'smoothie', 'kopi',
-            ]
-        )
+        return self._FOOD_BUSINESS_MATCHER.search(description.lower())
 
     # Bakery/dessert vs. drinks signals inside a food business. Whole-word
     # matched. Used to pick a food SUB-TYPE so a cake/pastry/dessert shop gets
@@ -2643,6 +2757,10 @@ Generate prompts now:"""
         'smoothie', 'smoothies', 'bubble tea', 'boba', 'kopi', 'coffee',
         'teh', 'tea', 'milkshake', 'kombucha', 'soda', 'mocktail',
     )
+    _FOOD_SUBTYPE_MATCHER = KeywordMatcher({
+        "bakery": _BAKERY_SUBTYPE_KEYWORDS,
+        "drinks": _DRINKS_SUBTYPE_KEYWORDS,
+    })
 
     def _food_subtype(self, description: str) -> str:
         """Sub-type of a food business: 'bakery' | 'drinks' | 'general'.
@@ -2656,8 +2774,9 @@ Generate prompts now:"""
         also sells coffee). Returns 'general' when neither signal is present.
         """
         low = (description or "").lower()
-        bakery_hits = sum(1 for k in self._BAKERY_SUBTYPE_KEYWORDS if self._has_word(low, k))
-        drinks_hits = sum(1 for k in self._DRINKS_SUBTYPE_KEYWORDS if self._has_word(low, k))
+        hits = self._FOOD_SUBTYPE_MATCHER.group_hits(low)
+        bakery_hits = len(hits.get("bakery", ()))
+        drinks_hits = len(hits.get("drinks", ()))
         if bakery_hits and bakery_hits >= drinks_hits:
             return "bakery"
         if drinks_hits:
@@ -2960,25 +3079,23 @@ OUTPUT FORMAT - a JSON array of exactly {n} strings, nothing else:
 ["Name 1", "Name 2", "Name 3", "Name 4"]"""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.deepseek_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 300,
-                        "temperature": 0.2,
-                    },
-                )
+            response = await self._cached_chat(
+                "extract_menu_item_names",
+                "https://api.deepseek.com/v1/chat/completions",
+                api_key,
+                {
+                    "model": self.deepseek_model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": 300,
+                    "temperature": 0.2,
+                },
+                timeout=30.0,
+            )
             if response.status_code != 200:
                 logger.error(f"🍽️ Item-name extraction failed: {response.status_code} - using fallback")
                 return self._fallback_item_names(description, n, business_name)
 
-            content = response.json()["choices"][0]["message"]["content"]
+            content = response.content
             match = re.search(r'\[[\s\S]*\]', content)
             if not match:
                 logger.error("🍽️ Item-name extraction returned no JSON array - using fallback")
@@ -3065,25 +3182,23 @@ OUTPUT FORMAT - a JSON array of exactly {n} strings, nothing else:
 ["Name 1", "Name 2", "Name 3", "Name 4"]"""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.deepseek_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 300,
-                        "temperature": 0.2,
-                    },
-                )
+            response = await self._cached_chat(
+                "extract_product_category_names",
+                "https://api.deepseek.com/v1/chat/completions",
+                api_key,
+                {
+                    "model": self.deepseek_model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": 300,
+                    "temperature": 0.2,
+                },
+                timeout=30.0,
+            )
             if response.status_code != 200:
                 logger.error(f"🛍️ Category-name extraction failed: {response.status_code} - using fallback")
                 return self._fallback_category_names(description, n)
 
-            content = response.json()["choices"][0]["message"]["content"]
+            content = response.content
             match = re.search(r'\[[\s\S]*\]', content)
             if not match:
                 logger.error("🛍️ Category-name extraction returned no JSON array - using fallback")
@@ -3182,25 +3297,23 @@ OUTPUT FORMAT - a JSON array of exactly {n} strings, nothing else:
 ["Name 1", "Name 2", "Name 3", "Name 4"]"""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.deepseek_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 300,
-                        "temperature": 0.2,
-                    },
-                )
+            response = await self._cached_chat(
+                "extract_service_names",
+                "https://api.deepseek.com/v1/chat/completions",
+                api_key,
+                {
+                    "model": self.deepseek_model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": 300,
+                    "temperature": 0.2,
+                },
+                timeout=30.0,
+            )
             if response.status_code != 200:
                 logger.error(f"💇 Service-name extraction failed: {response.status_code} - using fallback")
                 return self._fallback_service_names(description, n)
 
-            content = response.json()["choices"][0]["message"]["content"]
+            content = response.content
             match = re.search(r'\[[\s\S]*\]', content)
             if not match:
                 logger.error("💇 Service-name extraction returned no JSON array - using fallback")
@@ -3593,21 +3706,19 @@ OUTPUT FORMAT - a JSON array of exactly {n} strings, nothing else:
         }
     }
 
+    # Checked in priority order: the first type with any keyword present wins.
+    _DETECT_TYPE_MATCHER = KeywordMatcher({
+        "pet_shop": ['kucing', 'cat', 'pet', 'haiwan', 'anjing', 'dog'],
+        "salon": ['salon', 'rambut', 'hair', 'haircut', 'beauty', 'spa', 'kecantikan', 'gunting'],
+        "restaurant": ['makan', 'makanan', 'restoran', 'restaurant', 'food', 'nasi', 'cafe', 'kafe', 'warung', 'catering'],
+        "clothing": ['pakaian', 'clothing', 'fashion', 'baju', 'boutique', 'fesyen', 'tudung', 'hijab'],
+        "photography": ['photo', 'foto', 'fotografi', 'photography', 'jurugambar', 'photographer', 'studio', 'gallery', 'galeri'],
+    })
+
     def _detect_type(self, desc: str) -> str:
         """Detect business type (whole-word keyword matches — 'cat' must
         not match "catering", 'nasi' not "penasihat")"""
-        d = desc.lower()
-        if self._has_any_word(d, ['kucing', 'cat', 'pet', 'haiwan', 'anjing', 'dog']):
-            return "pet_shop"
-        if self._has_any_word(d, ['salon', 'rambut', 'hair', 'haircut', 'beauty', 'spa', 'kecantikan', 'gunting']):
-            return "salon"
-        if self._has_any_word(d, ['makan', 'makanan', 'restoran', 'restaurant', 'food', 'nasi', 'cafe', 'kafe', 'warung', 'catering']):
-            return "restaurant"
-        if self._has_any_word(d, ['pakaian', 'clothing', 'fashion', 'baju', 'boutique', 'fesyen', 'tudung', 'hijab']):
-            return "clothing"
-        if self._has_any_word(d, ['photo', 'foto', 'fotografi', 'photography', 'jurugambar', 'photographer', 'studio', 'gallery', 'galeri']):
-            return "photography"
-        return "default"
+        return self._DETECT_TYPE_MATCHER.first_group(desc.lower()) or "default"
 
     # Known dummy/example numbers that must never reach a published page.
     # "60123456789" was the pipeline's own default and shipped on live sites;
@@ -4530,6 +4641,102 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
             )
         return html
 
+    def _stream_options(self, provider: str, budget_seconds: float) -> Dict:
+        """post_chat_completion kwargs for a provider call: stream when
+        AI_STREAM_RESPONSES is on, feeding the build's progress hook, with a
+        deadline at the caller's wait_for budget."""
+        return {
+            "provider": provider,
+            "stream": AI_STREAM_RESPONSES,
+            "deadline": time.monotonic() + budget_seconds,
+            "on_progress": self._generation().on_stream_progress,
+        }
+
+    async def _cached_chat(
+        self, function: str, url: str, api_key: str, body: Dict, timeout: float
+    ) -> ChatCompletion:
+        """One non-streaming chat completion, answered from the AI response
+        cache when AI_RESPONSE_CACHE is on and this exact request was seen.
+
+        Only complete answers are stored (200, content, finish_reason
+        "stop"), so a failed or truncated call is retried next time rather
+        than replayed. Callers keep their own status handling.
+        """
+        key = cache_key(function, body.get("model", ""), body) if AI_RESPONSE_CACHE else None
+        if key:
+            cached = await get_ai_response_cache().get(function, key)
+            if cached is not None:
+                return ChatCompletion(200, content=cached, finish_reason="stop")
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await post_chat_completion(
+                client,
+                url,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                body=body,
+                provider=function,
+            )
+        if key and response.ok and response.content and response.finish_reason == "stop":
+            await get_ai_response_cache().put(function, key, response.content)
+        return response
+
+    def _abandon_stream(self, provider: str, model: str, started: float, resp: ChatCompletion) -> None:
+        """A stream that could not finish inside its budget: give up now so the
+        fallback provider starts, instead of waiting out the timeout."""
+        logger.error(
+            f"⏰ {provider} stream abandoned after {time.perf_counter() - started:.0f}s "
+            f"({len(resp.content)} chars) — projected to miss its time budget"
+        )
+        record_llm_call(provider, model, time.perf_counter() - started, "deadline", resp.usage)
+        self._last_api_call = {"provider": provider, "finish_reason": "deadline", "truncated": False}
+        return None
+
+    async def _generate_html_routed(self, prompt: str, image_urls: Dict) -> Tuple[str, str]:
+        """GLM / DeepSeek HTML generation through the health-aware router.
+
+        Same acceptance rules as the fixed chain in _generate_website: GLM
+        output is discarded when truncated or not HTML, DeepSeek output is
+        kept (its truncation is flagged downstream). Each provider runs in
+        its own GenerationContext so a hedged pair cannot overwrite each
+        other's finish_reason; the winner's is copied back to the build.
+        Returns (raw_html, model); raises asyncio.TimeoutError when every
+        provider failed and one of them on a timeout, like the chain does.
+        """
+        glm_image_urls = self._ordered_prompt_image_urls(image_urls)
+        build = self._generation()
+
+        def isolated(call, accept):
+            async def run():
+                ctx = GenerationContext(build_id=build.build_id, on_stream_progress=build.on_stream_progress)
+                with generation_scope(ctx):
+                    html = await call()
+                return (html, ctx) if accept(html, ctx) else None
+            return run
+
+        result = await _HTML_ROUTER.run(
+            {
+                "glm": isolated(
+                    lambda: self._call_glm(prompt, has_images=bool(glm_image_urls)),
+                    lambda html, ctx: bool(html) and "<" in html and not ctx.api_call.get("truncated"),
+                ),
+                "deepseek": isolated(
+                    lambda: self._call_deepseek(prompt, model=self.deepseek_model_pro),
+                    lambda html, ctx: bool(html),
+                ),
+            },
+            budgets={"glm": AI_GLM_TIMEOUT_SECONDS, "deepseek": AI_PRIMARY_TIMEOUT_SECONDS},
+            hedge=AI_PROVIDER_HEDGING,
+        )
+        html_raw, winner_ctx = result.value
+        build.api_call = winner_ctx.api_call
+        logger.info(
+            f"🔀 HTML from {result.provider}{' (hedged)' if result.hedged else ''} — "
+            f"router health {_HTML_ROUTER.snapshot()}"
+        )
+        if result.provider == "deepseek":
+            return html_raw, self.deepseek_model_pro
+        html_raw = await self._run_premium_design_loop(html_raw, has_images=bool(glm_image_urls))
+        return self._replace_photo_slots(html_raw, glm_image_urls), self.zai_model
+
     async def _call_glm(
         self,
         prompt: str,
@@ -4571,6 +4778,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
             + self._GLM_PROMPT_RULES_TAIL
             + self._GLM_PROMPT_FREEDOM
         )
+        started = time.perf_counter()
         try:
             logger.info(
                 f"🟣 Calling GLM (Z.ai) API ({chosen_model})... "
@@ -4581,13 +4789,14 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
             # as _call_deepseek's primary-budget+30 — the outer wait_for at
             # AI_GLM_TIMEOUT_SECONDS is the effective bound either way.
             async with httpx.AsyncClient(timeout=AI_GLM_TIMEOUT_SECONDS + 30) as client:
-                r = await client.post(
+                resp = await post_chat_completion(
+                    client,
                     f"{self.zai_base_url}/chat/completions",
                     headers={
                         "Authorization": f"Bearer {self.zai_api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
+                    body={
                         "model": chosen_model,
                         "messages": [
                             {
@@ -4601,14 +4810,15 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         # CRITICAL: without this glm-5.3 burns the entire
                         # token budget on reasoning and returns empty content.
                         "thinking": {"type": "disabled"},
-                    }
+                    },
+                    **self._stream_options("glm", AI_GLM_TIMEOUT_SECONDS),
                 )
-                if r.status_code == 200:
-                    payload = r.json()
-                    choice = (payload.get("choices") or [{}])[0]
-                    content = (choice.get("message") or {}).get("content", "") or ""
-                    finish_reason = choice.get("finish_reason") or "unknown"
-                    usage = payload.get("usage") or {}
+                if resp.stopped == DEADLINE:
+                    return self._abandon_stream("glm", chosen_model, started, resp)
+                if resp.ok:
+                    content = resp.content
+                    finish_reason = resp.finish_reason or "unknown"
+                    usage = resp.usage
                     completion_tokens = usage.get("completion_tokens")
                     logger.info(
                         f"🟣 GLM ✅ Generated {len(content)} chars "
@@ -4623,6 +4833,11 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                             f"tokens ({_pct:.0f}% of cap)"
                         )
                     truncated_at_api = finish_reason in self._TRUNCATED_FINISH_REASONS
+                    record_llm_call(
+                        "glm", chosen_model, time.perf_counter() - started,
+                        "truncated" if truncated_at_api else ("ok" if content.strip() else "empty"),
+                        usage,
+                    )
                     self._last_api_call = {
                         "provider": "glm",
                         "finish_reason": finish_reason,
@@ -4646,17 +4861,17 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         return None
                     return content
                 else:
-                    try:
-                        error_body = r.text[:500]
-                    except Exception:
-                        error_body = "(unable to read response)"
-                    logger.error(f"🟣 GLM ❌ Status {r.status_code}: {error_body}")
+                    logger.error(f"🟣 GLM ❌ Status {resp.status_code}: {resp.error_body}")
+                    record_llm_call("glm", chosen_model, time.perf_counter() - started, f"http_{resp.status_code}")
         except httpx.TimeoutException as e:
             logger.error(f"🟣 GLM ❌ Timeout: {e}")
+            record_llm_call("glm", chosen_model, time.perf_counter() - started, "timeout")
         except httpx.ConnectError as e:
             logger.error(f"🟣 GLM ❌ Connection error: {e}")
+            record_llm_call("glm", chosen_model, time.perf_counter() - started, "error")
         except Exception as e:
             logger.error(f"🟣 GLM ❌ Exception: {e}")
+            record_llm_call("glm", chosen_model, time.perf_counter() - started, "error")
         return None
 
     # Reviewer prompt for the premium design critique loop. The rule list is
@@ -4901,16 +5116,18 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
             return None
 
         chosen_model = model or self.deepseek_model
+        started = time.perf_counter()
         try:
             logger.info(f"🔷 Calling DeepSeek API ({chosen_model})... (prompt length: {len(prompt)} chars)")
             async with httpx.AsyncClient(timeout=AI_PRIMARY_TIMEOUT_SECONDS + 30) as client:
-                r = await client.post(
+                resp = await post_chat_completion(
+                    client,
                     f"{self.deepseek_base_url}/chat/completions",
                     headers={
                         "Authorization": f"Bearer {self.deepseek_api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
+                    body={
                         "model": chosen_model,
                         "messages": [
                             {
@@ -4921,14 +5138,15 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         ],
                         "temperature": temperature,
                         "max_tokens": AI_DEEPSEEK_MAX_TOKENS,
-                    }
+                    },
+                    **self._stream_options("deepseek", AI_PRIMARY_TIMEOUT_SECONDS),
                 )
-                if r.status_code == 200:
-                    payload = r.json()
-                    choice = (payload.get("choices") or [{}])[0]
-                    content = (choice.get("message") or {}).get("content", "")
-                    finish_reason = choice.get("finish_reason") or "unknown"
-                    usage = payload.get("usage") or {}
+                if resp.stopped == DEADLINE:
+                    return self._abandon_stream("deepseek", chosen_model, started, resp)
+                if resp.ok:
+                    content = resp.content
+                    finish_reason = resp.finish_reason or "unknown"
+                    usage = resp.usage
                     completion_tokens = usage.get("completion_tokens")
                     logger.info(
                         f"🔷 DeepSeek ✅ Generated {len(content)} chars "
@@ -4945,6 +5163,11 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                             f"tokens ({_pct:.0f}% of cap)"
                         )
                     truncated_at_api = finish_reason in self._TRUNCATED_FINISH_REASONS
+                    record_llm_call(
+                        "deepseek", chosen_model, time.perf_counter() - started,
+                        "truncated" if truncated_at_api else ("ok" if content else "empty"),
+                        usage,
+                    )
                     self._last_api_call = {
                         "provider": "deepseek",
                         "finish_reason": finish_reason,
@@ -4957,17 +5180,17 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         )
                     return content
                 else:
-                    try:
-                        error_body = r.text[:500]
-                    except Exception:
-                        error_body = "(unable to read response)"
-                    logger.error(f"🔷 DeepSeek ❌ Status {r.status_code}: {error_body}")
+                    logger.error(f"🔷 DeepSeek ❌ Status {resp.status_code}: {resp.error_body}")
+                    record_llm_call("deepseek", chosen_model, time.perf_counter() - started, f"http_{resp.status_code}")
         except httpx.TimeoutException as e:
             logger.error(f"🔷 DeepSeek ❌ Timeout after 120s: {e}")
+            record_llm_call("deepseek", chosen_model, time.perf_counter() - started, "timeout")
         except httpx.ConnectError as e:
             logger.error(f"🔷 DeepSeek ❌ Connection error: {e}")
+            record_llm_call("deepseek", chosen_model, time.perf_counter() - started, "error")
         except Exception as e:
             logger.error(f"🔷 DeepSeek ❌ Exception: {e}")
+            record_llm_call("deepseek", chosen_model, time.perf_counter() - started, "error")
         return None
 
     # Default Qwen config for HTML generation.
@@ -5016,19 +5239,21 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         model_id = model or self.QWEN_HTML_MODEL
         mt = max_tokens or self.QWEN_HTML_MAX_TOKENS
 
+        started = time.perf_counter()
         try:
             logger.info(
                 f"🟡 Calling Qwen API... model={model_id} max_tokens={mt} "
                 f"prompt_chars={len(prompt)}"
             )
             async with httpx.AsyncClient(timeout=240.0) as client:
-                r = await client.post(
+                resp = await post_chat_completion(
+                    client,
                     f"{self.qwen_base_url}/chat/completions",
                     headers={
                         "Authorization": f"Bearer {self.qwen_api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
+                    body={
                         "model": model_id,
                         "messages": [
                             {
@@ -5039,20 +5264,26 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         ],
                         "temperature": temperature,
                         "max_tokens": mt,
-                    }
+                    },
+                    **self._stream_options("qwen", 240.0),
                 )
-                if r.status_code == 200:
-                    payload = r.json()
-                    choice = (payload.get("choices") or [{}])[0]
-                    content = (choice.get("message") or {}).get("content", "")
-                    finish_reason = choice.get("finish_reason") or "unknown"
-                    usage = payload.get("usage") or {}
+                if resp.stopped == DEADLINE:
+                    return self._abandon_stream("qwen", model_id, started, resp)
+                if resp.ok:
+                    content = resp.content
+                    finish_reason = resp.finish_reason or "unknown"
+                    usage = resp.usage
                     completion_tokens = usage.get("completion_tokens")
                     logger.info(
                         f"🟡 Qwen ✅ Generated {len(content)} chars "
                         f"(finish_reason={finish_reason}, completion_tokens={completion_tokens})"
                     )
                     truncated_at_api = finish_reason in self._TRUNCATED_FINISH_REASONS
+                    record_llm_call(
+                        "qwen", model_id, time.perf_counter() - started,
+                        "truncated" if truncated_at_api else ("ok" if content else "empty"),
+                        usage,
+                    )
                     self._last_api_call = {
                         "provider": "qwen",
                         "finish_reason": finish_reason,
@@ -5065,17 +5296,17 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                         )
                     return content
                 else:
-                    try:
-                        error_body = r.text[:500]
-                    except Exception:
-                        error_body = "(unable to read response)"
-                    logger.error(f"🟡 Qwen ❌ Status {r.status_code}: {error_body}")
+                    logger.error(f"🟡 Qwen ❌ Status {resp.status_code}: {resp.error_body}")
+                    record_llm_call("qwen", model_id, time.perf_counter() - started, f"http_{resp.status_code}")
         except httpx.TimeoutException as e:
             logger.error(f"🟡 Qwen ❌ Timeout after 240s: {e}")
+            record_llm_call("qwen", model_id, time.perf_counter() - started, "timeout")
         except httpx.ConnectError as e:
             logger.error(f"🟡 Qwen ❌ Connection error: {e}")
+            record_llm_call("qwen", model_id, time.perf_counter() - started, "error")
         except Exception as e:
             logger.error(f"🟡 Qwen ❌ Exception: {e}")
+            record_llm_call("qwen", model_id, time.perf_counter() - started, "error")
         return None
 
     # Balance helpers moved to app.utils.html_balance so the publish endpoints
@@ -5148,7 +5379,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         import re
 
         # Reset per-call diagnostic state (single call site at a time per request)
-        self._last_extract_info: Dict = {"was_truncated": False, "unclosed_tags": [], "tail": ""}
+        self._last_extract_info = {"was_truncated": False, "unclosed_tags": [], "tail": ""}
 
         if not text:
             return None
@@ -5555,6 +5786,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         zai_phase: Optional[Dict] = None,
         business_description: str = "",
         doodle: bool = False,
+        scheduler: Optional[ImageScheduler] = None,
     ) -> tuple:
         """
         Replace Unsplash food images with AI-generated images
@@ -5573,6 +5805,8 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                 non-food site (a gym/photocopy/coworking card heading that
                 merely contains a food-looking substring used to get a
                 Malaysian dish photo).
+            scheduler: The build's ImageScheduler. Its provider lanes bound
+                the image calls, replacing the fixed semaphore below.
 
         Returns tuple of (html_with_ai_images, count_of_images_generated)
         """
@@ -5659,7 +5893,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         # Generate AI images for each food item in parallel, bounded by a
         # semaphore so we don't burst Stability AI's per-second rate limit.
         # Start at 4 concurrent calls; lower to 2 if rate limits appear.
-        food_image_semaphore = asyncio.Semaphore(4)
+        food_image_semaphore = asyncio.Semaphore(4) if scheduler is None else nullcontext()
 
         async def _bounded_food_image(item_name: str, old_url: str):
             """Return (old_url, item_name, new_url_or_None) — never raises."""
@@ -5667,7 +5901,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                 try:
                     logger.info(f"   🎨 Generating AI image for: {item_name}")
                     ai_url = await self.generate_food_image(
-                        item_name, zai_phase=zai_phase, doodle=doodle
+                        item_name, zai_phase=zai_phase, doodle=doodle, scheduler=scheduler
                     )
                     if ai_url and 'cloudinary' in ai_url.lower():
                         logger.info(f"   ✅ Generated: {ai_url[:60]}...")
@@ -5778,17 +6012,18 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         # WhatsApp clients; a page can end up with both forms. Rewrite the phone
         # segment of every wa.me/ URL to bare digits while preserving any query
         # string (?text=...).
-        html = self._normalize_wa_links(html)
-
+        #
         # Post-generation linter: strip Pro-only Font Awesome icons (blank
         # squares on free-6.x) and rewrite out-of-scale Tailwind opacity/spacing
-        # utilities the Play CDN silently drops. Deterministic + logged.
+        # utilities the Play CDN silently drops. Deterministic + logged. Both
+        # run in one tokenize/serialize pass (wa_links=True).
         try:
             from app.services.generation_linter import lint_html
             html, lint_report = lint_html(
                 html,
                 context=f"{name} {desc}",
                 business_type=detect_business_type(desc),
+                wa_links=True,
             )
             if lint_report.changed:
                 logger.info(
@@ -5798,6 +6033,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
                 )
         except Exception as e:
             logger.warning(f"   ⚠️ Generation linter skipped: {e}")
+            html = self._normalize_wa_links(html)
 
         return html
 
@@ -5807,18 +6043,7 @@ Generate ONLY the complete HTML code. No explanations. No markdown. Just pure HT
         dashes). Preserves the path's query string. Idempotent."""
         if not html or "wa.me/" not in html:
             return html
-
-        def _repl(m: re.Match) -> str:
-            digits = re.sub(r"\D", "", m.group("phone"))
-            return f"wa.me/{digits}"
-
-        # Match wa.me/ followed by a phone-ish segment (digits, +, spaces, dashes)
-        # up to the query string, fragment, quote, or whitespace.
-        return re.sub(
-            r"wa\.me/(?P<phone>[+\d][\d\s\-+]*)",
-            _repl,
-            html,
-        )
+        return WA_PHONE_RE.sub(wa_digits_repl, html)
 
     def _fix_broken_image_urls(self, html: str, business_description: str = "") -> str:
         """
@@ -7016,6 +7241,7 @@ IMPORTANT RULES:
         image_urls: Dict,
         max_ai_images: Optional[int] = None,
         zai_phase: Optional[Dict] = None,
+        scheduler: Optional[ImageScheduler] = None,
     ) -> int:
         """Auto-fill hero/gallery slots that uploads didn't cover (free-by-default).
 
@@ -7032,19 +7258,53 @@ IMPORTANT RULES:
         Bug-2 stock-image pool so the slot never ships blank; pool-filled
         slots do NOT count toward the returned AI-image count.
 
+        With a build ImageScheduler the jobs run through its provider lanes
+        instead of _generate_image (see app.services.image_scheduler).
+
         Returns the number of images actually AI-generated (for usage
         accounting upstream).
         """
+        plan = await self._plan_autofill(request, image_urls, max_ai_images)
+        if plan is None:
+            return 0
+        work, is_food, is_doodle, cap = plan
+
+        # gather still fires the coroutines together, but with provider=zai
+        # the provider governor serializes the Z.ai requests (concurrency 1
+        # with spacing) — only Stability calls actually run in parallel.
+        _gen_started = time.monotonic()
+        results = await asyncio.gather(
+            *[
+                scheduler.generate(_p, food=is_food, doodle=is_doodle) if scheduler
+                else self._generate_image(_p, food=is_food, zai_phase=zai_phase, doodle=is_doodle)
+                for _, _, _p in work
+            ],
+            return_exceptions=True,
+        )
+        return self._apply_autofill_results(
+            request, image_urls, work, results, cap, time.monotonic() - _gen_started
+        )
+
+    async def _plan_autofill(
+        self,
+        request: WebsiteGenerationRequest,
+        image_urls: Dict,
+        max_ai_images: Optional[int] = None,
+    ) -> Optional[Tuple[List[Tuple[str, Optional[str], str]], bool, bool, int]]:
+        """The auto-fill work list: (slot_key, item_name, prompt) per image
+        to generate, hero first and truncated to the cap. Returns
+        (work, is_food, is_doodle, cap), or None when nothing needs filling.
+        """
         hero_missing = not image_urls.get("hero")
         missing_slots = [i for i in range(1, 5) if not image_urls.get(f"gallery{i}")]
         if not hero_missing and not missing_slots:
             logger.info("🖼️ All image slots covered by uploads — no auto-fill needed")
-            return 0
+            return None
 
         cap = self._resolve_autofill_image_cap(max_ai_images)
         if cap <= 0:
             logger.info("🚫 Auto-fill image cap is 0 — skipping AI image auto-fill")
-            return 0
+            return None
 
         category = self._autofill_prompt_category(request.description)
         is_food = category == "food"
@@ -7155,27 +7415,26 @@ IMPORTANT RULES:
             logger.info(f"✂️ Auto-fill capped at {cap} of {len(work)} missing image slot(s)")
             work = work[:cap]
         if not work:
-            return 0
+            return None
 
         logger.info(
             f"🎨 Auto-filling {len(work)} image slot(s) in PARALLEL "
             f"[provider={image_provider()}, category={category}, cap={cap}]: "
             + ", ".join(slot for slot, _, _ in work)
         )
+        return work, is_food, is_doodle, cap
 
-        # gather still fires the coroutines together, but with provider=zai
-        # the dispatcher's lock serializes the Z.ai requests (concurrency 1
-        # with spacing) — only Stability calls actually run in parallel.
-        _gen_started = time.monotonic()
-        results = await asyncio.gather(
-            *[
-                self._generate_image(_p, food=is_food, zai_phase=zai_phase, doodle=is_doodle)
-                for _, _, _p in work
-            ],
-            return_exceptions=True,
-        )
-        _gen_elapsed = time.monotonic() - _gen_started
-
+    def _apply_autofill_results(
+        self,
+        request: WebsiteGenerationRequest,
+        image_urls: Dict,
+        work: List[Tuple[str, Optional[str], str]],
+        results: List,
+        cap: int,
+        elapsed: float,
+    ) -> int:
+        """Write generated URLs into image_urls, pool-filling failures.
+        Returns the number of AI-generated images."""
         generated = 0
         for (slot_key, item_name, _p), result in zip(work, results):
             url = result if (result and not isinstance(result, Exception)) else None
@@ -7200,18 +7459,100 @@ IMPORTANT RULES:
                     image_urls[f"{slot_key}_name"] = item_name
 
         logger.info(
-            f"🖼️ Auto-fill complete in {_gen_elapsed:.1f}s: {generated}/{len(work)} "
+            f"🖼️ Auto-fill complete in {elapsed:.1f}s: {generated}/{len(work)} "
             f"AI-generated (cap={cap}); {len(image_urls)} image URL(s) ready for HTML generation"
         )
         return generated
 
+    async def _start_autofill(
+        self,
+        request: WebsiteGenerationRequest,
+        image_urls: Dict,
+        max_ai_images: Optional[int],
+        scheduler: ImageScheduler,
+    ) -> Optional[PendingImages]:
+        """Submit the auto-fill jobs and return without waiting for them.
+
+        image_urls gets placeholder URLs (and the real item names) for the
+        planned slots, so the HTML prompt can be built and sent while the
+        images generate; _finish_autofill swaps in the real URLs.
+        """
+        plan = await self._plan_autofill(request, image_urls, max_ai_images)
+        if plan is None:
+            return None
+        work, is_food, is_doodle, cap = plan
+        pending = PendingImages(
+            build_id=self._generation().build_id,
+            work=work,
+            tasks=[scheduler.submit(_p, food=is_food, doodle=is_doodle) for _, _, _p in work],
+            cap=cap,
+        )
+        for slot_key, item_name, _p in work:
+            image_urls[slot_key] = pending.placeholder(slot_key)
+            if item_name:
+                image_urls[f"{slot_key}_name"] = item_name
+        return pending
+
+    async def _finish_autofill(
+        self,
+        request: WebsiteGenerationRequest,
+        image_urls: Dict,
+        pending: PendingImages,
+        html: Optional[str] = None,
+    ) -> Tuple[Optional[str], int]:
+        """Wait for _start_autofill's jobs, record their URLs in image_urls
+        and replace the placeholders in `html`. Returns (html, generated)."""
+        results = await pending.results()
+        for slot_key, item_name, _p in pending.work:
+            image_urls.pop(slot_key, None)
+            if item_name:
+                image_urls.pop(f"{slot_key}_name", None)
+        generated = self._apply_autofill_results(
+            request, image_urls, pending.work, results, pending.cap,
+            time.monotonic() - pending.started,
+        )
+        if html:
+            for slot_key, _, _ in pending.work:
+                real = image_urls.get(slot_key) or self.IMAGES["default"]["gallery"][0]
+                html = html.replace(pending.placeholder(slot_key), real)
+        return html, generated
+
     async def generate_website(
         self,
         request: WebsiteGenerationRequest,
         style: Optional[str] = None,
         image_choice: str = "upload",  # NEW: none, upload, or ai
         progress_callback: Optional[Callable[[int, str], Awaitable[None]]] = None,  # NEW: callback for progress updates
-        max_ai_images: Optional[int] = None  # NEW: hard cap on AI images (caller's remaining quota)
+        max_ai_images: Optional[int] = None,  # NEW: hard cap on AI images (caller's remaining quota)
+        generation: Optional[GenerationContext] = None,
+    ) -> AIGenerationResponse:
+        """Generate one website inside its own GenerationContext.
+
+        `generation` lets a caller supply (and afterwards inspect) the
+        context; by default each call gets a fresh one, so concurrent builds
+        on the shared service never read each other's truncation flags or
+        sanitizer traces. See _generate_website for the pipeline itself.
+        """
+        with generation_scope(generation) as ctx:
+            try:
+                return await self._generate_website(
+                    request,
+                    style=style,
+                    image_choice=image_choice,
+                    progress_callback=progress_callback,
+                    max_ai_images=max_ai_images,
+                )
+            finally:
+                if ctx.image_scheduler is not None:
+                    await ctx.image_scheduler.aclose()
+
+    async def _generate_website(
+        self,
+        request: WebsiteGenerationRequest,
+        style: Optional[str] = None,
+        image_choice: str = "upload",
+        progress_callback: Optional[Callable[[int, str], Awaitable[None]]] = None,
+        max_ai_images: Optional[int] = None,
     ) -> AIGenerationResponse:
         """Generate website with Stability AI + Cloudinary + DeepSeek + Qwen
 
@@ -7262,6 +7603,14 @@ IMPORTANT RULES:
         # food-image post-pass, so their combined Z.ai time is bounded by
         # ZAI_IMAGE_PHASE_BUDGET_SECONDS. No-op when IMAGE_PROVIDER=stability.
         _zai_image_phase = self._new_zai_image_phase()
+        # AI_IMAGE_SCHEDULER: every image of this build goes through one
+        # scheduler, and the auto-fill images run while the HTML is written
+        # (_pending_autofill holds them until the HTML comes back).
+        _image_scheduler: Optional[ImageScheduler] = None
+        _pending_autofill: Optional[PendingImages] = None
+        if AI_IMAGE_SCHEDULER and image_choice != "none":
+            _image_scheduler = ImageScheduler(self, image_provider(), zai_phase=_zai_image_phase)
+            self._generation().image_scheduler = _image_scheduler
 
         if image_choice == "none":
             logger.info("🚫 Image choice='none' - SKIPPING ALL image generation")
@@ -7308,9 +7657,14 @@ IMPORTANT RULES:
             # has_images decision downstream so a partially-covered site
             # still takes the photo-slots prompt branch.
             with _timed_step("stability_images", step_timings):
-                ai_images_generated = await self._autofill_missing_images(
-                    request, image_urls, max_ai_images, zai_phase=_zai_image_phase
-                )
+                if _image_scheduler:
+                    _pending_autofill = await self._start_autofill(
+                        request, image_urls, max_ai_images, _image_scheduler
+                    )
+                else:
+                    ai_images_generated = await self._autofill_missing_images(
+                        request, image_urls, max_ai_images, zai_phase=_zai_image_phase
+                    )
             if ai_images_generated:
                 await update_progress(45, "AI images generated")
 
@@ -7327,11 +7681,18 @@ IMPORTANT RULES:
             )
 
             with _timed_step("stability_images", step_timings):
-                ai_images_generated = await self._autofill_missing_images(
-                    request, image_urls, max_ai_images, zai_phase=_zai_image_phase
-                )
+                if _image_scheduler:
+                    _pending_autofill = await self._start_autofill(
+                        request, image_urls, max_ai_images, _image_scheduler
+                    )
+                else:
+                    ai_images_generated = await self._autofill_missing_images(
+                        request, image_urls, max_ai_images, zai_phase=_zai_image_phase
+                    )
 
-            await update_progress(45, "AI images generated")
+            await update_progress(
+                45, "AI images generating" if _pending_autofill else "AI images generated"
+            )
 
         # ===================================================================
         # PRE-BUILT TEMPLATE PATH: If user selected a template that has a
@@ -7345,6 +7706,15 @@ IMPORTANT RULES:
                 _prebuilt_file = get_prebuilt_template_filename(_tpl_id)
                 if _prebuilt_file:
                     logger.info(f"📄 Pre-built template found for '{_tpl_id}': {_prebuilt_file}")
+                    if _pending_autofill:
+                        # The template pipeline builds its own copy and takes
+                        # no image URLs, so there is no HTML to overlap with.
+                        with _timed_step("stability_images", step_timings):
+                            _, _autofilled = await self._finish_autofill(
+                                request, image_urls, _pending_autofill
+                            )
+                        ai_images_generated += _autofilled
+                        _pending_autofill = None
                     with _timed_step("template_pipeline", step_timings):
                         template_html = await self._generate_website_from_template(
                             request=request,
@@ -7367,6 +7737,7 @@ IMPORTANT RULES:
                                     zai_phase=_zai_image_phase,
                                     business_description=request.description,
                                     doodle=self._is_doodle_request(request),
+                                    scheduler=_image_scheduler,
                                 )
                                 ai_images_generated += food_images_count
                         with _timed_step("final_cleanup", step_timings):
@@ -7597,6 +7968,20 @@ IMPORTANT INSTRUCTIONS:
         )
 
         await update_progress(55, "Calling AI to generate HTML")
+
+        # With AI_STREAM_RESPONSES on, the provider reports how much HTML has
+        # arrived; map it onto 55→74% so the bar moves during the longest step
+        # (monotonic, so a GLM→DeepSeek fallback never moves it backwards).
+        _stream_reported = {"percent": 55}
+
+        async def _html_stream_progress(p: StreamProgress) -> None:
+            percent = 55 + int(19 * min(p.chars / STREAM_EXPECTED_CHARS, 1.0))
+            if percent > _stream_reported["percent"]:
+                _stream_reported["percent"] = percent
+                await update_progress(
+                    percent, f"AI writing HTML ({p.chars // 1000} KB, {p.sections} sections)"
+                )
+
         # Track truncation flags across the main AI call so they can be persisted
         # on generation_jobs (see Bug 1 fix).
         truncation_flags: Dict = {
@@ -7606,7 +7991,9 @@ IMPORTANT INSTRUCTIONS:
             "unclosed_tags": [],
         }
 
-        with _timed_step("ai_html_generation", step_timings):
+        with _timed_step("ai_html_generation", step_timings), _stream_progress(
+            self._generation(), _html_stream_progress
+        ):
             # API-boundary truncation flag from the DeepSeek call.
             api_truncated_provider: Optional[str] = None
             api_finish_reason: Optional[str] = None
@@ -7622,7 +8009,15 @@ IMPORTANT INSTRUCTIONS:
             # validation result so the fallback ordering can be tuned on
             # real degradation data rather than intuition.
             _html_model = ""
-            if USE_GLM_FOR_HTML and self.zai_api_key:
+            _routed = AI_PROVIDER_ROUTING and USE_GLM_FOR_HTML and bool(self.zai_api_key)
+            if _routed:
+                try:
+                    html_raw, _html_model = await self._generate_html_routed(prompt, image_urls)
+                except AllProvidersFailed as e:
+                    if any(isinstance(err, asyncio.TimeoutError) for err in e.errors.values()):
+                        raise asyncio.TimeoutError() from e
+                    html_raw = None
+            if USE_GLM_FOR_HTML and self.zai_api_key and not _routed:
                 # Image availability picks GLM's prompt mode up front (GLM is
                 # single-shot): with URLs, the PHOTO_SLOT contract; with none,
                 # the no-photo typography-led instruction — otherwise empty
@@ -7668,7 +8063,7 @@ IMPORTANT INSTRUCTIONS:
             # asyncio.TimeoutError straight up; the endpoint's existing
             # handler turns that into the user-facing "AI generation
             # timed out" message.
-            if not html_raw:
+            if not html_raw and not _routed:
                 html_raw = await asyncio.wait_for(
                     self._call_deepseek(prompt, model=self.deepseek_model_pro),
                     timeout=AI_PRIMARY_TIMEOUT_SECONDS,
@@ -7684,6 +8079,15 @@ IMPORTANT INSTRUCTIONS:
                 logger.error("❌ DeepSeek failed to generate")
                 raise Exception("Failed to generate website")
 
+            if _pending_autofill:
+                # Only the images still running after the HTML count here.
+                with _timed_step("stability_images", step_timings):
+                    html_raw, _autofilled = await self._finish_autofill(
+                        request, image_urls, _pending_autofill, html_raw
+                    )
+                ai_images_generated += _autofilled
+                _pending_autofill = None
+
             html = html_raw
 
             await update_progress(75, "Processing generated HTML")
@@ -7878,6 +8282,7 @@ IMPORTANT INSTRUCTIONS:
                     zai_phase=_zai_image_phase,
                     business_description=request.description,
                     doodle=self._is_doodle_request(request),
+                    scheduler=_image_scheduler,
                 )
                 ai_images_generated += food_images_count
 
@@ -7952,6 +8357,16 @@ IMPORTANT INSTRUCTIONS:
         )
 
     async def generate_multi_style(
+        self,
+        request: WebsiteGenerationRequest,
+        generation: Optional[GenerationContext] = None,
+    ) -> Dict[str, AIGenerationResponse]:
+        """Generate 3 style variations inside one GenerationContext
+        (fresh unless `generation` is given — see generate_website)."""
+        with generation_scope(generation):
+            return await self._generate_multi_style(request)
+
+    async def _generate_multi_style(
         self,
         request: WebsiteGenerationRequest
     ) -> Dict[str, AIGenerationResponse]:
@@ -0,0 +1,331 @@
+"""Shared context snapshots for the AI assistants.
+
+The customer chat auto-responder, the owner support chatbot, dispute
+auto-replies and email support each loaded the same restaurant / account
+data with their own queries on every AI turn. This module keeps one
+snapshot per website and per user in memory and hands every assistant
+the same copy:
+
+  website  menu items, delivery settings and website info, plus
+           `document` — a compact text rendering capped at
+           ASSISTANT_CONTEXT_TOKEN_BUDGET tokens (available items first).
+  user     websites, the latest orders placed on them and wallet
+           balance, plus `document`.
+
+The queries of one snapshot run concurrently, and concurrent misses for the
+same key share one load. Snapshots live for ASSISTANT_CONTEXT_TTL_SECONDS
+(website) / ASSISTANT_USER_CONTEXT_TTL_SECONDS (user). Every key has a
+version: the menu and delivery-settings write paths call
+`website_changed()`, which bumps it, so this worker rebuilds on the next
+turn, and a load that raced with the change is not stored. Other workers
+pick changes up when their TTL lapses. User snapshots are keyed by auth
+user id, which checkout doesn't know, so a new order shows up when the
+short user TTL lapses; `user_changed()` is for write paths that do know
+the account.
+
+A load where any query failed is returned but not cached, so one bad
+round trip doesn't pin an empty menu for the whole TTL. At most
+ASSISTANT_CONTEXT_MAX_ENTRIES snapshots are kept; past that, expired ones
+go first, then the least recently used.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.production.instrumentation import record_cache
+from app.services.supabase_client import supabase_service
+
+ASSISTANT_CONTEXT_TTL_SECONDS = float(os.getenv("ASSISTANT_CONTEXT_TTL_SECONDS", "300"))
+ASSISTANT_USER_CONTEXT_TTL_SECONDS = float(os.getenv("ASSISTANT_USER_CONTEXT_TTL_SECONDS", "60"))
+ASSISTANT_CONTEXT_TOKEN_BUDGET = int(os.getenv("ASSISTANT_CONTEXT_TOKEN_BUDGET", "600"))
+ASSISTANT_CONTEXT_MAX_ENTRIES = int(os.getenv("ASSISTANT_CONTEXT_MAX_ENTRIES", "2048"))
+
+# Rough size of a token in the Malay/English text these documents hold.
+_CHARS_PER_TOKEN = 4
+
+
+async def _select(table: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+    async with supabase_service._client() as client:
+        resp = await client.get(
+            f"{supabase_service.url}/rest/v1/{table}",
+            params=params,
+            headers=supabase_service.service_headers,
+        )
+    resp.raise_for_status()
+    return resp.json() or []
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    """Rows of a gather(return_exceptions=True) result; [] for a failure."""
+    return [] if isinstance(result, Exception) else result
+
+
+# =====================================================
+# Documents
+# =====================================================
+def render_website_document(
+    context: Dict[str, Any], budget_tokens: int = ASSISTANT_CONTEXT_TOKEN_BUDGET
+) -> str:
+    """Shop name, delivery terms and as much of the menu as fits."""
+    info = context.get("website_info") or {}
+    lines = [f"Kedai: {info.get('business_name') or 'kedai ini'}"]
+    ds = context.get("delivery_settings")
+    if ds:
+        delivery = f"Penghantaran: {'Ya' if ds.get('is_delivery_enabled') else 'Tidak'}."
+        if ds.get("min_order_amount"):
+            delivery += f" Minimum order: RM{ds['min_order_amount']}."
+        lines.append(delivery)
+    lines.append("Menu:")
+
+    items = context.get("menu_items") or []
+    if not items:
+        lines.append("Tiada menu tersedia.")
+        return "\n".join(lines)
+
+    # Leave room for the "... N lagi" line.
+    budget = budget_tokens * _CHARS_PER_TOKEN - sum(len(line) + 1 for line in lines) - 24
+    shown = 0
+    for item in sorted(items, key=lambda i: not i.get("is_available", True)):
+        avail = "Ada" if item.get("is_available", True) else "Habis"
+        line = f"- {item.get('name')}: RM{float(item.get('price') or 0):.2f} ({avail})"
+        if len(line) + 1 > budget:
+            break
+        lines.append(line)
+        budget -= len(line) + 1
+        shown += 1
+    if shown < len(items):
+        lines.append(f"... dan {len(items) - shown} item lagi")
+    return "\n".join(lines)
+
+
+def render_user_document(
+    context: Dict[str, Any], budget_tokens: int = ASSISTANT_CONTEXT_TOKEN_BUDGET
+) -> str:
+    """Wallet, websites and latest orders of one account."""
+    lines = [f"Wallet balance: RM{float(context.get('wallet_balance') or 0):.2f}"]
+    for site in (context.get("websites") or [])[:3]:
+        lines.append(f"Website: {site.get('business_name') or '-'} ({site.get('subdomain') or '-'})")
+    for order in (context.get("recent_orders") or [])[:3]:
+        lines.append(
+            f"Order {order.get('id')}: {order.get('status')}, "
+            f"RM{float(order.get('total_amount') or 0):.2f}, {order.get('created_at')}"
+        )
+    return "\n".join(lines)[: budget_tokens * _CHARS_PER_TOKEN]
+
+
+# =====================================================
+# Loaders
+# =====================================================
+# Each returns (context, complete); incomplete loads are not cached.
+async def _load_website(website_id: str) -> Tuple[Dict[str, Any], bool]:
+    menu, settings, website = await asyncio.gather(
+        _select("menu_items", {
+            "website_id": f"eq.{website_id}",
+            "select": "name,description,price,is_available",
+            "order": "sort_order.asc",
+        }),
+        _select("delivery_settings", {"website_id": f"eq.{website_id}", "select": "*"}),
+        _select("websites", {"id": f"eq.{website_id}", "select": "business_name,subdomain"}),
+        return_exceptions=True,
+    )
+    failed = [r for r in (menu, settings, website) if isinstance(r, Exception)]
+    for e in failed:
+        logger.warning(f"[AssistantContext] website {website_id} query failed: {e}")
+    context = {
+        "menu_items": _rows(menu),
+        "delivery_settings": (_rows(settings) or [None])[0],
+        "website_info": (_rows(website) or [{}])[0],
+    }
+    context["document"] = render_website_document(context)
+    return context, not failed
+
+
+async def _load_user(user_id: str) -> Tuple[Dict[str, Any], bool]:
+    websites, wallet = await asyncio.gather(
+        _select("websites", {"user_id": f"eq.{user_id}", "select": "id,business_name,subdomain"}),
+        _select("bina_credits", {"user_id": f"eq.{user_id}", "select": "balance"}),
+        return_exceptions=True,
+    )
+    # Orders carry the customer's phone, not an account: the user's recent
+    # orders are the latest ones placed on their websites.
+    website_ids = [str(w["id"]) for w in _rows(websites)]
+    orders: Any = []
+    if website_ids:
+        try:
+            orders = await _select("delivery_orders", {
+                "website_id": f"in.({','.join(website_ids)})",
+                "select": "id,website_id,status,total_amount,created_at",
+                "order": "created_at.desc",
+                "limit": "5",
+            })
+        except Exception as e:
+            orders = e
+    failed = [r for r in (orders, websites, wallet) if isinstance(r, Exception)]
+    for e in failed:
+        logger.warning(f"[AssistantContext] user {user_id} query failed: {e}")
+    wallet_rows = _rows(wallet)
+    context = {
+        "recent_orders": _rows(orders),
+        "websites": _rows(websites),
+        "wallet_balance": float(wallet_rows[0]["balance"]) if wallet_rows else 0.0,
+    }
+    context["document"] = render_user_document(context)
+    return context, not failed
+
+
+async def _load_owner_id(email: str) -> Tuple[Dict[str, Any], bool]:
+    try:
+        rows = await _select("profiles", {"email": f"eq.{email}", "select": "id", "limit": "1"})
+    except Exception as e:
+        logger.warning(f"[AssistantContext] profile lookup for {email} failed: {e}")
+        return {"user_id": None}, False
+    return {"user_id": rows[0]["id"] if rows else None}, True
+
+
+# =====================================================
+# Index
+# =====================================================
+@dataclass
+class _Entry:
+    version: int
+    expires_at: float
+    context: Dict[str, Any]
+
+
+class AssistantContextIndex:
+    """Versioned, TTL- and size-bounded snapshots keyed by website / user."""
+
+    def __init__(
+        self,
+        website_ttl_seconds: float = ASSISTANT_CONTEXT_TTL_SECONDS,
+        user_ttl_seconds: float = ASSISTANT_USER_CONTEXT_TTL_SECONDS,
+        max_entries: int = ASSISTANT_CONTEXT_MAX_ENTRIES,
+    ):
+        self.website_ttl_seconds = website_ttl_seconds
+        self.user_ttl_seconds = user_ttl_seconds
+        self.max_entries = max(1, max_entries)
+        # Least recently used first.
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Versions and locks only matter while a load is in flight (or its
+        # snapshot is cached); _loading counts the turns inside _get's load.
+        self._versions: Dict[str, int] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._loading: Dict[str, int] = {}
+        self.stats = {"hits": 0, "loads": 0}
+
+    # -- invalidation ---------------------------------------------------
+    def _drop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if key not in self._loading:
+            self._versions.pop(key, None)
+            self._load_locks.pop(key, None)
+
+    def _bump(self, key: str) -> None:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._drop(key)
+
+    def website_changed(self, website_id: Optional[str]) -> None:
+        """Menu, delivery settings or website info of a website changed."""
+        if website_id:
+            self._bump(f"website:{website_id}")
+
+    def user_changed(self, user_id: Optional[str]) -> None:
+        """Orders, websites or wallet of a user changed."""
+        if user_id:
+            self._bump(f"user:{user_id}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._versions.clear()
+        self._load_locks.clear()
+
+    # -- lookups --------------------------------------------------------
+    def _fresh(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != self._versions.get(key, 0) or time.monotonic() >= entry.expires_at:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for stale in [k for k, e in self._entries.items() if now >= e.expires_at]:
+            self._drop(stale)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def _get(
+        self,
+        key: str,
+        ttl: float,
+        loader: Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]],
+    ) -> Dict[str, Any]:
+        kind = key.split(":", 1)[0]
+        entry = self._fresh(key)
+        if entry is None:
+            self._loading[key] = self._loading.get(key, 0) + 1
+            try:
+                lock = self._load_locks.setdefault(key, asyncio.Lock())
+                async with lock:
+                    entry = self._fresh(key)  # another turn may have loaded it
+                    if entry is None:
+                        record_cache(f"assistant_context:{kind}", "miss")
+                        self.stats["loads"] += 1
+                        version = self._versions.get(key, 0)
+                        context, complete = await loader()
+                        if complete and self._versions.get(key, 0) == version:
+                            self._store(key, _Entry(version, time.monotonic() + ttl, context))
+                        return dict(context)
+            finally:
+                remaining = self._loading.pop(key) - 1
+                if remaining:
+                    self._loading[key] = remaining
+                elif key not in self._entries:
+                    self._drop(key)
+        record_cache(f"assistant_context:{kind}", "hit")
+        self.stats["hits"] += 1
+        return dict(entry.context)
+
+    async def for_website(self, website_id: str) -> Dict[str, Any]:
+        """{menu_items, delivery_settings, website_info, document}."""
+        website_id = str(website_id)
+        return await self._get(
+            f"website:{website_id}", self.website_ttl_seconds, lambda: _load_website(website_id)
+        )
+
+    async def for_user(self, user_id: str) -> Dict[str, Any]:
+        """{recent_orders, websites, wallet_balance, document}."""
+        user_id = str(user_id)
+        return await self._get(
+            f"user:{user_id}", self.user_ttl_seconds, lambda: _load_user(user_id)
+        )
+
+    async def for_owner_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """User snapshot of the account registered with `email`, or None."""
+        email = (email or "").strip().lower()
+        if not email:
+            return None
+        found = await self._get(
+            f"email:{email}", self.user_ttl_seconds, lambda: _load_owner_id(email)
+        )
+        if not found.get("user_id"):
+            return None
+        return await self.for_user(found["user_id"])
+
+
+assistant_context = AssistantContextIndex()
@@ -12,9 +12,11 @@ Business Types:
 - general: General stores, other businesses (Produk, Lain-lain)
 """
 
+from functools import lru_cache
 from typing import Dict, List
 import logging
-import re
+
+from app.utils.keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -331,6 +333,16 @@ BUSINESS_TYPE_KEYWORDS = {
 }
 
 
+_BUSINESS_TYPE_MATCHER = KeywordMatcher(BUSINESS_TYPE_KEYWORDS)
+
+
+@lru_cache(maxsize=None)
+def _category_matcher(business_type: str) -> KeywordMatcher:
+    """Compiled category_keywords for a business type (configs are static)."""
+    config = get_business_config(business_type)
+    return KeywordMatcher(config.get("category_keywords", {}))
+
+
 def detect_business_type(description: str) -> str:
     """
     Detect business type from description text.
@@ -355,15 +367,12 @@ def detect_business_type(description: str) -> str:
         "bakery": 0,
     }
 
-    for btype, keywords in BUSINESS_TYPE_KEYWORDS.items():
-        for keyword in keywords:
-            # Whole-word match only — substring matching misclassified
-            # businesses ('spa' in "spare parts", 'kek' in "kekal",
-            # 'urut' in "keturutan") and gave them wrong image prompts.
-            if re.search(rf"\b{re.escape(keyword)}\b", desc_lower):
-                # Multi-word keywords get higher weight
-                weight = len(keyword.split())
-                scores[btype] += weight
+    # Whole-word match only — substring matching misclassified businesses
+    # ('spa' in "spare parts", 'kek' in "kekal", 'urut' in "keturutan") and
+    # gave them wrong image prompts.
+    for btype, keywords in _BUSINESS_TYPE_MATCHER.group_hits(desc_lower).items():
+        # Multi-word keywords get higher weight
+        scores[btype] += sum(len(keyword.split()) for keyword in keywords)
 
     # Find the type with highest score
     max_score = max(scores.values())
@@ -424,14 +433,14 @@ def detect_item_category(item_name: str, business_type: str) -> str:
     
     name_lower = item_name.lower()
     config = get_business_config(business_type)
-    keywords_map = config.get("category_keywords", {})
-    
-    for category_id, keywords in keywords_map.items():
-        for keyword in keywords:
-            # Whole-word match — 'teh' must not match "the", 'air' not "hair"
-            if re.search(rf"\b{re.escape(keyword)}\b", name_lower):
-                return category_id
-    
+
+    # Whole-word match — 'teh' must not match "the", 'air' not "hair".
+    # First category (config order) with a keyword present wins.
+    known_type = business_type if business_type in BUSINESS_CONFIGS else "general"
+    category_id = _category_matcher(known_type).first_group(name_lower)
+    if category_id:
+        return category_id
+
     return config.get("default_category", "produk")
 
 
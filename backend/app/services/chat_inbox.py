@@ -0,0 +1,268 @@
+"""Owner chat inbox: one-query loads plus a per-owner in-memory page cache.
+
+`GET /chat/conversations` used to list the owner's conversations and then
+fetch each conversation's last messages with its own query, so an inbox
+refresh cost one round trip per conversation. Pages now come from the
+`list_chat_inbox` RPC (migration 057): conversations, their last
+INBOX_MESSAGES messages and an unread count in one query, ordered by
+(updated_at, id) DESC with keyset cursors.
+
+Loaded pages are kept per owner for CHAT_INBOX_CACHE_SECONDS. The chat
+endpoints keep them current on this worker instead of dropping them:
+
+  record_message()      new message → append to the preview, bump
+                        updated_at and unread_count, move the conversation
+                        to the top of the owner's first pages
+  mark_read()           owner read a conversation → unread_count = 0
+  invalidate_website()  conversation created/closed → reload next time
+
+Other workers pick the change up when their TTL lapses. Pages past the
+first (cursor set) are dropped rather than patched, since a conversation
+moving to the top shifts every later page.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from postgrest.exceptions import APIError as PostgrestAPIError
+
+from app.production.instrumentation import record_cache
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = float(raw)
+        return value if value >= 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+CHAT_INBOX_CACHE_SECONDS = _env_float("CHAT_INBOX_CACHE_SECONDS", 15.0)
+INBOX_MESSAGES = 10
+INBOX_MAX_LIMIT = 200
+
+# (website filter, status, cursor, limit)
+PageKey = Tuple[Tuple[str, ...], Optional[str], Optional[str], Optional[int]]
+
+
+# =====================================================
+# Cursors
+# =====================================================
+def encode_cursor(conversation: Dict[str, Any]) -> str:
+    raw = json.dumps([conversation.get("updated_at"), str(conversation["id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(updated_at, id) of the last conversation on the previous page.
+    Raises ValueError on anything that isn't a cursor we issued."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, conversation_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+    if not isinstance(updated_at, str) or not isinstance(conversation_id, str):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return updated_at, conversation_id
+
+
+# =====================================================
+# Pages
+# =====================================================
+@dataclass
+class InboxPage:
+    conversations: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def find(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        for conv in self.conversations:
+            if str(conv.get("id")) == conversation_id:
+                return conv
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Response body; copies so later cache patches don't leak into it."""
+        return {
+            "conversations": [
+                {**conv, "chat_messages": list(conv.get("chat_messages") or [])}
+                for conv in self.conversations
+            ],
+            "next_cursor": self.next_cursor,
+        }
+
+
+def build_page(
+    conversations: List[Dict[str, Any]], limit: Optional[int]
+) -> InboxPage:
+    """Trim a limit+1 fetch to `limit` rows and derive the next cursor."""
+    if limit is not None and len(conversations) > limit:
+        conversations = conversations[:limit]
+        return InboxPage(conversations, encode_cursor(conversations[-1]))
+    return InboxPage(conversations)
+
+
+def _row_to_conversation(row: Dict[str, Any], normalize) -> Dict[str, Any]:
+    conv = dict(row.get("conversation") or {})
+    conv["chat_messages"] = [normalize(dict(m)) for m in (row.get("messages") or [])]
+    conv["unread_count"] = int(row.get("unread_count") or 0)
+    return conv
+
+
+# =====================================================
+# Cache
+# =====================================================
+class ChatInbox:
+    """Per-owner cache of inbox pages, patched from the send/read paths."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = CHAT_INBOX_CACHE_SECONDS,
+        messages: int = INBOX_MESSAGES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.messages = messages
+        self.rpc_available = True
+        self._pages: Dict[str, Dict[PageKey, InboxPage]] = {}
+        self._website_owner: Dict[str, str] = {}
+        self._conversation_owners: Dict[str, Set[str]] = {}
+        self.stats = {"hits": 0, "loads": 0, "patched": 0}
+
+    # -- lookup -------------------------------------------------------
+    def get(self, owner: str, key: PageKey) -> Optional[InboxPage]:
+        page = self._pages.get(owner, {}).get(key)
+        if page is not None and time.monotonic() - page.loaded_at < self.ttl_seconds:
+            self.stats["hits"] += 1
+            record_cache("chat_inbox", "hit")
+            return page
+        record_cache("chat_inbox", "miss")
+        return None
+
+    def put(self, owner: str, key: PageKey, page: InboxPage) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        pages = self._pages.setdefault(owner, {})
+        for stale in [k for k, p in pages.items() if now - p.loaded_at >= self.ttl_seconds]:
+            del pages[stale]
+        pages[key] = page
+        for conv in page.conversations:
+            if conv.get("website_id"):
+                self._website_owner[str(conv["website_id"])] = owner
+            self._conversation_owners.setdefault(str(conv.get("id")), set()).add(owner)
+
+    # -- loading ------------------------------------------------------
+    async def load(
+        self,
+        supabase,
+        owner: str,
+        website_ids: Optional[Sequence[str]],
+        status: Optional[str],
+        cursor: Optional[str],
+        limit: Optional[int],
+        normalize,
+    ) -> Optional[InboxPage]:
+        """One list_chat_inbox call. None when the function isn't deployed
+        (the caller falls back to per-table queries)."""
+        if not self.rpc_available:
+            return None
+        before_updated_at, before_id = decode_cursor(cursor) if cursor else (None, None)
+        self.stats["loads"] += 1
+        try:
+            res = await run_in_threadpool(
+                supabase.rpc(
+                    "list_chat_inbox",
+                    {
+                        "p_user_id": owner,
+                        "p_website_ids": list(website_ids) if website_ids else None,
+                        "p_status": status,
+                        "p_before_updated_at": before_updated_at,
+                        "p_before_id": before_id,
+                        "p_limit": limit + 1 if limit is not None else None,
+                        "p_messages": self.messages,
+                    },
+                ).execute
+            )
+        except PostgrestAPIError as e:
+            if e.code == "PGRST202":
+                logger.warning("[ChatInbox] list_chat_inbox RPC missing — using per-table queries (apply migration 057)")
+                self.rpc_available = False
+                return None
+            raise
+        rows = [_row_to_conversation(r, normalize) for r in (res.data or [])]
+        return build_page(rows, limit)
+
+    # -- write-through --------------------------------------------------
+    def _owners_for(self, conversation_id: str, website_id: Optional[str]) -> Set[str]:
+        owners = set(self._conversation_owners.get(conversation_id, ()))
+        if website_id and str(website_id) in self._website_owner:
+            owners.add(self._website_owner[str(website_id)])
+        return owners
+
+    def record_message(self, message: Dict[str, Any], website_id: Optional[str] = None) -> None:
+        """Patch cached pages with a message that was just stored."""
+        conversation_id = str(message.get("conversation_id") or "")
+        for owner in self._owners_for(conversation_id, website_id):
+            pages = self._pages.get(owner, {})
+            for key, page in list(pages.items()):
+                conv = page.find(conversation_id)
+                if key[2] is not None or conv is None:
+                    # Later pages shift; a first page without the
+                    # conversation now lacks its newest entry.
+                    del pages[key]
+                    continue
+                preview = list(conv.get("chat_messages") or []) + [dict(message)]
+                conv["chat_messages"] = preview[-self.messages:]
+                if message.get("created_at"):
+                    conv["updated_at"] = message["created_at"]
+                if message.get("sender_type") != "owner":
+                    conv["unread_count"] = int(conv.get("unread_count") or 0) + 1
+                page.conversations.remove(conv)
+                page.conversations.insert(0, conv)
+                self.stats["patched"] += 1
+
+    def mark_read(self, conversation_id: str, user_type: str) -> None:
+        if user_type != "owner":
+            return
+        for owner in self._owners_for(str(conversation_id), None):
+            for page in self._pages.get(owner, {}).values():
+                conv = page.find(str(conversation_id))
+                if conv is None:
+                    continue
+                conv["unread_count"] = 0
+                conv["chat_messages"] = [
+                    {**m, "is_read": True} if m.get("sender_type") != "owner" else m
+                    for m in conv.get("chat_messages") or []
+                ]
+
+    def invalidate_owner(self, owner: str) -> None:
+        self._pages.pop(owner, None)
+
+    def invalidate_website(self, website_id: Optional[str]) -> None:
+        owner = self._website_owner.get(str(website_id)) if website_id else None
+        if owner:
+            self.invalidate_owner(owner)
+
+    def invalidate_conversation(self, conversation_id: str) -> None:
+        for owner in self._conversation_owners.pop(str(conversation_id), set()):
+            self.invalidate_owner(owner)
+
+    def clear(self) -> None:
+        self._pages.clear()
+        self._website_owner.clear()
+        self._conversation_owners.clear()
+
+
+chat_inbox = ChatInbox()
@@ -9,6 +9,8 @@ import httpx
 from loguru import logger
 from typing import Optional, Dict, Any, List
 
+from app.services.assistant_context import assistant_context
+
 
 class DisputeAIService:
     """AI-powered dispute analysis and resolution service"""
@@ -478,6 +480,15 @@ Respond with ONLY a valid JSON object (no markdown, no extra text):
                 trigger_type, dispute_data, conversation_history, customer_message
             )
 
+            # Customer-facing replies can refer to the restaurant's menu and
+            # delivery terms (shared snapshot, usually no DB round trip).
+            if trigger_type != "owner_complaint" and dispute_data.get("website_id"):
+                try:
+                    restaurant = await assistant_context.for_website(dispute_data["website_id"])
+                    prompt += f"\nRestaurant context (for reference):\n{restaurant['document']}\n"
+                except Exception as e:
+                    logger.warning(f"Restaurant context unavailable for dispute {dispute_id}: {e}")
+
             # Use owner support system prompt for owner complaints
             system_prompt = (
                 self.AI_OWNER_SUPPORT_PROMPT
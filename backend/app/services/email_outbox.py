@@ -0,0 +1,180 @@
+"""
+Persistent email outbox (migration 058).
+
+EmailService.queue_email() inserts into email_outbox instead of sending;
+flush_email_outbox() claims due rows in batches of EMAIL_OUTBOX_BATCH_SIZE
+and sends them concurrently through EmailService._deliver, i.e. over the
+pooled SMTP connections in app.services.smtp_pool — the pool bounds how
+many are in flight per account and paces them per provider.
+
+  - a failed send goes back to 'pending' with exponential backoff and is
+    'dead' after EMAIL_OUTBOX_MAX_ATTEMPTS; a refused recipient is dead at
+    once;
+  - EmailOutboxScheduler (app.core.scheduler) flushes every
+    EMAIL_OUTBOX_INTERVAL_SECONDS, and the subscription cron flushes at the
+    end of its run so its emails do not wait for the next sweep;
+  - rows are leased with FOR UPDATE SKIP LOCKED, so the API process and the
+    cron can flush at the same time. Delivery is at-least-once: a worker
+    that dies after sending but before recording the result re-sends once
+    the lease expires.
+
+Until the migration is applied enqueue_email() returns False and callers
+send directly.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import aiosmtplib
+from loguru import logger
+
+from app.services.supabase_client import supabase_service
+
+LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+# Upper bound on batches per flush, so one call cannot run forever.
+MAX_BATCHES = int(os.getenv("EMAIL_OUTBOX_MAX_BATCHES", "20"))
+
+# PostgREST has no email_outbox until migration 058 is applied.
+_OUTBOX_STATE = {"available": True}
+
+# The message itself is unacceptable: retrying cannot help.
+_PERMANENT_ERRORS = (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused)
+
+
+async def _rpc(name: str, params: Dict[str, Any]) -> Any:
+    async with supabase_service._client() as client:
+        resp = await client.post(
+            f"{supabase_service.url}/rest/v1/rpc/{name}",
+            json=params,
+            headers=supabase_service.service_headers,
+        )
+    resp.raise_for_status()
+    return resp.json() if resp.content else None
+
+
+async def enqueue_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None,
+    *,
+    kind: str = "general",
+    dedupe_key: Optional[str] = None,
+    from_email: Optional[str] = None,
+    from_name: Optional[str] = None,
+    reply_to: Optional[str] = None,
+) -> bool:
+    """Queue one email. True if it is on the outbox (including an earlier
+    row with the same dedupe_key), False if the caller should send it."""
+    if not _OUTBOX_STATE["available"]:
+        return False
+    row = {
+        "kind": kind,
+        "to_email": to_email,
+        "subject": subject,
+        "html_content": html_content,
+        "text_content": text_content,
+        "from_email": from_email,
+        "from_name": from_name,
+        "reply_to": reply_to,
+        "dedupe_key": dedupe_key,
+    }
+    try:
+        async with supabase_service._client() as client:
+            resp = await client.post(
+                f"{supabase_service.url}/rest/v1/email_outbox",
+                params={"on_conflict": "dedupe_key"} if dedupe_key else None,
+                json=row,
+                headers={
+                    **supabase_service.service_headers,
+                    "Prefer": "resolution=ignore-duplicates,return=minimal",
+                },
+            )
+    except Exception as e:
+        logger.warning(f"[EmailOutbox] enqueue failed, sending directly: {e}")
+        return False
+    if resp.status_code < 300:
+        return True
+    if resp.status_code == 404 or "PGRST205" in resp.text or "42P01" in resp.text:
+        _OUTBOX_STATE["available"] = False
+        logger.warning("[EmailOutbox] email_outbox missing (migration 058 not applied); sending directly")
+    else:
+        logger.warning(f"[EmailOutbox] enqueue failed ({resp.status_code}), sending directly: {resp.text[:300]}")
+    return False
+
+
+async def _send_row(row: Dict[str, Any]) -> bool:
+    from app.services.email_service import email_service
+
+    error: Optional[str] = None
+    permanent = False
+    try:
+        await email_service._deliver(
+            row["to_email"],
+            row["subject"],
+            row["html_content"],
+            row.get("text_content"),
+            from_email=row.get("from_email"),
+            from_name=row.get("from_name"),
+            reply_to=row.get("reply_to"),
+        )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"[:1000]
+        permanent = isinstance(e, _PERMANENT_ERRORS)
+        logger.warning(
+            f"[EmailOutbox] email {row.get('id')} ({row.get('kind')}) to {row.get('to_email')} "
+            f"attempt {row.get('attempts')} failed{' permanently' if permanent else ''}: {error}"
+        )
+    try:
+        await _rpc("finish_email_outbox", {
+            "p_id": row["id"],
+            "p_error": error,
+            "p_max_attempts": MAX_ATTEMPTS,
+            "p_permanent": permanent,
+        })
+    except Exception as e:
+        # The lease runs out and the email is sent again.
+        logger.error(f"[EmailOutbox] could not record result of email {row.get('id')}: {e}")
+    return error is None
+
+
+async def flush_email_outbox(limit: int = BATCH_SIZE) -> Dict[str, int]:
+    """Send due emails, `limit` per batch, until none are left.
+
+    Never raises — this is called from the scheduler and the cron.
+    Returns {"claimed", "sent", "failed"}.
+    """
+    totals = {"claimed": 0, "sent": 0, "failed": 0}
+    if not _OUTBOX_STATE["available"]:
+        return totals
+    for _ in range(MAX_BATCHES):
+        try:
+            rows: List[Dict[str, Any]] = await _rpc("claim_email_outbox", {
+                "p_limit": limit,
+                "p_lease_seconds": LEASE_SECONDS,
+            }) or []
+        except Exception as e:
+            if "PGRST202" in str(getattr(getattr(e, "response", None), "text", "")):
+                _OUTBOX_STATE["available"] = False
+                logger.warning("[EmailOutbox] claim_email_outbox missing (migration 058 not applied)")
+            else:
+                logger.error(f"[EmailOutbox] claim failed: {e}")
+            break
+        if not rows:
+            break
+        results = await asyncio.gather(*(_send_row(row) for row in rows))
+        sent = sum(results)
+        totals["claimed"] += len(rows)
+        totals["sent"] += sent
+        totals["failed"] += len(rows) - sent
+        if len(rows) < limit:
+            break
+    if totals["claimed"]:
+        logger.info(
+            f"[EmailOutbox] flushed {totals['claimed']} email(s): "
+            f"{totals['sent']} sent, {totals['failed']} failed"
+        )
+    return totals
@@ -1,11 +1,22 @@
 """
 Email Polling Service for BinaApp
-Polls IMAP inbox (Zoho Mail) for new support emails and processes them with AI
+Watches the IMAP inbox (Zoho Mail) for new support emails and processes them with AI
+
+One IMAP session stays logged in (ImapSession, on its own thread). The
+watcher fetches unseen mail, processes it, sets the flags on the same
+connection, then waits in IDLE until the server reports new mail, so a
+new email is picked up within seconds instead of on the next polling
+tick. A failed session is dropped and re-opened with backoff. Servers
+without IDLE (or EMAIL_IMAP_IDLE_ENABLED=false) fall back to polling
+every EMAIL_POLLING_INTERVAL_SECONDS, still on the same session.
 """
 import asyncio
 import hashlib
-from datetime import datetime
-from typing import Optional, Dict, Any, List, Set
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Set, Callable
 from loguru import logger
 
 try:
@@ -27,8 +38,98 @@ from app.services.ai_email_support import ai_email_support
 
 # Timeout for IMAP operations (seconds)
 IMAP_TIMEOUT = 30
-# Maximum time for a single poll cycle (seconds)
+# Maximum time for a single poll cycle (seconds); raised to fit a full
+# batch, see EmailPollingService.poll_timeout_seconds
 POLL_TIMEOUT = 180
+# Unseen emails fetched per poll
+FETCH_LIMIT = 20
+# Reconnect backoff after a session failure: 2s, 4s, ... capped here (seconds)
+IMAP_RECONNECT_MAX_SECONDS = 300
+# How often an IDLE wait checks whether it has been asked to stop (seconds)
+IDLE_POLL_SLICE_SECONDS = 1.0
+
+
+class ImapSession:
+    """
+    One logged-in IMAP connection, owned by a dedicated thread.
+
+    imaplib blocks and a MailBox must not be used from two threads, so
+    every operation on it is handed to this session's thread with run().
+    The connection is opened on first use and kept until drop() (called
+    when an operation on it fails); the next operation logs in again.
+    """
+
+    def __init__(self, connect: Callable[[], Any]):
+        self._connect = connect
+        self.mailbox: Optional[Any] = None
+        self.supports_idle = False
+        self.logins = 0
+        # Set to end an IDLE wait early (manual poll, shutdown).
+        self.wake = threading.Event()
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _worker(jobs: "queue.Queue") -> None:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            fn, args, loop, future = job
+            try:
+                result, error = fn(*args), None
+            except BaseException as e:
+                result, error = None, e
+            if future is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(ImapSession._settle, future, result, error)
+
+    @staticmethod
+    def _settle(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) on the session thread and return its result."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._worker, args=(self._jobs,), name="imap-session", daemon=True
+            )
+            self._thread.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((fn, args, loop, future))
+        return await future
+
+    def connection(self) -> Any:
+        """The logged-in MailBox (session thread only)."""
+        if self.mailbox is None:
+            mailbox = self._connect()
+            self.logins += 1
+            capabilities = getattr(getattr(mailbox, "client", None), "capabilities", ()) or ()
+            self.supports_idle = "IDLE" in capabilities
+            self.mailbox = mailbox
+        return self.mailbox
+
+    def drop(self) -> None:
+        """Log out and forget the connection (session thread only)."""
+        mailbox, self.mailbox = self.mailbox, None
+        if mailbox is not None:
+            try:
+                mailbox.logout()
+            except Exception:
+                pass
+
+    def shutdown(self) -> None:
+        """End any IDLE wait, log out and stop the thread, without waiting."""
+        self.wake.set()
+        jobs, self._jobs = self._jobs, queue.Queue()
+        jobs.put((self.drop, (), None, None))
+        jobs.put(None)
+        self._thread = None
 
 
 class EmailPollingService:
@@ -42,6 +143,8 @@ class EmailPollingService:
         """Initialize the Email Polling Service"""
         self.enabled = settings.EMAIL_POLLING_ENABLED
         self.polling_interval = settings.EMAIL_POLLING_INTERVAL_SECONDS
+        self.idle_enabled = settings.EMAIL_IMAP_IDLE_ENABLED
+        self.idle_seconds = min(max(30, settings.EMAIL_IMAP_IDLE_SECONDS), 29 * 60)
         self.imap_server = settings.IMAP_SERVER
         self.imap_port = settings.IMAP_PORT
         self.email = settings.SUPPORT_EMAIL
@@ -58,9 +161,20 @@ class EmailPollingService:
         self._processed_uids: Set[str] = set()  # Track processed email UIDs
         self._last_reset_date: Optional[datetime] = None
 
-        # Rate limiting
+        # Long-lived IMAP session and the task that watches it
+        self._session = ImapSession(self._connect_imap_sync)
+        self._watch_task: Optional[asyncio.Task] = None
+        self._poll_lock: Optional[asyncio.Lock] = None
+
+        # Parallel processing: at most `processing_concurrency` emails at
+        # once, each cut off after `processing_timeout` seconds
+        self.processing_concurrency = max(1, settings.EMAIL_PROCESSING_CONCURRENCY)
+        self.processing_timeout = max(10, settings.EMAIL_PROCESSING_TIMEOUT_SECONDS)
+
+        # Rate limiting: email starts are spaced this far apart (replies are
+        # additionally paced by the SMTP pool)
         self._last_email_sent_time: Optional[datetime] = None
-        self._min_email_interval_seconds: int = 5  # Minimum 5 seconds between sends
+        self._min_email_interval_seconds: float = 1
 
         logger.info("=" * 60)
         logger.info("EMAIL POLLING SERVICE INITIALIZATION")
@@ -69,6 +183,7 @@ class EmailPollingService:
         logger.info(f"IMAP Server: {self.imap_server}:{self.imap_port}")
         logger.info(f"Email Account: {self.email}")
         logger.info(f"Polling Interval: {self.polling_interval} seconds")
+        logger.info(f"IMAP IDLE: {'on' if self.idle_enabled else 'off'} ({self.idle_seconds}s)")
         logger.info(f"Password configured: {'Yes' if self.password else 'NO - MISSING!'}")
         logger.info("=" * 60)
 
@@ -140,131 +255,208 @@ class EmailPollingService:
             return name, email
 
     async def _rate_limit_check(self):
-        """Ensure we don't send emails too quickly"""
+        """Ensure we don't start emails too quickly. Each caller reserves the
+        next free start time, so concurrent emails are spaced out too."""
+        now = datetime.utcnow()
+        start = now
         if self._last_email_sent_time:
-            elapsed = (datetime.utcnow() - self._last_email_sent_time).total_seconds()
-            if elapsed < self._min_email_interval_seconds:
-                wait_time = self._min_email_interval_seconds - elapsed
-                logger.debug(f"Rate limiting: waiting {wait_time:.1f} seconds before next email")
-                await asyncio.sleep(wait_time)
-        self._last_email_sent_time = datetime.utcnow()
+            start = max(now, self._last_email_sent_time + timedelta(seconds=self._min_email_interval_seconds))
+        self._last_email_sent_time = start
+        wait_time = (start - now).total_seconds()
+        if wait_time > 0:
+            logger.debug(f"Rate limiting: waiting {wait_time:.1f} seconds before next email")
+            await asyncio.sleep(wait_time)
+
+    @property
+    def processing_budget_seconds(self) -> float:
+        """How long a poll keeps starting emails: a full batch processed
+        `processing_concurrency` at a time. One sender's emails run one
+        after another, so a long chain from a single sender is cut off here
+        and its remaining emails wait for the next poll."""
+        waves = -(-FETCH_LIMIT // self.processing_concurrency)
+        return waves * self.processing_timeout
+
+    @property
+    def poll_timeout_seconds(self) -> float:
+        """Upper bound for one poll: fetch + flags, the processing budget
+        and the last emails started within it."""
+        return max(
+            POLL_TIMEOUT,
+            2 * IMAP_TIMEOUT + self.processing_budget_seconds + self.processing_timeout,
+        )
+
+    def _connect_imap_sync(self) -> Any:
+        """Open and log in the session's IMAP connection (session thread)."""
+        logger.info(f"[IMAP] Connecting to {self.imap_server}:{self.imap_port} (timeout={IMAP_TIMEOUT}s)")
+        self.imap_connection_status = "connecting"
+        mailbox = MailBox(self.imap_server, self.imap_port, timeout=IMAP_TIMEOUT)
+        try:
+            mailbox.login(self.email, self.password, initial_folder="INBOX")
+        except Exception:
+            self.imap_connection_status = "failed"
+            try:
+                mailbox.logout()
+            except Exception:
+                pass
+            raise
+        logger.info("[IMAP] LOGIN SUCCESSFUL!")
+        self.imap_connection_status = "connected"
+        return mailbox
 
     def _fetch_unseen_emails_sync(self) -> List[Dict[str, Any]]:
         """
-        Synchronous IMAP fetch - runs in thread pool to avoid blocking event loop.
-        Connects to IMAP, fetches unseen emails, extracts data, and disconnects.
+        Synchronous IMAP fetch - runs on the session thread.
+        Fetches unseen emails over the open session and extracts their data.
 
         Returns:
             List of dicts with extracted email data
         """
         fetched = []
-        mailbox = None
         try:
-            logger.info(f"[IMAP] Connecting to {self.imap_server}:{self.imap_port} (timeout={IMAP_TIMEOUT}s)")
-            self.imap_connection_status = "connecting"
-
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    logger.info(f"[IMAP] Connection attempt {attempt + 1}/{max_retries}")
-                    mailbox = MailBox(self.imap_server, self.imap_port, timeout=IMAP_TIMEOUT)
-                    mailbox.login(self.email, self.password)
-                    logger.info("[IMAP] LOGIN SUCCESSFUL!")
-                    self.imap_connection_status = "connected"
-                    break
-                except Exception as conn_error:
-                    logger.error(f"[IMAP] Connection attempt {attempt + 1} FAILED: {conn_error}")
-                    self.imap_connection_status = "failed"
-                    if mailbox:
-                        try:
-                            mailbox.logout()
-                        except Exception:
-                            pass
-                        mailbox = None
-                    if attempt < max_retries - 1:
-                        import time
-                        wait_time = 2 ** (attempt + 1)
-                        logger.warning(f"[IMAP] Retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        raise conn_error
-
-            mailbox.folder.set("INBOX")
-            logger.info("[IMAP] Fetching unread emails (limit: 20)...")
-            messages = list(mailbox.fetch(AND(seen=False), limit=20, reverse=True))
-            logger.info(f"[IMAP] Found {len(messages)} unread emails")
-
-            for msg in messages:
-                # Extract all data from IMAP message while connection is open
-                email_hash = self._generate_email_hash(msg)
-                sender_name, sender_email = self._extract_sender_name(msg.from_)
-                body_text = self._extract_plain_text(msg)
-                html_body = msg.html if msg.html else None
-
-                fetched.append({
-                    "uid": msg.uid,
-                    "subject": msg.subject or "(No Subject)",
-                    "from": msg.from_,
-                    "sender_name": sender_name,
-                    "sender_email": sender_email,
-                    "body_text": body_text,
-                    "html_body": html_body,
-                    "email_hash": email_hash,
-                    "date": str(msg.date) if msg.date else None,
-                })
-
-        finally:
-            if mailbox:
-                try:
-                    mailbox.logout()
-                    self.imap_connection_status = "disconnected"
-                except Exception as e:
-                    logger.warning(f"[IMAP] Error closing fetch connection: {e}")
+            mailbox = self._session.connection()
+            logger.info(f"[IMAP] Fetching unread emails (limit: {FETCH_LIMIT})...")
+            messages = list(mailbox.fetch(AND(seen=False), limit=FETCH_LIMIT, reverse=True, bulk=True))
+        except Exception:
+            self._session.drop()
+            self.imap_connection_status = "error"
+            raise
+        logger.info(f"[IMAP] Found {len(messages)} unread emails")
+
+        for msg in messages:
+            email_hash = self._generate_email_hash(msg)
+            sender_name, sender_email = self._extract_sender_name(msg.from_)
+            body_text = self._extract_plain_text(msg)
+            html_body = msg.html if msg.html else None
+
+            fetched.append({
+                "uid": msg.uid,
+                "subject": msg.subject or "(No Subject)",
+                "from": msg.from_,
+                "sender_name": sender_name,
+                "sender_email": sender_email,
+                "body_text": body_text,
+                "html_body": html_body,
+                "email_hash": email_hash,
+                "date": str(msg.date) if msg.date else None,
+            })
 
         return fetched
 
     def _mark_emails_in_imap_sync(self, uid_actions: List[Dict[str, Any]]):
         """
-        Synchronous IMAP flag update - runs in thread pool.
-        Reconnects to IMAP and applies flags for processed emails.
+        Synchronous IMAP flag update - runs on the session thread.
+        Applies flags for processed emails on the same connection they were
+        fetched on, one STORE per flag for the whole batch.
         """
         if not uid_actions:
             return
 
-        mailbox = None
+        escalated = [a["uid"] for a in uid_actions if a.get("escalated")]
+        answered = [a["uid"] for a in uid_actions if not a.get("escalated")]
         try:
-            mailbox = MailBox(self.imap_server, self.imap_port, timeout=IMAP_TIMEOUT)
-            mailbox.login(self.email, self.password)
-            mailbox.folder.set("INBOX")
-
-            for action in uid_actions:
-                uid = action["uid"]
-                escalated = action.get("escalated", False)
+            mailbox = self._session.connection()
+            if escalated:
+                # Keep unread for admin, try custom flag
+                mailbox.flag(escalated, ['\\Seen'], False)
                 try:
-                    if escalated:
-                        # Keep unread for admin, try custom flag
-                        mailbox.flag(uid, ['\\Seen'], False)
-                        try:
-                            mailbox.flag(uid, [self.FLAG_ESCALATED], True)
-                        except Exception:
-                            pass
-                    else:
-                        mailbox.flag(uid, ['\\Seen'], True)
-                        try:
-                            mailbox.flag(uid, [self.FLAG_PROCESSED_BY_AI], True)
-                        except Exception:
-                            pass
-                except Exception as flag_err:
-                    logger.warning(f"[IMAP] Could not flag UID {uid}: {flag_err}")
-
+                    mailbox.flag(escalated, [self.FLAG_ESCALATED], True)
+                except Exception:
+                    pass
+            if answered:
+                mailbox.flag(answered, ['\\Seen'], True)
+                try:
+                    mailbox.flag(answered, [self.FLAG_PROCESSED_BY_AI], True)
+                except Exception:
+                    pass
         except Exception as e:
             logger.warning(f"[IMAP] Failed to update flags: {e}")
+            self._session.drop()
+
+    def _wait_for_mail_sync(self, timeout: float) -> Optional[bool]:
+        """
+        IDLE until the server reports new mail (True), `timeout` passes
+        (False) or session.wake is set (True). None if the server has no
+        IDLE. Runs on the session thread.
+        """
+        mailbox = self._session.connection()
+        if not self._session.supports_idle:
+            return None
+        wake = self._session.wake
+        deadline = time.monotonic() + timeout
+        try:
+            with mailbox.idle as idle:
+                while not wake.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    slice_seconds = min(IDLE_POLL_SLICE_SECONDS, remaining)
+                    started = time.monotonic()
+                    responses = idle.poll(timeout=slice_seconds)
+                    if any(b"EXISTS" in line for line in responses):
+                        return True
+                    if not responses and time.monotonic() - started < slice_seconds / 2:
+                        # poll() swallows EOF: readable socket, nothing to read
+                        raise ConnectionError("IMAP connection closed during IDLE")
+            return True
+        except Exception:
+            self._session.drop()
+            raise
         finally:
-            if mailbox:
+            wake.clear()
+
+    async def watch_inbox(self) -> None:
+        """
+        Process unseen mail, then wait for more (IDLE, or the polling
+        interval without it); repeat until cancelled. A failure drops the
+        session and retries after 2s, 4s, ... up to IMAP_RECONNECT_MAX_SECONDS.
+        """
+        failures = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(
+                    self.poll_inbox(from_watcher=True), timeout=self.poll_timeout_seconds
+                )
+                if not result.get("success"):
+                    raise RuntimeError(result.get("error") or "poll failed")
+                new_mail = None
+                if self.idle_enabled:
+                    new_mail = await self._session.run(self._wait_for_mail_sync, self.idle_seconds)
+                failures = 0
+                if new_mail is None:
+                    await asyncio.sleep(self.polling_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(IMAP_RECONNECT_MAX_SECONDS, 2 ** failures)
+                logger.warning(f"[IMAP] Session failed ({e}); reconnecting in {delay}s")
+                self.imap_connection_status = "reconnecting"
                 try:
-                    mailbox.logout()
+                    await self._session.run(self._session.drop)
                 except Exception:
                     pass
+                await asyncio.sleep(delay)
+
+    @property
+    def is_watching(self) -> bool:
+        return self._watch_task is not None and not self._watch_task.done()
+
+    def start_watching(self) -> bool:
+        """Start the watcher task on the running loop (no-op if running)."""
+        if self.is_watching:
+            return True
+        if not self.is_available():
+            return False
+        self._watch_task = asyncio.get_running_loop().create_task(self.watch_inbox())
+        return True
+
+    def stop_watching(self) -> None:
+        """Cancel the watcher and close the IMAP session."""
+        task, self._watch_task = self._watch_task, None
+        if task is not None:
+            task.cancel()
+        self._session.shutdown()
+        self.imap_connection_status = "disconnected"
 
     async def process_email_data(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -322,23 +514,23 @@ class EmailPollingService:
             # Apply rate limiting
             await self._rate_limit_check()
 
-            # Process with AI email support (fully async)
+            # Process with AI email support (fully async). The email counts
+            # as handled once the reply is out, so a timeout after that
+            # doesn't answer it again.
             ai_result = await ai_email_support.process_incoming_email(
                 sender_email=sender_email,
                 sender_name=sender_name,
                 subject=email_data["subject"],
                 body=body_text,
-                html_body=html_body
+                html_body=html_body,
+                on_reply_sent=lambda: self._mark_handled(email_hash)
             )
 
             result["thread_id"] = ai_result.get("thread_id")
             result["ai_response_sent"] = ai_result.get("ai_response_sent", False)
             result["escalated"] = ai_result.get("escalated", False)
 
-            # Track processed UID
-            self._processed_uids.add(email_hash)
-            if len(self._processed_uids) > 1000:
-                self._processed_uids = set(list(self._processed_uids)[-500:])
+            self._mark_handled(email_hash)
 
             result["success"] = True
             result["processed"] = True
@@ -364,10 +556,41 @@ class EmailPollingService:
 
         return result
 
-    async def poll_inbox(self) -> Dict[str, Any]:
+    def _mark_handled(self, email_hash: str) -> None:
+        """Remember an email so later polls don't process it again."""
+        self._processed_uids.add(email_hash)
+        if len(self._processed_uids) > 1000:
+            self._processed_uids = set(list(self._processed_uids)[-500:])
+
+    async def _process_with_timeout(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """process_email_data with the per-email timeout; never raises.
+        An email whose reply went out before the timeout is still reported
+        as processed, so it gets flagged and isn't answered twice."""
+        logger.info(f"[EMAIL] Processing: {email_data['subject']} | From: {email_data['from']}")
+        try:
+            return await asyncio.wait_for(
+                self.process_email_data(email_data), timeout=self.processing_timeout
+            )
+        except Exception as e:
+            error = (
+                f"Timed out after {self.processing_timeout}s"
+                if isinstance(e, asyncio.TimeoutError) else str(e)
+            )
+            logger.error(f"Failed to process email {email_data['uid']}: {error}")
+            self.errors_today.append({
+                "time": datetime.utcnow().isoformat(),
+                "uid": email_data["uid"],
+                "subject": email_data["subject"],
+                "error": error
+            })
+            handled = email_data["email_hash"] in self._processed_uids
+            return {"uid": email_data["uid"], "processed": handled, "escalated": False, "error": error}
+
+    async def poll_inbox(self, from_watcher: bool = False) -> Dict[str, Any]:
         """
         Poll the IMAP inbox for new unread emails and process them.
-        IMAP operations run in a thread pool to avoid blocking the event loop.
+        IMAP operations run on the session thread to avoid blocking the event loop.
+        from_watcher is set by watch_inbox() only.
 
         Returns:
             Dict with polling results
@@ -387,6 +610,17 @@ class EmailPollingService:
             logger.warning("Email polling attempted but service not available")
             return poll_result
 
+        # One poll at a time. A poll from outside the watcher (manual
+        # trigger) ends its IDLE wait so the session thread is free; it
+        # takes the lock first, so the watcher's own poll runs after it.
+        if self._poll_lock is None:
+            self._poll_lock = asyncio.Lock()
+        async with self._poll_lock:
+            if not from_watcher and self.is_watching:
+                self._session.wake.set()
+            return await self._poll_inbox_locked(poll_result)
+
+    async def _poll_inbox_locked(self, poll_result: Dict[str, Any]) -> Dict[str, Any]:
         self._reset_daily_stats()
         self.last_poll_time = datetime.utcnow()
         self.last_poll_status = "in_progress"
@@ -398,9 +632,9 @@ class EmailPollingService:
         logger.info(f"Poll started at: {self.last_poll_time.isoformat()}")
 
         try:
-            # Step 1: Fetch emails via thread pool (non-blocking)
-            logger.info("[POLL] Fetching emails from IMAP (in thread pool)...")
-            fetched_emails = await asyncio.to_thread(self._fetch_unseen_emails_sync)
+            # Step 1: Fetch emails on the session thread (non-blocking)
+            logger.info("[POLL] Fetching emails from IMAP (session thread)...")
+            fetched_emails = await self._session.run(self._fetch_unseen_emails_sync)
             poll_result["emails_found"] = len(fetched_emails)
 
             if not fetched_emails:
@@ -408,37 +642,56 @@ class EmailPollingService:
             else:
                 logger.info(f"[EMAIL] Found {len(fetched_emails)} emails, starting processing...")
 
-            # Step 2: Process each email asynchronously (AI + DB, no IMAP blocking)
+            # Step 2: Process emails in parallel (AI + DB, no IMAP blocking).
+            # One sender's emails stay in order so they land in one thread.
+            # Emails not started within the processing budget stay unseen
+            # and are fetched again by the next poll.
+            by_sender: Dict[str, List[Dict[str, Any]]] = {}
+            for email_data in fetched_emails:
+                by_sender.setdefault(email_data["sender_email"].lower(), []).append(email_data)
+            slots = asyncio.Semaphore(self.processing_concurrency)
+            results: Dict[str, Dict[str, Any]] = {}
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.processing_budget_seconds
+
+            async def process_sender(emails: List[Dict[str, Any]]) -> None:
+                for email_data in emails:
+                    async with slots:
+                        if loop.time() >= deadline:
+                            return
+                        results[email_data["uid"]] = await self._process_with_timeout(email_data)
+
+            await asyncio.gather(*(process_sender(emails) for emails in by_sender.values()))
+            if len(results) < len(fetched_emails):
+                logger.info(
+                    f"[EMAIL] Processing budget used up; {len(fetched_emails) - len(results)} "
+                    f"emails left for the next poll"
+                )
+
             uid_actions = []
-            for idx, email_data in enumerate(fetched_emails, 1):
-                logger.info(f"[EMAIL {idx}/{len(fetched_emails)}] Processing: {email_data['subject']} | From: {email_data['from']}")
-                try:
-                    email_result = await self.process_email_data(email_data)
-                    if email_result.get("processed"):
-                        poll_result["emails_processed"] += 1
-                        uid_actions.append({
-                            "uid": email_data["uid"],
-                            "escalated": email_result.get("escalated", False)
-                        })
-                    if email_result.get("escalated"):
-                        poll_result["emails_escalated"] += 1
-                    if email_result.get("error"):
-                        poll_result["errors"].append({
-                            "uid": email_data["uid"],
-                            "error": email_result["error"]
-                        })
-                except Exception as email_error:
-                    logger.error(f"Failed to process email {email_data['uid']}: {email_error}")
+            for email_data in fetched_emails:
+                email_result = results.get(email_data["uid"])
+                if email_result is None:
+                    continue
+                if email_result.get("processed"):
+                    poll_result["emails_processed"] += 1
+                    uid_actions.append({
+                        "uid": email_data["uid"],
+                        "escalated": email_result.get("escalated", False)
+                    })
+                if email_result.get("escalated"):
+                    poll_result["emails_escalated"] += 1
+                if email_result.get("error"):
                     poll_result["errors"].append({
                         "uid": email_data["uid"],
-                        "error": str(email_error)
+                        "error": email_result["error"]
                     })
 
-            # Step 3: Mark processed emails in IMAP via thread pool (non-blocking)
+            # Step 3: Mark processed emails on the same IMAP session
             if uid_actions:
                 logger.info(f"[IMAP] Marking {len(uid_actions)} emails as processed...")
                 try:
-                    await asyncio.to_thread(self._mark_emails_in_imap_sync, uid_actions)
+                    await self._session.run(self._mark_emails_in_imap_sync, uid_actions)
                 except Exception as flag_err:
                     logger.warning(f"[IMAP] Flag update failed (non-critical): {flag_err}")
 
@@ -482,6 +735,9 @@ class EmailPollingService:
         return {
             "is_available": self.is_available(),
             "is_running": self.is_running,
+            "is_watching": self.is_watching,
+            "mode": "idle" if self.idle_enabled else "interval",
+            "imap_logins": self._session.logins,
             "enabled": self.enabled,
             "last_poll_time": self.last_poll_time.isoformat() if self.last_poll_time else None,
             "last_poll_status": self.last_poll_status,
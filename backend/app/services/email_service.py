@@ -2,12 +2,12 @@
 Email Service for BinaApp
 Handles all email sending via Zoho SMTP
 """
-import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, List
 from loguru import logger
 from app.core.config import settings
+from app.services.smtp_pool import get_smtp_pool
 
 
 class EmailService:
@@ -65,57 +65,17 @@ class EmailService:
         Returns:
             bool: True if email sent successfully, False otherwise
         """
-        # Use override credentials if provided, otherwise use defaults
-        effective_smtp_host = smtp_host or self.smtp_host
-        effective_smtp_port = smtp_port or self.smtp_port
-        effective_smtp_user = smtp_user or self.smtp_user
-        effective_smtp_password = smtp_password or self.smtp_password
-
-        if not effective_smtp_user or not effective_smtp_password:
+        if not (smtp_user or self.smtp_user) or not (smtp_password or self.smtp_password):
             logger.warning("Email service not configured. Skipping email send.")
             return False
 
         try:
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = f"{from_name or self.from_name} <{from_email or self.from_email}>"
-            message["To"] = to_email
-
-            if reply_to:
-                message["Reply-To"] = reply_to
-            if cc:
-                message["Cc"] = ", ".join(cc)
-
-            # Attach text content
-            if text_content:
-                message.attach(MIMEText(text_content, "plain"))
-
-            # Attach HTML content
-            message.attach(MIMEText(html_content, "html"))
-
-            # Build recipient list
-            recipients = [to_email]
-            if cc:
-                recipients.extend(cc)
-            if bcc:
-                recipients.extend(bcc)
-
-            # Send email via Zoho SMTP
-            # Port 465 uses SSL, Port 587 uses STARTTLS
-            use_tls = effective_smtp_port == 465
-            start_tls = effective_smtp_port == 587
-
-            await aiosmtplib.send(
-                message,
-                hostname=effective_smtp_host,
-                port=effective_smtp_port,
-                username=effective_smtp_user,
-                password=effective_smtp_password,
-                use_tls=use_tls,
-                start_tls=start_tls
+            await self._deliver(
+                to_email, subject, html_content, text_content,
+                from_email=from_email, from_name=from_name, reply_to=reply_to,
+                cc=cc, bcc=bcc, smtp_host=smtp_host, smtp_port=smtp_port,
+                smtp_user=smtp_user, smtp_password=smtp_password,
             )
-
             logger.info(f"Email sent successfully to {to_email}: {subject}")
             return True
 
@@ -123,6 +83,100 @@ class EmailService:
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
             return False
 
+    async def _deliver(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None,
+        reply_to: Optional[str] = None,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+        smtp_host: Optional[str] = None,
+        smtp_port: Optional[int] = None,
+        smtp_user: Optional[str] = None,
+        smtp_password: Optional[str] = None
+    ) -> None:
+        """Build the message and send it over a pooled SMTP connection.
+        Raises on failure (the outbox needs the error to decide on a retry)."""
+        # Use override credentials if provided, otherwise use defaults
+        effective_smtp_user = smtp_user or self.smtp_user
+        effective_smtp_password = smtp_password or self.smtp_password
+        if not effective_smtp_user or not effective_smtp_password:
+            raise RuntimeError("Email service not configured")
+
+        # Create message
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = f"{from_name or self.from_name} <{from_email or self.from_email}>"
+        message["To"] = to_email
+
+        if reply_to:
+            message["Reply-To"] = reply_to
+        if cc:
+            message["Cc"] = ", ".join(cc)
+
+        # Attach text content
+        if text_content:
+            message.attach(MIMEText(text_content, "plain"))
+
+        # Attach HTML content
+        message.attach(MIMEText(html_content, "html"))
+
+        # Build recipient list
+        recipients = [to_email]
+        if cc:
+            recipients.extend(cc)
+        if bcc:
+            recipients.extend(bcc)
+
+        # Reuses a logged-in connection to this account when one is idle
+        pool = get_smtp_pool(
+            smtp_host or self.smtp_host,
+            smtp_port or self.smtp_port,
+            effective_smtp_user,
+            effective_smtp_password,
+        )
+        await pool.send(message, recipients)
+
+    async def queue_email(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        *,
+        kind: str = "general",
+        dedupe_key: Optional[str] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None,
+        reply_to: Optional[str] = None,
+    ) -> bool:
+        """
+        Put an email on the persistent outbox (sent, retried and paced by the
+        outbox flusher). Falls back to sending now when the outbox is not
+        available. A dedupe_key already on the outbox counts as queued.
+        """
+        if not self._is_configured():
+            logger.warning("Email service not configured. Skipping email send.")
+            return False
+
+        from app.services.email_outbox import enqueue_email
+
+        queued = await enqueue_email(
+            to_email, subject, html_content, text_content,
+            kind=kind, dedupe_key=dedupe_key,
+            from_email=from_email, from_name=from_name, reply_to=reply_to,
+        )
+        if queued:
+            return True
+        return await self._send_email(
+            to_email, subject, html_content, text_content,
+            from_email=from_email, from_name=from_name, reply_to=reply_to,
+        )
+
     # =====================
     # Order Emails
     # =====================
@@ -0,0 +1,76 @@
+"""
+Per-build state for AIService.
+
+AIService is a process-wide singleton, but a build leaves state behind
+that later steps of the SAME build read back:
+
+  api_call         finish_reason / truncation of the last provider call
+                   (set by every _call_<provider>)
+  extract_info     truncation diagnostics from the last HTML extraction
+  sanitizer_trace  sensitive-claim removals, asserted on by the validator
+  template_hours   structured opening hours from the template copy pass
+  on_stream_progress
+                   progress hook the provider methods feed while an HTML
+                   response streams in (see app.services.llm_stream)
+  image_scheduler  the build's ImageScheduler, closed when the build ends
+                   (see app.services.image_scheduler)
+
+These used to be plain attributes on the service, so two builds awaited
+concurrently on one event loop read each other's truncation flags and
+sanitizer traces. They now live on a GenerationContext that
+generate_website / generate_multi_style open per call. The context is held
+in a ContextVar (the same approach as app.production.query_profiler), so
+it follows the build through every await, asyncio.wait_for / gather task
+and to_thread call without being passed by hand, and concurrent builds
+never see each other's state.
+
+Code running outside any build (a direct _call_glm from a script or a
+test) falls back to a context owned by the service instance — the old
+behaviour.
+"""
+
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+
+def empty_api_call() -> Dict[str, Any]:
+    return {"provider": None, "finish_reason": None, "truncated": False}
+
+
+def empty_extract_info() -> Dict[str, Any]:
+    return {"was_truncated": False, "unclosed_tags": [], "tail": ""}
+
+
+@dataclass
+class GenerationContext:
+    """Mutable state of one website build (see module docstring)."""
+
+    build_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    api_call: Dict[str, Any] = field(default_factory=empty_api_call)
+    extract_info: Dict[str, Any] = field(default_factory=empty_extract_info)
+    sanitizer_trace: List[Dict[str, str]] = field(default_factory=list)
+    template_hours: list = field(default_factory=list)
+    on_stream_progress: Optional[Callable[[Any], Awaitable[None]]] = None
+    image_scheduler: Optional[Any] = None
+
+
+_current: ContextVar[Optional[GenerationContext]] = ContextVar("generation_context", default=None)
+
+
+def current_generation() -> Optional[GenerationContext]:
+    """The build being generated in this task, or None outside a build."""
+    return _current.get()
+
+
+@contextmanager
+def generation_scope(ctx: Optional[GenerationContext] = None) -> Iterator[GenerationContext]:
+    """Make `ctx` (or a fresh context) current for the enclosed build."""
+    ctx = ctx or GenerationContext()
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
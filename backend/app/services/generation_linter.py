@@ -32,6 +32,8 @@ from typing import Dict, List, Tuple
 
 from loguru import logger
 
+from app.services.html_transform import HtmlTransform, Rewriter
+
 
 # =============================================================================
 # Font Awesome free-6.x whitelist
@@ -285,75 +287,101 @@ def _is_known_free_glyph(glyph: str) -> bool:
 _CLASS_ATTR_RE = re.compile(r'class\s*=\s*(["\'])(.*?)\1', re.DOTALL)
 
 
-def _rewrite_fa_glyphs(html: str, decide) -> Tuple[str, List[Tuple[str, str]]]:
-    """Shared class-attribute glyph rewriter.
+_FA_MARKERS = {"fa", "fas", "far", "fab", "fal", "fat", "fad"}
+
+
+def _fa_class_repl(*stages):
+    """_CLASS_ATTR_RE repl shared by the glyph passes.
 
-    `decide(glyph)` returns the replacement glyph name (without the `fa-`
-    prefix) or None to leave the token untouched. Style prefixes (fa-solid),
+    Each stage is (decide, replacements): `decide(glyph)` returns the
+    replacement glyph name (without the `fa-` prefix) or None to leave the
+    token untouched, and each rewrite is appended to `replacements` as
+    (old, new). Stages run in order on every glyph token, so two stages in
+    one repl give the same result as two passes. Style prefixes (fa-solid),
     sizing (fa-2x), and animation (fa-spin) modifiers are never passed to
-    `decide`. Returns (new_html, [(old_glyph, new_glyph), ...]).
+    `decide`.
     """
-    replacements: List[Tuple[str, str]] = []
 
     def _fix_class_value(match: re.Match) -> str:
-        quote = match.group(1)
         value = match.group(2)
         # An element only carries a glyph if it also carries a fa style family
         # or the bare `fa`/`fas`/`far`/`fab` marker. Cheap guard to avoid
         # touching class lists that merely contain a false "fa-" token.
+        if "fa" not in value:
+            return match.group(0)
         tokens = value.split()
-        has_fa_marker = any(
-            t in ("fa", "fas", "far", "fab", "fal", "fat", "fad")
-            or t in ("fa-solid", "fa-regular", "fa-brands", "fa-light", "fa-thin", "fa-duotone", "fa-sharp")
-            for t in tokens
-        )
-        if not has_fa_marker and not any(t.startswith("fa-") for t in tokens):
+        if not (_FA_MARKERS.intersection(tokens) or any(t.startswith("fa-") for t in tokens)):
             return match.group(0)
 
         new_tokens: List[str] = []
         for tok in tokens:
             m = _FA_TOKEN_RE.fullmatch(tok)
-            if not m:
-                new_tokens.append(tok)
-                continue
-            glyph = m.group(1)
-            if glyph in _FA_NON_GLYPH_TOKENS:
-                new_tokens.append(tok)
-                continue
-            replacement = decide(glyph)
-            if replacement is None:
-                new_tokens.append(tok)
-                continue
-            new_tokens.append(f"fa-{replacement}")
-            replacements.append((glyph, replacement))
-        return f"class={quote}{' '.join(new_tokens)}{quote}"
-
-    return _CLASS_ATTR_RE.sub(_fix_class_value, html), replacements
+            if m and m.group(1) not in _FA_NON_GLYPH_TOKENS:
+                for decide, replacements in stages:
+                    glyph = tok[3:]
+                    replacement = decide(glyph)
+                    if replacement is not None:
+                        tok = f"fa-{replacement}"
+                        replacements.append((glyph, replacement))
+            new_tokens.append(tok)
+        return f"class={match.group(1)}{' '.join(new_tokens)}{match.group(1)}"
 
+    return _fix_class_value
 
-def lint_fontawesome_icons(html: str, context: str = "") -> Tuple[str, List[Tuple[str, str]]]:
-    """
-    Replace unknown / Pro-only Font Awesome glyph classes with a free fallback.
 
-    Only tokens that look like glyph names are considered — style prefixes
-    (fa-solid), sizing (fa-2x), and animation (fa-spin) modifiers are skipped.
-    Returns (new_html, [(old_glyph, new_glyph), ...]).
-    """
-    if not html:
-        return html, []
+def _rewrite_fa_glyphs(html: str, decide) -> Tuple[str, List[Tuple[str, str]]]:
+    """Shared class-attribute glyph rewriter (see _fa_class_repl).
+    Returns (new_html, [(old_glyph, new_glyph), ...])."""
+    replacements: List[Tuple[str, str]] = []
+    return _CLASS_ATTR_RE.sub(_fa_class_repl((decide, replacements)), html), replacements
 
+
+def _unknown_glyph_decider(context: str):
     fallback = _pick_fallback(context)
+    return fallback, lambda glyph: None if _is_known_free_glyph(glyph) else fallback
+
+
+def _food_glyph_decider(context: str):
+    neutral = _pick_nonfood_neutral(context)
+    return neutral, lambda glyph: neutral if glyph in _FOOD_GLYPHS else None
+
 
-    def _decide(glyph: str):
-        return None if _is_known_free_glyph(glyph) else fallback
+def _is_food_business(business_type: str) -> bool:
+    btype = (business_type or "").strip().lower()
+    return not btype or btype in _FOOD_BUSINESS_TYPES
 
-    new_html, replacements = _rewrite_fa_glyphs(html, _decide)
 
+def _log_fa(replacements: List[Tuple[str, str]], fallback: str) -> None:
     if replacements:
         logger.info(
             f"🔤 FA linter replaced {len(replacements)} unknown/Pro icon(s) "
             f"with fa-{fallback}: {[r[0] for r in replacements]}"
         )
+
+
+def _log_food_bias(replacements: List[Tuple[str, str]], business_type: str, neutral: str) -> None:
+    if replacements:
+        logger.info(
+            f"🍽️→🧹 Food-icon bias pass replaced {len(replacements)} food "
+            f"glyph(s) on a '{business_type.strip().lower()}' business with fa-{neutral}: "
+            f"{[r[0] for r in replacements]}"
+        )
+
+
+def lint_fontawesome_icons(html: str, context: str = "") -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Replace unknown / Pro-only Font Awesome glyph classes with a free fallback.
+
+    Only tokens that look like glyph names are considered — style prefixes
+    (fa-solid), sizing (fa-2x), and animation (fa-spin) modifiers are skipped.
+    Returns (new_html, [(old_glyph, new_glyph), ...]).
+    """
+    if not html:
+        return html, []
+
+    fallback, decide = _unknown_glyph_decider(context)
+    new_html, replacements = _rewrite_fa_glyphs(html, decide)
+    _log_fa(replacements, fallback)
     return new_html, replacements
 
 
@@ -378,23 +406,12 @@ def lint_food_icon_bias(
     """
     if not html:
         return html, []
-    btype = (business_type or "").strip().lower()
-    if not btype or btype in _FOOD_BUSINESS_TYPES:
+    if _is_food_business(business_type):
         return html, []
 
-    neutral = _pick_nonfood_neutral(context)
-
-    def _decide(glyph: str):
-        return neutral if glyph in _FOOD_GLYPHS else None
-
-    new_html, replacements = _rewrite_fa_glyphs(html, _decide)
-
-    if replacements:
-        logger.info(
-            f"🍽️→🧹 Food-icon bias pass replaced {len(replacements)} food "
-            f"glyph(s) on a '{btype}' business with fa-{neutral}: "
-            f"{[r[0] for r in replacements]}"
-        )
+    neutral, decide = _food_glyph_decider(context)
+    new_html, replacements = _rewrite_fa_glyphs(html, decide)
+    _log_food_bias(replacements, business_type, neutral)
     return new_html, replacements
 
 
@@ -442,7 +459,7 @@ def _format_decimal(value: float) -> str:
     return s if s else "0"
 
 
-def _rewrite_opacity(html: str, rewrites: List[Tuple[str, str]]) -> str:
+def _opacity_repl(rewrites: List[Tuple[str, str]]):
     def repl(m: re.Match) -> str:
         op = int(m.group("op"))
         if op in _VALID_OPACITY or op > 100:
@@ -451,20 +468,21 @@ def _rewrite_opacity(html: str, rewrites: List[Tuple[str, str]]) -> str:
         rewrites.append((m.group(0), new))
         return new
 
-    return _OPACITY_RE.sub(repl, html)
+    return repl
 
 
-def _rewrite_spacing(html: str, rewrites: List[Tuple[str, str]]) -> str:
-    # Build one alternation ordered longest-first so `inset-x` wins over `inset`.
-    prefixes = sorted(_SPACING_PREFIXES, key=len, reverse=True)
-    alt = "|".join(re.escape(p) for p in prefixes)
-    # Optional leading `-` for negative utilities. Value is a bare integer or
-    # half-step. Trailing boundary rejects fractions (w-1/2), arbitrary values
-    # (right-[..]) and further identifier chars.
-    pattern = re.compile(
-        rf"(?<![\w-])(?P<neg>-)?(?P<prefix>{alt})-(?P<val>\d+(?:\.\d+)?)(?![\w./\[-])"
-    )
+# One alternation ordered longest-first so `inset-x` wins over `inset`.
+# Optional leading `-` for negative utilities. Value is a bare integer or
+# half-step. Trailing boundary rejects fractions (w-1/2), arbitrary values
+# (right-[..]) and further identifier chars.
+_SPACING_RE = re.compile(
+    r"(?<![\w-])(?P<neg>-)?(?P<prefix>"
+    + "|".join(re.escape(p) for p in sorted(_SPACING_PREFIXES, key=len, reverse=True))
+    + r")-(?P<val>\d+(?:\.\d+)?)(?![\w./\[-])"
+)
+
 
+def _spacing_repl(rewrites: List[Tuple[str, str]]):
     def repl(m: re.Match) -> str:
         raw = m.group("val")
         try:
@@ -490,7 +508,23 @@ def _rewrite_spacing(html: str, rewrites: List[Tuple[str, str]]) -> str:
         rewrites.append((m.group(0), new))
         return new
 
-    return pattern.sub(repl, html)
+    return repl
+
+
+def _rewrite_opacity(html: str, rewrites: List[Tuple[str, str]]) -> str:
+    return _OPACITY_RE.sub(_opacity_repl(rewrites), html)
+
+
+def _rewrite_spacing(html: str, rewrites: List[Tuple[str, str]]) -> str:
+    return _SPACING_RE.sub(_spacing_repl(rewrites), html)
+
+
+def _log_tailwind(rewrites: List[Tuple[str, str]]) -> None:
+    if rewrites:
+        logger.info(
+            f"🎨 Tailwind linter rewrote {len(rewrites)} out-of-scale class(es): "
+            f"{[r[0] + '→' + r[1] for r in rewrites[:8]]}"
+        )
 
 
 def lint_tailwind_classes(html: str) -> Tuple[str, List[Tuple[str, str]]]:
@@ -503,14 +537,30 @@ def lint_tailwind_classes(html: str) -> Tuple[str, List[Tuple[str, str]]]:
     rewrites: List[Tuple[str, str]] = []
     html = _rewrite_opacity(html, rewrites)
     html = _rewrite_spacing(html, rewrites)
-    if rewrites:
-        logger.info(
-            f"🎨 Tailwind linter rewrote {len(rewrites)} out-of-scale class(es): "
-            f"{[r[0] + '→' + r[1] for r in rewrites[:8]]}"
-        )
+    _log_tailwind(rewrites)
     return html, rewrites
 
 
+_TYPO_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in MALAY_TYPO_FIXES) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def _typo_repl(fixes: List[Tuple[str, str]]):
+    def _repl(m: "re.Match") -> str:
+        word = m.group(1)
+        fixed = MALAY_TYPO_FIXES[word.lower()]
+        if word[:1].isupper():
+            fixed = fixed[:1].upper() + fixed[1:]
+        if word.isupper():
+            fixed = fixed.upper()
+        fixes.append((word, fixed))
+        return fixed
+
+    return _repl
+
+
 def lint_malay_typos(html: str) -> Tuple[str, List[Tuple[str, str]]]:
     """Correct known Malay misspellings in VISIBLE TEXT only.
 
@@ -523,39 +573,33 @@ def lint_malay_typos(html: str) -> Tuple[str, List[Tuple[str, str]]]:
         return html, []
 
     fixes: List[Tuple[str, str]] = []
-    pattern = re.compile(
-        r"\b(" + "|".join(re.escape(k) for k in MALAY_TYPO_FIXES) + r")\b",
-        re.IGNORECASE,
-    )
-
     # Split into markup / text / raw-block runs and only rewrite text runs.
-    parts = re.split(r"(<script\b[^>]*>.*?</script>|<style\b[^>]*>.*?</style>|<[^>]+>)",
-                     html, flags=re.IGNORECASE | re.DOTALL)
+    html = Rewriter("typos", _TYPO_RE, _typo_repl(fixes), text_only=True).apply(html)
+    return html, fixes
 
-    def _repl(m: "re.Match") -> str:
-        word = m.group(1)
-        fixed = MALAY_TYPO_FIXES[word.lower()]
-        if word[:1].isupper():
-            fixed = fixed[:1].upper() + fixed[1:]
-        if word.isupper():
-            fixed = fixed.upper()
-        fixes.append((word, fixed))
-        return fixed
 
-    out = []
-    for i, part in enumerate(parts):
-        # Odd indices are the captured separators (markup / raw blocks).
-        out.append(part if i % 2 else pattern.sub(_repl, part))
-    return "".join(out), fixes
+# wa.me/ followed by a phone-ish segment (digits, +, spaces, dashes) up to
+# the query string, fragment, quote, or whitespace. See
+# AIService._normalize_wa_links.
+WA_PHONE_RE = re.compile(r"wa\.me/(?P<phone>[+\d][\d\s\-+]*)")
+
+
+def wa_digits_repl(m: "re.Match") -> str:
+    digits = re.sub(r"\D", "", m.group("phone"))
+    return f"wa.me/{digits}"
 
 
 def lint_html(
-    html: str, context: str = "", business_type: str = ""
+    html: str, context: str = "", business_type: str = "", wa_links: bool = False
 ) -> Tuple[str, LintReport]:
     """
     Run all post-generation linters. Safe to call on already-clean HTML
     (returns it unchanged with an empty report).
 
+    The passes run as rewriters of one HtmlTransform (app.services.html_transform):
+    the page is split into tag / text / script runs once and joined once,
+    with output identical to running them one after another.
+
     Args:
         html: generated HTML
         context: business name/description/type — used to pick a sensible
@@ -563,16 +607,39 @@ def lint_html(
         business_type: detected business type (detect_business_type). When
                  provided and not F&B, the food-icon bias pass strips
                  food/drink glyphs the model shouldn't have used.
+        wa_links: first normalize every wa.me/ phone segment to bare digits
+                 (AIService._normalize_wa_links) in the same pass.
     """
     report = LintReport()
     if not html:
         return html, report
-    html, report.fa_replacements = lint_fontawesome_icons(html, context)
-    # After the unknown-glyph pass, so any food-flavoured fallback it may
+
+    opacity: List[Tuple[str, str]] = []
+    spacing: List[Tuple[str, str]] = []
+    transform = HtmlTransform()
+    if wa_links:
+        transform.add("wa_links", WA_PHONE_RE, wa_digits_repl, needles=("wa.me/",))
+    fallback, decide = _unknown_glyph_decider(context)
+    glyph_stages = [(decide, report.fa_replacements)]
+    # After the unknown-glyph stage, so any food-flavoured fallback it may
     # have introduced is corrected too.
-    html, report.food_icon_replacements = lint_food_icon_bias(
-        html, business_type, context
+    food_bias = not _is_food_business(business_type)
+    if food_bias:
+        neutral, decide_food = _food_glyph_decider(context)
+        glyph_stages.append((decide_food, report.food_icon_replacements))
+    transform.add(
+        "fa_glyphs", _CLASS_ATTR_RE, _fa_class_repl(*glyph_stages),
+        needles=("class", "fa"), guard=True,
     )
-    html, report.tw_rewrites = lint_tailwind_classes(html)
-    html, report.typo_fixes = lint_malay_typos(html)
+    transform.add("tw_opacity", _OPACITY_RE, _opacity_repl(opacity), needles=("-", "/"))
+    transform.add("tw_spacing", _SPACING_RE, _spacing_repl(spacing), needles=("-",))
+    transform.add("typos", _TYPO_RE, _typo_repl(report.typo_fixes), text_only=True)
+
+    html = transform.run(html)
+
+    report.tw_rewrites = opacity + spacing
+    _log_fa(report.fa_replacements, fallback)
+    if food_bias:
+        _log_food_bias(report.food_icon_replacements, business_type, neutral)
+    _log_tailwind(report.tw_rewrites)
     return html, report
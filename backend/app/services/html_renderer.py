@@ -4,24 +4,60 @@ V2 HTML Renderer — converts a PageRecipe into a complete HTML page.
 This is the final stage of the pipeline. It is deterministic (no AI).
 Each component has an HTML template method that produces its markup.
 The renderer stitches them together with the nav, theme CSS, and scripts.
+
+Because it is deterministic, every fragment is memoized in a process-wide
+LRU (HTML_FRAGMENT_CACHE_ENTRIES) keyed on a hash of exactly the inputs
+that fragment reads:
+
+  section   component name, section id, reveal delay, props
+  nav       nav config + the theme's nav classes
+  theme     theme tokens + animation tokens (the :root CSS block)
+  tailwind  tailwind config
+
+Component templates only reference the theme through CSS custom properties
+(var(--color-primary) ...), so a theme-only edit re-renders the CSS block
+and reuses every section; a one-section edit in the design studio
+re-renders that section alone. render_html then reassembles the page from
+cached fragments. Lookups are reported as
+cache_lookups_total{cache="html_fragment:<kind>"}.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
-from typing import Any, Dict
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict
 
+from app.production.instrumentation import record_cache
 from app.schemas.recipe import PageRecipe, RenderedSection, NavConfig, ThemeTokens
 
+HTML_FRAGMENT_CACHE_ENTRIES = int(os.getenv("HTML_FRAGMENT_CACHE_ENTRIES", "2048"))
+
+_FRAGMENTS: "OrderedDict[str, str]" = OrderedDict()
+
 
 def render_html(recipe: PageRecipe) -> str:
     """Render a PageRecipe into a complete, self-contained HTML string."""
-    css_vars = _theme_to_css(recipe.theme, recipe.animation_tokens)
-    tw_config_script = _tailwind_config_script(recipe)
+    css_vars = _fragment(
+        "theme",
+        (recipe.theme.model_dump(mode="json"), recipe.animation_tokens),
+        lambda: _theme_to_css(recipe.theme, recipe.animation_tokens),
+    )
+    tw_config_script = _fragment(
+        "tailwind",
+        recipe.tailwind_config.theme if recipe.tailwind_config else None,
+        lambda: _tailwind_config_script(recipe),
+    )
     head_links = _head_links(recipe)
-    nav_html = _render_nav(recipe.nav, recipe.theme)
+    nav_html = _fragment(
+        "nav",
+        (recipe.nav.model_dump(mode="json"), recipe.theme.component_styles.nav),
+        lambda: _render_nav(recipe.nav, recipe.theme),
+    )
     sections_html = "\n\n".join(
-        _render_section(s) for s in recipe.sections
+        render_section(s) for s in recipe.sections
     )
     body_scripts = _body_scripts(recipe)
     reveal_script = _reveal_script()
@@ -55,6 +91,40 @@ def render_html(recipe: PageRecipe) -> str:
 </html>"""
 
 
+# ---------------------------------------------------------------------------
+# Fragment cache
+# ---------------------------------------------------------------------------
+
+def _fragment(kind: str, inputs: Any, render: Callable[[], str]) -> str:
+    """Return the cached fragment for (kind, inputs), rendering on a miss."""
+    payload = json.dumps([kind, inputs], sort_keys=True, ensure_ascii=False, default=str)
+    key = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    html = _FRAGMENTS.get(key)
+    if html is not None:
+        _FRAGMENTS.move_to_end(key)
+        record_cache(f"html_fragment:{kind}", "hit")
+        return html
+    record_cache(f"html_fragment:{kind}", "miss")
+    html = render()
+    _FRAGMENTS[key] = html
+    while len(_FRAGMENTS) > HTML_FRAGMENT_CACHE_ENTRIES:
+        _FRAGMENTS.popitem(last=False)
+    return html
+
+
+def render_section(section: RenderedSection) -> str:
+    """One section's wrapped markup, memoized on the inputs it reads."""
+    return _fragment(
+        "section",
+        (section.component, section.id, section.animation.delay, section.props),
+        lambda: _render_section(section),
+    )
+
+
+def clear_render_cache() -> None:
+    _FRAGMENTS.clear()
+
+
 # ---------------------------------------------------------------------------
 # Theme → CSS custom properties
 # ---------------------------------------------------------------------------
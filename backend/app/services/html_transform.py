@@ -0,0 +1,122 @@
+"""
+Single-pass runner for token-local HTML rewrites.
+
+Post-generation clean-up used to be a chain of whole-document regex passes
+(wa.me normalization, Font Awesome glyphs, food-icon bias, Tailwind opacity,
+Tailwind spacing, Malay typos). Each pass scans the full 50–150KB page and
+copies it again. None of their matches can contain '<' or '>', so every
+match lies inside one run of the document:
+
+  tag    <...>                    (markup: attributes, class lists)
+  raw    <script>...</script>, <style>...</style>
+  text   everything between tags
+
+HtmlTransform splits the page into those runs ONCE, runs each registered
+rewriter over the runs in registration order, and joins ONCE. A run is
+only handed to a rewriter when it contains all of the rewriter's
+`needles`, substrings every match must contain, and whitespace-only runs
+(indentation between tags) are skipped outright — no rewriter's pattern
+matches pure whitespace. That is where most of the CPU time is
+saved: most runs skip most rewriters.
+
+The result is identical to applying the rewriters one after another to the
+whole document, because a rewriter never adds or removes '<' or '>' and so
+never moves a run boundary. One pattern can reach past a run: the quoted
+class="..." attribute, if a quote is left open. A rewriter registered with
+`guard=True` first checks that none of its whole-document matches contains
+'<' or '>'. If one does, run() falls back to the whole-document passes, so
+the output never depends on which path ran.
+
+Structural passes (html_repair, gallery_normalizer) and the image fixers,
+which look at context across tags, are not run here.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+# Same split the Malay-typo pass has always used: raw blocks first so their
+# bodies stay whole, then any single tag.
+_RUN_RE = re.compile(
+    r"(<script\b[^>]*>.*?</script>|<style\b[^>]*>.*?</style>|<[^>]+>)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@dataclass
+class Rewriter:
+    name: str
+    pattern: "re.Pattern[str]"
+    repl: Callable[["re.Match[str]"], str]
+    needles: Tuple[str, ...] = ()
+    text_only: bool = False
+    guard: bool = False
+
+    def visit(self, run: str) -> str:
+        for needle in self.needles:
+            if needle not in run:
+                return run
+        return self.pattern.sub(self.repl, run)
+
+    def apply(self, html: str) -> str:
+        """The same rewrite as a whole-document pass."""
+        if not self.text_only:
+            return self.pattern.sub(self.repl, html)
+        parts = _RUN_RE.split(html)
+        return "".join(
+            part if i % 2 else self.pattern.sub(self.repl, part) for i, part in enumerate(parts)
+        )
+
+    def is_local(self, html: str) -> bool:
+        """No whole-document match of the pattern crosses a run boundary."""
+        for match in self.pattern.finditer(html):
+            text = match.group(0)
+            if "<" in text or ">" in text:
+                return False
+        return True
+
+
+class HtmlTransform:
+    """Ordered rewriters applied in one split/join of the document."""
+
+    def __init__(self) -> None:
+        self.rewriters: List[Rewriter] = []
+
+    def add(
+        self,
+        name: str,
+        pattern: "re.Pattern[str]",
+        repl: Callable[["re.Match[str]"], str],
+        *,
+        needles: Tuple[str, ...] = (),
+        text_only: bool = False,
+        guard: bool = False,
+    ) -> "HtmlTransform":
+        """Register a rewriter. `needles` are substrings every match
+        contains (runs lacking one are skipped); `guard` marks a pattern
+        that could match across runs, checked before the single pass."""
+        self.rewriters.append(Rewriter(name, pattern, repl, needles, text_only, guard))
+        return self
+
+    def run(self, html: str) -> str:
+        """Apply every rewriter, in one pass when the guards allow it."""
+        if not html or not self.rewriters:
+            return html
+        if all(r.is_local(html) for r in self.rewriters if r.guard):
+            return self._single_pass(html)
+        for rewriter in self.rewriters:
+            html = rewriter.apply(html)
+        return html
+
+    def _single_pass(self, html: str) -> str:
+        parts = _RUN_RE.split(html)
+        everywhere = [r for r in self.rewriters if not r.text_only]
+        for i, part in enumerate(parts):
+            if not part or part.isspace():
+                continue
+            for rewriter in everywhere if i % 2 else self.rewriters:
+                part = rewriter.visit(part)
+            parts[i] = part
+        return "".join(parts)
@@ -0,0 +1,155 @@
+"""
+Build-wide image scheduler (AI_IMAGE_SCHEDULER).
+
+Without it, one build generates images in two unrelated phases: the
+hero/gallery auto-fill (its own asyncio.gather, finished BEFORE the HTML
+prompt is built) and the food-image post-pass (another gather behind a
+hardcoded Semaphore(4)). With IMAGE_PROVIDER=zai every image then queues on
+the Z.ai lease, and Stability is only tried after a Z.ai attempt
+has failed — so five images cost five serialized Z.ai calls.
+
+One ImageScheduler per build owns the provider lanes instead:
+
+  zai        the provider-wide Z.ai lease + request spacing + per-build
+             phase budget (AIService._generate_zai_image_serialized)
+  stability  IMAGE_STABILITY_CONCURRENCY concurrent calls for this build
+
+and dispatches each job as it arrives:
+
+  - IMAGE_PROVIDER=stability: straight to the Stability lane.
+  - IMAGE_PROVIDER=zai: to Z.ai while its lane is free; if the lane is
+    already busy and Stability has a free slot, the job OVERFLOWS to
+    Stability at once instead of waiting out the Z.ai queue. A Z.ai failure
+    still falls back to Stability, as before.
+
+Auto-fill jobs are submitted before the HTML prompt is built and the prompt
+carries placeholder URLs (PendingImages), so the images generate while the
+model writes the page; the placeholders are swapped for the real URLs when
+the HTML comes back. Food-pass jobs go to the same lanes, so both passes
+share one concurrency budget. The scheduler is stored on the build's
+GenerationContext and closed when the build ends, cancelling anything a
+failed build left in flight.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+
+from app.production.provider_governor import get_provider_governor
+
+IMAGE_STABILITY_CONCURRENCY = int(os.getenv("IMAGE_STABILITY_CONCURRENCY", "4"))
+
+# Placeholder image URLs in the HTML prompt while auto-fill images are still
+# generating. Shaped like a real Cloudinary URL so the model copies it
+# verbatim and no image post-pass mistakes it for stock imagery.
+_PLACEHOLDER_URL = "https://res.cloudinary.com/binaapp/image/upload/pending/{build}-{slot}.jpg"
+
+
+class ImageScheduler:
+    """Dispatches one build's image jobs across provider lanes."""
+
+    def __init__(
+        self,
+        service: Any,
+        provider: str,
+        zai_phase: Optional[Dict] = None,
+        stability_concurrency: Optional[int] = None,
+    ):
+        self._service = service
+        self.provider = provider
+        self._zai_phase = zai_phase
+        self._stability = asyncio.Semaphore(stability_concurrency or IMAGE_STABILITY_CONCURRENCY)
+        self._zai_waiting = 0
+        self._tasks: Set["asyncio.Task"] = set()
+        self.stats: Dict[str, int] = {"zai": 0, "stability": 0, "overflow": 0, "failed": 0}
+
+    def submit(self, prompt: str, *, food: bool = True, doodle: bool = False) -> "asyncio.Task":
+        """Start a job now; the task resolves to a URL or None, never raises."""
+        task = asyncio.ensure_future(self.generate(prompt, food=food, doodle=doodle))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _zai_busy(self) -> bool:
+        return self._zai_waiting > 0 or get_provider_governor().busy("zai")
+
+    async def generate(self, prompt: str, *, food: bool = True, doodle: bool = False) -> Optional[str]:
+        service = self._service
+        try:
+            if self.provider == "zai":
+                has_stability = bool(service.stability_api_key)
+                if has_stability and self._zai_busy() and not self._stability.locked():
+                    self.stats["overflow"] += 1
+                    return await self._stability_lane(prompt, food, doodle, "stability (overflow)")
+                url = await self._zai_lane(prompt, food, doodle)
+                if url or not has_stability:
+                    return url
+                logger.warning("🎨 Z.ai image failed/skipped — falling back to Stability")
+                return await self._stability_lane(prompt, food, doodle, "stability (fallback)")
+            return await self._stability_lane(prompt, food, doodle, "stability")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"🎨 Scheduled image failed: {e}")
+            self.stats["failed"] += 1
+            return None
+
+    async def _zai_lane(self, prompt: str, food: bool, doodle: bool) -> Optional[str]:
+        service = self._service
+        self._zai_waiting += 1
+        try:
+            url = await service._generate_zai_image_serialized(
+                service._shape_image_prompt(prompt, food, doodle), self._zai_phase
+            )
+        finally:
+            self._zai_waiting -= 1
+        if url:
+            self.stats["zai"] += 1
+            logger.info(f"🖼️ Image served by provider=zai: {url[:60]}...")
+        return url
+
+    async def _stability_lane(self, prompt: str, food: bool, doodle: bool, label: str) -> Optional[str]:
+        async with self._stability:
+            url = await self._service._generate_stability_image(prompt, food=food, doodle=doodle)
+        if url:
+            self.stats["stability"] += 1
+            logger.info(f"🖼️ Image served by provider={label}: {url[:60]}...")
+        else:
+            self.stats["failed"] += 1
+        return url
+
+    async def aclose(self) -> None:
+        """Cancel jobs still in flight (a build that failed or returned early)."""
+        pending = [t for t in self._tasks if not t.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"🖼️ Image scheduler cancelled {len(pending)} unfinished image(s)")
+        if any(self.stats.values()):
+            logger.info(f"🖼️ Image scheduler: {self.stats}")
+
+
+@dataclass
+class PendingImages:
+    """Auto-fill jobs running behind placeholder URLs.
+
+    `work` is the auto-fill plan — (slot_key, item_name, prompt) tuples —
+    and `tasks[i]` generates work[i]'s image.
+    """
+
+    build_id: str
+    work: List[tuple]
+    tasks: List["asyncio.Task"]
+    cap: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def placeholder(self, slot_key: str) -> str:
+        return _PLACEHOLDER_URL.format(build=self.build_id, slot=slot_key)
+
+    async def results(self) -> List[Optional[str]]:
+        return list(await asyncio.gather(*self.tasks, return_exceptions=True))
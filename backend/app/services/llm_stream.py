@@ -0,0 +1,215 @@
+"""
+Chat-completion transport for the HTML providers (GLM, DeepSeek, Qwen).
+
+All three speak the OpenAI-compatible /chat/completions API. Without
+streaming, a build waits for the whole page (often 30-50K chars) before it
+learns anything: progress sits at one number for minutes, an output-cap hit
+shows up only in the final finish_reason, and a provider that is too slow
+to finish is only abandoned when the caller's asyncio.wait_for fires.
+
+With `stream=True` the response is consumed as server-sent chunks instead,
+which allows:
+
+  progress   on_progress(StreamProgress) fires at most every
+             STREAM_PROGRESS_INTERVAL_SECONDS with the chars and <section>s
+             received so far
+  html_closed  once '</html>' arrives the stream is closed — anything after
+             it is commentary that _extract_html would discard anyway, and
+             closing early stops the provider billing for it
+  runaway    past `max_chars` the output is degenerate (a repetition loop);
+             it is cut there and reported as finish_reason='length', exactly
+             like a provider cap hit, so the existing truncation handling runs
+  deadline   after STREAM_MIN_PROJECTION_SECONDS, the observed rate projects
+             when a typical page (STREAM_EXPECTED_CHARS) would finish; if
+             that is well past `deadline` the stream is abandoned so the
+             fallback provider starts now instead of at the timeout
+
+Non-streaming calls go through the same function so every provider method
+has one response shape to handle.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from loguru import logger
+
+STREAM_PROGRESS_INTERVAL_SECONDS = float(os.getenv("AI_STREAM_PROGRESS_INTERVAL_SECONDS", "1.5"))
+# A typical generated page; the deadline projection measures against this.
+STREAM_EXPECTED_CHARS = int(os.getenv("AI_STREAM_EXPECTED_CHARS", "30000"))
+# Output past this is never a real page (the largest legitimate sites are
+# ~50K chars) — it is a model stuck in a loop.
+STREAM_MAX_CHARS = int(os.getenv("AI_STREAM_MAX_CHARS", "120000"))
+# No projection before this much streaming: early rates are noisy.
+STREAM_MIN_PROJECTION_SECONDS = float(os.getenv("AI_STREAM_MIN_PROJECTION_SECONDS", "20"))
+# "Clearly unreachable": the projected finish overshoots the budget by this factor.
+STREAM_DEADLINE_SLACK = float(os.getenv("AI_STREAM_DEADLINE_SLACK", "1.25"))
+
+HTML_CLOSED = "html_closed"
+RUNAWAY = "runaway"
+DEADLINE = "deadline"
+
+
+@dataclass
+class StreamProgress:
+    provider: str
+    chars: int
+    sections: int
+    elapsed: float
+    done: bool = False
+
+
+@dataclass
+class ChatCompletion:
+    """One provider response, streamed or not."""
+
+    status_code: int
+    content: str = ""
+    finish_reason: Optional[str] = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    error_body: str = ""
+    # Set when the stream was cut short: HTML_CLOSED | RUNAWAY | DEADLINE.
+    stopped: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+
+ProgressHook = Callable[[StreamProgress], Awaitable[None]]
+
+
+def deadline_unreachable(
+    chars: int, streaming_seconds: float, started: float, now: float, deadline: float
+) -> bool:
+    """True when the current rate cannot finish a typical page in time."""
+    if streaming_seconds <= 0 or streaming_seconds < STREAM_MIN_PROJECTION_SECONDS or chars <= 0:
+        return False
+    rate = chars / streaming_seconds
+    remaining = max(STREAM_EXPECTED_CHARS - chars, STREAM_EXPECTED_CHARS * 0.1)
+    projected_end = now + remaining / rate
+    return projected_end - started > (deadline - started) * STREAM_DEADLINE_SLACK
+
+
+async def _emit(on_progress: Optional[ProgressHook], progress: StreamProgress) -> None:
+    if on_progress is None:
+        return
+    try:
+        await on_progress(progress)
+    except Exception as e:
+        logger.warning(f"Stream progress callback failed: {e}")
+
+
+async def post_chat_completion(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    headers: Dict[str, str],
+    body: Dict[str, Any],
+    provider: str,
+    stream: bool = False,
+    deadline: Optional[float] = None,
+    max_chars: Optional[int] = None,
+    on_progress: Optional[ProgressHook] = None,
+) -> ChatCompletion:
+    """POST a chat completion; `deadline` is a time.monotonic() instant.
+
+    Transport errors (httpx.TimeoutException, ConnectError) propagate —
+    the provider methods already log and meter them.
+    """
+    if not stream:
+        r = await client.post(url, headers=headers, json=body)
+        if r.status_code != 200:
+            try:
+                error_body = r.text[:500]
+            except Exception:
+                error_body = "(unable to read response)"
+            return ChatCompletion(r.status_code, error_body=error_body)
+        payload = r.json()
+        choice = (payload.get("choices") or [{}])[0]
+        return ChatCompletion(
+            200,
+            content=(choice.get("message") or {}).get("content", "") or "",
+            finish_reason=choice.get("finish_reason"),
+            usage=payload.get("usage") or {},
+        )
+
+    max_chars = max_chars or STREAM_MAX_CHARS
+    started = time.monotonic()
+    first_token_at: Optional[float] = None
+    next_progress = started + STREAM_PROGRESS_INTERVAL_SECONDS
+    parts: list = []
+    chars = 0
+    tail = ""
+    result = ChatCompletion(200)
+    stream_body = {**body, "stream": True, "stream_options": {"include_usage": True}}
+
+    async with client.stream("POST", url, headers=headers, json=stream_body) as r:
+        if r.status_code != 200:
+            try:
+                error_body = (await r.aread()).decode("utf-8", "replace")[:500]
+            except Exception:
+                error_body = "(unable to read response)"
+            return ChatCompletion(r.status_code, error_body=error_body)
+
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            if chunk.get("usage"):
+                result.usage = chunk["usage"]
+            choice = (chunk.get("choices") or [{}])[0]
+            if choice.get("finish_reason"):
+                result.finish_reason = choice["finish_reason"]
+            piece = (choice.get("delta") or {}).get("content") or ""
+            if not piece:
+                continue
+
+            now = time.monotonic()
+            if first_token_at is None:
+                first_token_at = now
+            parts.append(piece)
+            chars += len(piece)
+            # '</html>' may straddle two chunks; keep a short overlap.
+            window = tail + piece
+            tail = window[-6:]
+
+            if "</html>" in window.lower():
+                result.stopped = HTML_CLOSED
+                result.finish_reason = result.finish_reason or "stop"
+                break
+            if chars > max_chars:
+                result.stopped = RUNAWAY
+                result.finish_reason = "length"
+                break
+            if deadline is not None and deadline_unreachable(
+                chars, now - first_token_at, started, now, deadline
+            ):
+                result.stopped = DEADLINE
+                break
+            if now >= next_progress:
+                next_progress = now + STREAM_PROGRESS_INTERVAL_SECONDS
+                content = "".join(parts)
+                await _emit(on_progress, StreamProgress(
+                    provider, chars, content.count("<section"), now - started,
+                ))
+
+    result.content = "".join(parts)
+    await _emit(on_progress, StreamProgress(
+        provider, chars, result.content.count("<section"), time.monotonic() - started, done=True,
+    ))
+    if result.stopped:
+        logger.info(
+            f"[llm_stream] {provider} stream stopped early ({result.stopped}) "
+            f"after {chars} chars in {time.monotonic() - started:.1f}s"
+        )
+    return result
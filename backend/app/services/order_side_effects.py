@@ -0,0 +1,290 @@
+"""
+Post-commit side effects for delivery orders.
+
+create_delivery_order (migration 056) writes the order, its items and the
+customer row in one transaction and, in that same transaction, queues the
+work that has to follow in order_side_effects:
+
+  order_chat         "Pesanan baru" system message + owner notification (and
+                     the chat conversation, already written by the RPC since
+                     migration 061; id fixed by the RPC)
+  owner_whatsapp     new-order WhatsApp to the owner
+  customer_whatsapp  order-placed WhatsApp (tracking link) to the customer
+
+None of this may slow down or fail checkout, and none of it may be lost, so
+it runs here instead of in the request:
+
+  - create_order hands process_order_side_effects(order_id=...) to FastAPI
+    BackgroundTasks, so the jobs for an order normally run milliseconds after
+    its response is sent;
+  - OrderSideEffectScheduler (app.core.scheduler) sweeps the queue every
+    ORDER_SIDE_EFFECT_INTERVAL_SECONDS and picks up anything the first path
+    missed: a worker restart, or a failed attempt waiting out its backoff.
+
+claim_order_side_effects leases rows with FOR UPDATE SKIP LOCKED, so two
+workers never run the same job at once; a lease that expires (worker died
+mid-job) makes the job claimable again. Delivery is therefore at-least-once:
+order_chat is idempotent (fixed ids, duplicate inserts ignored), and each
+WhatsApp message is its own job so retrying one never re-sends another.
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from app.services.chat_inbox import chat_inbox
+from app.services.supabase_client import supabase_service
+from app.utils.whatsapp import notify_customer_order_placed, notify_owner_new_order
+
+ORDER_CHAT = "order_chat"
+OWNER_WHATSAPP = "owner_whatsapp"
+CUSTOMER_WHATSAPP = "customer_whatsapp"
+
+# Longer than any handler should take; an expired lease means the worker died.
+LEASE_SECONDS = int(os.getenv("ORDER_SIDE_EFFECT_LEASE_SECONDS", "120"))
+BATCH_SIZE = int(os.getenv("ORDER_SIDE_EFFECT_BATCH_SIZE", "25"))
+
+# Stable namespace for the ids of rows order_chat creates, so a retried job
+# hits the same primary keys instead of inserting twice.
+_ID_NAMESPACE = uuid.UUID("5b0e2f6e-56a4-4f43-9d55-0c1f7a1e0b56")
+
+
+# Flipped off the first time PostgREST reports claim_order_side_effects
+# missing (migration 056 not applied yet), so the sweeper stops probing and
+# logging every cycle; re-probed after the next restart.
+_QUEUE_STATE = {"available": True}
+
+
+class SideEffectError(RuntimeError):
+    """A handler could not complete; the job is retried with backoff."""
+
+
+def _stable_id(*parts: Any) -> str:
+    return str(uuid.uuid5(_ID_NAMESPACE, ":".join(str(p) for p in parts)))
+
+
+async def _rpc(name: str, params: Dict[str, Any]) -> Any:
+    async with supabase_service._client() as client:
+        resp = await client.post(
+            f"{supabase_service.url}/rest/v1/rpc/{name}",
+            json=params,
+            headers=supabase_service.service_headers,
+        )
+    resp.raise_for_status()
+    return resp.json() if resp.content else None
+
+
+def _function_missing(error: Exception) -> bool:
+    """True for PostgREST's "function not found" (PGRST202) response."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    try:
+        return (error.response.json() or {}).get("code") == "PGRST202"
+    except ValueError:
+        return False
+
+
+async def _insert_once(table: str, row: Dict[str, Any]) -> Optional[str]:
+    """INSERT ... ON CONFLICT (id) DO NOTHING. Returns the error body on
+    failure (None on success) so callers can decide whether to retry."""
+    async with supabase_service._client() as client:
+        resp = await client.post(
+            f"{supabase_service.url}/rest/v1/{table}",
+            params={"on_conflict": "id"},
+            json=row,
+            headers={
+                **supabase_service.service_headers,
+                "Prefer": "resolution=ignore-duplicates,return=minimal",
+            },
+        )
+    if resp.status_code < 300:
+        return None
+    return f"{resp.status_code} {resp.text[:300]}"
+
+
+# =====================================================
+# Handlers
+# =====================================================
+async def ensure_order_conversation(payload: Dict[str, Any]) -> Optional[str]:
+    """Write the order's chat_conversations row if it is not there yet.
+
+    Since migration 061 create_delivery_order inserts it itself and this is
+    a no-op; with 056 alone, create_order calls it before returning the
+    conversation_id. Returns the error body on failure, None on success.
+    """
+    conversation = {
+        "id": payload["conversation_id"],
+        "order_id": payload["order_id"],
+        "website_id": payload["website_id"],
+        "website_name": payload.get("website_name") or "",
+        "customer_name": payload.get("customer_name") or "Customer",
+        "customer_phone": payload.get("customer_phone") or "",
+        "status": "active",
+    }
+    error = await _insert_once("chat_conversations", conversation)
+    if error and "website_name" in error:
+        # Older schemas lack the column (same fallback as the legacy path).
+        conversation.pop("website_name")
+        error = await _insert_once("chat_conversations", conversation)
+    return error
+
+
+async def _order_chat(payload: Dict[str, Any]) -> None:
+    conversation_id = payload["conversation_id"]
+    order_id = payload["order_id"]
+    total = float(payload.get("total_amount") or 0)
+
+    error = await ensure_order_conversation(payload)
+    if error:
+        raise SideEffectError(f"chat_conversations: {error}")
+
+    content = (
+        f"Pesanan baru #{payload['order_number']}\n"
+        f"{payload.get('customer_name') or ''}\n"
+        f"{payload.get('delivery_address') or ''}\n"
+        f"RM{total:.2f}"
+    )
+    error = await _insert_once("chat_messages", {
+        "id": _stable_id(conversation_id, "order-placed"),
+        "conversation_id": conversation_id,
+        "sender_type": "system",
+        "message_text": content,
+        "content": content,
+        "is_read": False,
+    })
+    if error:
+        raise SideEffectError(f"chat_messages: {error}")
+
+    owner_id = payload.get("owner_id")
+    if owner_id:
+        chat_inbox.invalidate_owner(owner_id)
+    else:
+        chat_inbox.invalidate_website(payload["website_id"])
+    if owner_id:
+        error = await _insert_once("notifications", {
+            "id": _stable_id(order_id, "owner-new-order"),
+            "user_type": "owner",
+            "user_id": owner_id,
+            "website_id": payload["website_id"],
+            "order_id": order_id,
+            "conversation_id": conversation_id,
+            "type": "new_order",
+            "title": "Pesanan Baru!",
+            "body": f"{payload.get('customer_name') or ''} - RM{total:.2f}",
+        })
+        if error:
+            raise SideEffectError(f"notifications: {error}")
+
+
+async def _owner_whatsapp(payload: Dict[str, Any]) -> None:
+    async with supabase_service._client() as client:
+        resp = await client.get(
+            f"{supabase_service.url}/rest/v1/profiles",
+            params={"id": f"eq.{payload['owner_id']}", "select": "phone", "limit": "1"},
+            headers=supabase_service.service_headers,
+        )
+    resp.raise_for_status()
+    rows = resp.json() or []
+    phone = rows[0].get("phone") if rows else None
+    if not phone:
+        logger.info(f"[OrderSideEffects] owner {payload['owner_id']} has no phone; WhatsApp skipped")
+        return
+    sent = await asyncio.to_thread(
+        notify_owner_new_order,
+        owner_phone=phone,
+        order_number=payload["order_number"],
+        customer_name=payload.get("customer_name") or "",
+        customer_phone=payload.get("customer_phone") or "",
+        total_amount=float(payload.get("total_amount") or 0),
+        items=payload.get("items") or [],
+        delivery_address=payload.get("delivery_address") or "",
+    )
+    if not sent:
+        raise SideEffectError("owner WhatsApp not sent")
+
+
+async def _customer_whatsapp(payload: Dict[str, Any]) -> None:
+    if not payload.get("customer_phone"):
+        return
+    sent = await asyncio.to_thread(
+        notify_customer_order_placed,
+        customer_phone=payload["customer_phone"],
+        order_number=payload["order_number"],
+        restaurant_name=payload.get("restaurant_name") or "Restoran",
+        total_amount=float(payload.get("total_amount") or 0),
+    )
+    if not sent:
+        raise SideEffectError("customer WhatsApp not sent")
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {
+    ORDER_CHAT: _order_chat,
+    OWNER_WHATSAPP: _owner_whatsapp,
+    CUSTOMER_WHATSAPP: _customer_whatsapp,
+}
+
+
+# =====================================================
+# Worker
+# =====================================================
+async def _run_job(job: Dict[str, Any]) -> bool:
+    handler = HANDLERS.get(job.get("kind"))
+    error: Optional[str] = None
+    try:
+        if handler is None:
+            raise SideEffectError(f"unknown kind {job.get('kind')!r}")
+        await handler(job.get("payload") or {})
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"[:1000]
+        logger.warning(
+            f"[OrderSideEffects] job {job.get('id')} ({job.get('kind')}, order "
+            f"{job.get('order_id')}) attempt {job.get('attempts')} failed: {error}"
+        )
+    try:
+        await _rpc("finish_order_side_effect", {"p_id": job["id"], "p_error": error})
+    except Exception as e:
+        # The lease runs out and the job is retried; handlers are safe to repeat.
+        logger.error(f"[OrderSideEffects] could not record result of job {job.get('id')}: {e}")
+    return error is None
+
+
+async def process_order_side_effects(
+    order_id: Optional[str] = None, limit: int = BATCH_SIZE
+) -> Dict[str, int]:
+    """Claim and run up to `limit` due jobs (only `order_id`'s, if given).
+
+    Never raises — this is called from BackgroundTasks and the scheduler.
+    Returns {"claimed", "done", "failed"}.
+    """
+    if not _QUEUE_STATE["available"]:
+        return {"claimed": 0, "done": 0, "failed": 0}
+    try:
+        jobs: List[Dict[str, Any]] = await _rpc("claim_order_side_effects", {
+            "p_limit": limit,
+            "p_lease_seconds": LEASE_SECONDS,
+            "p_order_id": order_id,
+        }) or []
+    except Exception as e:
+        if _function_missing(e):
+            logger.warning(
+                "[OrderSideEffects] claim_order_side_effects RPC missing — "
+                "queue worker disabled (apply migration 056)"
+            )
+            _QUEUE_STATE["available"] = False
+        else:
+            logger.error(f"[OrderSideEffects] claim failed: {e}")
+        return {"claimed": 0, "done": 0, "failed": 0}
+
+    results = await asyncio.gather(*(_run_job(job) for job in jobs))
+    done = sum(results)
+    if jobs:
+        logger.info(
+            f"[OrderSideEffects] ran {len(jobs)} job(s)"
+            + (f" for order {order_id}" if order_id else "")
+            + f": {done} done, {len(jobs) - done} failed"
+        )
+    return {"claimed": len(jobs), "done": done, "failed": len(jobs) - done}
@@ -0,0 +1,227 @@
+"""
+Pooled, authenticated SMTP connections.
+
+EmailService used to call aiosmtplib.send() per message: TCP connect, TLS,
+EHLO, AUTH, send, QUIT. Against Zoho the setup and AUTH are most of the
+time per email, and bulk runs (subscription reminders) paid it for every
+recipient one after another.
+
+An SMTPPool keeps up to SMTP_POOL_SIZE logged-in connections per
+(host, port, user) and reuses them across messages:
+
+  - a connection is recycled after SMTP_MAX_MESSAGES_PER_CONNECTION
+    messages, and checked with NOOP before reuse once it has been idle
+    SMTP_IDLE_CHECK_SECONDS (providers drop idle sessions);
+  - a send that fails because a *reused* connection had gone stale is
+    retried once on a fresh connection; errors on a fresh connection and
+    SMTP replies (bad recipient, 5xx) are raised to the caller;
+  - SMTP_RATE_PER_MINUTE / SMTP_RATE_BURST pace sends per provider host,
+    across all of that host's accounts (0 = unpaced).
+
+Pools are per event loop (the cron runs under its own asyncio.run), see
+get_smtp_pool(). app.services.smtp_sink is a local server for tests.
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from dataclasses import dataclass
+from email.message import Message
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiosmtplib
+from loguru import logger
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+SMTP_POOL_SIZE = max(1, _env_int("SMTP_POOL_SIZE", 3))
+SMTP_MAX_MESSAGES_PER_CONNECTION = max(1, _env_int("SMTP_MAX_MESSAGES_PER_CONNECTION", 50))
+SMTP_IDLE_CHECK_SECONDS = _env_int("SMTP_IDLE_CHECK_SECONDS", 30)
+SMTP_RATE_PER_MINUTE = _env_int("SMTP_RATE_PER_MINUTE", 120)
+SMTP_RATE_BURST = max(1, _env_int("SMTP_RATE_BURST", 20))
+SMTP_TIMEOUT_SECONDS = _env_int("SMTP_TIMEOUT_SECONDS", 30) or 30
+
+# The connection is at fault, not the message: safe to retry elsewhere.
+_CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    OSError,
+    asyncio.TimeoutError,
+)
+
+
+class SendRate:
+    """GCRA pacing: `burst` sends at once, then one per 60/per_minute s."""
+
+    def __init__(self, per_minute: int = SMTP_RATE_PER_MINUTE, burst: int = SMTP_RATE_BURST):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.burst = max(1, burst)
+        self._tat = 0.0
+
+    async def take(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        wait = tat - now - (self.burst - 1) * self.interval
+        self._tat = tat + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class _Connection:
+    smtp: aiosmtplib.SMTP
+    sent: int = 0
+    last_used: float = 0.0
+
+    async def close(self) -> None:
+        try:
+            if self.smtp.is_connected:
+                await self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+
+class SMTPPool:
+    """Up to `size` authenticated connections to one SMTP account."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        size: int = SMTP_POOL_SIZE,
+        max_messages: int = SMTP_MAX_MESSAGES_PER_CONNECTION,
+        idle_check_seconds: float = SMTP_IDLE_CHECK_SECONDS,
+        rate: Optional[SendRate] = None,
+        timeout: float = SMTP_TIMEOUT_SECONDS,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_messages = max_messages
+        self.idle_check_seconds = idle_check_seconds
+        self.rate = rate or SendRate(0)
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_Connection] = []
+        self.stats = {"connects": 0, "reused": 0, "sent": 0, "stale": 0}
+
+    async def _connect(self) -> _Connection:
+        # Port 465 uses SSL, Port 587 uses STARTTLS
+        smtp = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            use_tls=self.port == 465,
+            start_tls=self.port == 587,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        try:
+            await smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.stats["connects"] += 1
+        return _Connection(smtp)
+
+    async def _checkout(self) -> _Connection:
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.smtp.is_connected:
+                continue
+            if time.monotonic() - conn.last_used >= self.idle_check_seconds:
+                try:
+                    await conn.smtp.noop()
+                except Exception:
+                    self.stats["stale"] += 1
+                    conn.smtp.close()
+                    continue
+            self.stats["reused"] += 1
+            return conn
+        return await self._connect()
+
+    async def _checkin(self, conn: _Connection) -> None:
+        if conn.sent >= self.max_messages or not conn.smtp.is_connected:
+            await conn.close()
+            return
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    async def send(self, message: Message, recipients: Sequence[str]) -> None:
+        """Send over a pooled connection. Raises on failure."""
+        await self.rate.take()
+        async with self._slots:
+            for attempt in range(2):
+                conn = await self._checkout()
+                try:
+                    await conn.smtp.send_message(message, recipients=list(recipients))
+                except _CONNECTION_ERRORS:
+                    conn.smtp.close()
+                    if attempt == 0 and conn.sent > 0:
+                        self.stats["stale"] += 1
+                        continue  # reused session had gone away
+                    raise
+                except aiosmtplib.SMTPException:
+                    # The server refused this message; the session is fine.
+                    try:
+                        await conn.smtp.rset()
+                        await self._checkin(conn)
+                    except Exception:
+                        conn.smtp.close()
+                    raise
+                conn.sent += 1
+                self.stats["sent"] += 1
+                await self._checkin(conn)
+                return
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(conn.close() for conn in idle), return_exceptions=True)
+
+
+# =====================================================
+# Registry
+# =====================================================
+PoolKey = Tuple[str, int, str]
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[PoolKey, SMTPPool]]" = (
+    weakref.WeakKeyDictionary()
+)
+_rates: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, SendRate]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_smtp_pool(host: str, port: int, username: str, password: str) -> SMTPPool:
+    """The pool for this account on the running loop (created on first use).
+    A changed password replaces the pool."""
+    loop = asyncio.get_running_loop()
+    pools = _pools.setdefault(loop, {})
+    key = (host, int(port), username)
+    pool = pools.get(key)
+    if pool is None or pool.password != password:
+        if pool is not None:
+            loop.create_task(pool.close())
+        rate = _rates.setdefault(loop, {}).setdefault(host, SendRate())
+        pool = pools[key] = SMTPPool(host, int(port), username, password, rate=rate)
+        logger.info(f"[SMTP] pool for {username}@{host}:{port} (size {SMTP_POOL_SIZE})")
+    return pool
+
+
+async def close_smtp_pools() -> None:
+    """QUIT every idle pooled connection on the running loop."""
+    pools = _pools.pop(asyncio.get_running_loop(), {})
+    await asyncio.gather(*(pool.close() for pool in pools.values()), return_exceptions=True)
@@ -0,0 +1,156 @@
+"""
+Local SMTP sink for tests and development.
+
+Speaks just enough ESMTP for aiosmtplib — EHLO, AUTH PLAIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT — and keeps every accepted message in memory. No
+TLS, so point the app at it with a port other than 465/587:
+
+    python -m app.services.smtp_sink 1025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_USER=dev SMTP_PASSWORD=dev ...
+
+Tests start one on a free port:
+
+    async with LocalSMTPSink() as sink:
+        pool = SMTPPool("127.0.0.1", sink.port, "u", "p")
+        ...
+        assert sink.messages[0].rcpt_tos == ["a@example.com"]
+
+`reject` makes RCPT TO fail with 550 for those addresses; `delay` slows
+every reply down, to stand in for a far-away provider.
+"""
+
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from email.message import Message
+from typing import Iterable, List, Optional
+
+
+@dataclass
+class SinkMessage:
+    mail_from: str
+    rcpt_tos: List[str]
+    data: bytes
+
+    @property
+    def message(self) -> Message:
+        return message_from_bytes(self.data)
+
+
+@dataclass
+class LocalSMTPSink:
+    host: str = "127.0.0.1"
+    port: int = 0
+    delay: float = 0.0
+    reject: Iterable[str] = ()
+    messages: List[SinkMessage] = field(default_factory=list)
+    connections: int = 0
+    logins: int = 0
+
+    def __post_init__(self):
+        self.reject = {addr.lower() for addr in self.reject}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set = set()
+
+    async def start(self) -> "LocalSMTPSink":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def drop_connections(self) -> None:
+        """Close every client socket, as a provider's idle timeout would."""
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.sleep(0)
+
+    async def __aenter__(self) -> "LocalSMTPSink":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _reply(self, writer: asyncio.StreamWriter, text: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        writer.write(text.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        mail_from, rcpt_tos = "", []
+        try:
+            await self._reply(writer, "220 binaapp-sink ESMTP")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                command, _, arg = line.decode().rstrip("\r\n").partition(" ")
+                command = command.upper()
+                if command == "EHLO":
+                    await self._reply(writer, "250-binaapp-sink\r\n250-8BITMIME\r\n250 AUTH PLAIN")
+                elif command == "HELO":
+                    await self._reply(writer, "250 binaapp-sink")
+                elif command == "AUTH":
+                    self.logins += 1
+                    await self._reply(writer, "235 2.7.0 Authentication successful")
+                elif command == "MAIL":
+                    mail_from, rcpt_tos = arg.partition(":")[2].strip().strip("<>").split(">")[0], []
+                    await self._reply(writer, "250 OK")
+                elif command == "RCPT":
+                    address = arg.partition(":")[2].strip().strip("<>").split(">")[0]
+                    if address.lower() in self.reject:
+                        await self._reply(writer, "550 5.1.1 Mailbox unavailable")
+                    else:
+                        rcpt_tos.append(address)
+                        await self._reply(writer, "250 OK")
+                elif command == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    self.messages.append(SinkMessage(mail_from, rcpt_tos, b"".join(lines)))
+                    mail_from, rcpt_tos = "", []
+                    await self._reply(writer, "250 OK: queued")
+                elif command in ("RSET", "NOOP"):
+                    if command == "RSET":
+                        mail_from, rcpt_tos = "", []
+                    await self._reply(writer, "250 OK")
+                elif command == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    return
+                else:
+                    await self._reply(writer, "502 5.5.2 Command not recognized")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+async def _serve(port: int) -> None:
+    sink = await LocalSMTPSink(port=port).start()
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port} (Ctrl+C to stop)")
+    seen = 0
+    while True:
+        await asyncio.sleep(0.5)
+        for item in sink.messages[seen:]:
+            print(f"  {item.mail_from} -> {', '.join(item.rcpt_tos)}: {item.message['Subject']}")
+        seen = len(sink.messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve(int(sys.argv[1]) if len(sys.argv) > 1 else 1025))
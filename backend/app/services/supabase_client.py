@@ -8,6 +8,7 @@ from typing import Any, AsyncIterator, Dict, Optional
 import httpx
 
 from app.core.config import settings
+from app.production.instrumentation import supabase_event_hooks
 
 class SupabaseService:
     """Supabase service using REST API (no SDK conflicts)"""
@@ -40,7 +41,9 @@ class SupabaseService:
     def _get_pooled_client(self) -> httpx.AsyncClient:
         """Return the shared pooled client, (re)creating it if needed."""
         if self._pooled_client is None or self._pooled_client.is_closed:
-            self._pooled_client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+            self._pooled_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0), event_hooks=supabase_event_hooks()
+            )
         return self._pooled_client
 
     @asynccontextmanager
@@ -0,0 +1,213 @@
+"""Compact conversation history for the AI support chatbot.
+
+AIChatbotService.chat() read every ai_support_messages row of a chat on
+each turn and sent the last 20 verbatim. Now:
+
+  tail     only the newest messages are fetched (newest first, LIMIT n,
+           with the chat's exact message count in the same request):
+           whatever the summary doesn't cover yet, at least
+           SUPPORT_HISTORY_TAIL and at most SUPPORT_HISTORY_TAIL +
+           SUPPORT_SUMMARY_MIN_NEW.
+  summary  older turns live on as ai_support_chats.history_summary, which
+           covers the first history_summarized_count messages (migration
+           060). That offset is compared with the counted rows, not with
+           ai_support_chats.messages_count, so concurrent writers (the
+           chatbot, admin replies) can't skew it. Once
+           SUPPORT_SUMMARY_MIN_NEW messages have fallen out of the tail, HistorySummarizer folds them into the summary in the
+           background with the cheap chat model, after the reply has been
+           sent. The write is guarded on history_summarized_count, so a
+           racing refresh can't overwrite a newer summary.
+  budget   build_history_messages() puts the summary and as many of the
+           newest messages as fit into SUPPORT_HISTORY_TOKEN_BUDGET tokens.
+
+Until migration 060 is applied the chat rows have no summary columns and
+the chatbot sends the tail alone.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from app.core.config import settings
+
+SUPPORT_HISTORY_TAIL = int(os.getenv("SUPPORT_HISTORY_TAIL", "12"))
+SUPPORT_HISTORY_TOKEN_BUDGET = int(os.getenv("SUPPORT_HISTORY_TOKEN_BUDGET", "2000"))
+SUPPORT_SUMMARY_MIN_NEW = int(os.getenv("SUPPORT_SUMMARY_MIN_NEW", "8"))
+SUPPORT_SUMMARY_MODEL = os.getenv("SUPPORT_SUMMARY_MODEL") or settings.DEEPSEEK_MODEL
+SUPPORT_SUMMARY_MAX_TOKENS = int(os.getenv("SUPPORT_SUMMARY_MAX_TOKENS", "300"))
+
+# Rough size of a token in the Malay/English text of a support chat.
+_CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """You keep a running summary of a BinaApp customer support chat between a user and BinaBot.
+Update the current summary with the new messages. Keep what the assistant will need later: the user's problem, order / website IDs, what was checked or tried, and any action taken or promised (credits, disputes, escalations).
+Write at most 150 words, in the language of the chat. Reply with the summary text only."""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return (len(text or "") + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _has_summary(chat: Dict[str, Any]) -> bool:
+    """Whether the chat row carries the summary columns (migration 060)."""
+    return "history_summarized_count" in chat
+
+
+def tail_limit(chat: Dict[str, Any], total: int) -> int:
+    """How many of the newest messages to send verbatim for a turn of `chat`
+    that has `total` messages."""
+    if not _has_summary(chat):
+        return SUPPORT_HISTORY_TAIL
+    pending = total - (chat.get("history_summarized_count") or 0)
+    return max(SUPPORT_HISTORY_TAIL, min(pending, SUPPORT_HISTORY_TAIL + SUPPORT_SUMMARY_MIN_NEW))
+
+
+async def load_tail(supabase, chat: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """The tail of `chat`, oldest first, and its exact message count."""
+    limit = SUPPORT_HISTORY_TAIL
+    if _has_summary(chat):
+        limit += SUPPORT_SUMMARY_MIN_NEW
+    result = await run_in_threadpool(
+        supabase.table("ai_support_messages").select("role, content", count="exact")
+        .eq("chat_id", chat["id"]).order("created_at", desc=True).limit(limit).execute
+    )
+    rows = result.data or []
+    total = result.count if result.count is not None else len(rows)
+    return list(reversed(rows[: tail_limit(chat, total)])), total
+
+
+async def count_messages(supabase, chat_id: str) -> int:
+    """Exact number of ai_support_messages rows of a chat."""
+    result = await run_in_threadpool(
+        supabase.table("ai_support_messages").select("id", count="exact", head=True)
+        .eq("chat_id", chat_id).execute
+    )
+    return result.count or 0
+
+
+def build_history_messages(
+    summary: Optional[str],
+    tail: List[Dict[str, Any]],
+    budget_tokens: int = SUPPORT_HISTORY_TOKEN_BUDGET,
+) -> List[Dict[str, str]]:
+    """Summary and the newest messages of `tail` that fit the budget.
+
+    The newest message is always kept, cut down if it alone is over budget.
+    """
+    messages: List[Dict[str, str]] = []
+    budget = budget_tokens
+    if summary:
+        text = f"Summary of the earlier conversation:\n{summary}"
+        messages.append({"role": "system", "content": text})
+        budget -= estimate_tokens(text)
+
+    kept: List[Dict[str, str]] = []
+    for msg in reversed(tail):
+        content = msg.get("content") or ""
+        cost = estimate_tokens(content)
+        if cost > budget:
+            if not kept and budget > 0:
+                kept.append({"role": msg["role"], "content": content[: budget * _CHARS_PER_TOKEN]})
+            break
+        kept.append({"role": msg["role"], "content": content})
+        budget -= cost
+    return messages + kept[::-1]
+
+
+class HistorySummarizer:
+    """Background refreshes of ai_support_chats.history_summary."""
+
+    def __init__(
+        self,
+        tail: int = SUPPORT_HISTORY_TAIL,
+        min_new: int = SUPPORT_SUMMARY_MIN_NEW,
+    ):
+        self.tail = tail
+        self.min_new = min_new
+        self._in_flight: Set[str] = set()
+        self._tasks: Set["asyncio.Task"] = set()
+
+    def schedule(
+        self, supabase, client, chat: Dict[str, Any], messages_count: int
+    ) -> Optional["asyncio.Task"]:
+        """Start a refresh if enough messages left the tail; don't wait for it.
+
+        `chat` is the row as read at the start of the turn, `messages_count`
+        the number of messages after it (counted, see load_tail).
+        """
+        if not _has_summary(chat) or chat["id"] in self._in_flight:
+            return None
+        summarized = chat.get("history_summarized_count") or 0
+        upto = messages_count - self.tail
+        if upto - summarized < self.min_new:
+            return None
+
+        self._in_flight.add(chat["id"])
+        task = asyncio.create_task(
+            self.refresh(supabase, client, chat["id"], chat.get("history_summary"), summarized, upto)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._in_flight.discard(chat["id"]))
+        return task
+
+    async def refresh(
+        self,
+        supabase,
+        client,
+        chat_id: str,
+        summary: Optional[str],
+        summarized: int,
+        upto: int,
+    ) -> Optional[str]:
+        """Fold messages [summarized, upto) into the summary. Returns the new one."""
+        try:
+            result = await run_in_threadpool(
+                supabase.table("ai_support_messages").select("role, content")
+                .eq("chat_id", chat_id).order("created_at").range(summarized, upto - 1).execute
+            )
+            rows = result.data or []
+            if not rows:
+                return None
+
+            transcript = "\n".join(f"{r['role']}: {r.get('content') or ''}" for r in rows)
+            response = await client.chat.completions.create(
+                model=SUPPORT_SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {
+                        "role": "user",
+                        "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+                    },
+                ],
+                temperature=0.2,
+                max_tokens=SUPPORT_SUMMARY_MAX_TOKENS,
+            )
+            new_summary = (response.choices[0].message.content or "").strip()
+            if not new_summary:
+                return None
+
+            # Guarded on the count we started from: a refresh that lost the
+            # race updates nothing.
+            await run_in_threadpool(
+                supabase.table("ai_support_chats").update({
+                    "history_summary": new_summary,
+                    "history_summarized_count": summarized + len(rows),
+                }).eq("id", chat_id).eq("history_summarized_count", summarized).execute
+            )
+            return new_summary
+        except Exception as e:
+            logger.warning(f"[SupportHistory] summary refresh for chat {chat_id} failed: {e}")
+            return None
+
+    async def drain(self) -> None:
+        """Wait for the refreshes in flight (shutdown, tests)."""
+        pending = [t for t in self._tasks if not t.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+history_summarizer = HistorySummarizer()
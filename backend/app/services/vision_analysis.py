@@ -0,0 +1,149 @@
+"""Concurrent, cached analysis of attached images.
+
+A support chat message or an upload batch can carry several images, and
+each cost its own vision round trip, one after another. analyze_images()
+runs them at most VISION_ANALYSIS_CONCURRENCY at a time and returns the
+answers in input order:
+
+  key      sha256 of the image bytes, plus the function name and prompt.
+           The same photo re-sent under a new upload URL is not analysed
+           again. The images are fetched concurrently (capped at
+           VISION_IMAGE_MAX_BYTES); when one can't be fetched its URL
+           stands in for the bytes.
+  fetch    the URLs come from clients, so only https URLs on the app's own
+           storage host (SUPABASE_URL, plus any VISION_IMAGE_HOSTS) that
+           resolve to public addresses are fetched, and every redirect hop
+           is held to the same rule. Anything else is keyed by its URL.
+  dedupe   identical images within one call are analysed once.
+  cache    the AI response cache (app.services.ai_response_cache), memory
+           then SQLite, when VISION_ANALYSIS_CACHE is on (default). Only
+           answers the caller's analyse function returned are stored — it
+           returns None for a failure, so failures are retried next time.
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import os
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+from app.services.ai_response_cache import get_ai_response_cache
+
+VISION_ANALYSIS_CONCURRENCY = int(os.getenv("VISION_ANALYSIS_CONCURRENCY", "4"))
+VISION_ANALYSIS_CACHE = os.getenv("VISION_ANALYSIS_CACHE", "true").strip().lower() in ("1", "true", "yes", "on")
+VISION_IMAGE_FETCH_TIMEOUT_SECONDS = float(os.getenv("VISION_IMAGE_FETCH_TIMEOUT_SECONDS", "10"))
+VISION_IMAGE_MAX_BYTES = int(os.getenv("VISION_IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+VISION_IMAGE_MAX_REDIRECTS = int(os.getenv("VISION_IMAGE_MAX_REDIRECTS", "3"))
+
+# One image URL in, its analysis text out — or None if it failed.
+Analyze = Callable[[str], Awaitable[Optional[str]]]
+
+
+def image_hosts() -> FrozenSet[str]:
+    """Hosts whose images may be fetched: the app's storage, plus extras."""
+    hosts = {h.strip().lower() for h in os.getenv("VISION_IMAGE_HOSTS", "").split(",") if h.strip()}
+    storage = httpx.URL(settings.SUPABASE_URL).host if settings.SUPABASE_URL else ""
+    if storage:
+        hosts.add(storage.lower())
+    return frozenset(hosts)
+
+
+async def _resolve(host: str) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None)
+    return [info[4][0] for info in infos]
+
+
+async def _check_fetchable(url: httpx.URL, hosts: FrozenSet[str]) -> None:
+    """Raise ValueError unless `url` is an https URL on an allowed host that
+    resolves only to public addresses."""
+    if url.scheme != "https" or url.host.lower() not in hosts:
+        raise ValueError("not on an image storage host")
+    try:
+        addresses = await _resolve(url.host)
+    except OSError as e:
+        raise ValueError(f"cannot resolve {url.host}: {e}") from e
+    if not addresses or not all(
+        ipaddress.ip_address(a.split("%", 1)[0]).is_global for a in addresses
+    ):
+        raise ValueError(f"{url.host} resolves to a non-public address")
+
+
+async def image_digest(
+    client: httpx.AsyncClient, url: str, hosts: Optional[FrozenSet[str]] = None
+) -> str:
+    """sha256 of the image bytes, or of the URL if they can't or mustn't be
+    read. `client` must not follow redirects itself; each hop is checked
+    here against `hosts` (default image_hosts())."""
+    hosts = image_hosts() if hosts is None else hosts
+    try:
+        target = httpx.URL(url)
+        for _ in range(VISION_IMAGE_MAX_REDIRECTS + 1):
+            await _check_fetchable(target, hosts)
+            digest = hashlib.sha256()
+            size = 0
+            async with client.stream("GET", target, follow_redirects=False) as resp:
+                if resp.next_request is not None:
+                    target = resp.next_request.url
+                    continue
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    if size > VISION_IMAGE_MAX_BYTES:
+                        raise ValueError(f"larger than {VISION_IMAGE_MAX_BYTES} bytes")
+                    digest.update(chunk)
+            return f"sha256:{digest.hexdigest()}"
+        raise ValueError(f"more than {VISION_IMAGE_MAX_REDIRECTS} redirects")
+    except Exception as e:
+        logger.debug(f"[Vision] keying {url[:80]} by URL: {e}")
+        return f"url:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
+
+async def analyze_images(
+    urls: Sequence[str],
+    analyze: Analyze,
+    *,
+    function: str,
+    prompt: str = "",
+    concurrency: int = VISION_ANALYSIS_CONCURRENCY,
+) -> List[Optional[str]]:
+    """analyze(url) for every url, concurrently and through the cache.
+
+    `function` and `prompt` go into the cache key: pass whatever else
+    the answer depends on besides the image.
+    """
+    if not urls:
+        return []
+    hosts = image_hosts()
+    async with httpx.AsyncClient(timeout=VISION_IMAGE_FETCH_TIMEOUT_SECONDS) as client:
+        digests = await asyncio.gather(*(image_digest(client, url, hosts) for url in urls))
+
+    cache = get_ai_response_cache() if VISION_ANALYSIS_CACHE else None
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(url: str, digest: str) -> Optional[str]:
+        key = hashlib.sha256(f"{function}\0{prompt}\0{digest}".encode("utf-8")).hexdigest()
+        if cache is not None:
+            cached = await cache.get(function, key)
+            if cached is not None:
+                return cached
+        async with semaphore:
+            try:
+                result = await analyze(url)
+            except Exception as e:
+                logger.error(f"[Vision] {function} failed for {url[:80]}: {e}")
+                return None
+        if cache is not None and result:
+            await cache.put(function, key, result)
+        return result
+
+    # First URL seen for each digest is the one analysed.
+    unique: Dict[str, str] = {}
+    for url, digest in zip(urls, digests):
+        unique.setdefault(digest, url)
+    results = await asyncio.gather(*(one(url, digest) for digest, url in unique.items()))
+    by_digest = dict(zip(unique, results))
+    return [by_digest[digest] for digest in digests]
@@ -0,0 +1,189 @@
+"""Per-socket outbound queues for WebSocket fan-out.
+
+The chat ConnectionManager used to broadcast by awaiting
+`websocket.send_json` for each participant in turn, so one slow or
+half-dead client held up delivery to everyone else in the conversation
+and blocked the request that sent the message.
+
+Each socket now gets a SocketSender: a bounded queue drained by its own
+writer task. A broadcast serializes the payload once and offers the same
+string to every sender without awaiting any network I/O. Policy when a
+consumer falls behind:
+
+  droppable frames  (typing, presence, rider_location — superseded by the
+                    next one anyway) are dropped once the queue is half
+                    full
+  other frames      (messages, read receipts, status) never dropped: a
+                    socket whose queue is full is closed with 1013 and
+                    the client reconnects and catches up through
+                    GET /messages?since=
+  stuck writes      a send that takes longer than WS_SEND_TIMEOUT_SECONDS
+                    closes the socket
+
+A reaper wakes every WS_PING_INTERVAL_SECONDS: sockets that have sent
+nothing for WS_IDLE_TIMEOUT_SECONDS are closed, quiet ones get a
+{"type": "ping"} frame so proxies keep the connection open and dead peers
+surface as send failures.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from app.production.metrics import get_metrics
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = float(raw)
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+WS_SEND_QUEUE_SIZE = int(_env_float("WS_SEND_QUEUE_SIZE", 64))
+WS_SEND_TIMEOUT_SECONDS = _env_float("WS_SEND_TIMEOUT_SECONDS", 10.0)
+WS_PING_INTERVAL_SECONDS = _env_float("WS_PING_INTERVAL_SECONDS", 25.0)
+WS_IDLE_TIMEOUT_SECONDS = _env_float("WS_IDLE_TIMEOUT_SECONDS", 300.0)
+
+# Frames a slow consumer can miss without losing state.
+DROPPABLE_TYPES = frozenset({"typing", "user_joined", "user_left", "rider_location", "ping"})
+
+# 1013 "Try Again Later": the client reconnects and resyncs.
+CLOSE_SLOW_CONSUMER = 1013
+
+_frames = get_metrics().register_counter(
+    "ws_frames_total",
+    "WebSocket frames offered to per-socket queues, by outcome",
+    labels=["outcome"],
+)
+
+
+def encode(message: Dict[str, Any]) -> str:
+    """Serialize once per broadcast, in the same form as send_json."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class SocketSender:
+    """Bounded outbound queue and writer task for one WebSocket."""
+
+    def __init__(
+        self,
+        websocket,
+        key: str,
+        on_close: Optional[Callable[["SocketSender"], None]] = None,
+        maxsize: int = WS_SEND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+    ):
+        self.websocket = websocket
+        self.key = key
+        self.maxsize = maxsize
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self.last_received = time.monotonic()
+        self.last_sent = self.last_received
+        self.dropped = 0
+        self._task = asyncio.create_task(self._writer())
+
+    def touch(self) -> None:
+        """The client sent a frame: it is alive."""
+        self.last_received = time.monotonic()
+
+    def offer(self, text: str, droppable: bool = False) -> bool:
+        """Queue a serialized frame without waiting. False if not queued."""
+        if self.closed:
+            return False
+        if droppable and self.queue.qsize() >= self.maxsize // 2:
+            self.dropped += 1
+            _frames.inc_sync((("outcome", "dropped"),))
+            return False
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            logger.warning(f"[WS] {self.key} is {self.maxsize} frames behind, disconnecting")
+            _frames.inc_sync((("outcome", "slow_consumer"),))
+            self.close(CLOSE_SLOW_CONSUMER)
+            return False
+        _frames.inc_sync((("outcome", "queued"),))
+        return True
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                self.last_sent = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"[WS] {self.key} send timed out after {self.send_timeout}s, disconnecting")
+            _frames.inc_sync((("outcome", "send_timeout"),))
+            self.close()
+        except Exception as e:
+            logger.warning(f"[WS] Failed to send to {self.key}: {e}")
+            _frames.inc_sync((("outcome", "send_failed"),))
+            self.close()
+
+    def close(self, code: int = 1000) -> None:
+        """Stop the writer and close the socket (in the background)."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        if self.on_close is not None:
+            self.on_close(self)
+        asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass  # already gone
+
+
+class SocketReaper:
+    """Pings quiet sockets and closes idle ones while any are registered."""
+
+    def __init__(
+        self,
+        senders: Callable[[], list],
+        interval: float = WS_PING_INTERVAL_SECONDS,
+        idle_timeout: float = WS_IDLE_TIMEOUT_SECONDS,
+    ):
+        self.senders = senders
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def sweep(self) -> None:
+        now = time.monotonic()
+        ping = encode({"type": "ping"})
+        for sender in self.senders():
+            if now - sender.last_received >= self.idle_timeout:
+                logger.info(f"[WS] {sender.key} idle for {self.idle_timeout:.0f}s, disconnecting")
+                sender.close()
+            elif now - max(sender.last_received, sender.last_sent) >= self.interval:
+                sender.offer(ping, droppable=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.senders():
+                return
+            self.sweep()
@@ -0,0 +1,294 @@
+"""In-process delivery-zone coverage engine.
+
+The public checkout (`GET /delivery/zones/{website_id}/cover`) used to run
+the PostGIS `find_zone_for_point` RPC for every coverage check, and the
+customer dragging the map pin fires one of those per drag. Zones change
+rarely, so this module keeps each website's zones in memory and answers
+the same question locally:
+
+  1. bounding-box prefilter per zone,
+  2. exact point-in-polygon (outer ring minus holes, boundary counts as
+     covered — ST_Covers semantics),
+  3. smallest `area_m2` wins, like the RPC's `order by ST_Area asc`.
+
+Zones are loaded lazily with one `list_delivery_zones` RPC per website and
+kept for ZONE_COVERAGE_TTL_SECONDS, for at most ZONE_COVERAGE_MAX_WEBSITES
+websites (least recently used go first). Every delivery_zones write
+(delivery_zones.py, menu_delivery.py, the publish flow in main.py) calls
+`zone_coverage.invalidate(website_id)` so this worker sees the change
+immediately; other workers/instances pick it up when their TTL lapses.
+
+The RPC stays the source of truth: if a website's zones fail to load or
+any polygon can't be compiled, lookups for that website fall through to
+`find_zone_for_point`. Results are returned in the RPC's row shape so
+callers don't care which path answered.
+
+Edges are treated as straight lines in lon/lat, while PostGIS geography
+uses great-circle edges. For the 64-vertex rings the zone editor draws
+(edges of a few hundred metres) the two disagree by millimetres, only
+right on a boundary.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = float(raw)
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+ZONE_COVERAGE_TTL_SECONDS = _env_float("ZONE_COVERAGE_TTL_SECONDS", 120.0)
+# The cover endpoint is public and keyed by any website id, so the index is
+# an LRU of at most this many websites.
+ZONE_COVERAGE_MAX_WEBSITES = int(_env_float("ZONE_COVERAGE_MAX_WEBSITES", 2048))
+
+Ring = Sequence[Tuple[float, float]]  # [(lng, lat), ...] — GeoJSON order
+
+
+# =====================================================
+# Geometry
+# =====================================================
+def _on_segment(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> bool:
+    cross = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    if abs(cross) > 1e-12:
+        return False
+    return min(ax, bx) - 1e-12 <= px <= max(ax, bx) + 1e-12 and min(ay, by) - 1e-12 <= py <= max(ay, by) + 1e-12
+
+
+def ring_contains(ring: Ring, x: float, y: float) -> Optional[bool]:
+    """Even-odd ray cast. Returns None when the point lies on the ring."""
+    inside = False
+    n = len(ring)
+    j = n - 1
+    for i in range(n):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if _on_segment(x, y, xi, yi, xj, yj):
+            return None
+        if (yi > y) != (yj > y):
+            x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+            if x < x_cross:
+                inside = not inside
+        j = i
+    return inside
+
+
+def _planar_area_m2(ring: Ring) -> float:
+    """Shoelace area in m² on a local equirectangular projection."""
+    if len(ring) < 3:
+        return 0.0
+    lat0 = math.radians(sum(p[1] for p in ring) / len(ring))
+    kx = 111_320.0 * math.cos(lat0)
+    ky = 110_540.0
+    total = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, list(ring[1:]) + [ring[0]]):
+        total += (x1 * kx) * (y2 * ky) - (x2 * kx) * (y1 * ky)
+    return abs(total) / 2.0
+
+
+@dataclass(frozen=True)
+class CompiledZone:
+    row: Dict[str, Any]  # find_zone_for_point-shaped row
+    active: bool
+    area_m2: float
+    bbox: Tuple[float, float, float, float]  # min_lng, min_lat, max_lng, max_lat
+    outer: Ring
+    holes: Tuple[Ring, ...]
+
+    def covers(self, lat: float, lng: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        if lng < min_x or lng > max_x or lat < min_y or lat > max_y:
+            return False
+        in_outer = ring_contains(self.outer, lng, lat)
+        if in_outer is False:
+            return False
+        for hole in self.holes:
+            in_hole = ring_contains(hole, lng, lat)
+            if in_hole:  # strictly inside a hole; hole boundary is covered
+                return False
+        return True
+
+
+def _ring_from_geojson(coords: Any) -> Ring:
+    ring = [(float(p[0]), float(p[1])) for p in coords]
+    if len(ring) >= 2 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    if len(ring) < 3:
+        raise ValueError("ring has fewer than 3 vertices")
+    return tuple(ring)
+
+
+def compile_zone(row: Dict[str, Any]) -> CompiledZone:
+    """`list_delivery_zones` row → CompiledZone. Raises ValueError if unusable."""
+    polygon = row.get("polygon_geojson") or {}
+    if polygon.get("type") != "Polygon" or not polygon.get("coordinates"):
+        raise ValueError(f"unsupported geometry {polygon.get('type')!r}")
+    rings = [_ring_from_geojson(r) for r in polygon["coordinates"]]
+    outer, holes = rings[0], tuple(rings[1:])
+    xs = [p[0] for p in outer]
+    ys = [p[1] for p in outer]
+    area = row.get("area_m2")
+    if area is None:
+        area = _planar_area_m2(outer) - sum(_planar_area_m2(h) for h in holes)
+    return CompiledZone(
+        row={
+            "id": row["id"],
+            "name": row["name"],
+            "fee_cents": row["fee_cents"],
+            "min_order_cents": row["min_order_cents"],
+            "color": row["color"],
+            "active": bool(row["active"]),
+            "estimated_delivery_min": row.get("estimated_delivery_min"),
+        },
+        active=bool(row["active"]),
+        area_m2=float(area),
+        bbox=(min(xs), min(ys), max(xs), max(ys)),
+        outer=outer,
+        holes=holes,
+    )
+
+
+def find_covering_zone(
+    zones: Sequence[CompiledZone], lat: float, lng: float, only_active: bool = True
+) -> Optional[Dict[str, Any]]:
+    """Smallest zone covering (lat, lng). `zones` must be sorted by area."""
+    for zone in zones:
+        if only_active and not zone.active:
+            continue
+        if zone.covers(lat, lng):
+            return dict(zone.row)
+    return None
+
+
+# =====================================================
+# Per-website index
+# =====================================================
+@dataclass
+class _Entry:
+    loaded_at: float
+    zones: Optional[List[CompiledZone]]  # None → website must use the RPC
+
+
+class ZoneCoverageIndex:
+    """Lazily loaded, TTL-bounded LRU of website_id → compiled zones."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = ZONE_COVERAGE_TTL_SECONDS,
+        max_websites: int = ZONE_COVERAGE_MAX_WEBSITES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_websites = max_websites
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "loads": 0, "rpc_fallbacks": 0}
+
+    def _drop(self, website_id: str) -> None:
+        self._entries.pop(website_id, None)
+        lock = self._load_locks.get(website_id)
+        if lock is not None and not lock.locked():
+            del self._load_locks[website_id]
+
+    def invalidate(self, website_id: str) -> None:
+        """Drop a website's zones; the next lookup reloads them."""
+        self._drop(str(website_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._load_locks.clear()
+
+    def _fresh(self, website_id: str) -> Optional[_Entry]:
+        entry = self._entries.get(website_id)
+        if entry and time.monotonic() - entry.loaded_at < self.ttl_seconds:
+            self._entries.move_to_end(website_id)
+            return entry
+        return None
+
+    def _store(self, website_id: str, entry: _Entry) -> None:
+        self._entries[website_id] = entry
+        self._entries.move_to_end(website_id)
+        if len(self._entries) <= self.max_websites:
+            return
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e.loaded_at >= self.ttl_seconds]:
+            self._drop(key)
+        while len(self._entries) > self.max_websites:
+            self._drop(next(iter(self._entries)))
+
+    async def _load(self, supabase, website_id: str) -> _Entry:
+        lock = self._load_locks.setdefault(website_id, asyncio.Lock())
+        async with lock:
+            entry = self._fresh(website_id)
+            if entry is not None:
+                return entry  # another request loaded it while we waited
+            self.stats["loads"] += 1
+            zones: Optional[List[CompiledZone]]
+            try:
+                res = await run_in_threadpool(
+                    supabase.rpc("list_delivery_zones", {"p_website_id": website_id}).execute
+                )
+                compiled = [compile_zone(r) for r in (res.data or [])]
+                compiled.sort(key=lambda z: (z.area_m2, str(z.row["id"])))
+                zones = compiled
+            except Exception as e:
+                logger.warning(
+                    f"[zone_coverage] in-memory index unavailable for {website_id}, "
+                    f"using find_zone_for_point: {e}"
+                )
+                zones = None
+            entry = _Entry(loaded_at=time.monotonic(), zones=zones)
+            self._store(website_id, entry)
+            return entry
+
+    async def find_zone(
+        self,
+        supabase,
+        website_id: str,
+        lat: float,
+        lng: float,
+        only_active: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        """Same contract as the find_zone_for_point RPC: one row or None."""
+        website_id = str(website_id)
+        entry = self._fresh(website_id)
+        if entry is None:
+            entry = await self._load(supabase, website_id)
+        else:
+            self.stats["hits"] += 1
+        if entry.zones is not None:
+            return find_covering_zone(entry.zones, lat, lng, only_active)
+
+        self.stats["rpc_fallbacks"] += 1
+        res = await run_in_threadpool(
+            supabase.rpc(
+                "find_zone_for_point",
+                {
+                    "p_website_id": website_id,
+                    "p_lat": lat,
+                    "p_lng": lng,
+                    "p_only_active": only_active,
+                },
+            ).execute
+        )
+        rows = res.data or []
+        return rows[0] if rows else None
+
+
+zone_coverage = ZoneCoverageIndex()
@@ -0,0 +1,164 @@
+"""
+Precompiled whole-word keyword matching.
+
+Business classification and image selection match text against fixed
+keyword vocabularies with word-boundary semantics — `\\bkeyword\\b`, so
+'ikan' does not match "kecantikan" and 'cat' does not match "catering".
+Doing that as one freshly formatted `re.search` per keyword costs a
+pattern-cache lookup and a full scan of the text for every keyword, every
+call.
+
+KeywordMatcher compiles a whole vocabulary ONCE into a single regex whose
+alternation is factored as a trie (`nasi(?: (?:lemak|kandar))?`), wrapped
+in a zero-width lookahead so one `finditer` pass reports the longest
+keyword starting at every position. Shorter keywords that start at the
+same position are necessarily prefixes of that longest match; whether
+their own trailing `\\b` holds is decided by the longest keyword's
+characters, so it is precomputed per keyword at build time. The result is
+every occurrence of every keyword — exactly what the per-keyword loop
+would find — from one scan in C.
+
+Text is matched as given; callers lowercase it themselves, as before.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+Vocabulary = Union[Iterable[str], Mapping[str, Iterable[str]]]
+
+
+def _is_word_char(ch: str) -> bool:
+    # Same definition as `\w` for str patterns.
+    return ch.isalnum() or ch == "_"
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Factored alternation; greedy, so the longest viable keyword wins."""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    keyword: str
+    start: int
+    end: int
+
+
+class KeywordMatcher:
+    """All whole-word occurrences of a fixed vocabulary in one pass.
+
+    `vocabulary` is either a keyword list, or a mapping of group name →
+    keywords (e.g. business type → its keywords) for the group helpers.
+    Vocabulary order is kept: `first()` and `first_group()` answer what a
+    `for keyword in ...: if match: return` loop over the same lists would.
+    """
+
+    def __init__(self, vocabulary: Vocabulary):
+        groups: Dict[str, Tuple[str, ...]] = {}
+        if isinstance(vocabulary, Mapping):
+            ordered: List[str] = []
+            membership: Dict[str, List[str]] = {}
+            for group, words in vocabulary.items():
+                for word in words:
+                    if not word:
+                        continue
+                    if word not in membership:
+                        ordered.append(word)
+                        membership[word] = []
+                    membership[word].append(group)
+            groups = {word: tuple(names) for word, names in membership.items()}
+            self.group_names: Tuple[str, ...] = tuple(vocabulary.keys())
+        else:
+            ordered = list(dict.fromkeys(word for word in vocabulary if word))
+            self.group_names = ()
+
+        self.keywords: Tuple[str, ...] = tuple(ordered)
+        self._groups = groups
+        self._rank = {word: i for i, word in enumerate(ordered)}
+        vocab = set(ordered)
+        self._implied: Dict[str, Tuple[str, ...]] = {
+            word: tuple(
+                word[:cut]
+                for cut in range(1, len(word))
+                if word[:cut] in vocab
+                and _is_word_char(word[cut - 1]) != _is_word_char(word[cut])
+            )
+            for word in ordered
+        }
+        self._pattern = (
+            re.compile(r"\b(?=(" + _trie_pattern(ordered) + r")\b)") if ordered else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Every keyword occurrence, by position (longest first at a tie)."""
+        if not text or self._pattern is None:
+            return []
+        found: List[KeywordMatch] = []
+        for m in self._pattern.finditer(text):
+            start = m.start()
+            keyword = m.group(1)
+            found.append(KeywordMatch(keyword, start, start + len(keyword)))
+            for prefix in reversed(self._implied[keyword]):
+                found.append(KeywordMatch(prefix, start, start + len(prefix)))
+        return found
+
+    def matched(self, text: str) -> Set[str]:
+        """Distinct keywords present in text."""
+        return {m.keyword for m in self.find_all(text)}
+
+    def search(self, text: str) -> bool:
+        """True if any keyword is present (stops at the first hit)."""
+        return bool(text) and self._pattern is not None and self._pattern.search(text) is not None
+
+    def first(self, text: str) -> Optional[str]:
+        """The present keyword that comes first in vocabulary order."""
+        hits = self.matched(text)
+        return min(hits, key=self._rank.__getitem__) if hits else None
+
+    def group_hits(self, text: str) -> Dict[str, List[str]]:
+        """group → its keywords present in text (vocabulary order)."""
+        hits: Dict[str, List[str]] = {}
+        for keyword in sorted(self.matched(text), key=self._rank.__getitem__):
+            for group in self._groups.get(keyword, ()):
+                hits.setdefault(group, []).append(keyword)
+        return hits
+
+    def first_group(self, text: str) -> Optional[str]:
+        """The first group (mapping order) with any keyword present."""
+        hits = self.group_hits(text)
+        for group in self.group_names:
+            if group in hits:
+                return group
+        return None
+
+
+@lru_cache(maxsize=512)
+def keyword_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """Shared matcher for an inline keyword tuple (compiled once, cached)."""
+    return KeywordMatcher(keywords)
+
+
+def has_any_word(text: str, keywords: Iterable[str]) -> bool:
+    """Drop-in for `any(re.search(rf"\\b{re.escape(k)}\\b", text) for k in keywords)`."""
+    return keyword_matcher(tuple(keywords)).search(text)
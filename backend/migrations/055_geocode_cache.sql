@@ -0,0 +1,50 @@
+-- =====================================================
+-- 055_geocode_cache.sql
+--
+-- Shared, persistent cache for Nominatim answers (app/core/geocoder.py).
+--
+-- The geocoder answers postcode and locality queries from the bundled
+-- offline gazetteer first. That index is small: 117 postcodes, 129
+-- localities (the main towns of each state) and 14 streets. Everything
+-- else (other postcodes and towns, house-level addresses, streets missing
+-- from the index) falls back to Nominatim; this table keeps those answers
+-- across restarts and shares them between every worker and instance, so
+-- one Nominatim call serves the whole fleet for the 7-day TTL instead of
+-- once per process.
+--
+-- cache_key is the geocoder's own key: 'PC:<country>:<postcode>' or
+-- 'ADDR:<country>:<lowercased query>'. "Not found" answers are cached too
+-- (found = false) so nonsense input doesn't keep hitting Nominatim.
+--
+-- Apply in the Supabase SQL editor. Idempotent. The backend treats a
+-- missing table as a cache miss, so applying this is not a deploy blocker.
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.geocode_cache (
+    cache_key TEXT PRIMARY KEY,
+    found BOOLEAN NOT NULL,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    display_name TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- TTL sweeps (DELETE ... WHERE updated_at < now() - interval '7 days').
+CREATE INDEX IF NOT EXISTS idx_geocode_cache_updated_at
+    ON public.geocode_cache (updated_at);
+
+COMMENT ON TABLE public.geocode_cache IS
+    'Nominatim answers shared across backend workers. Written only by the '
+    'service-role backend; safe to TRUNCATE at any time.';
+
+-- Service-role only (same posture as migration 049): no anon/authenticated
+-- policies, so the anon key can neither read nor poison the cache.
+ALTER TABLE public.geocode_cache ENABLE ROW LEVEL SECURITY;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- SELECT count(*) FROM public.geocode_cache;
+-- -- expect 0 on a fresh apply; grows as the fallback is used
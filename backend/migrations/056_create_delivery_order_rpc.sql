@@ -0,0 +1,307 @@
+-- =====================================================
+-- 056_create_delivery_order_rpc.sql
+--
+-- One-round-trip checkout: create_delivery_order() + a durable post-commit
+-- side-effect queue (order_side_effects).
+--
+-- POST /delivery/orders used to make about a dozen sequential PostgREST
+-- calls (website check, menu_items, find_zone_for_point, order insert,
+-- items insert with a hand-rolled compensating delete, customer lookup +
+-- upsert, conversation, system message, a second websites lookup,
+-- notification, owner profile, WhatsApp). Checkout latency was the sum of
+-- all of them, and a failure half-way left an order without its chat or
+-- notification.
+--
+-- create_delivery_order() now does, in ONE transaction:
+--   - website existence check
+--   - menu item lookup + server-side pricing
+--   - zone resolution via find_zone_for_point (migration 031) + minimum
+--     order check
+--   - delivery_orders + order_items insert (no compensating delete needed)
+--   - website_customers upsert (UNIQUE (website_id, phone), migration 005)
+--   - enqueue of the follow-up work into order_side_effects
+-- The follow-up work (chat conversation + system message + owner
+-- notification, owner WhatsApp, customer WhatsApp) is committed together
+-- with the order, so it can never be lost, and is run by the backend
+-- after the response is sent (app/services/order_side_effects.py).
+--
+-- Validation failures raise P0001 with a machine-readable MESSAGE that the
+-- backend maps to the same HTTP errors as before:
+--   WEBSITE_NOT_FOUND, MENU_ITEMS_NOT_FOUND, OUT_OF_COVERAGE,
+--   BELOW_MINIMUM (DETAIL = zone min_order_cents)
+--
+-- Apply in the Supabase SQL editor. Idempotent. Until it is applied the
+-- backend keeps using the old multi-call path, so this is not a deploy
+-- blocker.
+-- =====================================================
+
+BEGIN;
+
+-- =====================================================
+-- 1. Side-effect queue
+-- =====================================================
+CREATE TABLE IF NOT EXISTS public.order_side_effects (
+    id BIGSERIAL PRIMARY KEY,
+    order_id UUID NOT NULL REFERENCES public.delivery_orders(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,               -- 'order_chat' | 'owner_whatsapp' | 'customer_whatsapp'
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMPTZ
+);
+
+-- Claim scans only live rows; done/dead rows drop out of the index.
+CREATE INDEX IF NOT EXISTS idx_order_side_effects_live
+    ON public.order_side_effects (run_after, id)
+    WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_order_side_effects_order
+    ON public.order_side_effects (order_id);
+
+COMMENT ON TABLE public.order_side_effects IS
+    'Post-commit work queued by create_delivery_order(); drained by the '
+    'backend (claim_order_side_effects / finish_order_side_effect).';
+
+-- Service-role only (same posture as migrations 049/050).
+ALTER TABLE public.order_side_effects ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.order_side_effects FROM PUBLIC, anon, authenticated;
+GRANT ALL ON public.order_side_effects TO service_role;
+GRANT USAGE, SELECT ON SEQUENCE public.order_side_effects_id_seq TO service_role;
+
+-- =====================================================
+-- 2. create_delivery_order
+-- =====================================================
+CREATE OR REPLACE FUNCTION public.create_delivery_order(
+    p_website_id UUID,
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_order JSONB,
+    p_items JSONB
+) RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_website RECORD;
+    v_zone RECORD;
+    v_lines JSONB;
+    v_subtotal NUMERIC(10,2);
+    v_fee NUMERIC(10,2);
+    v_total NUMERIC(10,2);
+    v_order delivery_orders%ROWTYPE;
+    v_customer_id UUID;
+    v_conversation_id UUID := gen_random_uuid();
+    v_phone TEXT := COALESCE(p_order->>'customer_phone', '');
+    v_name TEXT := COALESCE(p_order->>'customer_name', '');
+    v_address TEXT := COALESCE(p_order->>'delivery_address', '');
+BEGIN
+    SELECT id, user_id, COALESCE(NULLIF(business_name, ''), name, '') AS display_name
+      INTO v_website
+      FROM websites
+     WHERE id = p_website_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'WEBSITE_NOT_FOUND' USING ERRCODE = 'P0001';
+    END IF;
+
+    -- Requested lines joined to their menu rows, in submission order.
+    SELECT jsonb_agg(jsonb_build_object(
+               'menu_item_id', m.id,
+               'item_name', m.name,
+               'unit_price', m.price,
+               'quantity', GREATEST(COALESCE((t.e->>'quantity')::int, 1), 1),
+               'options', NULLIF(t.e->'options', 'null'::jsonb),
+               'notes', COALESCE(t.e->>'notes', '')
+           ) ORDER BY t.ord)
+      INTO v_lines
+      FROM jsonb_array_elements(p_items) WITH ORDINALITY AS t(e, ord)
+      JOIN menu_items m ON m.id = (t.e->>'menu_item_id')::uuid;
+    IF v_lines IS NULL OR jsonb_array_length(v_lines) <> jsonb_array_length(p_items) THEN
+        RAISE EXCEPTION 'MENU_ITEMS_NOT_FOUND' USING ERRCODE = 'P0001';
+    END IF;
+
+    SELECT * INTO v_zone
+      FROM find_zone_for_point(p_website_id, p_lat, p_lng, true);
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'OUT_OF_COVERAGE' USING ERRCODE = 'P0001';
+    END IF;
+
+    SELECT COALESCE(sum(l.unit_price * l.quantity), 0) INTO v_subtotal
+      FROM jsonb_to_recordset(v_lines) AS l(unit_price NUMERIC, quantity INT);
+    IF v_subtotal < v_zone.min_order_cents / 100.0 THEN
+        RAISE EXCEPTION 'BELOW_MINIMUM' USING ERRCODE = 'P0001',
+            DETAIL = v_zone.min_order_cents::text;
+    END IF;
+    v_fee := v_zone.fee_cents / 100.0;
+    v_total := v_subtotal + v_fee;
+
+    -- order_number is filled by set_order_number_trigger (migration 002).
+    INSERT INTO delivery_orders (
+        website_id, customer_name, customer_phone, customer_email,
+        delivery_address, delivery_latitude, delivery_longitude, delivery_notes,
+        delivery_zone_id, delivery_fee, subtotal, total_amount,
+        payment_method, payment_status, status,
+        estimated_prep_time, estimated_delivery_time
+    ) VALUES (
+        p_website_id, v_name, v_phone, p_order->>'customer_email',
+        v_address, p_lat, p_lng, p_order->>'delivery_notes',
+        v_zone.id, v_fee, v_subtotal, v_total,
+        COALESCE(p_order->>'payment_method', 'cod'), 'pending', 'pending',
+        30, v_zone.estimated_delivery_min
+    )
+    RETURNING * INTO v_order;
+
+    INSERT INTO order_items (
+        order_id, menu_item_id, item_name, quantity,
+        unit_price, total_price, options, notes
+    )
+    SELECT v_order.id, l.menu_item_id, l.item_name, l.quantity,
+           l.unit_price, l.unit_price * l.quantity, l.options, l.notes
+      FROM jsonb_to_recordset(v_lines) AS l(
+          menu_item_id UUID, item_name TEXT, quantity INT,
+          unit_price NUMERIC, options JSONB, notes TEXT);
+
+    IF v_phone <> '' THEN
+        INSERT INTO website_customers (website_id, phone, name, address)
+        VALUES (p_website_id, v_phone, v_name, v_address)
+        ON CONFLICT (website_id, phone) DO UPDATE
+            SET name = EXCLUDED.name,
+                address = EXCLUDED.address,
+                updated_at = NOW()
+        RETURNING id INTO v_customer_id;
+    END IF;
+
+    -- Post-commit work. The conversation id is fixed here so every retry of
+    -- the order_chat job writes the same row.
+    INSERT INTO order_side_effects (order_id, kind, payload) VALUES
+        (v_order.id, 'order_chat', jsonb_build_object(
+            'conversation_id', v_conversation_id,
+            'order_id', v_order.id,
+            'order_number', v_order.order_number,
+            'website_id', p_website_id,
+            'website_name', v_website.display_name,
+            'owner_id', v_website.user_id,
+            'customer_name', v_name,
+            'customer_phone', v_phone,
+            'delivery_address', v_address,
+            'total_amount', v_total)),
+        (v_order.id, 'customer_whatsapp', jsonb_build_object(
+            'customer_phone', v_phone,
+            'order_number', v_order.order_number,
+            'restaurant_name', COALESCE(NULLIF(v_website.display_name, ''), 'Restoran'),
+            'total_amount', v_total));
+    IF v_website.user_id IS NOT NULL THEN
+        INSERT INTO order_side_effects (order_id, kind, payload) VALUES
+            (v_order.id, 'owner_whatsapp', jsonb_build_object(
+                'owner_id', v_website.user_id,
+                'order_number', v_order.order_number,
+                'customer_name', v_name,
+                'customer_phone', v_phone,
+                'delivery_address', v_address,
+                'total_amount', v_total,
+                'items', v_lines));
+    END IF;
+
+    RETURN jsonb_build_object(
+        'order', to_jsonb(v_order),
+        'customer_id', v_customer_id,
+        'conversation_id', v_conversation_id
+    );
+END
+$$;
+
+REVOKE ALL ON FUNCTION public.create_delivery_order(UUID, DOUBLE PRECISION, DOUBLE PRECISION, JSONB, JSONB)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.create_delivery_order(UUID, DOUBLE PRECISION, DOUBLE PRECISION, JSONB, JSONB)
+    TO service_role;
+
+-- =====================================================
+-- 3. Queue claim / finish
+-- =====================================================
+-- Leases up to p_limit runnable jobs (optionally for one order). SKIP
+-- LOCKED keeps concurrent workers off each other's rows; a 'running' job
+-- whose lease expired (worker died) is runnable again.
+CREATE OR REPLACE FUNCTION public.claim_order_side_effects(
+    p_limit INT DEFAULT 20,
+    p_lease_seconds INT DEFAULT 120,
+    p_order_id UUID DEFAULT NULL
+) RETURNS SETOF public.order_side_effects
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE order_side_effects e
+       SET status = 'running',
+           attempts = e.attempts + 1,
+           locked_until = NOW() + make_interval(secs => p_lease_seconds)
+     WHERE e.id IN (
+        SELECT q.id
+          FROM order_side_effects q
+         WHERE ((q.status = 'pending' AND q.run_after <= NOW())
+             OR (q.status = 'running' AND q.locked_until < NOW()))
+           AND (p_order_id IS NULL OR q.order_id = p_order_id)
+         ORDER BY q.id
+         LIMIT p_limit
+           FOR UPDATE SKIP LOCKED
+     )
+    RETURNING e.*;
+END
+$$;
+
+-- p_error NULL → done. Otherwise back off exponentially (30s, 60s, ...
+-- capped at 1h) and give up after p_max_attempts.
+CREATE OR REPLACE FUNCTION public.finish_order_side_effect(
+    p_id BIGINT,
+    p_error TEXT DEFAULT NULL,
+    p_max_attempts INT DEFAULT 6
+) RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF p_error IS NULL THEN
+        UPDATE order_side_effects
+           SET status = 'done', completed_at = NOW(), locked_until = NULL, last_error = NULL
+         WHERE id = p_id;
+    ELSE
+        UPDATE order_side_effects
+           SET status = CASE WHEN attempts >= p_max_attempts THEN 'dead' ELSE 'pending' END,
+               run_after = NOW() + LEAST(30 * power(2, GREATEST(attempts - 1, 0)), 3600) * INTERVAL '1 second',
+               locked_until = NULL,
+               last_error = left(p_error, 1000)
+         WHERE id = p_id;
+    END IF;
+END
+$$;
+
+REVOKE ALL ON FUNCTION public.claim_order_side_effects(INT, INT, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_order_side_effects(INT, INT, UUID) TO service_role;
+REVOKE ALL ON FUNCTION public.finish_order_side_effect(BIGINT, TEXT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.finish_order_side_effect(BIGINT, TEXT, INT) TO service_role;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- 1) Functions exist:
+-- SELECT proname FROM pg_proc
+--  WHERE proname IN ('create_delivery_order', 'claim_order_side_effects',
+--                    'finish_order_side_effect');   -- expect 3 rows
+--
+-- 2) Queue health — should hover near zero pending, no dead rows:
+-- SELECT kind, status, count(*) FROM public.order_side_effects
+--  GROUP BY 1, 2 ORDER BY 1, 2;
+--
+-- 3) Dead jobs with their last error:
+-- SELECT id, order_id, kind, attempts, last_error
+--   FROM public.order_side_effects WHERE status = 'dead' ORDER BY id DESC LIMIT 20;
@@ -0,0 +1,102 @@
+-- =====================================================
+-- 057_chat_inbox_rpc.sql
+--
+-- One-query owner inbox: list_chat_inbox().
+--
+-- GET /chat/conversations loaded the owner's websites, then every
+-- conversation, then ran one chat_messages select per conversation for
+-- the preview. An owner with 500 conversations waited on 502 sequential
+-- round trips on every inbox refresh.
+--
+-- list_chat_inbox() returns one row per conversation with:
+--   conversation  the chat_conversations row (to_jsonb, so every schema
+--                 variant of the table comes back as-is)
+--   messages      the last p_messages messages, oldest first (lateral join
+--                 on idx_chat_messages_conv_created)
+--   unread_count  messages not sent by the owner and not yet read
+-- Ownership is enforced in the join on websites.user_id, so the backend no
+-- longer pre-loads the owner's website ids.
+--
+-- Pagination is keyset on (updated_at, id) DESC: pass the last row's
+-- updated_at / id as p_before_updated_at / p_before_id for the next page.
+-- p_limit NULL returns every conversation (older clients that don't page).
+-- =====================================================
+
+BEGIN;
+
+-- Older chat schemas created chat_messages without is_read (migration 014
+-- backfills it); the unread count below needs it.
+ALTER TABLE public.chat_messages ADD COLUMN IF NOT EXISTS is_read BOOLEAN DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_website_updated
+    ON public.chat_conversations (website_id, updated_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_conv_created
+    ON public.chat_messages (conversation_id, created_at DESC);
+
+CREATE OR REPLACE FUNCTION public.list_chat_inbox(
+    p_user_id UUID,
+    p_website_ids UUID[] DEFAULT NULL,
+    p_status TEXT DEFAULT NULL,
+    p_before_updated_at TIMESTAMPTZ DEFAULT NULL,
+    p_before_id UUID DEFAULT NULL,
+    p_limit INT DEFAULT NULL,
+    p_messages INT DEFAULT 10
+) RETURNS TABLE (
+    conversation JSONB,
+    messages JSONB,
+    unread_count INT
+) LANGUAGE sql STABLE AS $$
+    SELECT
+        to_jsonb(c),
+        coalesce(recent.messages, '[]'::jsonb),
+        coalesce(unread.n, 0)
+    FROM public.chat_conversations c
+    JOIN public.websites w
+      ON w.id = c.website_id
+     AND w.user_id = p_user_id
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(to_jsonb(m) ORDER BY m.created_at) AS messages
+        FROM (
+            SELECT *
+            FROM public.chat_messages m0
+            WHERE m0.conversation_id = c.id
+            ORDER BY m0.created_at DESC
+            LIMIT p_messages
+        ) m
+    ) recent ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT count(*)::int AS n
+        FROM public.chat_messages m1
+        WHERE m1.conversation_id = c.id
+          AND m1.is_read IS NOT TRUE
+          AND m1.sender_type <> 'owner'
+    ) unread ON TRUE
+    WHERE (p_website_ids IS NULL OR c.website_id = ANY (p_website_ids))
+      AND (p_status IS NULL OR c.status = p_status)
+      AND (
+        p_before_updated_at IS NULL
+        OR (c.updated_at, c.id) < (p_before_updated_at, p_before_id)
+      )
+    ORDER BY c.updated_at DESC, c.id DESC
+    LIMIT p_limit;
+$$;
+
+-- p_user_id is trusted input (the backend passes the JWT subject), so the
+-- function is service-role only.
+REVOKE ALL ON FUNCTION public.list_chat_inbox(UUID, UUID[], TEXT, TIMESTAMPTZ, UUID, INT, INT)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.list_chat_inbox(UUID, UUID[], TEXT, TIMESTAMPTZ, UUID, INT, INT)
+    TO service_role;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- EXPLAIN ANALYZE
+-- SELECT * FROM public.list_chat_inbox('<owner uuid>', NULL, NULL, NULL, NULL, 50, 10);
+-- expect an Index Scan on idx_chat_messages_conv_created inside the lateral
+-- loop, not a Seq Scan on chat_messages.
@@ -0,0 +1,142 @@
+-- =====================================================
+-- 058_email_outbox.sql
+--
+-- Persistent outbox for bulk / non-interactive email.
+--
+-- The subscription cron sent each reminder, expiry and grace-period email
+-- inline, one SMTP session per message, and a Zoho hiccup simply lost the
+-- email (the cron logged and moved on). Emails now go into email_outbox
+-- and app/services/email_outbox.py sends them in batches over pooled SMTP
+-- connections (app/services/smtp_pool.py), retrying failures with backoff.
+--
+--   dedupe_key  unique when set: the cron uses '<type>:<email>:<date>' so
+--               a re-run on the same day does not queue the email twice.
+--   permanent   finish_email_outbox(p_permanent => true) marks a row dead
+--               at once (recipient refused: retrying cannot help).
+--
+-- Apply in the Supabase SQL editor. Idempotent. Until it is applied the
+-- backend sends directly, as before.
+-- =====================================================
+
+BEGIN;
+
+-- =====================================================
+-- 1. Outbox
+-- =====================================================
+CREATE TABLE IF NOT EXISTS public.email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL DEFAULT 'general',
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html_content TEXT NOT NULL,
+    text_content TEXT,
+    from_email TEXT,
+    from_name TEXT,
+    reply_to TEXT,
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'sent', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+-- Full (not partial) unique index so PostgREST on_conflict=dedupe_key works.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_email_outbox_dedupe
+    ON public.email_outbox (dedupe_key);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_live
+    ON public.email_outbox (run_after, id)
+    WHERE status IN ('pending', 'running');
+
+COMMENT ON TABLE public.email_outbox IS
+    'Queued outgoing email; drained by the backend '
+    '(claim_email_outbox / finish_email_outbox).';
+
+ALTER TABLE public.email_outbox ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.email_outbox FROM PUBLIC, anon, authenticated;
+GRANT ALL ON public.email_outbox TO service_role;
+GRANT USAGE, SELECT ON SEQUENCE public.email_outbox_id_seq TO service_role;
+
+-- =====================================================
+-- 2. Claim / finish (same lease + backoff as migration 056)
+-- =====================================================
+CREATE OR REPLACE FUNCTION public.claim_email_outbox(
+    p_limit INT DEFAULT 50,
+    p_lease_seconds INT DEFAULT 300
+) RETURNS SETOF public.email_outbox
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE email_outbox e
+       SET status = 'running',
+           attempts = e.attempts + 1,
+           locked_until = NOW() + make_interval(secs => p_lease_seconds)
+     WHERE e.id IN (
+        SELECT q.id
+          FROM email_outbox q
+         WHERE (q.status = 'pending' AND q.run_after <= NOW())
+            OR (q.status = 'running' AND q.locked_until < NOW())
+         ORDER BY q.id
+         LIMIT p_limit
+           FOR UPDATE SKIP LOCKED
+     )
+    RETURNING e.*;
+END
+$$;
+
+-- p_error NULL → sent. Otherwise back off (60s, 120s, ... capped at 1h)
+-- and give up after p_max_attempts, or at once when p_permanent.
+CREATE OR REPLACE FUNCTION public.finish_email_outbox(
+    p_id BIGINT,
+    p_error TEXT DEFAULT NULL,
+    p_max_attempts INT DEFAULT 6,
+    p_permanent BOOLEAN DEFAULT FALSE
+) RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF p_error IS NULL THEN
+        UPDATE email_outbox
+           SET status = 'sent', sent_at = NOW(), locked_until = NULL, last_error = NULL
+         WHERE id = p_id;
+    ELSE
+        UPDATE email_outbox
+           SET status = CASE WHEN p_permanent OR attempts >= p_max_attempts THEN 'dead' ELSE 'pending' END,
+               run_after = NOW() + LEAST(60 * power(2, GREATEST(attempts - 1, 0)), 3600) * INTERVAL '1 second',
+               locked_until = NULL,
+               last_error = left(p_error, 1000)
+         WHERE id = p_id;
+    END IF;
+END
+$$;
+
+REVOKE ALL ON FUNCTION public.claim_email_outbox(INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_email_outbox(INT, INT) TO service_role;
+REVOKE ALL ON FUNCTION public.finish_email_outbox(BIGINT, TEXT, INT, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.finish_email_outbox(BIGINT, TEXT, INT, BOOLEAN) TO service_role;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- 1) Functions exist:
+-- SELECT proname FROM pg_proc
+--  WHERE proname IN ('claim_email_outbox', 'finish_email_outbox');   -- expect 2 rows
+--
+-- 2) Outbox health — pending should drain every few minutes:
+-- SELECT kind, status, count(*) FROM public.email_outbox GROUP BY 1, 2 ORDER BY 1, 2;
+--
+-- 3) Dead emails with their last error:
+-- SELECT id, kind, to_email, attempts, last_error
+--   FROM public.email_outbox WHERE status = 'dead' ORDER BY id DESC LIMIT 20;
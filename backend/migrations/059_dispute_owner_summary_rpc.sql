@@ -0,0 +1,118 @@
+-- =====================================================
+-- 059_dispute_owner_summary_rpc.sql
+--
+-- Server-side dispute analytics + keyset indexes for the owner views.
+--
+-- GET /disputes/owner/summary fetched every ai_disputes row of the owner's
+-- websites with select("*") and computed the counts, refund total,
+-- category / priority breakdowns and average resolution time in Python,
+-- so the dashboard got slower with every dispute ever filed.
+-- dispute_owner_summary() returns the same figures from one aggregate
+-- query.
+--
+-- GET /disputes/owner/list pages by (created_at, id) keyset now; the two
+-- indexes below serve it with and without the status filter, and the
+-- summary's website_id join.
+--
+-- ai_disputes has no CREATE TABLE in this repo (created in prod, see 051),
+-- so the indexes are guarded; the function is plpgsql and only resolves
+-- the table when called.
+--
+-- Apply in the Supabase SQL editor. Idempotent. Until it is applied the
+-- backend computes the summary in Python, as before.
+-- =====================================================
+
+BEGIN;
+
+-- =====================================================
+-- 1. Indexes
+-- =====================================================
+DO $$
+BEGIN
+    IF to_regclass('public.ai_disputes') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_ai_disputes_website_created
+            ON public.ai_disputes (website_id, created_at DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_ai_disputes_website_status_created
+            ON public.ai_disputes (website_id, status, created_at DESC, id DESC);
+    END IF;
+END $$;
+
+-- =====================================================
+-- 2. dispute_owner_summary
+-- =====================================================
+-- Same definitions as the Python summary it replaces:
+--   open      = open | under_review | awaiting_response
+--   resolved  = resolved | closed
+--   avg_resolution_hours over disputes with resolved_at set
+CREATE OR REPLACE FUNCTION public.dispute_owner_summary(p_user_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_result JSONB;
+BEGIN
+    WITH d AS (
+        SELECT d.status, d.category, d.priority, d.refund_amount,
+               d.created_at, d.resolved_at
+          FROM ai_disputes d
+          JOIN websites w ON w.id = d.website_id
+         WHERE w.user_id = p_user_id
+    ),
+    totals AS (
+        SELECT count(*) AS total,
+               count(*) FILTER (WHERE status IN ('open', 'under_review', 'awaiting_response')) AS open,
+               count(*) FILTER (WHERE status IN ('resolved', 'closed')) AS resolved,
+               count(*) FILTER (WHERE status = 'escalated') AS escalated,
+               COALESCE(sum(refund_amount), 0) AS total_refunded,
+               avg(extract(epoch FROM resolved_at - created_at) / 3600.0)
+                   FILTER (WHERE resolved_at IS NOT NULL AND created_at IS NOT NULL) AS avg_hours
+          FROM d
+    )
+    SELECT jsonb_build_object(
+               'total', t.total,
+               'open', t.open,
+               'resolved', t.resolved,
+               'escalated', t.escalated,
+               'total_refunded', t.total_refunded,
+               'avg_resolution_hours', t.avg_hours,
+               'by_category', COALESCE((
+                   SELECT jsonb_object_agg(c.k, c.n)
+                     FROM (SELECT COALESCE(category, 'other') AS k, count(*) AS n
+                             FROM d GROUP BY 1) c
+               ), '{}'::jsonb),
+               'by_priority', COALESCE((
+                   SELECT jsonb_object_agg(p.k, p.n)
+                     FROM (SELECT COALESCE(priority, 'medium') AS k, count(*) AS n
+                             FROM d GROUP BY 1) p
+               ), '{}'::jsonb)
+           )
+      INTO v_result
+      FROM totals t;
+    RETURN v_result;
+END
+$$;
+
+REVOKE ALL ON FUNCTION public.dispute_owner_summary(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.dispute_owner_summary(UUID) TO service_role;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- 1) Function exists:
+-- SELECT proname FROM pg_proc WHERE proname = 'dispute_owner_summary';   -- expect 1 row
+--
+-- 2) Summary for one owner:
+-- SELECT public.dispute_owner_summary('<owner uuid>');
+--
+-- 3) List page uses the keyset index (expect Index Scan on
+--    idx_ai_disputes_website_status_created):
+-- EXPLAIN SELECT * FROM public.ai_disputes
+--  WHERE website_id = ANY('{<website uuid>}') AND status = 'open'
+--  ORDER BY created_at DESC, id DESC LIMIT 21;
@@ -0,0 +1,52 @@
+-- =====================================================
+-- 060_support_chat_history_summary.sql
+--
+-- Rolling summary + tail index for the AI support chatbot history.
+--
+-- AIChatbotService.chat() read every ai_support_messages row of a chat on
+-- each turn and kept the last 20 in Python. It now fetches only the
+-- newest SUPPORT_HISTORY_TAIL messages (newest first, LIMIT n) and carries
+-- older turns as a summary stored on the chat row:
+--
+--   history_summary            summary text of the summarised messages
+--   history_summarized_count   how many of the oldest messages it covers
+--
+-- The summary is refreshed in the background by the chat model once
+-- enough messages have fallen out of the tail; the update is guarded on
+-- history_summarized_count so two refreshes never overwrite each other.
+--
+-- Apply in the Supabase SQL editor. Idempotent. Until it is applied the
+-- chatbot sends the tail alone, without a summary.
+-- =====================================================
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF to_regclass('public.ai_support_chats') IS NOT NULL THEN
+        ALTER TABLE public.ai_support_chats
+            ADD COLUMN IF NOT EXISTS history_summary TEXT,
+            ADD COLUMN IF NOT EXISTS history_summarized_count INTEGER NOT NULL DEFAULT 0;
+    END IF;
+
+    IF to_regclass('public.ai_support_messages') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_support_messages_chat_created
+            ON public.ai_support_messages (chat_id, created_at DESC);
+    END IF;
+END $$;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- 1) Columns exist:
+-- SELECT column_name FROM information_schema.columns
+--  WHERE table_name = 'ai_support_chats' AND column_name LIKE 'history_%';   -- expect 2 rows
+--
+-- 2) Tail query uses the index (expect Index Scan on
+--    idx_support_messages_chat_created):
+-- EXPLAIN SELECT role, content FROM public.ai_support_messages
+--  WHERE chat_id = '<chat uuid>' ORDER BY created_at DESC LIMIT 12;
@@ -0,0 +1,218 @@
+-- =====================================================
+-- 061_create_delivery_order_conversation.sql
+--
+-- create_delivery_order() (migration 056) returned a conversation_id whose
+-- chat_conversations row was only written later, by the order_chat
+-- side-effect job. A customer who opened the chat straight from the
+-- checkout response got a 404 or an empty chat until that job had run.
+--
+-- The function now inserts the conversation in the checkout transaction
+-- and reports it with 'conversation_created': true. Everything else is
+-- unchanged. The order_chat job keeps the same payload; its conversation
+-- insert hits the existing id and is ignored, and it still writes the
+-- "Pesanan baru" system message and the owner notification.
+--
+-- chat_conversations has drifted between environments (migrations 004,
+-- 008, 014), so this migration first makes sure the columns the insert
+-- relies on exist and that the legacy customer_id column, which the
+-- backend no longer writes, does not block it.
+--
+-- Apply in the Supabase SQL editor after 056. Idempotent. Until it is
+-- applied the backend writes the conversation itself before returning
+-- the checkout response.
+-- =====================================================
+
+BEGIN;
+
+-- =====================================================
+-- 1. chat_conversations columns
+-- =====================================================
+DO $$
+BEGIN
+    IF to_regclass('public.chat_conversations') IS NOT NULL THEN
+        ALTER TABLE public.chat_conversations
+            ADD COLUMN IF NOT EXISTS website_name TEXT;
+
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = 'public'
+                      AND table_name = 'chat_conversations'
+                      AND column_name = 'customer_id'
+                      AND is_nullable = 'NO') THEN
+            ALTER TABLE public.chat_conversations
+                ALTER COLUMN customer_id DROP NOT NULL;
+        END IF;
+    END IF;
+END $$;
+
+-- =====================================================
+-- 2. create_delivery_order
+-- =====================================================
+CREATE OR REPLACE FUNCTION public.create_delivery_order(
+    p_website_id UUID,
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_order JSONB,
+    p_items JSONB
+) RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_website RECORD;
+    v_zone RECORD;
+    v_lines JSONB;
+    v_subtotal NUMERIC(10,2);
+    v_fee NUMERIC(10,2);
+    v_total NUMERIC(10,2);
+    v_order delivery_orders%ROWTYPE;
+    v_customer_id UUID;
+    v_conversation_id UUID := gen_random_uuid();
+    v_phone TEXT := COALESCE(p_order->>'customer_phone', '');
+    v_name TEXT := COALESCE(p_order->>'customer_name', '');
+    v_address TEXT := COALESCE(p_order->>'delivery_address', '');
+BEGIN
+    SELECT id, user_id, COALESCE(NULLIF(business_name, ''), name, '') AS display_name
+      INTO v_website
+      FROM websites
+     WHERE id = p_website_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'WEBSITE_NOT_FOUND' USING ERRCODE = 'P0001';
+    END IF;
+
+    -- Requested lines joined to their menu rows, in submission order.
+    SELECT jsonb_agg(jsonb_build_object(
+               'menu_item_id', m.id,
+               'item_name', m.name,
+               'unit_price', m.price,
+               'quantity', GREATEST(COALESCE((t.e->>'quantity')::int, 1), 1),
+               'options', NULLIF(t.e->'options', 'null'::jsonb),
+               'notes', COALESCE(t.e->>'notes', '')
+           ) ORDER BY t.ord)
+      INTO v_lines
+      FROM jsonb_array_elements(p_items) WITH ORDINALITY AS t(e, ord)
+      JOIN menu_items m ON m.id = (t.e->>'menu_item_id')::uuid;
+    IF v_lines IS NULL OR jsonb_array_length(v_lines) <> jsonb_array_length(p_items) THEN
+        RAISE EXCEPTION 'MENU_ITEMS_NOT_FOUND' USING ERRCODE = 'P0001';
+    END IF;
+
+    SELECT * INTO v_zone
+      FROM find_zone_for_point(p_website_id, p_lat, p_lng, true);
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'OUT_OF_COVERAGE' USING ERRCODE = 'P0001';
+    END IF;
+
+    SELECT COALESCE(sum(l.unit_price * l.quantity), 0) INTO v_subtotal
+      FROM jsonb_to_recordset(v_lines) AS l(unit_price NUMERIC, quantity INT);
+    IF v_subtotal < v_zone.min_order_cents / 100.0 THEN
+        RAISE EXCEPTION 'BELOW_MINIMUM' USING ERRCODE = 'P0001',
+            DETAIL = v_zone.min_order_cents::text;
+    END IF;
+    v_fee := v_zone.fee_cents / 100.0;
+    v_total := v_subtotal + v_fee;
+
+    -- order_number is filled by set_order_number_trigger (migration 002).
+    INSERT INTO delivery_orders (
+        website_id, customer_name, customer_phone, customer_email,
+        delivery_address, delivery_latitude, delivery_longitude, delivery_notes,
+        delivery_zone_id, delivery_fee, subtotal, total_amount,
+        payment_method, payment_status, status,
+        estimated_prep_time, estimated_delivery_time
+    ) VALUES (
+        p_website_id, v_name, v_phone, p_order->>'customer_email',
+        v_address, p_lat, p_lng, p_order->>'delivery_notes',
+        v_zone.id, v_fee, v_subtotal, v_total,
+        COALESCE(p_order->>'payment_method', 'cod'), 'pending', 'pending',
+        30, v_zone.estimated_delivery_min
+    )
+    RETURNING * INTO v_order;
+
+    INSERT INTO order_items (
+        order_id, menu_item_id, item_name, quantity,
+        unit_price, total_price, options, notes
+    )
+    SELECT v_order.id, l.menu_item_id, l.item_name, l.quantity,
+           l.unit_price, l.unit_price * l.quantity, l.options, l.notes
+      FROM jsonb_to_recordset(v_lines) AS l(
+          menu_item_id UUID, item_name TEXT, quantity INT,
+          unit_price NUMERIC, options JSONB, notes TEXT);
+
+    IF v_phone <> '' THEN
+        INSERT INTO website_customers (website_id, phone, name, address)
+        VALUES (p_website_id, v_phone, v_name, v_address)
+        ON CONFLICT (website_id, phone) DO UPDATE
+            SET name = EXCLUDED.name,
+                address = EXCLUDED.address,
+                updated_at = NOW()
+        RETURNING id INTO v_customer_id;
+    END IF;
+
+    -- The chat exists as soon as the order does, so the conversation_id in
+    -- the response can be opened straight away.
+    INSERT INTO chat_conversations (
+        id, order_id, website_id, website_name,
+        customer_name, customer_phone, status
+    ) VALUES (
+        v_conversation_id, v_order.id, p_website_id, v_website.display_name,
+        COALESCE(NULLIF(v_name, ''), 'Customer'), v_phone, 'active'
+    )
+    ON CONFLICT (id) DO NOTHING;
+
+    -- Post-commit work. order_chat still carries the conversation so its
+    -- insert stays a harmless no-op retry; it adds the system message and
+    -- owner notification.
+    INSERT INTO order_side_effects (order_id, kind, payload) VALUES
+        (v_order.id, 'order_chat', jsonb_build_object(
+            'conversation_id', v_conversation_id,
+            'order_id', v_order.id,
+            'order_number', v_order.order_number,
+            'website_id', p_website_id,
+            'website_name', v_website.display_name,
+            'owner_id', v_website.user_id,
+            'customer_name', v_name,
+            'customer_phone', v_phone,
+            'delivery_address', v_address,
+            'total_amount', v_total)),
+        (v_order.id, 'customer_whatsapp', jsonb_build_object(
+            'customer_phone', v_phone,
+            'order_number', v_order.order_number,
+            'restaurant_name', COALESCE(NULLIF(v_website.display_name, ''), 'Restoran'),
+            'total_amount', v_total));
+    IF v_website.user_id IS NOT NULL THEN
+        INSERT INTO order_side_effects (order_id, kind, payload) VALUES
+            (v_order.id, 'owner_whatsapp', jsonb_build_object(
+                'owner_id', v_website.user_id,
+                'order_number', v_order.order_number,
+                'customer_name', v_name,
+                'customer_phone', v_phone,
+                'delivery_address', v_address,
+                'total_amount', v_total,
+                'items', v_lines));
+    END IF;
+
+    RETURN jsonb_build_object(
+        'order', to_jsonb(v_order),
+        'customer_id', v_customer_id,
+        'conversation_id', v_conversation_id,
+        'conversation_created', true
+    );
+END
+$$;
+
+REVOKE ALL ON FUNCTION public.create_delivery_order(UUID, DOUBLE PRECISION, DOUBLE PRECISION, JSONB, JSONB)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.create_delivery_order(UUID, DOUBLE PRECISION, DOUBLE PRECISION, JSONB, JSONB)
+    TO service_role;
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- =====================================================
+-- Verification (run after applying)
+-- =====================================================
+-- 1) Every recent RPC order has its conversation (expect 0 rows):
+-- SELECT o.id, o.order_number FROM public.delivery_orders o
+--   JOIN public.order_side_effects e ON e.order_id = o.id AND e.kind = 'order_chat'
+--  WHERE o.created_at > NOW() - INTERVAL '1 day'
+--    AND NOT EXISTS (SELECT 1 FROM public.chat_conversations c WHERE c.order_id = o.id);
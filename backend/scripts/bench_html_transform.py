@@ -0,0 +1,112 @@
+"""
+Benchmark post-generation clean-up: the old chain of whole-document passes
+(wa.me normalization, FA glyphs, food-icon bias, Tailwind, Malay typos)
+against lint_html(wa_links=True), which runs them as rewriters of one
+HtmlTransform. Asserts identical HTML and reports on every sample page.
+
+Pages: every *.html in the repository's docs/ and app/templates/, each
+also with a block of typical generator mistakes injected before </body>
+so every rewriter has work to do.
+
+Run:
+    cd backend && python scripts/bench_html_transform.py
+    cd backend && python scripts/bench_html_transform.py --repeat 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from loguru import logger
+
+logger.remove()
+
+from app.services.ai_service import AIService
+from app.services.generation_linter import (
+    lint_food_icon_bias,
+    lint_fontawesome_icons,
+    lint_html,
+    lint_malay_typos,
+    lint_tailwind_classes,
+)
+
+CONTEXT = "Kedai Phone Ali — kedai phone & smart line"
+BUSINESS_TYPE = "phone"
+
+DEFECTS = """
+<section class="py-20 -right-30 bg-amber-300/8">
+  <i class="fa-solid fa-pot-food text-2xl"></i>
+  <i class="fas fa-bowl-food"></i>
+  <p class="text-black/33 mt-13">Sesuai untuk majas rumah dan tempahn korporat.</p>
+  <a href="https://wa.me/+60 12-345 6789?text=Hai">WhatsApp</a>
+</section>
+"""
+
+
+def pages() -> List[Tuple[str, str]]:
+    roots = [BACKEND.parent / "docs", BACKEND / "app" / "templates"]
+    found = []
+    for root in roots:
+        for path in sorted(root.rglob("*.html")):
+            html = path.read_text(encoding="utf-8")
+            found.append((path.name, html))
+            found.append((f"{path.name}+defects", html.replace("</body>", DEFECTS + "</body>", 1)))
+    return found
+
+
+def legacy(html: str):
+    html = AIService._normalize_wa_links(html)
+    html, fa = lint_fontawesome_icons(html, CONTEXT)
+    html, food = lint_food_icon_bias(html, BUSINESS_TYPE, CONTEXT)
+    html, tw = lint_tailwind_classes(html)
+    html, typos = lint_malay_typos(html)
+    return html, (fa, food, tw, typos)
+
+
+def single_pass(html: str):
+    html, report = lint_html(html, CONTEXT, BUSINESS_TYPE, wa_links=True)
+    return html, (
+        report.fa_replacements, report.food_icon_replacements, report.tw_rewrites, report.typo_fixes,
+    )
+
+
+def timed(label: str, fn: Callable[[str], object], docs: List[str], repeat: int) -> float:
+    for html in docs:
+        fn(html)  # warm regex caches
+    start = time.process_time()
+    for _ in range(repeat):
+        for html in docs:
+            fn(html)
+    per_page = (time.process_time() - start) / (repeat * len(docs)) * 1e3
+    print(f"  {label:<28} {per_page:9.3f} ms/page (CPU)")
+    return per_page
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    samples = pages()
+    changed = 0
+    for name, html in samples:
+        old, new = legacy(html), single_pass(html)
+        assert new == old, f"output differs on {name}"
+        changed += old[0] != html
+    docs = [html for _, html in samples]
+    size = sum(len(d) for d in docs)
+    print(f"{len(docs)} pages, {size / 1024:.0f} KB, {changed} rewritten — output identical")
+    old = timed("whole-document passes", legacy, docs, args.repeat)
+    new = timed("HtmlTransform single pass", single_pass, docs, args.repeat)
+    print(f"  speedup                      {old / new:9.1f}×")
+
+
+if __name__ == "__main__":
+    main()
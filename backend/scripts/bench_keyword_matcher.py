@@ -0,0 +1,94 @@
+"""
+Benchmark whole-word keyword matching: the old one-`re.search`-per-keyword
+loop against app.utils.keyword_matcher.KeywordMatcher, on the vocabularies
+business classification and image selection actually use.
+
+Run:
+    cd backend && python scripts/bench_keyword_matcher.py
+    cd backend && python scripts/bench_keyword_matcher.py --repeat 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+logger.remove()
+
+from app.services.ai_service import AIService
+from app.services.business_types import BUSINESS_TYPE_KEYWORDS
+from app.utils.keyword_matcher import KeywordMatcher
+
+DESCRIPTIONS = [
+    "Kedai kek hari jadi dan kek kahwin di Shah Alam. Kami juga ada cupcakes, "
+    "brownies dan cheesecake, tempahan untuk majlis perkahwinan dan hari raya.",
+    "Warung mamak 24 jam — nasi lemak, nasi kandar, roti canai, mee goreng "
+    "mamak, teh tarik dan kopi o. Delivery sekitar Bangsar dan Brickfields.",
+    "Pusat kecantikan muslimah: facial, rawatan rambut, hair spa, urut badan, "
+    "manicure pedicure. Pakej pengantin dan makeup untuk majlis.",
+    "Servis aircond dan pendawaian elektrik rumah, pemasangan kipas, repair "
+    "peti sejuk. Perkhidmatan pantas di Johor Bahru dan Iskandar Puteri.",
+    "Butik baju kurung moden, tudung bawal, kebaya dan aksesori. Koleksi "
+    "raya terkini, saiz XS hingga 5XL, pos ke seluruh Malaysia.",
+]
+
+MENU = [
+    "Nasi Lemak Ayam Rendang", "Teh Tarik Kaw", "Kek Coklat Moist", "Roti Canai Telur",
+    "Baju Kurung Pahang", "Tudung Bawal Satin", "Potong Rambut Lelaki", "Facial Deep Cleansing",
+    "Mee Goreng Mamak", "Cendol Durian", "Servis Aircond 1HP", "Set Hadiah Korporat",
+]
+
+
+def old_matched(text: str, keywords: Iterable[str]) -> set:
+    return {k for k in keywords if re.search(rf"\b{re.escape(k)}\b", text)}
+
+
+def timed(label: str, fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm regex caches
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call = (time.perf_counter() - start) / repeat * 1e6
+    print(f"  {label:<28} {per_call:9.1f} µs")
+    return per_call
+
+
+def bench(name: str, keywords: List[str], texts: List[str], repeat: int) -> None:
+    matcher = KeywordMatcher(keywords)
+    for text in texts:
+        assert matcher.matched(text) == old_matched(text, keywords), text
+    print(f"{name}: {len(keywords)} keywords × {len(texts)} texts")
+    old = timed("per-keyword re.search", lambda: [old_matched(t, keywords) for t in texts], repeat)
+    new = timed("KeywordMatcher", lambda: [matcher.matched(t) for t in texts], repeat)
+    print(f"  speedup                      {old / new:9.1f}×\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    descriptions = [d.lower() for d in DESCRIPTIONS]
+    menu = [m.lower() for m in MENU]
+    business_keywords = list(dict.fromkeys(k for ks in BUSINESS_TYPE_KEYWORDS.values() for k in ks))
+    image_keys = [k for k in AIService._ALL_IMAGES if k != "default"]
+
+    bench("detect_business_type", business_keywords, descriptions, args.repeat)
+    bench("image keys (get_matching_image)", image_keys, menu, args.repeat)
+    bench("Malay pool keywords", list(AIService.MALAY_KEYWORD_TO_POOL), menu, args.repeat)
+
+    service = AIService.__new__(AIService)
+    print(f"get_matching_image over {len(MENU)} menu items")
+    timed("end to end", lambda: [service.get_matching_image(m) for m in MENU], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Build the offline geocoder index (app/data/gazetteer/my_gazetteer.bin).
+
+Compiles the human-editable TSV source table into the fixed-width,
+mmap-able index read by app.core.gazetteer. Re-run after editing
+app/data/gazetteer/my_places.tsv and commit both files together —
+tests/test_gazetteer.py fails when the committed .bin is stale.
+
+Run:
+    cd backend && python scripts/build_gazetteer.py
+    # add a GeoNames postal-code dump (https://download.geonames.org/export/zip/MY.zip)
+    cd backend && python scripts/build_gazetteer.py --geonames MY.txt --out /srv/gazetteer.bin
+
+An index built with --geonames is large; point GEOCODER_OFFLINE_INDEX at
+it instead of committing it. The bundled index covers the postcodes and
+localities listed in my_places.tsv.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.gazetteer import (
+    DEFAULT_INDEX_PATH,
+    DEFAULT_SOURCE_PATH,
+    GazetteerRow,
+    build_index,
+    read_source,
+)
+
+
+def read_geonames(path: Path) -> List[GazetteerRow]:
+    """GeoNames postal-code dump → postcode + locality rows.
+
+    Columns: country, postal code, place name, admin1 name, admin1 code,
+    admin2 name, admin2 code, admin3 name, admin3 code, lat, lng, accuracy.
+    """
+    rows: List[GazetteerRow] = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 11 or cols[0] != "MY" or len(cols[1]) != 5:
+                continue
+            postcode, place, state = cols[1], cols[2], cols[3]
+            lat, lng = float(cols[9]), float(cols[10])
+            rows.append(GazetteerRow("postcode", "", postcode, state, lat, lng))
+            if place:
+                rows.append(GazetteerRow("locality", place, postcode, state, lat, lng))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--source", type=Path, default=DEFAULT_SOURCE_PATH)
+    parser.add_argument("--geonames", type=Path, help="optional GeoNames MY.txt dump")
+    parser.add_argument("--out", type=Path, default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+
+    # Curated rows first: build_index keeps the first row per postcode, so
+    # hand-checked centroids win over the GeoNames ones.
+    rows = read_source(args.source)
+    if args.geonames:
+        rows += read_geonames(args.geonames)
+
+    blob = build_index(rows)
+    args.out.write_bytes(blob)
+    print(f"Wrote {args.out} ({len(blob):,} bytes, {len(rows):,} source rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Provides:
 - FastAPI TestClient fixture
 - Fake JWT tokens for authenticated requests
 - Mock environment variables
+- A fresh in-process provider governor per test
 """
 
 import os
@@ -126,6 +127,234 @@ def mock_supabase_table():
     return _factory
 
 
+class FakeSupabase:
+    """In-memory stand-in for the sync Supabase client.
+
+    table() queries filter, order and page the rows in `tables` the way
+    PostgREST would (eq / neq / lt / lte / gt / gte / in_ / is_ / or_,
+    order, limit, range, single, count="exact"), and writes change them.
+    rpc() answers from `rpc`: a value, a callable taking the params, or an
+    exception to raise. Anything in `errors` (by table or function name)
+    is raised on execute().
+
+    Every table query's calls are recorded under calls[table] as
+    (method, args, kwargs); rpc calls in rpc_calls; writes in writes as
+    (table, op, payload).
+    """
+
+    def __init__(self, tables=None, rpc=None, errors=None):
+        self.tables = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.rpc_results = dict(rpc or {})
+        self.errors = dict(errors or {})
+        self.calls = {}
+        self.rpc_calls = []
+        self.writes = []
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        self.rpc_calls.append((name, params))
+        return _FakeRpc(self, name, params)
+
+
+class _FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+        self.error = None
+
+
+class _FakeRpc:
+    def __init__(self, fake, name, params):
+        self.fake, self.name, self.params = fake, name, params
+
+    def execute(self):
+        if self.name in self.fake.errors:
+            raise self.fake.errors[self.name]
+        result = self.fake.rpc_results.get(self.name)
+        if isinstance(result, Exception):
+            raise result
+        if callable(result):
+            result = result(self.params)
+        return _FakeResult(result)
+
+
+def _split_terms(expr):
+    """Top-level comma-separated terms of a PostgREST or=/and= filter."""
+    terms, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(expr):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            terms.append(expr[start:i])
+            start = i + 1
+    terms.append(expr[start:])
+    return terms
+
+
+def _compare(value, op, target):
+    if op == "is":
+        return value is None if target in (None, "null") else value == target
+    if op == "in":
+        return str(value) in {str(t) for t in target}
+    if value is None:
+        return op == "neq"
+    if not isinstance(value, str):
+        target = type(value)(target)
+    elif not isinstance(target, str):
+        target = str(target)
+    return {
+        "eq": value == target, "neq": value != target,
+        "lt": value < target, "lte": value <= target,
+        "gt": value > target, "gte": value >= target,
+    }[op]
+
+
+def _matches(row, expr):
+    """Whether `row` passes one PostgREST filter term (col.op.value,
+    and(...), or(...))."""
+    for group, combine in (("and(", all), ("or(", any)):
+        if expr.startswith(group):
+            return combine(_matches(row, term) for term in _split_terms(expr[len(group):-1]))
+    col, op, value = expr.split(".", 2)
+    return _compare(row.get(col), op, value.strip('"'))
+
+
+class _FakeQuery:
+    def __init__(self, fake, name):
+        self.fake, self.name = fake, name
+        self.calls = fake.calls.setdefault(name, [])
+        self.filters = []
+        self.orders = []
+        self.window = (0, None)
+        self.count = None
+        self.head = False
+        self.one = False
+        self.write = None
+
+    def _record(self, method, *args, **kwargs):
+        self.calls.append((method, args, kwargs))
+        return self
+
+    def select(self, *columns, count=None, head=None):
+        self.count, self.head = count, bool(head)
+        kwargs = {"count": count} if head is None else {"count": count, "head": head}
+        return self._record("select", *columns, **kwargs)
+
+    def _filter(self, op, col, value):
+        self.filters.append(lambda r: _compare(r.get(col), op, value))
+        return self._record(op if op not in ("in", "is") else f"{op}_", col, value)
+
+    def eq(self, col, value):
+        return self._filter("eq", col, value)
+
+    def neq(self, col, value):
+        return self._filter("neq", col, value)
+
+    def lt(self, col, value):
+        return self._filter("lt", col, value)
+
+    def lte(self, col, value):
+        return self._filter("lte", col, value)
+
+    def gt(self, col, value):
+        return self._filter("gt", col, value)
+
+    def gte(self, col, value):
+        return self._filter("gte", col, value)
+
+    def in_(self, col, values):
+        return self._filter("in", col, list(values))
+
+    def is_(self, col, value):
+        return self._filter("is", col, value)
+
+    def or_(self, expr):
+        self.filters.append(lambda r: any(_matches(r, term) for term in _split_terms(expr)))
+        return self._record("or_", expr)
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self._record("order", col, desc=desc)
+
+    def limit(self, n):
+        self.window = (self.window[0], n)
+        return self._record("limit", n)
+
+    def range(self, start, end):
+        self.window = (start, end - start + 1)
+        return self._record("range", start, end)
+
+    def single(self):
+        self.one = True
+        return self._record("single")
+
+    maybe_single = single
+
+    def insert(self, rows):
+        self.write = ("insert", rows)
+        return self._record("insert", rows)
+
+    def upsert(self, rows, **kwargs):
+        self.write = ("upsert", rows)
+        return self._record("upsert", rows, **kwargs)
+
+    def update(self, values):
+        self.write = ("update", values)
+        return self._record("update", values)
+
+    def delete(self):
+        self.write = ("delete", None)
+        return self._record("delete")
+
+    def _selected(self, rows):
+        return [r for r in rows if all(f(r) for f in self.filters)]
+
+    def execute(self):
+        if self.name in self.fake.errors:
+            raise self.fake.errors[self.name]
+        table = self.fake.tables.setdefault(self.name, [])
+        if self.write is not None:
+            op, payload = self.write
+            self.fake.writes.append((self.name, op, payload))
+            if op in ("insert", "upsert"):
+                new = [dict(r) for r in (payload if isinstance(payload, list) else [payload])]
+                if op == "upsert":
+                    ids = {r.get("id") for r in new}
+                    table[:] = [r for r in table if r.get("id") not in ids]
+                table.extend(new)
+                return _FakeResult([dict(r) for r in new])
+            hit = self._selected(table)
+            if op == "update":
+                for r in hit:
+                    r.update(payload)
+            else:
+                table[:] = [r for r in table if r not in hit]
+            return _FakeResult([dict(r) for r in hit])
+
+        rows = self._selected(table)
+        total = len(rows) if self.count else None
+        for col, desc in reversed(self.orders):
+            rows = sorted(rows, key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        start, size = self.window
+        rows = rows[start:] if size is None else rows[start: start + size]
+        data = [] if self.head else [dict(r) for r in rows]
+        if self.one:
+            data = data[0] if data else None
+        return _FakeResult(data, total)
+
+
+@pytest.fixture
+def fake_supabase():
+    """Factory for an in-memory FakeSupabase (see the class docstring)."""
+    return FakeSupabase
+
+
 @pytest.fixture
 def mock_supabase_service():
     """Mock the supabase_service used in auth endpoints."""
@@ -149,3 +378,14 @@ def client():
     from app.main import app
 
     return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fresh_provider_governor():
+    """Each test gets its own in-process provider governor, so Z.ai spacing
+    and queue state never carry over from a previous test."""
+    from app.production.provider_governor import LocalProviderGovernor, set_provider_governor
+
+    set_provider_governor(LocalProviderGovernor())
+    yield
+    set_provider_governor(None)
@@ -0,0 +1,164 @@
+"""
+Tests for app.services.ai_response_cache — the content-addressed memory →
+SQLite cache for small AI sub-calls — and for AIService._cached_chat, the
+single choke point the extraction / description / image-prompt calls use.
+"""
+
+import json
+
+import httpx
+import pytest
+
+import app.services.ai_service as ai_service_module
+from app.production import instrumentation
+from app.services import ai_response_cache
+from app.services.ai_response_cache import AIResponseCache, cache_key
+from app.services.ai_service import AIService
+
+
+def _lookups(function, result):
+    key = (("cache", f"ai_response:{function}"), ("result", result))
+    return instrumentation._cache_lookups.get_values().get(key, 0.0)
+
+
+class TestKey:
+    def test_whitespace_is_normalized_but_content_is_not(self):
+        body = {"model": "m", "messages": [{"role": "user", "content": "Kedai  nasi\n lemak"}]}
+        spaced = {"model": "m", "messages": [{"role": "user", "content": " Kedai nasi lemak "}]}
+        other = {"model": "m", "messages": [{"role": "user", "content": "Kedai nasi kandar"}]}
+        assert cache_key("f", "m", body) == cache_key("f", "m", spaced)
+        assert cache_key("f", "m", body) != cache_key("f", "m", other)
+        assert cache_key("f", "m", body) != cache_key("g", "m", body)
+        assert cache_key("f", "m", body) != cache_key("f", "m2", body)
+
+
+class TestCache:
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_a_new_process(self, tmp_path):
+        path = str(tmp_path / "ai.sqlite3")
+        await AIResponseCache(path).put("f", "k", '["Nasi Lemak"]')
+
+        fresh = AIResponseCache(path)
+        disk = _lookups("f", "disk")
+        assert await fresh.get("f", "k") == '["Nasi Lemak"]'
+        assert _lookups("f", "disk") == disk + 1
+        # Promoted: the next read is answered from memory.
+        memory = _lookups("f", "memory")
+        assert await fresh.get("f", "k") == '["Nasi Lemak"]'
+        assert _lookups("f", "memory") == memory + 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_are_misses(self, tmp_path, monkeypatch):
+        cache = AIResponseCache(str(tmp_path / "ai.sqlite3"), ttl=60)
+        now = [1000.0]
+        monkeypatch.setattr(ai_response_cache.time, "time", lambda: now[0])
+        await cache.put("f", "k", "v")
+        now[0] += 61
+        assert await cache.get("f", "k") is None
+
+    @pytest.mark.asyncio
+    async def test_size_bounded_eviction_keeps_recently_used(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "ai.sqlite3")
+        cache = AIResponseCache(path, memory_entries=2, max_entries=10)
+        now = [1000.0]
+        monkeypatch.setattr(ai_response_cache.time, "time", lambda: now[0])
+        for i in range(10):
+            now[0] += 1
+            await cache.put("f", f"k{i}", str(i))
+        now[0] += 1
+        cache.clear_memory()
+        assert await cache.get("f", "k0") == "0"  # touched: now most recent
+        now[0] += 1
+        await cache.put("f", "k10", "10")  # 11 rows > 10: trim to 9
+
+        assert len(cache._memory) == 2
+        cache.clear_memory()
+        assert await cache.get("f", "k0") == "0"
+        assert await cache.get("f", "k1") is None
+        assert await cache.get("f", "k10") == "10"
+
+    @pytest.mark.asyncio
+    async def test_unusable_path_degrades_to_memory_only(self, tmp_path):
+        cache = AIResponseCache(str(tmp_path / "missing" / "ai.sqlite3"))
+        await cache.put("f", "k", "v")
+        assert await cache.get("f", "k") == "v"
+
+
+class TestCachedChat:
+    @pytest.fixture
+    def service(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(ai_service_module, "AI_RESPONSE_CACHE", True)
+        monkeypatch.setattr(ai_response_cache, "_cache", AIResponseCache(str(tmp_path / "ai.sqlite3")))
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+        return AIService()
+
+    @staticmethod
+    def _route(monkeypatch, handler):
+        real_client = httpx.AsyncClient
+        monkeypatch.setattr(
+            ai_service_module.httpx, "AsyncClient",
+            lambda **kw: real_client(transport=httpx.MockTransport(handler)),
+        )
+
+    @staticmethod
+    def _completion(content, finish_reason="stop"):
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": content}, "finish_reason": finish_reason}]}
+        )
+
+    @pytest.mark.asyncio
+    async def test_repeat_extraction_skips_the_round_trip(self, service, monkeypatch):
+        calls = []
+
+        def handler(request):
+            calls.append(json.loads(request.content))
+            return self._completion('["Nasi Lemak", "Roti Canai", "Teh Tarik"]')
+
+        self._route(monkeypatch, handler)
+        first = await service.extract_menu_item_names("Kedai mamak jual nasi lemak dan roti canai", n=3)
+        again = await service.extract_menu_item_names("Kedai mamak jual  nasi lemak dan roti canai", n=3)
+
+        assert first == again == ["Nasi Lemak", "Roti Canai", "Teh Tarik"]
+        assert len(calls) == 1
+        # A different question is a different key.
+        await service.extract_menu_item_names("Kedai mamak jual nasi lemak dan roti canai", n=4)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_failures_are_not_cached(self, service, monkeypatch):
+        responses = [httpx.Response(402, text="Insufficient Balance"), self._completion("A rich curry")]
+        self._route(monkeypatch, lambda request: responses.pop(0))
+        service.deepseek_api_key, service.qwen_api_key = "test-key", None
+
+        assert await service._generate_food_description("Nasi Kandar") is None
+        assert await service._generate_food_description("Nasi Kandar") == "A rich curry"
+        assert responses == []
+
+    @pytest.mark.asyncio
+    async def test_truncated_answers_are_not_cached(self, service, monkeypatch):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return self._completion('["Nasi Lemak", "Roti', finish_reason="length")
+
+        self._route(monkeypatch, handler)
+        body = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "menu"}]}
+        for _ in range(2):
+            resp = await service._cached_chat("extract_menu_item_names", "https://api.test/chat", "k", body, 5)
+            assert resp.finish_reason == "length"
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_flag_off_always_calls_the_provider(self, service, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "AI_RESPONSE_CACHE", False)
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return self._completion('{"hero": "x"}')
+
+        self._route(monkeypatch, handler)
+        for _ in range(2):
+            await service.generate_smart_image_prompts("Studio fotografi perkahwinan di Ipoh")
+        assert len(calls) == 2
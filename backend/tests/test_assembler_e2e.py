@@ -1,11 +1,15 @@
 """
 Phase 1 — Step 4/5 E2E test: hand-crafted Khulafa Bistro Design Brief
-→ recipe_builder → html_renderer → valid HTML output.
+→ recipe_builder → html_renderer → valid HTML output, and the renderer's
+fragment cache re-rendering only what an edit changed.
 """
 
+import pytest
+
 from app.schemas.recipe import DesignBrief
+from app.services import html_renderer
 from app.services.recipe_builder import build_recipe
-from app.services.html_renderer import render_html
+from app.services.html_renderer import clear_render_cache, render_html
 
 
 KHULAFA_BRIEF = {
@@ -302,3 +306,67 @@ def test_write_sample_output(tmp_path):
     print(f"\n📄 Sample HTML written to: {out}")
     print(f"   Size: {len(html):,} bytes ({len(html)/1024:.1f} KB)")
     assert out.exists()
+
+
+# ---------------------------------------------------------------------------
+# Fragment cache
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def recipe():
+    clear_render_cache()
+    yield build_recipe(DesignBrief(**KHULAFA_BRIEF))
+    clear_render_cache()
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Ids of the sections / fragments actually rendered (cache misses)."""
+    seen = {"sections": [], "theme": 0}
+    render_section, theme_to_css = html_renderer._render_section, html_renderer._theme_to_css
+
+    def counting_section(section):
+        seen["sections"].append(section.id)
+        return render_section(section)
+
+    def counting_theme(*args):
+        seen["theme"] += 1
+        return theme_to_css(*args)
+
+    monkeypatch.setattr(html_renderer, "_render_section", counting_section)
+    monkeypatch.setattr(html_renderer, "_theme_to_css", counting_theme)
+    return seen
+
+
+def test_cached_page_is_identical(recipe):
+    first = render_html(recipe)
+    assert render_html(recipe) == first
+    clear_render_cache()
+    assert render_html(recipe) == first
+
+
+def test_one_section_edit_rerenders_one_section(recipe, rendered):
+    render_html(recipe)
+    assert len(rendered["sections"]) == len(recipe.sections)
+
+    rendered["sections"].clear()
+    edited = recipe.model_copy(deep=True)
+    edited.sections[1].props["heading"] = "Cerita Kami"
+    html = render_html(edited)
+
+    assert rendered["sections"] == [edited.sections[1].id]
+    assert rendered["theme"] == 1
+    assert "Cerita Kami" in html
+
+
+def test_theme_edit_reuses_every_section(recipe, rendered):
+    render_html(recipe)
+    rendered["sections"].clear()
+
+    edited = recipe.model_copy(deep=True)
+    edited.theme.colors.primary = "#123456"
+    html = render_html(edited)
+
+    assert rendered["sections"] == []
+    assert rendered["theme"] == 2
+    assert "--color-primary: #123456;" in html
@@ -0,0 +1,155 @@
+"""
+Tests for app.services.assistant_context: shared snapshot loads, version
+bumps from the write paths, uncached partial loads, the size bound, the
+token-budgeted document and the owner-email lookup.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import assistant_context as ac
+
+WEBSITE_ID = "33333333-3333-3333-3333-333333333333"
+USER_ID = "44444444-4444-4444-4444-444444444444"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    state = {
+        "calls": [],
+        "delay": 0.05,
+        "fail": set(),
+        "menu": [{"name": "Nasi Lemak", "price": 8.5, "is_available": True}],
+    }
+    tables = {
+        "delivery_settings": lambda: [{"is_delivery_enabled": True, "min_order_amount": 20}],
+        "websites": lambda: [{"id": WEBSITE_ID, "business_name": "Kedai Ali", "subdomain": "ali"}],
+        "delivery_orders": lambda: [{"id": "o1", "status": "delivered", "total_amount": 30, "created_at": "2026-01-01"}],
+        "bina_credits": lambda: [{"balance": "12.5"}],
+        "profiles": lambda: [{"id": USER_ID}] if state.get("profile") else [],
+        "menu_items": lambda: list(state["menu"]),
+    }
+
+    async def fake_select(table, params):
+        state["calls"].append(table)
+        state.setdefault("params", {})[table] = params
+        await asyncio.sleep(state["delay"])
+        if table in state["fail"]:
+            raise RuntimeError("boom")
+        return tables[table]()
+
+    monkeypatch.setattr(ac, "_select", fake_select)
+    return ac.AssistantContextIndex(), state
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_share_one_parallel_load(db):
+    index, state = db
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await asyncio.gather(*(index.for_website(WEBSITE_ID) for _ in range(5)))
+
+    assert loop.time() - start < 0.12  # three queries at once, not one after another
+    assert sorted(state["calls"]) == ["delivery_settings", "menu_items", "websites"]
+    assert all(r["website_info"]["business_name"] == "Kedai Ali" for r in results)
+    assert "Nasi Lemak: RM8.50 (Ada)" in results[0]["document"]
+
+    await index.for_website(WEBSITE_ID)
+    assert len(state["calls"]) == 3 and index.stats == {"hits": 5, "loads": 1}
+
+
+@pytest.mark.asyncio
+async def test_change_bumps_version_and_racing_load_is_not_stored(db):
+    index, state = db
+    await index.for_website(WEBSITE_ID)
+    state["menu"].append({"name": "Teh Tarik", "price": 3, "is_available": True})
+    index.website_changed(WEBSITE_ID)
+    assert "Teh Tarik" in (await index.for_website(WEBSITE_ID))["document"]
+
+    # A change that lands while a load is in flight: that load is served
+    # but not cached, so the next turn reloads.
+    load = asyncio.create_task(index.for_website(WEBSITE_ID + "-x"))
+    await asyncio.sleep(0.01)
+    index.website_changed(WEBSITE_ID + "-x")
+    await load
+    calls = len(state["calls"])
+    await index.for_website(WEBSITE_ID + "-x")
+    assert len(state["calls"]) == calls + 3
+
+
+@pytest.mark.asyncio
+async def test_partial_load_is_returned_but_not_cached(db):
+    index, state = db
+    state["fail"] = {"bina_credits"}
+    user = await index.for_user(USER_ID)
+    assert user["wallet_balance"] == 0.0 and user["websites"][0]["subdomain"] == "ali"
+
+    state["fail"] = set()
+    user = await index.for_user(USER_ID)
+    assert user["wallet_balance"] == 12.5
+    assert "Wallet balance: RM12.50" in user["document"]
+    assert index.stats["loads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_bounded_with_expired_snapshots_evicted_first(db, monkeypatch):
+    _, state = db
+    state["delay"] = 0
+    now = [1000.0]
+    monkeypatch.setattr(ac.time, "monotonic", lambda: now[0])
+    index = ac.AssistantContextIndex(website_ttl_seconds=300, user_ttl_seconds=60, max_entries=3)
+
+    await index.for_user("u-old")          # expires at 1060
+    await index.for_website("w-1")
+    await index.for_website("w-2")
+    now[0] += 120
+    await index.for_website("w-1")         # hit: now most recent
+    await index.for_website("w-3")         # over the cap: the expired user goes first
+    assert list(index._entries) == ["website:w-2", "website:w-1", "website:w-3"]
+
+    await index.for_website("w-4")         # nothing expired: least recently used goes
+    assert list(index._entries) == ["website:w-1", "website:w-3", "website:w-4"]
+    assert set(index._load_locks) <= set(index._entries)
+
+    # Changes to websites nobody has asked about leave nothing behind.
+    for n in range(50):
+        index.website_changed(f"unseen-{n}")
+    assert index._versions == {}
+
+
+@pytest.mark.asyncio
+async def test_change_during_load_is_still_fenced_after_pruning(db):
+    index, state = db
+    load = asyncio.create_task(index.for_website("w-race"))
+    await asyncio.sleep(0.01)
+    index.website_changed("w-race")        # must survive while the load runs
+    await load
+    assert "website:w-race" not in index._entries
+    assert index._versions == {} and index._load_locks == {} and index._loading == {}
+
+
+def test_document_keeps_to_the_token_budget():
+    menu = [{"name": f"Hidangan {n}", "price": n, "is_available": n % 2 == 0} for n in range(200)]
+    doc = ac.render_website_document(
+        {"website_info": {"business_name": "Kedai Ali"}, "menu_items": menu}, budget_tokens=100
+    )
+    lines = doc.splitlines()
+    assert len(doc) <= 100 * ac._CHARS_PER_TOKEN
+    assert lines[0] == "Kedai: Kedai Ali"
+    assert all("(Ada)" in line for line in lines[2:-1])  # available items first
+    assert lines[-1].startswith("... dan ") and lines[-1].endswith(" item lagi")
+
+
+@pytest.mark.asyncio
+async def test_owner_email_lookup_caches_unknown_senders(db):
+    index, state = db
+    assert await index.for_owner_email("orang.luar@example.com") is None
+    assert await index.for_owner_email("Orang.Luar@example.com ") is None
+    assert state["calls"] == ["profiles"]
+
+    state["profile"] = True
+    user = await index.for_owner_email("ali@example.com")
+    assert user["recent_orders"][0]["id"] == "o1"
+    # The owner's orders are those placed on their websites
+    assert state["params"]["delivery_orders"]["website_id"] == f"in.({WEBSITE_ID})"
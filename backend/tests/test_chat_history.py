@@ -0,0 +1,115 @@
+"""
+Tests for GET /chat/conversations/{id}/messages: keyset pages
+(before / after), `since` delta sync and ETag / 304.
+
+chat_messages is a small in-memory table (conftest's FakeSupabase), which
+applies the eq / or / order / limit filters the endpoint sends, so the
+keyset logic is exercised end to end.
+"""
+
+import pytest
+
+from app.api.v1.endpoints import chat
+
+CONV = "33333333-3333-3333-3333-333333333333"
+URL = f"/api/v1/chat/conversations/{CONV}/messages"
+
+
+def _id(n):
+    return f"00000000-0000-0000-0000-{n:012d}"
+
+
+# Messages 3 and 4 share a timestamp; the id breaks the tie.
+MESSAGES = [
+    {
+        "id": _id(n),
+        "conversation_id": CONV,
+        "sender_type": "customer" if n % 2 else "owner",
+        "message_text": f"mesej {n}",
+        "created_at": f"2026-10-18T04:{3 if n == 4 else n:02d}:00+00:00",
+    }
+    for n in range(1, 8)
+]
+
+
+@pytest.fixture
+def history(client, monkeypatch, fake_supabase):
+    fake = fake_supabase({"chat_messages": MESSAGES})
+    monkeypatch.setattr(chat, "get_supabase", lambda: fake)
+    return client, fake
+
+
+def _texts(resp):
+    return [m["message_text"] for m in resp.json()]
+
+
+def test_no_parameters_returns_whole_history(history):
+    client, _ = history
+    resp = client.get(URL)
+    assert resp.status_code == 200
+    assert _texts(resp) == [f"mesej {n}" for n in (1, 2, 3, 4, 5, 6, 7)]
+    assert resp.headers["x-has-more"] == "false"
+
+
+def test_latest_page_then_older_pages(history):
+    client, _ = history
+    latest = client.get(URL, params={"limit": 3})
+    assert _texts(latest) == ["mesej 5", "mesej 6", "mesej 7"]
+    assert latest.headers["x-has-more"] == "true"
+
+    older = client.get(URL, params={"limit": 3, "before": latest.json()[0]["id"]})
+    assert _texts(older) == ["mesej 2", "mesej 3", "mesej 4"]
+
+    oldest = client.get(URL, params={"limit": 3, "before": older.json()[0]["id"]})
+    assert _texts(oldest) == ["mesej 1"]
+    assert oldest.headers["x-has-more"] == "false"
+
+
+def test_latest_page_edge_on_a_shared_timestamp(history):
+    client, fake = history
+    # Messages 5-7 share one created_at and are stored out of id order; the
+    # latest page ends inside that group, so its oldest row is the cursor.
+    same = "2026-10-18T04:05:00+00:00"
+    rows = {m["id"]: {**m, "created_at": same} if m["id"] >= _id(5) else m for m in MESSAGES}
+    fake.tables["chat_messages"] = [rows[_id(n)] for n in (1, 2, 3, 4, 6, 5, 7)]
+
+    latest = client.get(URL, params={"limit": 2})
+    assert _texts(latest) == ["mesej 6", "mesej 7"]
+    older = client.get(URL, params={"limit": 3, "before": latest.json()[0]["id"]})
+    assert _texts(older) == ["mesej 3", "mesej 4", "mesej 5"]
+
+
+def test_after_pages_forward_across_equal_timestamps(history):
+    client, _ = history
+    resp = client.get(URL, params={"limit": 2, "after": _id(3)})
+    assert _texts(resp) == ["mesej 4", "mesej 5"]
+    assert resp.headers["x-has-more"] == "true"
+
+
+def test_since_returns_only_new_messages(history):
+    client, _ = history
+    assert _texts(client.get(URL, params={"since": _id(5)})) == ["mesej 6", "mesej 7"]
+    assert _texts(client.get(URL, params={"since": "2026-10-18T04:04:00Z"})) == ["mesej 5", "mesej 6", "mesej 7"]
+
+
+def test_unknown_anchor_and_mixed_modes_rejected(history):
+    client, _ = history
+    assert client.get(URL, params={"before": _id(99)}).status_code == 404
+    assert client.get(URL, params={"since": "yesterday"}).status_code == 400
+    assert client.get(URL, params={"before": _id(2), "after": _id(1)}).status_code == 400
+
+
+def test_unchanged_history_returns_304(history):
+    client, fake = history
+    first = client.get(URL, params={"since": _id(5)})
+    etag = first.headers["etag"]
+
+    again = client.get(URL, params={"since": _id(5)}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    fake.tables["chat_messages"].append({**MESSAGES[-1], "id": _id(8), "message_text": "baru",
+                                         "created_at": "2026-10-18T04:09:00+00:00"})
+    changed = client.get(URL, params={"since": _id(5)}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert _texts(changed)[-1] == "baru"
@@ -0,0 +1,185 @@
+"""
+Tests for the owner chat inbox (list_chat_inbox RPC, migration 057) and
+its per-owner page cache in app.services.chat_inbox.
+
+The chat endpoints' sync Supabase client is conftest's in-memory
+FakeSupabase: list_chat_inbox returns scripted rows, and send / mark-read
+write to its chat_conversations and chat_messages tables.
+"""
+
+import pytest
+from postgrest.exceptions import APIError as PostgrestAPIError
+
+from app.api.v1.endpoints import chat
+from app.services.chat_inbox import chat_inbox, decode_cursor, encode_cursor
+
+OWNER = {"sub": "11111111-1111-1111-1111-111111111111"}
+WEBSITE_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def _row(n, unread=0):
+    return {
+        "conversation": {
+            "id": f"conv-{n}",
+            "website_id": WEBSITE_ID,
+            "customer_name": f"Pelanggan {n}",
+            "status": "active",
+            "updated_at": f"2026-10-18T04:{59 - n:02d}:00+00:00",
+        },
+        # Older schema: text in `content`, no message_type.
+        "messages": [{"id": f"m-{n}", "conversation_id": f"conv-{n}", "sender_type": "customer",
+                      "content": f"hai {n}", "created_at": "2026-10-18T04:00:00+00:00"}],
+        "unread_count": unread,
+    }
+
+
+@pytest.fixture
+def inbox(monkeypatch, fake_supabase):
+    chat_inbox.clear()
+    monkeypatch.setattr(chat_inbox, "rpc_available", True)
+    monkeypatch.setattr(chat_inbox, "ttl_seconds", 60.0)
+
+    def install(rows=(), error=None):
+        fake = fake_supabase(
+            {"chat_conversations": [{"id": "conv-3", "website_id": WEBSITE_ID}], "chat_messages": []},
+            rpc={"list_chat_inbox": error or list(rows)},
+        )
+        monkeypatch.setattr(chat, "get_supabase", lambda: fake)
+        return fake
+
+    yield install
+    chat_inbox.clear()
+
+
+async def _get(limit=None, cursor=None, website_ids=None):
+    return await chat.get_conversations(
+        website_ids=website_ids, status=None, cursor=cursor, limit=limit, current_user=OWNER
+    )
+
+
+class TestInboxQuery:
+    @pytest.mark.asyncio
+    async def test_one_rpc_call_per_page(self, inbox):
+        fake = inbox(rows=[_row(n, unread=n) for n in (1, 2, 3)])
+        body = await _get(limit=2)
+
+        assert [name for name, _ in fake.rpc_calls] == ["list_chat_inbox"]
+        params = fake.rpc_calls[0][1]
+        assert params["p_user_id"] == OWNER["sub"]
+        assert params["p_limit"] == 3 and params["p_messages"] == 10
+        assert [c["id"] for c in body["conversations"]] == ["conv-1", "conv-2"]
+        first = body["conversations"][0]
+        assert first["unread_count"] == 1
+        assert first["chat_messages"][0]["message_text"] == "hai 1"
+        assert decode_cursor(body["next_cursor"]) == (
+            "2026-10-18T04:57:00+00:00", "conv-2",
+        )
+
+    @pytest.mark.asyncio
+    async def test_cursor_is_passed_as_keyset(self, inbox):
+        fake = inbox(rows=[_row(3)])
+        cursor = encode_cursor({"id": "conv-2", "updated_at": "2026-10-18T04:57:00+00:00"})
+        body = await _get(limit=2, cursor=cursor)
+
+        params = fake.rpc_calls[0][1]
+        assert params["p_before_updated_at"] == "2026-10-18T04:57:00+00:00"
+        assert params["p_before_id"] == "conv-2"
+        assert body["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_bad_cursor_and_foreign_ids_never_reach_the_database(self, inbox):
+        fake = inbox()
+        with pytest.raises(chat.HTTPException) as err:
+            await _get(cursor="not-a-cursor")
+        assert err.value.status_code == 400
+        assert await _get(website_ids="'; drop table x") == {"conversations": [], "next_cursor": None}
+        assert fake.rpc_calls == []
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_function_not_deployed(self, inbox, monkeypatch):
+        legacy_calls = []
+
+        def legacy(supabase, user_id, website_ids, status, cursor, limit):
+            legacy_calls.append(user_id)
+            return chat.InboxPage([])
+
+        monkeypatch.setattr(chat, "_load_inbox_legacy", legacy)
+        fake = inbox(error=PostgrestAPIError({"code": "PGRST202", "message": "not found"}))
+        await _get(limit=10)
+        chat_inbox.clear()
+        await _get(limit=10)
+        assert len(fake.rpc_calls) == 1  # not re-probed every refresh
+        assert legacy_calls == [OWNER["sub"], OWNER["sub"]]
+
+
+class TestInboxCache:
+    @pytest.mark.asyncio
+    async def test_refresh_is_served_from_cache(self, inbox):
+        fake = inbox(rows=[_row(1), _row(2)])
+        first = await _get()
+        second = await _get()
+        assert second == first
+        assert len(fake.rpc_calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_sent_message_patches_the_cached_page(self, inbox):
+        fake = inbox(rows=[_row(n) for n in (1, 2, 3)])
+        await _get()
+
+        await chat.send_message(chat.SendMessageRequest(
+            conversation_id="conv-3", sender_type="customer", sender_id="c", message_text="Ada stok?",
+        ))
+        body = await _get()
+
+        assert len(fake.rpc_calls) == 1
+        top = body["conversations"][0]
+        assert top["id"] == "conv-3"
+        assert [m["message_text"] for m in top["chat_messages"]] == ["hai 3", "Ada stok?"]
+        assert top["unread_count"] == 1
+
+        await chat.mark_messages_read(chat.MarkReadRequest(conversation_id="conv-3", user_type="owner"))
+        assert (await _get())["conversations"][0]["unread_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_system_message_patches_the_cached_page(self, inbox):
+        fake = inbox(rows=[_row(n) for n in (1, 2, 3)])
+        await _get()
+
+        await chat.add_rider_to_conversation("conv-3", "rider-1", "Ali")
+        top = (await _get())["conversations"][0]
+
+        assert len(fake.rpc_calls) == 1
+        assert top["id"] == "conv-3"
+        assert top["chat_messages"][-1]["message_text"].startswith("Rider Ali")
+        assert [m["conversation_id"] for m in fake.tables["chat_messages"]] == ["conv-3"]
+
+    @pytest.mark.asyncio
+    async def test_new_conversation_reloads_the_owner_inbox(self, inbox):
+        fake = inbox(rows=[_row(1)])
+        await _get()
+        chat_inbox.record_message(
+            {"conversation_id": "conv-new", "sender_type": "customer", "message_text": "hai"},
+            WEBSITE_ID,
+        )
+        await _get()
+        assert len(fake.rpc_calls) == 2
+
+
+def test_legacy_unread_counts_messages_like_the_rpc(fake_supabase):
+    fake = fake_supabase({
+        "websites": [{"id": WEBSITE_ID, "user_id": OWNER["sub"]}],
+        "chat_conversations": [
+            {"id": f"conv-{n}", "website_id": WEBSITE_ID, "unread_owner": 9,
+             "updated_at": f"2026-10-18T04:0{n}:00+00:00"}
+            for n in (1, 2)
+        ],
+        "chat_messages": [
+            {"id": f"m-{i}", "conversation_id": "conv-1", "sender_type": sender, "is_read": read,
+             "message_text": "hai", "created_at": f"2026-10-18T04:1{i}:00+00:00"}
+            for i, (sender, read) in enumerate([
+                ("customer", False), ("system", None), ("customer", True), ("owner", False),
+            ])
+        ],
+    })
+    page = chat._load_inbox_legacy(fake, OWNER["sub"], None, None, None, None)
+    assert {c["id"]: c["unread_count"] for c in page.conversations} == {"conv-1": 2, "conv-2": 0}
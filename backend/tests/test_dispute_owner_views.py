@@ -0,0 +1,123 @@
+"""
+Tests for the business owner dispute views in app.api.v1.endpoints.disputes:
+GET /disputes/owner/summary through the dispute_owner_summary RPC (migration
+059) and its Python fallback, and keyset paging of GET /disputes/owner/list.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError as PostgrestAPIError
+
+from app.api.v1.endpoints import disputes
+from app.core.security import get_current_user
+from app.main import app
+
+OWNER_ID = "44444444-4444-4444-4444-444444444444"
+WEBSITE_ID = "33333333-3333-3333-3333-333333333333"
+
+
+def _dispute(n, created_at, **extra):
+    return {
+        "id": f"00000000-0000-0000-0000-{n:012d}",
+        "dispute_number": f"DSP-{n}",
+        "order_id": "22222222-2222-2222-2222-222222222222",
+        "website_id": WEBSITE_ID,
+        "customer_name": "Ali",
+        "category": "wrong_items",
+        "description": "Pesanan salah",
+        "status": "open",
+        "priority": "medium",
+        "order_amount": 25.0,
+        "created_at": created_at,
+        "updated_at": created_at,
+        **extra,
+    }
+
+
+@pytest.fixture
+def owner(monkeypatch, fake_supabase):
+    fake = fake_supabase({
+        "websites": [{"id": WEBSITE_ID, "user_id": OWNER_ID}],
+        "ai_disputes": [],
+    })
+    monkeypatch.setattr(disputes, "get_supabase_client", lambda: fake)
+    monkeypatch.setitem(disputes._SUMMARY_RPC_STATE, "available", True)
+    app.dependency_overrides[get_current_user] = lambda: {"sub": OWNER_ID}
+    yield TestClient(app), fake
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+class TestOwnerSummary:
+    def test_summary_comes_from_the_rpc(self, owner):
+        client, fake = owner
+        fake.rpc_results["dispute_owner_summary"] = {
+            "total": 4, "open": 1, "resolved": 3, "escalated": 0,
+            "total_refunded": 37.5, "avg_resolution_hours": 5.26,
+            "by_category": {"wrong_items": 3, "other": 1}, "by_priority": {"medium": 4},
+        }
+        resp = client.get("/api/v1/disputes/owner/summary")
+
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert body["total_disputes"] == 4 and body["resolved_disputes"] == 3
+        assert body["resolution_rate"] == 75.0
+        assert body["avg_resolution_time_hours"] == 5.3
+        assert body["by_category"] == {"wrong_items": 3, "other": 1}
+        assert fake.rpc_calls == [("dispute_owner_summary", {"p_user_id": OWNER_ID})]
+        assert "ai_disputes" not in fake.calls
+
+    def test_missing_rpc_falls_back_to_python_once(self, owner):
+        client, fake = owner
+        fake.rpc_results["dispute_owner_summary"] = PostgrestAPIError({"code": "PGRST202", "message": "not found"})
+        fake.tables["ai_disputes"] = [
+            _dispute(1, "2026-01-01T00:00:00+00:00", status="resolved",
+                     resolved_at="2026-01-01T04:00:00+00:00", refund_amount=10),
+            _dispute(2, "2026-01-02T00:00:00+00:00", category=None),
+        ]
+        for _ in range(2):
+            body = client.get("/api/v1/disputes/owner/summary").json()
+            assert body["total_disputes"] == 2 and body["open_disputes"] == 1
+            assert body["avg_resolution_time_hours"] == 4.0
+            assert body["total_refunded"] == 10.0
+            assert body["by_category"] == {"wrong_items": 1, "other": 1}
+
+        assert len(fake.rpc_calls) == 1
+        assert disputes._SUMMARY_RPC_STATE["available"] is False
+
+
+class TestOwnerList:
+    def test_first_page_counts_and_returns_cursor(self, owner):
+        client, fake = owner
+        fake.tables["ai_disputes"] = [_dispute(n, f"2026-01-0{9 - n}T00:00:00+00:00") for n in range(5)]
+        body = client.get("/api/v1/disputes/owner/list?per_page=2").json()
+
+        assert [d["dispute_number"] for d in body["disputes"]] == ["DSP-0", "DSP-1"]
+        assert body["total"] == 5
+        assert disputes._decode_list_cursor(body["next_cursor"]) == (
+            "2026-01-08T00:00:00+00:00", fake.tables["ai_disputes"][1]["id"]
+        )
+        calls = fake.calls["ai_disputes"]
+        assert ("select", ("*",), {"count": "exact"}) in calls
+        assert ("order", ("id",), {"desc": True}) in calls
+
+    def test_cursor_page_uses_keyset_and_skips_count(self, owner):
+        client, fake = owner
+        fake.tables["ai_disputes"] = [_dispute(n, "2026-01-05T00:00:00+00:00") for n in range(2)]
+        cursor = disputes._encode_list_cursor(_dispute(7, "2026-01-06T00:00:00+00:00"))
+        body = client.get(f"/api/v1/disputes/owner/list?per_page=2&cursor={cursor}").json()
+
+        assert body["total"] is None and body["next_cursor"] is None
+        assert len(body["disputes"]) == 2
+        calls = fake.calls["ai_disputes"]
+        assert ("select", ("*",), {"count": None}) in calls
+        assert ("limit", (3,), {}) in calls
+        keyset = next(args[0] for name, args, _ in calls if name == "or_")
+        assert keyset == (
+            'created_at.lt."2026-01-06T00:00:00+00:00",'
+            'and(created_at.eq."2026-01-06T00:00:00+00:00",id.lt.00000000-0000-0000-0000-000000000007)'
+        )
+
+    def test_bad_cursor_is_400(self, owner):
+        client, _ = owner
+        resp = client.get("/api/v1/disputes/owner/list?cursor=not-a-cursor")
+        assert resp.status_code == 400
@@ -0,0 +1,162 @@
+"""
+Tests for the long-lived IMAP session in app.services.email_polling_service:
+one login for fetch + flags + IDLE, new mail picked up from IDLE, manual
+polls interrupting IDLE, and reconnect after the server drops the session.
+
+FakeMailBox stands in for imap_tools.MailBox; its IDLE reports "EXISTS"
+once a test drops a message into the inbox.
+"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import email_polling_service as eps
+
+
+class FakeIdle:
+    def __init__(self, box):
+        self.box = box
+
+    def __enter__(self):
+        self.box.calls.append("IDLE")
+        return self
+
+    def __exit__(self, *exc):
+        self.box.calls.append("DONE")
+
+    def poll(self, timeout):
+        if self.box.dead:
+            raise ConnectionError("connection reset")
+        if self.box.arrived.wait(timeout):
+            self.box.arrived.clear()
+            return [b"* 3 EXISTS"]
+        return []
+
+
+class FakeMailBox:
+    def __init__(self, server):
+        self.server = server
+        self.dead = False
+        self.arrived = threading.Event()
+        self.client = SimpleNamespace(capabilities=("IMAP4REV1", "IDLE"))
+        self.calls = []
+        self.idle = FakeIdle(self)
+
+    def fetch(self, criteria, limit=None, reverse=False, bulk=False):
+        if self.dead:
+            raise ConnectionError("connection reset")
+        self.calls.append("FETCH")
+        return [m for m in self.server.inbox if "\\Seen" not in m.flags]
+
+    def flag(self, uids, flags, value):
+        self.calls.append(("STORE", tuple(uids), tuple(flags), value))
+        for m in self.server.inbox:
+            if m.uid in uids:
+                m.flags.update(flags) if value else m.flags.difference_update(flags)
+
+    def logout(self):
+        self.calls.append("LOGOUT")
+
+
+class FakeServer:
+    def __init__(self):
+        self.inbox = []
+        self.boxes = []
+
+    def connect(self):
+        box = FakeMailBox(self)
+        self.boxes.append(box)
+        return box
+
+    def deliver(self, uid, subject):
+        self.inbox.append(SimpleNamespace(
+            uid=uid, subject=subject, from_="Ali <ali@example.com>",
+            text="Bila kedai buka?", html="", date=None, flags=set(),
+        ))
+        for box in self.boxes:
+            box.arrived.set()
+
+
+@pytest.fixture
+def watched(monkeypatch):
+    server = FakeServer()
+    service = eps.EmailPollingService()
+    service.enabled = True
+    service.email, service.password = "support@binaapp.my", "secret"
+    service.idle_enabled = True
+    service._session = eps.ImapSession(server.connect)
+    monkeypatch.setattr(eps, "IMAP_TOOLS_AVAILABLE", True)
+    monkeypatch.setattr(eps, "AND", lambda **kw: kw, raising=False)
+
+    handled = []
+
+    async def fake_process(**kwargs):
+        handled.append(kwargs["subject"])
+        return {"thread_id": "t", "ai_response_sent": True, "escalated": "aduan" in kwargs["subject"]}
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    service._min_email_interval_seconds = 0
+    return service, server, handled
+
+
+async def _until(predicate, timeout=3.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_new_mail_is_processed_from_idle_on_one_session(watched):
+    service, server, handled = watched
+    server.deliver("1", "Soalan menu")
+    assert service.start_watching()
+    await _until(lambda: handled == ["Soalan menu"] and "IDLE" in server.boxes[0].calls)
+
+    server.deliver("2", "aduan pesanan")
+    await _until(lambda: handled == ["Soalan menu", "aduan pesanan"])
+    await _until(lambda: server.boxes[0].calls.count("IDLE") == 2)
+
+    box = server.boxes[0]
+    await asyncio.sleep(0.2)
+    assert box.calls.count("FETCH") == 2  # back in IDLE, not polling
+    assert len(server.boxes) == 1 and service._session.logins == 1
+    assert ("STORE", ("1",), ("\\Seen",), True) in box.calls
+    assert ("STORE", ("2",), ("\\Seen",), False) in box.calls  # escalated stays unread
+    service.stop_watching()
+
+
+@pytest.mark.asyncio
+async def test_manual_poll_interrupts_idle(watched):
+    service, server, handled = watched
+    service.start_watching()
+    await _until(lambda: server.boxes and "IDLE" in server.boxes[0].calls)
+
+    server.inbox.append(SimpleNamespace(
+        uid="9", subject="Manual", from_="Siti <siti@example.com>",
+        text="Hai", html="", date=None, flags=set(),
+    ))  # no EXISTS: only a manual poll finds it
+    result = await asyncio.wait_for(service.poll_inbox(), timeout=3)
+    assert result["emails_processed"] == 1 and handled == ["Manual"]
+    assert service._session.logins == 1
+    service.stop_watching()
+
+
+@pytest.mark.asyncio
+async def test_dropped_session_reconnects_with_backoff(watched, monkeypatch):
+    service, server, handled = watched
+    monkeypatch.setattr(eps, "IMAP_RECONNECT_MAX_SECONDS", 0)
+    service.start_watching()
+    await _until(lambda: server.boxes and "IDLE" in server.boxes[0].calls)
+
+    server.boxes[0].dead = True
+    server.deliver("5", "Selepas putus")
+    await _until(lambda: handled == ["Selepas putus"])
+
+    assert len(server.boxes) == 2 and service._session.logins == 2
+    assert "LOGOUT" in server.boxes[0].calls
+    service.stop_watching()
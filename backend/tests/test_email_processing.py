@@ -0,0 +1,183 @@
+"""
+Tests for parallel processing of inbound support emails: bounded fan-out
+in EmailPollingService.poll_inbox, per-email timeouts, per-sender ordering,
+the cap on one sender's chain, and the overlapping steps inside
+AIEmailSupportService.process_incoming_email.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import email_polling_service as eps
+from app.services.ai_email_support import AIEmailSupportService
+
+
+def _email(uid, sender, subject):
+    return {
+        "uid": uid, "subject": subject, "from": sender, "sender_name": sender.split("@")[0],
+        "sender_email": sender, "body_text": "Hai", "html_body": None,
+        "email_hash": f"h{uid}", "date": None,
+    }
+
+
+@pytest.fixture
+def service(monkeypatch):
+    svc = eps.EmailPollingService()
+    svc.enabled = True
+    svc.email, svc.password = "support@binaapp.my", "secret"
+    svc._min_email_interval_seconds = 0
+    svc.processing_concurrency = 3
+    monkeypatch.setattr(eps, "IMAP_TOOLS_AVAILABLE", True)
+    svc.flagged = []
+    svc._mark_emails_in_imap_sync = svc.flagged.extend
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_batch_fans_out_under_the_concurrency_limit(service, monkeypatch):
+    emails = [_email(str(n), f"c{n}@example.com", f"S{n}") for n in range(9)]
+    service._fetch_unseen_emails_sync = lambda: emails
+    in_flight, peak = 0, 0
+
+    async def fake_process(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return {"thread_id": "t", "ai_response_sent": True, "escalated": False}
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result = await service.poll_inbox()
+
+    assert result["emails_processed"] == 9
+    assert peak == 3
+    assert loop.time() - start < 0.4  # three waves, not nine
+    assert sorted(a["uid"] for a in service.flagged) == [str(n) for n in range(9)]
+
+
+@pytest.mark.asyncio
+async def test_slow_email_times_out_alone(service, monkeypatch):
+    service.processing_timeout = 0.1
+    emails = [_email("1", "a@example.com", "lambat"), _email("2", "b@example.com", "cepat")]
+    service._fetch_unseen_emails_sync = lambda: emails
+
+    async def fake_process(**kwargs):
+        await asyncio.sleep(5 if kwargs["subject"] == "lambat" else 0)
+        return {"thread_id": "t", "ai_response_sent": True, "escalated": False}
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    result = await asyncio.wait_for(service.poll_inbox(), timeout=2)
+
+    assert result["success"] and result["emails_processed"] == 1
+    assert result["errors"] == [{"uid": "1", "error": "Timed out after 0.1s"}]
+    assert [a["uid"] for a in service.flagged] == ["2"]
+
+
+@pytest.mark.asyncio
+async def test_timeout_after_the_reply_went_out_is_not_answered_again(service, monkeypatch):
+    service.processing_timeout = 0.1
+    emails = [_email("1", "a@example.com", "lambat")]
+    service._fetch_unseen_emails_sync = lambda: emails
+    calls = []
+
+    async def fake_process(**kwargs):
+        calls.append(kwargs["subject"])
+        kwargs["on_reply_sent"]()
+        await asyncio.sleep(5)  # bookkeeping after the send hangs
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    result = await asyncio.wait_for(service.poll_inbox(), timeout=2)
+
+    assert result["emails_processed"] == 1
+    assert result["errors"] == [{"uid": "1", "error": "Timed out after 0.1s"}]
+    assert [a["uid"] for a in service.flagged] == ["1"]
+
+    # Fetched again (say the flag update failed): skipped, not re-sent
+    await service.poll_inbox()
+    assert calls == ["lambat"]
+
+
+@pytest.mark.asyncio
+async def test_same_sender_processed_in_order(service, monkeypatch):
+    emails = [_email(str(n), "ali@example.com", f"S{n}") for n in range(3)]
+    service._fetch_unseen_emails_sync = lambda: emails
+    order = []
+
+    async def fake_process(**kwargs):
+        order.append(("start", kwargs["subject"]))
+        await asyncio.sleep(0.01)
+        order.append(("end", kwargs["subject"]))
+        return {"thread_id": "t", "ai_response_sent": True, "escalated": False}
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    await service.poll_inbox()
+    assert order == [(step, f"S{n}") for n in range(3) for step in ("start", "end")]
+
+
+@pytest.mark.asyncio
+async def test_long_chain_from_one_sender_is_cut_off_within_the_poll(service, monkeypatch):
+    monkeypatch.setattr(eps, "FETCH_LIMIT", 3)
+    service.processing_timeout = 0.2  # one wave: a 0.2s budget
+    emails = [_email(str(n), "ali@example.com", f"S{n}") for n in range(3)]
+    service._fetch_unseen_emails_sync = lambda: emails
+
+    async def fake_process(**kwargs):
+        await asyncio.sleep(0.15)
+        return {"thread_id": "t", "ai_response_sent": True, "escalated": False}
+
+    monkeypatch.setattr(eps.ai_email_support, "process_incoming_email", fake_process)
+    result = await service.poll_inbox()
+
+    # S2 would start after the budget: it stays unseen for the next poll
+    assert result["success"] and result["emails_processed"] == 2
+    assert result["errors"] == []
+    assert [a["uid"] for a in service.flagged] == ["0", "1"]
+
+
+class TestProcessIncomingEmail:
+    @pytest.mark.asyncio
+    async def test_analysis_and_history_lookups_overlap(self, monkeypatch):
+        ai = AIEmailSupportService()
+        events = []
+
+        async def analyze(content, subject, sender):
+            events.append("analyze")
+            await asyncio.sleep(0.05)
+            events.append("analyzed")
+            return {"should_escalate": False, "escalation_reasons": [], "category": "general"}
+
+        async def select(table, filters=None, order_by=None, limit=None):
+            events.append(table)
+            if table == "email_threads":
+                return [{"id": "thread-1"}]
+            if table == "email_messages" and "sender_type" in (filters or {}):
+                return [{"id": "m1"}, {"id": "m2"}]  # + the one being stored = 3
+            return []
+
+        async def track(**kwargs):
+            events.append(("track", kwargs["thread_id"]))
+            return ("thread-1", "m3")
+
+        admin = []
+
+        async def notify_admin(**kwargs):
+            admin.append(kwargs["escalation_reasons"])
+            return True
+
+        monkeypatch.setattr(ai, "analyze_email", analyze)
+        monkeypatch.setattr(ai, "_db_select", select)
+        monkeypatch.setattr(ai, "track_conversation", track)
+        monkeypatch.setattr(ai, "notify_admin", notify_admin)
+        monkeypatch.setattr(ai, "is_available", lambda: False)
+
+        result = await ai.process_incoming_email("ali@example.com", "Ali", "Tolong", "Hai")
+
+        assert result["success"] and result["escalated"]
+        # Thread lookup ran while the analysis was in flight
+        assert events.index("email_threads") < events.index("analyzed")
+        assert ("track", "thread-1") in events
+        assert admin == [["Multiple emails in short time (3+ in 1 hour)"]]
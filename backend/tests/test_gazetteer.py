@@ -0,0 +1,209 @@
+"""
+Tests for the offline gazetteer (app.core.gazetteer) and the geocoder's
+lookup order: gazetteer → in-process LRU → shared geocode_cache → Nominatim.
+
+Nominatim and the shared cache are replaced with in-memory fakes — no
+network involved.
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import geocoder
+from app.core.gazetteer import (
+    DEFAULT_INDEX_PATH,
+    Gazetteer,
+    GazetteerRow,
+    build_index,
+    normalize,
+    read_source,
+    reset_gazetteer,
+)
+
+
+@pytest.fixture(scope="module")
+def gaz():
+    return Gazetteer.open()
+
+
+class TestIndex:
+    def test_committed_index_matches_source_table(self):
+        # Fails when my_places.tsv was edited without re-running
+        # scripts/build_gazetteer.py.
+        assert DEFAULT_INDEX_PATH.read_bytes() == build_index(read_source())
+
+    def test_rejects_foreign_file(self):
+        with pytest.raises(ValueError):
+            Gazetteer(b"NOPE" + b"\x00" * 32)
+
+    def test_first_row_per_postcode_wins(self):
+        rows = [
+            GazetteerRow("postcode", "", "40000", "Selangor", 3.0, 101.0),
+            GazetteerRow("postcode", "", "40000", "Selangor", 9.0, 109.0),
+        ]
+        hit = Gazetteer(build_index(rows)).lookup_postcode("40000")
+        assert (hit.lat, hit.lng) == (3.0, 101.0)
+
+
+class TestNormalize:
+    def test_expands_abbreviations(self):
+        assert normalize("Jln. Bkt Bintang, KL") == "jalan bukit bintang kuala lumpur"
+
+    def test_strips_accents_and_punctuation(self):
+        assert normalize("  Café—Taman  ") == "cafe taman"
+
+
+class TestPostcode:
+    def test_exact_hit(self, gaz):
+        hit = gaz.lookup_postcode("40000")
+        assert hit.kind == "postcode"
+        assert hit.lat == pytest.approx(3.0738)
+        assert "Selangor" in hit.display_name
+
+    def test_first_and_last_records(self, gaz):
+        assert gaz.lookup_postcode("01000") is not None
+        assert gaz.lookup_postcode("98700") is not None
+
+    def test_miss(self, gaz):
+        assert gaz.lookup_postcode("40001") is None
+        assert gaz.lookup_postcode("99999") is None
+        assert gaz.lookup_postcode("123") is None
+
+
+class TestAddress:
+    def test_bare_locality(self, gaz):
+        hit = gaz.match_address("Shah Alam")
+        assert hit.kind == "locality"
+        assert hit.postcode == "40000"
+
+    def test_locality_with_postcode_and_state(self, gaz):
+        assert gaz.match_address("40000 Shah Alam, Selangor, Malaysia").kind == "locality"
+
+    def test_typo_tolerated(self, gaz):
+        hit = gaz.match_address("Shah Alm")
+        assert hit.postcode == "40000"
+        assert hit.score < 1.0
+
+    def test_street_hit_with_house_number(self, gaz):
+        hit = gaz.match_address("No 5, Jln Bukit Bintang, 55100 Kuala Lumpur")
+        assert hit.kind == "street"
+        assert hit.display_name.startswith("Jalan Bukit Bintang")
+
+    def test_unknown_street_is_not_collapsed_to_locality(self, gaz):
+        # Nominatim can place the street; the locality centroid would be
+        # kilometres off.
+        assert gaz.match_address("12 Jalan Mawar 3, Shah Alam") is None
+
+    def test_postcode_region_must_agree(self, gaz):
+        # Jalan Ampang in the index is the KL one (50450); 68000 is Ampang
+        # Selangor, so the street must not match — and the leftover street
+        # detail keeps the Ampang locality from answering either.
+        assert gaz.match_address("Jalan Ampang, 68000 Ampang") is None
+
+    @pytest.mark.parametrize("query", [
+        "Jalan Gaya, Kuala Lumpur",               # indexed Jalan Gaya is in Kota Kinabalu
+        "Jalan Sultan Ismail, Kuala Terengganu",  # indexed one is in KL
+        "Jalan Alor Setar",                       # a town, not Jalan Alor KL
+        "12 Jalan Penang, Ipoh",                  # indexed one is in George Town
+    ])
+    def test_street_in_another_town_goes_to_nominatim(self, gaz, query):
+        assert gaz.match_address(query) is None
+
+    def test_street_with_its_own_locality_or_state(self, gaz):
+        assert gaz.match_address("12 Jalan Penang, George Town, Pulau Pinang").kind == "street"
+        assert gaz.match_address("Jalan Gaya, 88000 Kota Kinabalu, Sabah").kind == "street"
+        assert gaz.match_address("Jalan Alor, Bukit Bintang, KL").kind == "street"
+        assert gaz.match_address("Jalan Penang, Penang").kind == "street"
+
+    def test_postcode_only_query(self, gaz):
+        assert gaz.match_address("40000 Selangor").kind == "postcode"
+
+    def test_nonsense(self, gaz):
+        assert gaz.match_address("xyzzy plugh") is None
+
+    def test_similar_names_do_not_cross_match(self, gaz):
+        assert gaz.match_address("Kampar, Perak").postcode == "31900"
+        assert gaz.match_address("Kajang").postcode == "43000"
+
+
+class FakeBackends:
+    """Stands in for Nominatim and the shared geocode_cache table."""
+
+    def __init__(self, nominatim_rows=None):
+        self.nominatim_calls = []
+        self.shared = {}
+        self.nominatim_rows = nominatim_rows or []
+
+    async def nominatim(self, params):
+        self.nominatim_calls.append(params)
+        return self.nominatim_rows
+
+    async def shared_get(self, key):
+        return self.shared.get(key)
+
+    async def shared_put(self, key, data):
+        self.shared[key] = (geocoder.time.time(), data)
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    fake = FakeBackends([{"lat": "3.1", "lon": "101.6", "display_name": "Somewhere"}])
+    monkeypatch.setattr(geocoder, "_nominatim_fetch", fake.nominatim)
+    monkeypatch.setattr(geocoder, "_shared_cache_get", fake.shared_get)
+    monkeypatch.setattr(geocoder, "_shared_cache_put", fake.shared_put)
+    geocoder._GEOCODE_CACHE.clear()
+    reset_gazetteer()
+    yield fake
+    geocoder._GEOCODE_CACHE.clear()
+    reset_gazetteer()
+
+
+class TestGeocoderLookupOrder:
+    @pytest.mark.asyncio
+    async def test_postcode_answered_offline(self, backends):
+        result = await geocoder.geocode_postcode("40000")
+        assert result.found and result.lat == pytest.approx(3.0738)
+        assert backends.nominatim_calls == []
+
+    @pytest.mark.asyncio
+    async def test_unknown_postcode_falls_back_and_is_shared(self, backends):
+        result = await geocoder.geocode_postcode("40460")
+        assert result.found and result.display_name == "Somewhere"
+        assert len(backends.nominatim_calls) == 1
+        assert "PC:MY:40460" in backends.shared
+
+        # Another process: empty LRU, but the shared table answers.
+        geocoder._GEOCODE_CACHE.clear()
+        await geocoder.geocode_postcode("40460")
+        assert len(backends.nominatim_calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_offline_index_can_be_disabled(self, backends, monkeypatch):
+        monkeypatch.setenv("GEOCODER_OFFLINE_INDEX", "off")
+        reset_gazetteer()
+        await geocoder.geocode_postcode("40000")
+        assert len(backends.nominatim_calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_address_detail_goes_to_nominatim(self, backends):
+        await geocoder.geocode_address("Shah Alam")
+        assert backends.nominatim_calls == []
+        await geocoder.geocode_address("12 Jalan Mawar 3, Shah Alam")
+        assert len(backends.nominatim_calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_postcode_rejected_before_lookup(self, backends):
+        with pytest.raises(HTTPException) as exc:
+            await geocoder.geocode_postcode("KFC")
+        assert exc.value.status_code == 400
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(geocoder, "_GEOCODE_CACHE_MAX", 2)
+    geocoder._GEOCODE_CACHE.clear()
+    geocoder._cache_put("a", {"found": False})
+    geocoder._cache_put("b", {"found": False})
+    geocoder._cache_get("a")  # touch → "b" is now the oldest
+    geocoder._cache_put("c", {"found": False})
+    assert list(geocoder._GEOCODE_CACHE) == ["a", "c"]
+    geocoder._GEOCODE_CACHE.clear()
@@ -0,0 +1,120 @@
+"""
+Tests for per-build GenerationContext isolation on the shared AIService.
+
+The stress test runs many generate_website builds concurrently on ONE
+service with stub providers that record per-call state and then yield to
+the event loop — exactly the interleaving that used to leak one build's
+truncation flag into another's result.
+"""
+
+import asyncio
+import random
+import re
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import app.services.ai_service as ai_service_module
+from app.models.schemas import WebsiteGenerationRequest
+from app.services.ai_service import AIService
+from app.services.generation_context import GenerationContext, current_generation, generation_scope
+from app.services.generation_validator import ValidationResult
+
+VALID_HTML = (
+    "<!DOCTYPE html><html><head><title>t</title></head>"
+    "<body><h1>Kedai</h1><p>" + ("x" * 200) + "</p></body></html>"
+)
+
+
+def _request(n: int) -> WebsiteGenerationRequest:
+    return WebsiteGenerationRequest(
+        business_name=f"Kedai Nombor{n}",
+        description="Kedai makan mamak di KL",
+        whatsapp_number="0123456789",
+        subdomain=f"kedai-{n}",
+    )
+
+
+def _stub_service() -> AIService:
+    service = AIService()
+    service._validate_generated_html = MagicMock(return_value=[])
+    service._improve_with_qwen = AsyncMock(side_effect=lambda html, desc: html)
+    service._fix_placeholders = MagicMock(side_effect=lambda html, *a, **k: html)
+    service._fix_menu_item_images = MagicMock(side_effect=lambda html, *a, **k: html)
+    service._generate_ai_food_images = AsyncMock(side_effect=lambda html, **k: (html, 0))
+    service._fix_broken_image_urls = MagicMock(side_effect=lambda html, *a, **k: html)
+    service._validate_and_repair = AsyncMock(
+        side_effect=lambda html, request, **k: (html, ValidationResult())
+    )
+    return service
+
+
+class TestConcurrentBuilds:
+    @pytest.mark.asyncio
+    async def test_parallel_builds_do_not_share_provider_state(self, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "USE_GLM_FOR_HTML", False)
+        service = _stub_service()
+        rng = random.Random(7)
+
+        async def deepseek(prompt, *a, **k):
+            # Odd-numbered builds hit the output cap. The flag is recorded
+            # BEFORE yielding, so any other build finishing its call in the
+            # meantime would overwrite a shared attribute.
+            n = int(re.search(r"Nombor(\d+)", prompt).group(1))
+            service._last_api_call = {
+                "provider": "deepseek",
+                "finish_reason": "length" if n % 2 else "stop",
+                "truncated": bool(n % 2),
+            }
+            await asyncio.sleep(rng.random() / 100)
+            return VALID_HTML
+
+        service._call_deepseek = AsyncMock(side_effect=deepseek)
+        contexts = [GenerationContext() for _ in range(40)]
+
+        results = await asyncio.gather(*(
+            service.generate_website(_request(n), image_choice="none", generation=contexts[n])
+            for n in range(40)
+        ))
+
+        assert [r.was_truncated for r in results] == [bool(n % 2) for n in range(40)]
+        assert [c.api_call["truncated"] for c in contexts] == [bool(n % 2) for n in range(40)]
+        assert len({c.build_id for c in contexts}) == 40
+
+    @pytest.mark.asyncio
+    async def test_state_does_not_outlive_the_build(self, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "USE_GLM_FOR_HTML", False)
+        service = _stub_service()
+
+        async def deepseek(prompt, *a, **k):
+            service._last_api_call = {"provider": "deepseek", "finish_reason": "length", "truncated": True}
+            return VALID_HTML
+
+        service._call_deepseek = AsyncMock(side_effect=deepseek)
+        await service.generate_website(_request(1), image_choice="none")
+
+        assert current_generation() is None
+        assert service._last_api_call["truncated"] is False  # instance fallback untouched
+
+
+class TestScope:
+    def test_properties_follow_the_active_context(self):
+        service = AIService.__new__(AIService)  # no __init__: fallback made lazily
+        service._last_sanitizer_trace = [{"claim": "halal"}]
+        with generation_scope() as ctx:
+            assert service._last_sanitizer_trace == []
+            service._last_template_hours = [{"day": "Isnin"}]
+            assert ctx.template_hours == [{"day": "Isnin"}]
+        assert service._last_sanitizer_trace == [{"claim": "halal"}]
+        assert service._last_template_hours == []
+
+    @pytest.mark.asyncio
+    async def test_context_reaches_tasks_and_threads(self):
+        service = AIService.__new__(AIService)
+
+        def in_thread():
+            service._last_extract_info = {"was_truncated": True, "unclosed_tags": ["div"], "tail": ""}
+
+        with generation_scope() as ctx:
+            await asyncio.wait_for(asyncio.to_thread(in_thread), timeout=5)
+        assert ctx.extract_info["unclosed_tags"] == ["div"]
@@ -3,6 +3,7 @@
 from app.services.generation_linter import (
     lint_fontawesome_icons,
     lint_tailwind_classes,
+    lint_malay_typos,
     lint_html,
 )
 
@@ -249,3 +250,43 @@ def test_lint_html_food_bias_corrects_unknown_glyph_fallback_too():
     out, report = lint_html(html, context="tomyam merchandise store", business_type="general")
     assert "fa-pot-food" not in out
     assert "fa-bowl-food" not in out
+
+
+# ---------------------------------------------------------------------------
+# Single pass (app.services.html_transform)
+# ---------------------------------------------------------------------------
+
+def _sequential(html, context, business_type):
+    html, _ = lint_fontawesome_icons(html, context)
+    html, _ = lint_food_icon_bias(html, business_type, context)
+    html, _ = lint_tailwind_classes(html)
+    html, _ = lint_malay_typos(html)
+    return html
+
+
+SAMPLE = (
+    '<section class="py-20 -right-30 bg-amber-300/8"><i class="fas fa-pot-food"></i>'
+    '<p class="mt-13">Sesuai untuk majas dan tempahn. bg-red-500/8</p>'
+    '<script>var c = "text-black/33";</script></section>'
+)
+
+
+def test_lint_html_matches_the_sequential_passes():
+    out, _ = lint_html(SAMPLE, context=PHONE_CTX, business_type="phone")
+    assert out == _sequential(SAMPLE, PHONE_CTX, "phone")
+    assert "majlis" in out and "fa-pot-food" not in out
+
+
+def test_unclosed_class_quote_falls_back_to_whole_document_passes():
+    # class=" left open swallows the following tags; the single pass must
+    # not split that match into runs.
+    html = '<div class="p-4 <i class="fas fa-pot-food"></i>"><p class="mt-13">majas</p></div>'
+    out, _ = lint_html(html, context=PHONE_CTX, business_type="phone")
+    assert out == _sequential(html, PHONE_CTX, "phone")
+
+
+def test_lint_html_normalizes_whatsapp_links_on_request():
+    html = '<a href="https://wa.me/+60 12-345 6789?text=Hai">WhatsApp</a>'
+    assert lint_html(html)[0] == html
+    out, _ = lint_html(html, wa_links=True)
+    assert 'href="https://wa.me/60123456789?text=Hai"' in out
@@ -0,0 +1,133 @@
+"""
+Tests for app.services.image_scheduler — provider lanes, Stability
+overflow while the Z.ai queue is busy — and for generate_website running
+the auto-fill images alongside HTML generation when AI_IMAGE_SCHEDULER is on.
+
+Providers are stubs that sleep for a scripted latency.
+"""
+
+import asyncio
+import re
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import app.services.ai_service as ai_service_module
+from app.models.schemas import WebsiteGenerationRequest
+from app.services.ai_service import AIService
+from app.services.generation_validator import ValidationResult
+from app.services.image_scheduler import ImageScheduler
+
+PLACEHOLDER_RE = re.compile(r"https://res\.cloudinary\.com/binaapp/image/upload/pending/[\w-]+\.jpg")
+
+
+def _service(zai_delay=0.2, stability_delay=0.05, zai_url=True):
+    service = AIService()
+    service.stability_api_key = "stability-key"
+    calls = {"zai": 0, "stability": 0, "stability_peak": 0, "stability_active": 0}
+
+    async def zai(prompt):
+        calls["zai"] += 1
+        await asyncio.sleep(zai_delay)
+        return "https://res.cloudinary.com/demo/zai.jpg" if zai_url else None
+
+    async def stability(prompt, food=True, doodle=False):
+        calls["stability"] += 1
+        n = calls["stability"]
+        calls["stability_active"] += 1
+        calls["stability_peak"] = max(calls["stability_peak"], calls["stability_active"])
+        await asyncio.sleep(stability_delay)
+        calls["stability_active"] -= 1
+        return f"https://res.cloudinary.com/demo/stability-{n}.jpg"
+
+    service._generate_image_zai = zai
+    service._generate_stability_image = stability
+    return service, calls
+
+
+class TestScheduler:
+    @pytest.mark.asyncio
+    async def test_overflow_to_stability_while_zai_is_busy(self, monkeypatch):
+        monkeypatch.setenv("ZAI_IMAGE_REQUEST_DELAY_SECONDS", "0")
+        service, calls = _service(zai_delay=0.3)
+        scheduler = ImageScheduler(service, "zai", zai_phase=service._new_zai_image_phase())
+
+        started = time.monotonic()
+        urls = await asyncio.gather(*(scheduler.submit(f"p{i}", food=False) for i in range(4)))
+        elapsed = time.monotonic() - started
+
+        assert all(urls)
+        assert calls["zai"] == 1 and calls["stability"] == 3
+        assert scheduler.stats["overflow"] == 3
+        # Close to the slowest single image, not four serialized Z.ai calls.
+        assert elapsed < 0.6
+
+    @pytest.mark.asyncio
+    async def test_zai_failure_falls_back_to_stability(self, monkeypatch):
+        monkeypatch.setenv("ZAI_IMAGE_REQUEST_DELAY_SECONDS", "0")
+        service, calls = _service(zai_url=False)
+        scheduler = ImageScheduler(service, "zai")
+
+        assert await scheduler.generate("p", food=False) == "https://res.cloudinary.com/demo/stability-1.jpg"
+        assert calls == {**calls, "zai": 1, "stability": 1}
+
+    @pytest.mark.asyncio
+    async def test_stability_lane_is_bounded(self):
+        service, calls = _service()
+        scheduler = ImageScheduler(service, "stability", stability_concurrency=2)
+        await asyncio.gather(*(scheduler.submit(f"p{i}") for i in range(6)))
+        assert calls["stability"] == 6 and calls["stability_peak"] == 2
+
+    @pytest.mark.asyncio
+    async def test_aclose_cancels_unfinished_jobs(self):
+        service, _ = _service(stability_delay=5)
+        scheduler = ImageScheduler(service, "stability")
+        task = scheduler.submit("p")
+        await asyncio.sleep(0)
+        await scheduler.aclose()
+        assert task.cancelled()
+
+
+class TestOverlappedBuild:
+    @pytest.mark.asyncio
+    async def test_images_generate_while_html_is_written(self, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "AI_IMAGE_SCHEDULER", True)
+        monkeypatch.setattr(ai_service_module, "USE_GLM_FOR_HTML", False)
+        monkeypatch.setenv("IMAGE_PROVIDER", "stability")
+        service, calls = _service(stability_delay=0.2)
+        service.extract_menu_item_names = AsyncMock(return_value=["Nasi Lemak", "Roti Canai"])
+        service._validate_generated_html = MagicMock(return_value=[])
+        service._improve_with_qwen = AsyncMock(side_effect=lambda html, desc: html)
+        service._fix_placeholders = MagicMock(side_effect=lambda html, *a, **k: html)
+        service._fix_menu_item_images = MagicMock(side_effect=lambda html, *a, **k: html)
+        service._generate_ai_food_images = AsyncMock(side_effect=lambda html, **k: (html, 0))
+        service._fix_broken_image_urls = MagicMock(side_effect=lambda html, *a, **k: html)
+        service._validate_and_repair = AsyncMock(
+            side_effect=lambda html, request, **k: (html, ValidationResult())
+        )
+        seen_at_html = {}
+
+        async def deepseek(prompt, *a, **k):
+            seen_at_html["stability_calls"] = calls["stability"]
+            seen_at_html["in_flight"] = calls["stability_active"]
+            imgs = "".join(f'<img src="{url}">' for url in PLACEHOLDER_RE.findall(prompt))
+            await asyncio.sleep(0.05)
+            return f"<!DOCTYPE html><html><body><h1>Kedai</h1>{imgs}<p>{'x' * 200}</p></body></html>"
+
+        service._call_deepseek = AsyncMock(side_effect=deepseek)
+        request = WebsiteGenerationRequest(
+            business_name="Kedai Mak Som",
+            description="Kedai makan nasi lemak dan roti canai di KL",
+            whatsapp_number="0123456789",
+            subdomain="kedai-mak-som",
+        )
+
+        result = await service.generate_website(request, image_choice="ai")
+
+        # Three images (hero + two items) were already running when HTML began.
+        assert seen_at_html == {"stability_calls": 3, "in_flight": 3}
+        assert result.ai_images_count == 3
+        assert not PLACEHOLDER_RE.search(result.html_content)
+        for n in (1, 2, 3):
+            assert f"https://res.cloudinary.com/demo/stability-{n}.jpg" in result.html_content
@@ -0,0 +1,113 @@
+"""
+Tests for app.utils.keyword_matcher — the single-pass whole-word matcher
+behind business classification and image selection. The reference is the
+per-keyword `re.search(rf"\\b{re.escape(k)}\\b", text)` loop it replaced.
+"""
+
+import re
+
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.business_types import (
+    BUSINESS_CONFIGS,
+    BUSINESS_TYPE_KEYWORDS,
+    detect_item_category,
+)
+from app.utils.keyword_matcher import KeywordMatch, KeywordMatcher, has_any_word
+
+
+def _reference(text, keywords):
+    return {k for k in keywords if re.search(rf"\b{re.escape(k)}\b", text)}
+
+
+TEXTS = [
+    "kedai kek hari jadi dan kek kahwin di shah alam, juga kopi",
+    "nasi lemak, nasi kandar & teh tarik — warung mamak 24 jam",
+    "pusat kecantikan: facial, spa, hair spa dan potong rambut",
+    "spare parts kereta, servis aircond, tayar",
+    "butik baju kurung, tudung bawal, kebaya moden",
+    "catering majlis perkahwinan + jamuan hari raya",
+    "price list: meeting room, fotokopi, iskandar puteri",
+    "wedding cake / birthday cake / cupcakes & cheesecake!!",
+    "",
+]
+
+
+class TestParity:
+    @pytest.mark.parametrize("text", TEXTS)
+    def test_business_type_vocabulary(self, text):
+        vocab = [k for keywords in BUSINESS_TYPE_KEYWORDS.values() for k in keywords]
+        assert KeywordMatcher(vocab).matched(text) == _reference(text, vocab)
+
+    @pytest.mark.parametrize("text", TEXTS)
+    def test_image_vocabulary(self, text):
+        vocab = [k for k in AIService._ALL_IMAGES if k != "default"]
+        assert AIService._ALL_IMAGE_MATCHER.matched(text) == _reference(text, vocab)
+
+    def test_prefix_keywords_share_a_start(self):
+        matcher = KeywordMatcher(["kek", "kek hari jadi", "kek harijadi", "hari", "hari jadi"])
+        text = "kek hari jadi"
+        assert matcher.matched(text) == {"kek", "kek hari jadi", "hari", "hari jadi"}
+        assert matcher.matched("kekal") == set()
+
+    def test_prefix_needs_its_own_boundary(self):
+        # 'cup' is a prefix of 'cupcake' but not a word inside "cupcake".
+        matcher = KeywordMatcher(["cup", "cupcake", "cupcake box"])
+        assert matcher.matched("cupcake box") == {"cupcake", "cupcake box"}
+        assert matcher.matched("cup cupcake") == {"cup", "cupcake"}
+
+    def test_punctuation_in_keywords(self):
+        matcher = KeywordMatcher(["a&w", "7-eleven", "c++"])
+        assert matcher.matched("a&w dan 7-eleven") == {"a&w", "7-eleven"}
+        assert matcher.matched("c++") == _reference("c++", ["c++"])
+
+
+class TestApi:
+    def test_positions_and_repeats(self):
+        matcher = KeywordMatcher(["nasi", "nasi lemak"])
+        assert matcher.find_all("nasi lemak, nasi") == [
+            KeywordMatch("nasi lemak", 0, 10),
+            KeywordMatch("nasi", 0, 4),
+            KeywordMatch("nasi", 12, 16),
+        ]
+
+    def test_first_follows_vocabulary_order_not_position(self):
+        matcher = KeywordMatcher(["majlis", "kopi"])
+        assert matcher.first("kopi untuk majlis") == "majlis"
+        assert matcher.first("tiada") is None
+
+    def test_groups(self):
+        matcher = KeywordMatcher({"pet": ["cat", "dog"], "salon": ["hair", "cat"]})
+        assert matcher.group_hits("cat and dog") == {"pet": ["cat", "dog"], "salon": ["cat"]}
+        assert matcher.first_group("hair cat") == "pet"
+        assert matcher.first_group("hair") == "salon"
+        assert matcher.first_group("catering") is None
+
+    def test_empty_inputs(self):
+        assert KeywordMatcher([]).matched("anything") == set()
+        assert not KeywordMatcher(["x"]).search("")
+        assert not has_any_word("apa-apa", ())
+
+
+class TestCallSites:
+    def test_detect_item_category_keeps_config_order(self):
+        for btype, config in BUSINESS_CONFIGS.items():
+            for category_id, keywords in config.get("category_keywords", {}).items():
+                for keyword in keywords:
+                    expected = next(
+                        cid for cid, kws in config["category_keywords"].items()
+                        if _reference(keyword, kws)
+                    )
+                    assert detect_item_category(keyword, btype) == expected
+
+    def test_detect_type_priority(self):
+        service = AIService.__new__(AIService)
+        assert service._detect_type("Salon kucing dan anjing") == "pet_shop"
+        assert service._detect_type("Catering nasi") == "restaurant"
+        assert service._detect_type("Kedai spare parts") == "default"
+
+    def test_malay_pool_uses_dictionary_order(self):
+        service = AIService.__new__(AIService)
+        assert service._malay_pool_for("servis majlis") == "events"
+        assert service._malay_pool_for("tiada padanan") is None
@@ -0,0 +1,194 @@
+"""
+Tests for app.services.llm_stream — streamed chat completions with
+progress, early '</html>' / runaway / deadline stops — and for the
+provider methods that use it when AI_STREAM_RESPONSES is on.
+
+Providers are an httpx.MockTransport serving server-sent-event bodies.
+"""
+
+import json
+import time
+
+import httpx
+import pytest
+
+import app.services.ai_service as ai_service_module
+from app.services import llm_stream
+from app.services.ai_service import AIService
+from app.services.generation_context import generation_scope
+from app.services.llm_stream import (
+    DEADLINE,
+    HTML_CLOSED,
+    RUNAWAY,
+    deadline_unreachable,
+    post_chat_completion,
+)
+
+URL = "https://llm.test/v1/chat/completions"
+
+
+def _sse(pieces, finish_reason="stop", usage=None, sent=None):
+    """SSE body streaming `pieces`; appends to `sent` as each is read."""
+
+    async def body():
+        for piece in pieces:
+            if sent is not None:
+                sent.append(piece)
+            chunk = {"choices": [{"delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        final = {"choices": [{"delta": {}, "finish_reason": finish_reason}]}
+        yield f"data: {json.dumps(final)}\n\n".encode()
+        if usage:
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    return body()
+
+
+def _client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _post(handler, **kwargs):
+    async with _client(handler) as client:
+        return await post_chat_completion(
+            client, URL, headers={}, body={"model": "m"}, provider="test", stream=True, **kwargs
+        )
+
+
+class TestStream:
+    @pytest.mark.asyncio
+    async def test_assembles_content_usage_and_progress(self, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_PROGRESS_INTERVAL_SECONDS", 0.0)
+        requests, progress = [], []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, content=_sse(
+                ["<section>a</section>", "<section>b", "</section>"],
+                usage={"completion_tokens": 9},
+            ))
+
+        async def on_progress(p):
+            progress.append((p.chars, p.sections, p.done))
+
+        resp = await _post(handler, on_progress=on_progress)
+
+        assert resp.ok and resp.stopped is None
+        assert resp.content == "<section>a</section><section>b</section>"
+        assert resp.finish_reason == "stop"
+        assert resp.usage == {"completion_tokens": 9}
+        assert requests[0]["stream"] is True
+        assert requests[0]["stream_options"] == {"include_usage": True}
+        assert progress[-1] == (len(resp.content), 2, True)
+        assert [c for c, _, _ in progress] == sorted(c for c, _, _ in progress)
+
+    @pytest.mark.asyncio
+    async def test_stops_reading_at_closing_html_tag(self):
+        sent = []
+        pieces = ["<html><body>hi</body></ht", "ml>", "\nHope this helps!", "x" * 1000]
+        resp = await _post(lambda r: httpx.Response(200, content=_sse(pieces, sent=sent)))
+
+        assert resp.stopped == HTML_CLOSED
+        assert resp.finish_reason == "stop"
+        assert resp.content == "<html><body>hi</body></html>"
+        assert len(sent) < len(pieces)
+
+    @pytest.mark.asyncio
+    async def test_runaway_output_is_reported_as_a_cap_hit(self):
+        resp = await _post(
+            lambda r: httpx.Response(200, content=_sse(["<div>" * 50] * 100)), max_chars=1000
+        )
+        assert resp.stopped == RUNAWAY
+        assert resp.finish_reason == "length"
+        assert len(resp.content) <= 1250
+
+    @pytest.mark.asyncio
+    async def test_unreachable_deadline_abandons_the_stream(self, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_MIN_PROJECTION_SECONDS", 0.0)
+        resp = await _post(
+            lambda r: httpx.Response(200, content=_sse(["<div>"] * 20)),
+            deadline=time.monotonic(),
+        )
+        assert resp.stopped == DEADLINE
+        assert 0 < len(resp.content) < 100
+
+    @pytest.mark.asyncio
+    async def test_http_error_body_is_returned(self):
+        resp = await _post(lambda r: httpx.Response(429, text="rate limited"))
+        assert resp.status_code == 429 and not resp.ok
+        assert resp.error_body == "rate limited"
+
+    def test_deadline_projection(self, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_EXPECTED_CHARS", 30000)
+        monkeypatch.setattr(llm_stream, "STREAM_MIN_PROJECTION_SECONDS", 20.0)
+        # 3K chars in 30s → 270s more for a typical page; 60s budget left.
+        assert deadline_unreachable(3000, 30.0, started=0.0, now=30.0, deadline=90.0)
+        # 20K chars in 30s → 15s more; comfortably inside the budget.
+        assert not deadline_unreachable(20000, 30.0, started=0.0, now=30.0, deadline=90.0)
+        # Too early to judge.
+        assert not deadline_unreachable(10, 5.0, started=0.0, now=5.0, deadline=6.0)
+
+
+class TestProviderMethods:
+    @pytest.fixture
+    def service(self, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "AI_STREAM_RESPONSES", True)
+        service = AIService()
+        service.deepseek_api_key = "test-key"
+        return service
+
+    @staticmethod
+    def _route(monkeypatch, handler):
+        real_client = httpx.AsyncClient
+        monkeypatch.setattr(
+            ai_service_module.httpx, "AsyncClient",
+            lambda **kw: real_client(transport=httpx.MockTransport(handler)),
+        )
+
+    @pytest.mark.asyncio
+    async def test_deepseek_streams_into_the_build_progress_hook(self, service, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_PROGRESS_INTERVAL_SECONDS", 0.0)
+        self._route(monkeypatch, lambda r: httpx.Response(200, content=_sse(
+            ["<html><body>", "<section>x</section>", "</body></html>"]
+        )))
+        seen = []
+
+        async def hook(p):
+            seen.append(p.provider)
+
+        with generation_scope() as ctx:
+            ctx.on_stream_progress = hook
+            html = await service._call_deepseek("prompt")
+
+        assert html == "<html><body><section>x</section></body></html>"
+        assert ctx.api_call == {"provider": "deepseek", "finish_reason": "stop", "truncated": False}
+        assert seen and set(seen) == {"deepseek"}
+
+    def test_progress_hook_is_cleared_when_the_html_step_fails(self):
+        async def hook(p):
+            pass
+
+        with generation_scope() as ctx:
+            with pytest.raises(RuntimeError):
+                with ai_service_module._stream_progress(ctx, hook):
+                    assert ctx.on_stream_progress is hook
+                    raise RuntimeError("provider down")
+            assert ctx.on_stream_progress is None
+
+    @pytest.mark.asyncio
+    async def test_runaway_sets_truncated(self, service, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_MAX_CHARS", 500)
+        self._route(monkeypatch, lambda r: httpx.Response(200, content=_sse(["<div>" * 40] * 50)))
+        html = await service._call_deepseek("prompt")
+        assert html and service._last_api_call["truncated"] is True
+        assert service._last_api_call["finish_reason"] == "length"
+
+    @pytest.mark.asyncio
+    async def test_deadline_returns_none_for_fallback(self, service, monkeypatch):
+        monkeypatch.setattr(llm_stream, "STREAM_MIN_PROJECTION_SECONDS", 0.0)
+        monkeypatch.setattr(ai_service_module, "AI_PRIMARY_TIMEOUT_SECONDS", 0.0)
+        self._route(monkeypatch, lambda r: httpx.Response(200, content=_sse(["<div>"] * 50)))
+
+        assert await service._call_deepseek("prompt") is None
+        assert service._last_api_call["finish_reason"] == "deadline"
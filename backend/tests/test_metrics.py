@@ -0,0 +1,260 @@
+"""
+Tests for the metrics layer: app.production.metrics (lock-free primitives
+and Prometheus export) and app.production.instrumentation (route-template
+request latency, Supabase REST hooks, LLM call metrics, cache counters),
+plus the GET /metrics endpoint.
+
+No network: Supabase is an httpx.MockTransport, LLM providers are mocked.
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app.services.ai_service as ai_service_module
+from app.core import geocoder
+from app.main import app
+from app.middleware import subdomain
+from app.production.instrumentation import (
+    instrument_httpx_client,
+    instrument_supabase_client,
+    supabase_event_hooks,
+    supabase_target,
+)
+from app.production.metrics import Histogram, MetricsCollector, get_metrics
+from app.services.ai_service import AIService
+
+
+def _counter(name, **labels):
+    values = get_metrics().get_counter(name).get_values()
+    return values.get(tuple(sorted(labels.items())), 0)
+
+
+# =====================================================
+# Primitives
+# =====================================================
+class TestPrimitives:
+    def test_histogram_export_is_cumulative(self):
+        collector = MetricsCollector(prefix="t")
+        hist = collector.register_histogram("lat", "latency", buckets=(0.1, 1.0))
+        for v in (0.05, 0.1, 0.5, 3.0):
+            hist.observe_sync(v, {"route": "/x"})
+        text = collector.export()
+        assert 't_lat_bucket{route="/x",le="0.1"} 2' in text
+        assert 't_lat_bucket{route="/x",le="1.0"} 3' in text
+        assert 't_lat_bucket{route="/x",le="+Inf"} 4' in text
+        assert 't_lat_count{route="/x"} 4' in text
+
+    def test_inf_bucket_always_present(self):
+        assert Histogram(buckets=(1.0,)).buckets == (1.0, float("inf"))
+
+    def test_label_values_escaped(self):
+        collector = MetricsCollector(prefix="t")
+        collector.register_counter("c", "c").inc_sync({"q": 'a"b\\c\nd'})
+        assert 't_c{q="a\\"b\\\\c\\nd"} 1.0' in collector.export()
+
+    def test_register_is_idempotent(self):
+        collector = MetricsCollector(prefix="t")
+        first = collector.register_counter("c", "c")
+        first.inc_sync()
+        assert collector.register_counter("c", "c") is first
+        assert first.get_values()[()] == 1.0
+
+
+# =====================================================
+# HTTP
+# =====================================================
+class TestRequestMetrics:
+    def test_latency_recorded_by_route_template(self, monkeypatch):
+        monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+        client = TestClient(app, headers={"Authorization": "Bearer s3cret"})
+        before = _counter(
+            "http_requests_total",
+            endpoint="/api/generate/progress/{session_id}", method="GET", status="200",
+        )
+        for session in ("a1", "b2", "c3"):
+            assert client.get(f"/api/generate/progress/{session}").status_code == 200
+        after = _counter(
+            "http_requests_total",
+            endpoint="/api/generate/progress/{session_id}", method="GET", status="200",
+        )
+        assert after - before == 3
+
+        text = client.get("/metrics").text
+        assert 'endpoint="/api/generate/progress/{session_id}"' in text
+        assert "/api/generate/progress/a1" not in text
+
+    def test_unknown_paths_do_not_add_series(self, monkeypatch):
+        monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+        client = TestClient(app, headers={"Authorization": "Bearer s3cret"})
+        client.get("/definitely/not/a/route/123")
+        before = set(get_metrics().get_counter("http_requests_total").get_values())
+        client.get("/definitely/not/a/route/456")
+        client.get("/another/unknown/path")
+        after = set(get_metrics().get_counter("http_requests_total").get_values())
+        assert after == before
+        assert "/route/123" not in client.get("/metrics").text
+
+    def test_metrics_endpoint_token(self, monkeypatch):
+        client = TestClient(app)
+        monkeypatch.delenv("METRICS_TOKEN", raising=False)
+        assert client.get("/metrics").status_code == 404  # disabled without a token
+        monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        assert "# TYPE binaapp_http_request_duration_seconds histogram" in resp.text
+
+
+# =====================================================
+# Supabase REST
+# =====================================================
+def _supabase_transport(request):
+    return httpx.Response(200, json=[])
+
+
+class TestSupabaseHooks:
+    def test_target_labels(self):
+        assert supabase_target("/rest/v1/delivery_orders") == "delivery_orders"
+        assert supabase_target("/rest/v1/rpc/find_zone_for_point") == "rpc:find_zone_for_point"
+        assert supabase_target("/storage/v1/object/public/websites/x.html") == "storage"
+
+    @pytest.mark.asyncio
+    async def test_async_client_counts_per_table(self):
+        before = _counter("supabase_requests_total", method="GET", status="200", table="websites")
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(_supabase_transport),
+            event_hooks=supabase_event_hooks(),
+        ) as http:
+            await http.get("https://x.supabase.co/rest/v1/websites", params={"id": "eq.1"})
+            await http.get("https://x.supabase.co/rest/v1/websites", params={"id": "eq.2"})
+        assert _counter("supabase_requests_total", method="GET", status="200", table="websites") - before == 2
+
+        durations = get_metrics().get_histogram("supabase_request_duration_seconds").get_values()
+        assert durations["counts"][(("method", "GET"), ("table", "websites"))] >= 2
+
+    def test_sync_client_instrumented_once(self):
+        http = httpx.Client(transport=httpx.MockTransport(_supabase_transport))
+        instrument_httpx_client(http)
+        instrument_httpx_client(http)
+        assert len(http.event_hooks["response"]) == 1
+
+        before = _counter("supabase_requests_total", method="POST", status="200", table="rpc:list_delivery_zones")
+        http.post("https://x.supabase.co/rest/v1/rpc/list_delivery_zones", json={})
+        after = _counter("supabase_requests_total", method="POST", status="200", table="rpc:list_delivery_zones")
+        assert after - before == 1
+
+    def test_supabase_py_client_sessions_are_hooked(self):
+        from supabase import create_client
+
+        client = instrument_supabase_client(
+            create_client("https://x.supabase.co", "eyJhbGciOiJIUzI1NiJ9.e30.sig")
+        )
+        assert client.postgrest.session.event_hooks["response"]
+
+
+# =====================================================
+# LLM providers
+# =====================================================
+def _completion(content="<html></html>", finish_reason="stop", status_code=200):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.text = "error body"
+    resp.json.return_value = {
+        "choices": [{"message": {"content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 800},
+    }
+    return resp
+
+
+def _patch_client(response=None, side_effect=None):
+    client = MagicMock()
+    client.post = AsyncMock(return_value=response, side_effect=side_effect)
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=client)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    return patch.object(ai_service_module.httpx, "AsyncClient", return_value=ctx)
+
+
+@pytest.fixture
+def ai():
+    service = AIService()
+    service.zai_api_key = "k"
+    service.zai_model = "glm-test"
+    service.deepseek_api_key = "k"
+    service.deepseek_model = "deepseek-test"
+    return service
+
+
+class TestLlmMetrics:
+    @pytest.mark.asyncio
+    async def test_glm_latency_and_tokens(self, ai):
+        ok = dict(model="glm-test", outcome="ok", provider="glm")
+        before_calls = _counter("llm_requests_total", **ok)
+        before_tokens = _counter("llm_tokens_total", kind="completion", model="glm-test", provider="glm")
+        with _patch_client(_completion()):
+            await ai._call_glm("site")
+        assert _counter("llm_requests_total", **ok) - before_calls == 1
+        assert _counter("llm_tokens_total", kind="completion", model="glm-test", provider="glm") - before_tokens == 800
+
+    @pytest.mark.asyncio
+    async def test_deepseek_outcomes(self, ai):
+        labels = dict(model="deepseek-test", provider="deepseek")
+        before = {
+            o: _counter("llm_requests_total", outcome=o, **labels)
+            for o in ("truncated", "http_503", "timeout", "error")
+        }
+        with _patch_client(_completion(finish_reason="length")):
+            await ai._call_deepseek("site")
+        with _patch_client(_completion(status_code=503)):
+            await ai._call_deepseek("site")
+        with _patch_client(side_effect=httpx.ReadTimeout("slow")):
+            await ai._call_deepseek("site")
+        with _patch_client(side_effect=ValueError("bad payload")):
+            await ai._call_deepseek("site")
+        for outcome, count in before.items():
+            assert _counter("llm_requests_total", outcome=outcome, **labels) - count == 1
+
+
+# =====================================================
+# Caches
+# =====================================================
+class TestCacheMetrics:
+    def test_subdomain_cache_hit_and_miss(self):
+        cache = {}
+        before_miss = _counter("cache_lookups_total", cache="subdomain_html", result="miss")
+        before_hit = _counter("cache_lookups_total", cache="subdomain_html", result="hit")
+        assert subdomain._cache_get(cache, "kedai", "subdomain_html") is None
+        subdomain._cache_set(cache, "kedai", "<html>")
+        assert subdomain._cache_get(cache, "kedai", "subdomain_html") == "<html>"
+        assert _counter("cache_lookups_total", cache="subdomain_html", result="miss") - before_miss == 1
+        assert _counter("cache_lookups_total", cache="subdomain_html", result="hit") - before_hit == 1
+
+    @pytest.mark.asyncio
+    async def test_geocoder_tiers(self, monkeypatch):
+        async def no_shared(key):
+            return None
+
+        async def nominatim(params):
+            return [{"lat": "3.1", "lon": "101.6", "display_name": "X"}]
+
+        async def discard(key, data):
+            return None
+
+        monkeypatch.setattr(geocoder, "_shared_cache_get", no_shared)
+        monkeypatch.setattr(geocoder, "_shared_cache_put", discard)
+        monkeypatch.setattr(geocoder, "_nominatim_fetch", nominatim)
+        geocoder._GEOCODE_CACHE.clear()
+        before = {r: _counter("cache_lookups_total", cache="geocoder", result=r) for r in ("gazetteer", "lru", "miss")}
+
+        await geocoder.geocode_postcode("40000")  # bundled index
+        await geocoder.geocode_postcode("40460")  # miss → Nominatim
+        await geocoder.geocode_postcode("40460")  # LRU
+        geocoder._GEOCODE_CACHE.clear()
+
+        for result in ("gazetteer", "lru", "miss"):
+            assert _counter("cache_lookups_total", cache="geocoder", result=result) - before[result] == 1
@@ -0,0 +1,325 @@
+"""
+Tests for single-round-trip checkout (create_delivery_order RPC, migration
+056) and the post-commit side-effect queue (app.services.order_side_effects).
+
+Supabase is faked: the endpoint's sync client is conftest's in-memory
+FakeSupabase, and the worker's pooled REST client runs on an
+httpx.MockTransport.
+"""
+
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError as PostgrestAPIError
+
+from app.api.v1.endpoints import delivery
+from app.core.supabase import get_supabase_client
+from app.main import app
+from app.production.rate_limiter import LocalRateLimitBackend, RateLimiter, set_rate_limiter
+from app.services import order_side_effects
+from app.services.supabase_client import supabase_service
+
+WEBSITE_ID = "44444444-4444-4444-4444-444444444444"
+ORDER_ID = "55555555-5555-5555-5555-555555555555"
+CONVERSATION_ID = "66666666-6666-6666-6666-666666666666"
+
+ORDER_BODY = {
+    "website_id": WEBSITE_ID,
+    "customer_name": "Aina",
+    "customer_phone": "0123456789",
+    "delivery_address": "Jalan 1, Shah Alam",
+    "delivery_latitude": 3.07,
+    "delivery_longitude": 101.51,
+    "items": [{"menu_item_id": "77777777-7777-7777-7777-777777777777", "quantity": 2}],
+}
+
+ORDER_ROW = {
+    "id": ORDER_ID,
+    "order_number": "BNA-20261018-0001",
+    "website_id": WEBSITE_ID,
+    "customer_name": "Aina",
+    "customer_phone": "0123456789",
+    "customer_email": "",
+    "delivery_address": "Jalan 1, Shah Alam",
+    "delivery_latitude": 3.07,
+    "delivery_longitude": 101.51,
+    "delivery_notes": "",
+    "delivery_zone_id": "88888888-8888-8888-8888-888888888888",
+    "delivery_fee": 5.0,
+    "subtotal": 24.0,
+    "total_amount": 29.0,
+    "payment_method": "cod",
+    "payment_status": "pending",
+    "payment_reference": None,
+    "status": "pending",
+    "created_at": "2026-10-18T04:00:00+00:00",
+    "confirmed_at": None,
+    "preparing_at": None,
+    "ready_at": None,
+    "picked_up_at": None,
+    "delivered_at": None,
+    "completed_at": None,
+    "cancelled_at": None,
+    "rider_id": None,
+    "estimated_prep_time": 30,
+    "estimated_delivery_time": 40,
+    "actual_delivery_time": None,
+}
+
+
+@pytest.fixture
+def checkout(monkeypatch, fake_supabase):
+    scheduled = []
+
+    async def record(order_id=None, limit=None):
+        scheduled.append(order_id)
+
+    monkeypatch.setattr(delivery, "process_order_side_effects", record)
+    monkeypatch.setitem(delivery._ORDER_RPC_STATE, "available", True)
+    set_rate_limiter(RateLimiter(LocalRateLimitBackend()))
+
+    def install(data=None, error=None):
+        fake = fake_supabase(rpc={"create_delivery_order": error or data})
+        app.dependency_overrides[get_supabase_client] = lambda: fake
+        return TestClient(app), fake, scheduled
+
+    yield install
+    app.dependency_overrides.pop(get_supabase_client, None)
+    set_rate_limiter(None)
+
+
+# =====================================================
+# Checkout
+# =====================================================
+class TestCreateOrderRpc:
+    def test_one_round_trip_and_jobs_scheduled(self, checkout):
+        client, fake, scheduled = checkout(data={
+            "order": ORDER_ROW, "customer_id": "c-1", "conversation_id": CONVERSATION_ID,
+            "conversation_created": True,
+        })
+        resp = client.post("/api/v1/delivery/orders", json=ORDER_BODY)
+
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert body["order_number"] == "BNA-20261018-0001"
+        assert body["conversation_id"] == CONVERSATION_ID
+        assert [name for name, _ in fake.rpc_calls] == ["create_delivery_order"]
+        params = fake.rpc_calls[0][1]
+        assert params["p_website_id"] == WEBSITE_ID
+        assert params["p_items"][0]["quantity"] == 2
+        assert scheduled == [ORDER_ID]
+        assert fake.calls == {}  # the RPC path does not touch tables
+
+    @pytest.mark.parametrize("error, expected_id", [(None, CONVERSATION_ID), ("409 conflict", None)])
+    def test_conversation_written_before_its_id_is_returned(
+        self, checkout, monkeypatch, error, expected_id
+    ):
+        # Migration 056 without 061: the RPC does not create the conversation.
+        written = []
+
+        async def ensure(payload):
+            written.append(payload)
+            return error
+
+        monkeypatch.setattr(delivery, "ensure_order_conversation", ensure)
+        client, _, _ = checkout(data={
+            "order": ORDER_ROW, "customer_id": "c-1", "conversation_id": CONVERSATION_ID,
+        })
+        resp = client.post("/api/v1/delivery/orders", json=ORDER_BODY)
+
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["conversation_id"] == expected_id
+        assert written[0]["conversation_id"] == CONVERSATION_ID
+        assert written[0]["order_id"] == ORDER_ID
+
+    @pytest.mark.parametrize("error, status, expected", [
+        ({"code": "P0001", "message": "WEBSITE_NOT_FOUND"}, 404, "WEBSITE_NOT_FOUND"),
+        ({"code": "P0001", "message": "OUT_OF_COVERAGE"}, 400, "OUT_OF_COVERAGE"),
+        ({"code": "P0001", "message": "MENU_ITEMS_NOT_FOUND"}, 400, "Some menu items not found"),
+        ({"code": "22P02", "message": "invalid input syntax for type uuid"}, 400, "Some menu items not found"),
+        ({"code": "P0001", "message": "BELOW_MINIMUM", "details": "2000"}, 400, "RM20.00"),
+    ])
+    def test_validation_errors_keep_their_http_shape(self, checkout, error, status, expected):
+        client, _, scheduled = checkout(error=PostgrestAPIError(error))
+        resp = client.post("/api/v1/delivery/orders", json=ORDER_BODY)
+        assert resp.status_code == status
+        assert expected in json.dumps(resp.json())
+        assert scheduled == []
+
+    def test_missing_coordinates_rejected_before_database(self, checkout):
+        client, fake, _ = checkout()
+        body = {**ORDER_BODY, "delivery_latitude": None}
+        resp = client.post("/api/v1/delivery/orders", json=body)
+        assert resp.status_code == 400
+        assert "MISSING_COORDINATES" in resp.text
+        assert fake.rpc_calls == []
+
+    def test_falls_back_when_function_not_deployed(self, checkout, monkeypatch):
+        legacy_calls = []
+
+        async def legacy(order, supabase):
+            legacy_calls.append(order.website_id)
+            return {**ORDER_ROW, "conversation_id": None, "customer_id": None}
+
+        monkeypatch.setattr(delivery, "_create_order_legacy", legacy)
+        client, fake, scheduled = checkout(error=PostgrestAPIError({"code": "PGRST202", "message": "not found"}))
+
+        assert client.post("/api/v1/delivery/orders", json=ORDER_BODY).status_code == 200
+        assert client.post("/api/v1/delivery/orders", json=ORDER_BODY).status_code == 200
+        assert len(fake.rpc_calls) == 1  # not re-probed every order
+        assert len(legacy_calls) == 2
+        assert scheduled == []
+
+
+# =====================================================
+# Worker
+# =====================================================
+class FakeRest:
+    """PostgREST stand-in for the pooled client."""
+
+    def __init__(self, jobs, profile_phone="0191112222", fail_table=None):
+        self.jobs = jobs
+        self.profile_phone = profile_phone
+        self.fail_table = fail_table
+        self.inserts = []
+        self.finished = {}
+        self.claims = []
+
+    def __call__(self, request):
+        path = request.url.path
+        body = json.loads(request.content) if request.content else None
+        if path.endswith("/rpc/claim_order_side_effects"):
+            self.claims.append(body)
+            jobs, self.jobs = self.jobs, []
+            return httpx.Response(200, json=jobs)
+        if path.endswith("/rpc/finish_order_side_effect"):
+            self.finished[body["p_id"]] = body["p_error"]
+            return httpx.Response(204)
+        if path.endswith("/profiles"):
+            return httpx.Response(200, json=[{"phone": self.profile_phone}])
+        table = path.rsplit("/", 1)[-1]
+        if table == self.fail_table:
+            return httpx.Response(409, json={"message": "insert or update violates foreign key"})
+        self.inserts.append((table, body, request.headers.get("prefer")))
+        return httpx.Response(201)
+
+
+@pytest.fixture
+def rest(monkeypatch):
+    monkeypatch.setitem(order_side_effects._QUEUE_STATE, "available", True)
+
+    def install(fake):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+        monkeypatch.setattr(supabase_service, "_pooled_client", client)
+        monkeypatch.setattr(supabase_service, "url", "https://x.supabase.co")
+        return fake
+
+    return install
+
+
+def _job(job_id, kind, payload):
+    return {"id": job_id, "order_id": ORDER_ID, "kind": kind, "payload": payload, "attempts": 1}
+
+
+CHAT_PAYLOAD = {
+    "conversation_id": CONVERSATION_ID,
+    "order_id": ORDER_ID,
+    "order_number": "BNA-20261018-0001",
+    "website_id": WEBSITE_ID,
+    "website_name": "Kedai Aina",
+    "owner_id": "owner-1",
+    "customer_name": "Aina",
+    "customer_phone": "0123456789",
+    "delivery_address": "Jalan 1",
+    "total_amount": 29.0,
+}
+
+
+class TestWorker:
+    @pytest.mark.asyncio
+    async def test_order_chat_is_idempotent_inserts(self, rest):
+        fake = rest(FakeRest([_job(1, "order_chat", CHAT_PAYLOAD)]))
+        result = await order_side_effects.process_order_side_effects(order_id=ORDER_ID)
+
+        assert result == {"claimed": 1, "done": 1, "failed": 0}
+        assert fake.claims[0]["p_order_id"] == ORDER_ID
+        assert [t for t, _, _ in fake.inserts] == ["chat_conversations", "chat_messages", "notifications"]
+        assert all("ignore-duplicates" in prefer for _, _, prefer in fake.inserts)
+        assert fake.inserts[0][1]["id"] == CONVERSATION_ID
+        assert fake.inserts[2][1]["conversation_id"] == CONVERSATION_ID
+        assert fake.finished == {1: None}
+
+        # A retry writes the same primary keys.
+        first_ids = [row["id"] for _, row, _ in fake.inserts]
+        fake.jobs = [_job(1, "order_chat", CHAT_PAYLOAD)]
+        fake.inserts.clear()
+        await order_side_effects.process_order_side_effects()
+        assert [row["id"] for _, row, _ in fake.inserts] == first_ids
+
+    @pytest.mark.asyncio
+    async def test_failures_are_reported_per_job(self, rest, monkeypatch):
+        sent = []
+        monkeypatch.setattr(
+            order_side_effects, "notify_customer_order_placed",
+            lambda **kw: sent.append(kw["order_number"]) or True,
+        )
+        fake = rest(FakeRest(
+            [
+                _job(1, "order_chat", CHAT_PAYLOAD),
+                _job(2, "customer_whatsapp", {
+                    "customer_phone": "0123456789", "order_number": "BNA-1",
+                    "restaurant_name": "Kedai Aina", "total_amount": 29.0,
+                }),
+                _job(3, "mystery", {}),
+            ],
+            fail_table="chat_conversations",
+        ))
+        result = await order_side_effects.process_order_side_effects()
+
+        assert result == {"claimed": 3, "done": 1, "failed": 2}
+        assert fake.finished[2] is None
+        assert "chat_conversations" in fake.finished[1]
+        assert "unknown kind" in fake.finished[3]
+        assert sent == ["BNA-1"]
+
+    @pytest.mark.asyncio
+    async def test_owner_whatsapp_uses_profile_phone(self, rest, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            order_side_effects, "notify_owner_new_order",
+            lambda **kw: calls.append(kw) or True,
+        )
+        rest(FakeRest([_job(5, "owner_whatsapp", {
+            "owner_id": "owner-1", "order_number": "BNA-1", "customer_name": "Aina",
+            "customer_phone": "0123", "delivery_address": "Jalan 1", "total_amount": 29.0,
+            "items": [{"item_name": "Nasi Lemak", "quantity": 2, "unit_price": 12.0}],
+        })]))
+        await order_side_effects.process_order_side_effects()
+        assert calls[0]["owner_phone"] == "0191112222"
+        assert calls[0]["items"][0]["item_name"] == "Nasi Lemak"
+
+    @pytest.mark.asyncio
+    async def test_claim_failure_never_raises(self, rest):
+        def down(request):
+            return httpx.Response(503, text="unavailable")
+
+        rest(down)
+        assert await order_side_effects.process_order_side_effects() == {"claimed": 0, "done": 0, "failed": 0}
+
+    @pytest.mark.asyncio
+    async def test_queue_worker_latches_off_without_migration(self, rest):
+        calls = []
+
+        def missing(request):
+            calls.append(request.url.path)
+            return httpx.Response(404, json={"code": "PGRST202", "message": "not found"})
+
+        rest(missing)
+        for _ in range(3):
+            assert await order_side_effects.process_order_side_effects() == {
+                "claimed": 0, "done": 0, "failed": 0,
+            }
+        assert len(calls) == 1  # not re-probed every sweep
+        assert order_side_effects._QUEUE_STATE["available"] is False
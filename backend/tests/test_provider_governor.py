@@ -0,0 +1,192 @@
+"""
+Tests for app.production.provider_governor: the in-process governor's
+limit / spacing / fair-turn rules, the Redis backend's polling and outage
+fallback, and AIService routing every Z.ai image through one governor.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.production.provider_governor import (
+    LocalProviderGovernor,
+    RedisProviderGovernor,
+    get_provider_governor,
+)
+from app.services.ai_service import AIService
+from app.services.generation_context import GenerationContext, generation_scope
+
+
+async def _held(governor, order, holder, hold=0.01, **kwargs):
+    async with governor.lease("zai", holder=holder, **kwargs) as lease:
+        order.append(holder)
+        await asyncio.sleep(hold)
+        return lease
+
+
+class TestLocalGovernor:
+    @pytest.mark.asyncio
+    async def test_limit_is_enforced(self):
+        governor = LocalProviderGovernor()
+        state = {"active": 0, "peak": 0}
+
+        async def call():
+            async with governor.lease("zai", limit=2):
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                await asyncio.sleep(0.01)
+                state["active"] -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        assert state["peak"] == 2
+        assert not governor.busy("zai")
+
+    @pytest.mark.asyncio
+    async def test_builds_take_turns(self):
+        governor = LocalProviderGovernor()
+        order = []
+        first = [asyncio.create_task(_held(governor, order, "A")) for _ in range(4)]
+        await asyncio.sleep(0)
+        second = [asyncio.create_task(_held(governor, order, "B")) for _ in range(2)]
+        await asyncio.gather(*first, *second)
+        # B's images are not queued behind all of A's.
+        assert order == ["A", "B", "A", "B", "A", "A"]
+
+    @pytest.mark.asyncio
+    async def test_spacing_and_queue_wait(self):
+        governor = LocalProviderGovernor()
+        await _held(governor, [], "A", hold=0, spacing=0.1)
+        started = time.monotonic()
+        lease = await _held(governor, [], "A", hold=0, spacing=0.1)
+        assert time.monotonic() - started >= 0.09
+        assert lease.waited >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_frees_its_place(self):
+        governor = LocalProviderGovernor()
+        order = []
+        holder = asyncio.create_task(_held(governor, order, "A", hold=0.05))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_held(governor, order, "B"))
+        after = asyncio.create_task(_held(governor, order, "C"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(holder, after, return_exceptions=True)
+        assert order == ["A", "C"]
+        assert governor._queues["zai"].active == 0
+
+
+class FakeRedis:
+    """register_script stand-in: acquire replies are scripted, release/leave recorded."""
+
+    def __init__(self, acquire_replies=(), error=None):
+        self.acquire_replies = list(acquire_replies)
+        self.error = error
+        self.calls = []
+
+    def register_script(self, source):
+        async def run(keys, args):
+            kind = "acquire" if "ZRANK" in source else "release" if "HSET" in source else "leave"
+            self.calls.append((kind, keys, args))
+            if self.error:
+                raise self.error
+            if kind == "acquire":
+                return self.acquire_replies.pop(0)
+            return 1
+
+        return run
+
+
+class TestRedisGovernor:
+    @pytest.mark.asyncio
+    async def test_polls_until_granted_then_releases(self):
+        fake = FakeRedis(acquire_replies=[(0, -1), (0, 5), (1, 0)])
+        governor = RedisProviderGovernor("redis://test", client=fake, poll_interval=0.01)
+
+        async with governor.lease("zai", holder="build-1", limit=1, spacing=1.0, lease_seconds=270) as lease:
+            assert lease.backend == "redis"
+            assert governor.busy("zai")
+
+        kinds = [kind for kind, _, _ in fake.calls]
+        assert kinds == ["acquire", "acquire", "acquire", "release"]
+        _, keys, args = fake.calls[0]
+        assert keys[0] == "binaapp:gov:zai:leases"
+        assert args[1:5] == ["build-1", 1, 270_000, 1000]
+        # One token for the whole wait, released by the same token.
+        assert fake.calls[1][2][0] == args[0] == fake.calls[3][2][0]
+        assert not governor.busy("zai")
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        fake = FakeRedis(acquire_replies=[(0, -1)] * 100)
+        governor = RedisProviderGovernor("redis://test", client=fake, poll_interval=0.01)
+        task = asyncio.create_task(governor.acquire("zai", "b", 1, 0.0, 60))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert fake.calls[-1][0] == "leave"
+        assert fake.calls[-1][1] == ["binaapp:gov:zai:queue", "binaapp:gov:zai:seen"]
+
+    @pytest.mark.asyncio
+    async def test_outage_degrades_to_local_leases(self):
+        fake = FakeRedis(error=ConnectionError("down"))
+        governor = RedisProviderGovernor("redis://test", client=fake, retry_interval=30)
+        state = {"active": 0, "peak": 0}
+
+        async def call():
+            async with governor.lease("zai", limit=1):
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                await asyncio.sleep(0.01)
+                state["active"] -= 1
+
+        await asyncio.gather(*(call() for _ in range(3)))
+        assert state["peak"] == 1  # governed per worker, not switched off
+        assert len(fake.calls) == 1  # Redis not retried inside the interval
+
+
+class TestZaiImagesThroughGovernor:
+    @pytest.mark.asyncio
+    async def test_service_instances_share_one_slot(self, monkeypatch):
+        monkeypatch.setenv("ZAI_IMAGE_REQUEST_DELAY_SECONDS", "0")
+        state = {"active": 0, "peak": 0}
+
+        async def zai(prompt):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.02)
+            state["active"] -= 1
+            return "https://res.cloudinary.com/zai.png"
+
+        services = [AIService(), AIService()]
+        for service in services:
+            service._generate_image_zai = zai
+
+        await asyncio.gather(
+            *(services[i % 2]._generate_zai_image_serialized(f"p{i}", None) for i in range(4))
+        )
+        assert state["peak"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_is_not_charged_to_the_phase_budget(self, monkeypatch):
+        monkeypatch.setenv("ZAI_IMAGE_REQUEST_DELAY_SECONDS", "0")
+        service = AIService()
+
+        async def zai(prompt):
+            await asyncio.sleep(0.05)
+            return "https://res.cloudinary.com/zai.png"
+
+        service._generate_image_zai = zai
+        other = asyncio.create_task(service._generate_zai_image_serialized("other build", None))
+        await asyncio.sleep(0)
+
+        phase = service._new_zai_image_phase()
+        with generation_scope(GenerationContext(build_id="b1")):
+            assert await service._generate_zai_image_serialized("mine", phase)
+        await other
+
+        assert phase["queued"] >= 0.04
+        assert phase["spent"] < 0.09
+        assert not get_provider_governor().busy("zai")
@@ -0,0 +1,224 @@
+"""
+Tests for app.production.provider_router — health-ranked routing and
+hedged requests across HTML providers — and for its use by
+AIService._generate_html_routed when AI_PROVIDER_ROUTING is on.
+
+Providers are plain coroutines sleeping for a scripted latency.
+"""
+
+import asyncio
+
+import pytest
+
+import app.services.ai_service as ai_service_module
+from app.production import provider_router
+from app.production.circuit_breaker import CircuitState
+from app.production.provider_router import AllProvidersFailed, ProviderRouter
+from app.services.ai_service import AIService
+from app.services.generation_context import generation_scope
+
+
+def _provider(value, delay=0.0, log=None, name=None):
+    async def call():
+        if log is not None:
+            log.append(("start", name))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(("cancelled", name))
+            raise
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+    return call
+
+
+def _warm(router, provider, latency, n=10, ok=True):
+    for _ in range(n):
+        router.health[provider].record(ok, latency)
+
+
+def _hedges(provider, result):
+    return provider_router._hedges.get_values().get((("provider", provider), ("result", result)), 0.0)
+
+
+class TestRanking:
+    def test_cold_router_keeps_configured_order(self):
+        router = ProviderRouter(("glm", "deepseek"))
+        _warm(router, "deepseek", 1.0)  # glm has no samples yet
+        assert router.rank(["glm", "deepseek"]) == ["glm", "deepseek"]
+
+    def test_warm_router_prefers_faster_and_healthier(self):
+        router = ProviderRouter(("glm", "deepseek"))
+        _warm(router, "glm", 60.0)
+        _warm(router, "deepseek", 30.0)
+        assert router.rank(["glm", "deepseek"]) == ["deepseek", "glm"]
+
+        # Half of deepseek's calls now fail: 30s / 0.5 > 60s.
+        _warm(router, "deepseek", 30.0, n=10, ok=False)
+        assert router.health["deepseek"].error_rate == pytest.approx(0.5)
+        assert router.rank(["glm", "deepseek"]) == ["glm", "deepseek"]
+
+    def test_percentiles(self):
+        router = ProviderRouter(("glm",))
+        for seconds in range(1, 11):
+            router.health["glm"].record(True, float(seconds))
+        assert router.health["glm"].p50() == 5.0
+        assert router.health["glm"].p90() == 9.0
+        assert router.hedge_delay("glm") == 9.0
+
+
+class TestRun:
+    @pytest.mark.asyncio
+    async def test_falls_back_in_order_and_records_health(self):
+        router = ProviderRouter(("glm", "deepseek"))
+        result = await router.run({"glm": _provider(None), "deepseek": _provider("<html>")})
+
+        assert (result.provider, result.value, result.hedged) == ("deepseek", "<html>", False)
+        assert router.health["glm"].error_rate == 1.0
+        assert router.health["deepseek"].samples == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_timeouts_are_reported(self):
+        router = ProviderRouter(("glm", "deepseek"))
+        with pytest.raises(AllProvidersFailed) as exc:
+            await router.run(
+                {"glm": _provider("<html>", delay=1), "deepseek": _provider(None)},
+                budgets={"glm": 0.01},
+            )
+        assert isinstance(exc.value.errors["glm"], asyncio.TimeoutError)
+        assert "deepseek" not in exc.value.errors  # a None result is not an exception
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_is_skipped(self, monkeypatch):
+        monkeypatch.setattr(provider_router, "ROUTER_FAILURE_THRESHOLD", 2)
+        router = ProviderRouter(("glm", "deepseek"))
+        calls = []
+
+        async def glm():
+            calls.append("glm")
+            return None
+
+        for _ in range(2):
+            await router.run({"glm": glm, "deepseek": _provider("<html>")})
+        assert router.health["glm"].breaker.state == CircuitState.OPEN
+
+        assert router.rank(["glm", "deepseek"]) == ["deepseek", "glm"]
+        result = await router.run({"glm": glm, "deepseek": _provider("<html>")})
+        assert result.provider == "deepseek" and calls == ["glm", "glm"]
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_over_slow_primary(self, monkeypatch):
+        monkeypatch.setattr(provider_router, "ROUTER_HEDGE_DELAY_SECONDS", 0.05)
+        router = ProviderRouter(("glm", "deepseek"))
+        log = []
+        won = _hedges("deepseek", "won")
+
+        result = await router.run(
+            {
+                "glm": _provider("<glm>", delay=5, log=log, name="glm"),
+                "deepseek": _provider("<ds>", delay=0.01, log=log, name="deepseek"),
+            },
+            hedge=True,
+        )
+
+        assert (result.provider, result.value, result.hedged) == ("deepseek", "<ds>", True)
+        assert ("cancelled", "glm") in log
+        assert _hedges("deepseek", "won") == won + 1
+        assert router.health["glm"].samples == 0  # a cancelled loser is not a failure
+        assert router.health["glm"].breaker.get_metrics()["total_failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_primary_still_wins_after_hedge_fires(self, monkeypatch):
+        monkeypatch.setattr(provider_router, "ROUTER_HEDGE_DELAY_SECONDS", 0.01)
+        router = ProviderRouter(("glm", "deepseek"))
+        cancelled = _hedges("deepseek", "cancelled")
+
+        result = await router.run(
+            {"glm": _provider("<glm>", delay=0.05), "deepseek": _provider("<ds>", delay=5)},
+            hedge=True,
+        )
+
+        assert (result.provider, result.hedged) == ("glm", True)
+        assert _hedges("deepseek", "cancelled") == cancelled + 1
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_never_hedges(self):
+        router = ProviderRouter(("glm", "deepseek"))
+        _warm(router, "glm", 1.0)
+        log = []
+        result = await router.run(
+            {"glm": _provider("<glm>", delay=0.01), "deepseek": _provider("<ds>", log=log, name="deepseek")},
+            hedge=True,
+        )
+        assert (result.provider, result.hedged) == ("glm", False)
+        assert log == []
+
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("hedge", [False, True])
+    async def test_cancelled_caller_cancels_the_attempt(self, hedge):
+        router = ProviderRouter(("glm", "deepseek"))
+        _warm(router, "glm", 1.0)  # hedge delay well past the cancel
+        log = []
+        run = asyncio.ensure_future(router.run(
+            {"glm": _provider("<glm>", delay=5, log=log, name="glm"), "deepseek": _provider("<ds>")},
+            hedge=hedge,
+        ))
+        await asyncio.sleep(0.02)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        assert log == [("start", "glm"), ("cancelled", "glm")]
+
+
+class TestRoutedGeneration:
+    @pytest.mark.asyncio
+    async def test_hedged_pair_keeps_winner_api_call(self, monkeypatch):
+        monkeypatch.setattr(provider_router, "ROUTER_HEDGE_DELAY_SECONDS", 0.02)
+        monkeypatch.setattr(ai_service_module, "AI_PROVIDER_HEDGING", True)
+        monkeypatch.setattr(ai_service_module, "_HTML_ROUTER", ProviderRouter(("glm", "deepseek")))
+        service = AIService()
+
+        async def glm(prompt, has_images=True):
+            service._last_api_call = {"provider": "glm", "finish_reason": "length", "truncated": True}
+            await asyncio.sleep(5)
+            return "<html>glm</html>"
+
+        async def deepseek(prompt, model=None):
+            await asyncio.sleep(0.05)
+            service._last_api_call = {"provider": "deepseek", "finish_reason": "stop", "truncated": False}
+            return "<html>ds</html>"
+
+        service._call_glm = glm
+        service._call_deepseek = deepseek
+
+        with generation_scope() as build:
+            html, model = await service._generate_html_routed("prompt", {})
+
+        assert (html, model) == ("<html>ds</html>", service.deepseek_model_pro)
+        # GLM's in-flight truncation flag never reached the build.
+        assert build.api_call == {"provider": "deepseek", "finish_reason": "stop", "truncated": False}
+
+    @pytest.mark.asyncio
+    async def test_truncated_glm_falls_back(self, monkeypatch):
+        monkeypatch.setattr(ai_service_module, "_HTML_ROUTER", ProviderRouter(("glm", "deepseek")))
+        service = AIService()
+
+        async def glm(prompt, has_images=True):
+            service._last_api_call = {"provider": "glm", "finish_reason": "length", "truncated": True}
+            return "<html>cut"
+
+        async def deepseek(prompt, model=None):
+            service._last_api_call = {"provider": "deepseek", "finish_reason": "stop", "truncated": False}
+            return "<html>ds</html>"
+
+        service._call_glm = glm
+        service._call_deepseek = deepseek
+
+        with generation_scope():
+            html, _ = await service._generate_html_routed("prompt", {})
+        assert html == "<html>ds</html>"
+        assert ai_service_module._HTML_ROUTER.health["glm"].error_rate == 1.0
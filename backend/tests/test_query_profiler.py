@@ -0,0 +1,126 @@
+"""
+Tests for app.production.query_profiler: query shapes, row counts, N+1
+flagging, and the middleware's enable/expose rules. Supabase is an
+httpx.MockTransport behind the same event hooks the app uses.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import app as main_app
+from app.production import query_profiler
+from app.production.instrumentation import supabase_event_hooks
+from app.production.query_profiler import (
+    PROFILE_HEADER,
+    query_profile_middleware,
+    query_shape,
+    rows_from_content_range,
+)
+
+TOKEN = "profile-me"
+
+
+def _supabase(request):
+    return httpx.Response(200, json=[{}, {}], headers={"Content-Range": "0-1/*"})
+
+
+def _profiled_app():
+    app = FastAPI()
+    app.middleware("http")(query_profile_middleware)
+
+    @app.get("/menu/{website_id}")
+    async def menu(website_id: str, loop: int = 0):
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(_supabase),
+            event_hooks=supabase_event_hooks(),
+        ) as http:
+            await http.get(
+                "https://x.supabase.co/rest/v1/websites",
+                params={"id": f"eq.{website_id}", "select": "id,name"},
+            )
+            # A per-item lookup loop — the classic N+1.
+            await asyncio.gather(*(
+                http.get(
+                    "https://x.supabase.co/rest/v1/menu_items",
+                    params={"id": f"eq.item-{i}", "select": "*"},
+                )
+                for i in range(loop)
+            ))
+        return {"ok": True}
+
+    return app
+
+
+class TestShapes:
+    def test_values_are_stripped(self):
+        a = httpx.Request("GET", "https://x.supabase.co/rest/v1/orders?website_id=eq.1&status=in.(a,b)&select=id&limit=5")
+        b = httpx.Request("GET", "https://x.supabase.co/rest/v1/orders?status=in.(c)&website_id=eq.2&select=id&limit=50")
+        assert query_shape(a, "orders") == query_shape(b, "orders")
+        assert query_shape(a, "orders") == "GET orders?limit&select=id&status=in&website_id=eq"
+
+    def test_negated_operator_kept(self):
+        request = httpx.Request("GET", "https://x.supabase.co/rest/v1/orders?status=not.eq.cancelled")
+        assert query_shape(request, "orders") == "GET orders?status=not.eq"
+
+    def test_rows_from_content_range(self):
+        assert rows_from_content_range("0-24/*") == 25
+        assert rows_from_content_range("*/0") == 0
+        assert rows_from_content_range(None) is None
+
+
+class TestMiddleware:
+    def test_n_plus_one_flagged_in_header(self, monkeypatch):
+        monkeypatch.setenv("QUERY_PROFILE_TOKEN", TOKEN)
+        client = TestClient(_profiled_app())
+        resp = client.get("/menu/w1?loop=4", headers={PROFILE_HEADER: TOKEN})
+        header = resp.headers[PROFILE_HEADER]
+        assert "calls=5" in header and "rows=10" in header
+        assert "n+1=GET menu_items?id=eq&select=* x4" in header
+
+    def test_below_threshold_not_flagged(self, monkeypatch):
+        monkeypatch.setenv("QUERY_PROFILE_TOKEN", TOKEN)
+        client = TestClient(_profiled_app())
+        resp = client.get("/menu/w1?loop=2", headers={PROFILE_HEADER: TOKEN})
+        assert "n+1" not in resp.headers[PROFILE_HEADER]
+
+    def test_wrong_or_unconfigured_token_is_ignored(self, monkeypatch):
+        client = TestClient(_profiled_app())
+        monkeypatch.delenv("QUERY_PROFILE_TOKEN", raising=False)
+        assert PROFILE_HEADER not in client.get("/menu/w1", headers={PROFILE_HEADER: ""}).headers
+        monkeypatch.setenv("QUERY_PROFILE_TOKEN", TOKEN)
+        assert PROFILE_HEADER not in client.get("/menu/w1", headers={PROFILE_HEADER: "guess"}).headers
+
+    def test_sampled_requests_are_logged_not_exposed(self, monkeypatch):
+        monkeypatch.delenv("QUERY_PROFILE_TOKEN", raising=False)
+        monkeypatch.setenv("QUERY_PROFILE_SAMPLE_RATE", "1")
+        summaries = []
+        original = query_profiler.QueryProfile.summary
+
+        def spy(self, threshold=3):
+            summary = original(self, threshold)
+            summaries.append(summary)
+            return summary
+
+        monkeypatch.setattr(query_profiler.QueryProfile, "summary", spy)
+        resp = TestClient(_profiled_app()).get("/menu/w1?loop=3")
+        assert PROFILE_HEADER not in resp.headers
+        assert summaries[0]["calls"] == 4
+        assert summaries[0]["n_plus_1"][0]["count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_calls_outside_a_request_are_not_recorded(self):
+        assert query_profiler.current_profile() is None
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(_supabase), event_hooks=supabase_event_hooks()
+        ) as http:
+            await http.get("https://x.supabase.co/rest/v1/websites")
+        assert query_profiler.current_profile() is None
+
+    def test_installed_on_main_app(self, monkeypatch):
+        monkeypatch.setenv("QUERY_PROFILE_TOKEN", TOKEN)
+        resp = TestClient(main_app).get("/api/generate/progress/abc", headers={PROFILE_HEADER: TOKEN})
+        assert resp.headers[PROFILE_HEADER].startswith("calls=")
@@ -0,0 +1,248 @@
+"""
+Tests for app.production.rate_limiter: the in-process algorithms, the Redis
+backend's script contract and degradation, the FastAPI dependency on the
+public order / generation endpoints, and main.py's free-tier daily quota.
+
+Redis itself is replaced by a fake script runner — no server involved.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import app.main as main
+from app.production.rate_limiter import (
+    SLIDING_WINDOW,
+    TOKEN_BUCKET,
+    LocalRateLimitBackend,
+    RateLimiter,
+    RateLimitRule,
+    RedisRateLimitBackend,
+    _categorize_path,
+    client_identifier,
+    set_rate_limiter,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# =====================================================
+# Local backend
+# =====================================================
+class TestTokenBucket:
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        backend = LocalRateLimitBackend(clock=clock)
+        rule = RateLimitRule(limit=60, window_seconds=60, burst=3)  # 1 token/s
+
+        assert [backend.decide("ip", rule).allowed for _ in range(4)] == [True, True, True, False]
+        denied = backend.decide("ip", rule)
+        assert denied.retry_after == pytest.approx(1.0)
+
+        clock.now += 1.0
+        assert backend.decide("ip", rule).allowed
+        assert not backend.decide("ip", rule).allowed
+
+    def test_peek_does_not_consume(self):
+        backend = LocalRateLimitBackend(clock=FakeClock())
+        rule = RateLimitRule(limit=1, window_seconds=60)
+        assert backend.decide("ip", rule, peek=True).allowed
+        assert backend.decide("ip", rule).allowed
+        assert not backend.decide("ip", rule, peek=True).allowed
+
+    @pytest.mark.asyncio
+    async def test_concurrent_hits_never_overshoot(self):
+        backend = LocalRateLimitBackend()
+        rule = RateLimitRule(limit=10, window_seconds=3600)
+        results = await asyncio.gather(*(backend.hit("ip", rule) for _ in range(50)))
+        assert sum(r.allowed for r in results) == 10
+
+
+class TestSlidingWindow:
+    RULE = RateLimitRule(limit=3, window_seconds=86400, algorithm=SLIDING_WINDOW)
+
+    def test_exact_count_in_trailing_window(self):
+        clock = FakeClock()
+        backend = LocalRateLimitBackend(clock=clock)
+        for hour in range(3):
+            clock.now = 1000.0 + hour * 3600
+            assert backend.decide("user", self.RULE).allowed
+
+        clock.now = 1000.0 + 23 * 3600
+        denied = backend.decide("user", self.RULE)
+        assert not denied.allowed and denied.remaining == 0
+        # The first hit (at t=1000) ages out exactly one day later.
+        assert denied.retry_after == pytest.approx(3600)
+
+        clock.now = 1000.0 + 86400
+        allowed = backend.decide("user", self.RULE)
+        assert allowed.allowed and allowed.remaining == 0
+
+    def test_keys_are_independent(self):
+        backend = LocalRateLimitBackend(clock=FakeClock())
+        for _ in range(3):
+            backend.decide("a", self.RULE)
+        assert not backend.decide("a", self.RULE).allowed
+        assert backend.decide("b", self.RULE).allowed
+
+    def test_cleanup_keeps_live_windows(self):
+        clock = FakeClock()
+        backend = LocalRateLimitBackend(cleanup_interval=60, clock=clock)
+        backend.decide("user", self.RULE)
+        backend.decide("ip", RateLimitRule(limit=10))
+        clock.now += 120
+        backend.decide("other", RateLimitRule(limit=10))
+        assert set(backend._entries) == {
+            f"{SLIDING_WINDOW}:user", f"{TOKEN_BUCKET}:other",
+        }
+
+
+def test_categorize_path():
+    assert _categorize_path("/api/generate/start") == "generation"
+    assert _categorize_path("/api/orders") == "orders"
+    assert _categorize_path("/api/v1/delivery/orders/") == "orders"
+    assert _categorize_path("/api/v1/delivery/orders/BNA-123") == "api"
+    assert _categorize_path("/api/v1/auth/login") == "auth"
+
+
+# =====================================================
+# Redis backend
+# =====================================================
+class FakeRedis:
+    """Records script invocations; replies like the Lua scripts do."""
+
+    def __init__(self, reply=(1, 4, 0, 12000), error=None):
+        self.reply = list(reply)
+        self.error = error
+        self.calls = []
+
+    def register_script(self, source):
+        async def run(keys, args):
+            self.calls.append((source, keys, args))
+            if self.error:
+                raise self.error
+            return self.reply
+
+        return run
+
+
+class TestRedisBackend:
+    @pytest.mark.asyncio
+    async def test_decision_parsed_from_script_reply(self):
+        fake = FakeRedis(reply=(0, 0, 1500, 60000))
+        backend = RedisRateLimitBackend("redis://test", client=fake)
+        decision = await backend.hit("generation:1.2.3.4", RateLimitRule(limit=5, burst=2))
+
+        assert (decision.allowed, decision.remaining) == (False, 0)
+        assert decision.retry_after == pytest.approx(1.5)
+        _, keys, args = fake.calls[0]
+        assert keys == ["binaapp:rl:tb:generation:1.2.3.4"]
+        assert args[0] == 2 and float(args[1]) == pytest.approx(5 / 60 / 1000)
+
+    @pytest.mark.asyncio
+    async def test_sliding_window_members_are_unique(self):
+        fake = FakeRedis()
+        backend = RedisRateLimitBackend("redis://test", client=fake)
+        rule = RateLimitRule(limit=3, window_seconds=86400, algorithm=SLIDING_WINDOW)
+        await backend.hit("q:user", rule)
+        await backend.hit("q:user", rule)
+        (_, keys, a1), (_, _, a2) = fake.calls
+        assert keys == ["binaapp:rl:sw:q:user"]
+        assert a1[:4] == [3, 86_400_000, 1, 0]
+        assert a1[4] != a2[4]
+
+    @pytest.mark.asyncio
+    async def test_outage_degrades_to_local_limits(self):
+        fake = FakeRedis(error=ConnectionError("down"))
+        backend = RedisRateLimitBackend("redis://test", client=fake, retry_interval=30)
+        rule = RateLimitRule(limit=2, window_seconds=3600)
+
+        results = [(await backend.hit("ip", rule)).allowed for _ in range(3)]
+        assert results == [True, True, False]  # limited, not switched off
+        assert len(fake.calls) == 1  # Redis not retried inside the interval
+
+        backend._down_until = 0.0
+        fake.error = None
+        assert (await backend.hit("ip", rule)).allowed
+        assert len(fake.calls) == 2
+
+
+# =====================================================
+# Wiring
+# =====================================================
+@pytest.fixture
+def limiter():
+    limiter = RateLimiter(LocalRateLimitBackend())
+    limiter.register("orders", RateLimitRule(limit=1, window_seconds=3600))
+    set_rate_limiter(limiter)
+    yield limiter
+    set_rate_limiter(None)
+
+
+class TestRouteDependency:
+    @pytest.mark.parametrize("path", ["/api/orders", "/api/delivery/orders", "/api/v1/delivery/orders"])
+    def test_public_order_endpoints_are_limited_per_client(self, limiter, path):
+        client = TestClient(main.app)
+        first = client.post(path, json={})
+        assert first.status_code != 429
+
+        second = client.post(path, json={})
+        assert second.status_code == 429
+        assert int(second.headers["Retry-After"]) > 0
+
+        other = client.post(path, json={}, headers={"X-Forwarded-For": "203.0.113.9"})
+        assert other.status_code != 429
+
+
+def _request(forwarded=None, peer="10.0.0.5"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 443)})
+
+
+class TestClientIdentifier:
+    def test_spoofed_leftmost_hops_are_ignored(self):
+        # The proxy appends the real peer; whatever the client put in front
+        # of it must not change the key.
+        assert client_identifier(_request("1.1.1.1, 198.51.100.7"), 1) == "198.51.100.7"
+        assert client_identifier(_request("2.2.2.2, 198.51.100.7"), 1) == "198.51.100.7"
+        assert client_identifier(_request("1.1.1.1, 198.51.100.7, 10.0.0.9"), 2) == "198.51.100.7"
+
+    def test_falls_back_to_peer(self):
+        assert client_identifier(_request("198.51.100.7"), 0) == "10.0.0.5"
+        assert client_identifier(_request(), 1) == "10.0.0.5"
+        assert client_identifier(_request("198.51.100.7"), 2) == "10.0.0.5"
+
+
+class TestDailyGenerationQuota:
+    @pytest.mark.asyncio
+    async def test_quota_counts_down_and_blocks(self, limiter):
+        assert (await main.check_rate_limit("guest"))["remaining"] == main.FREE_LIMIT
+        for _ in range(main.FREE_LIMIT):
+            await main.increment_usage("guest")
+
+        usage = await main.check_rate_limit("guest")
+        assert usage["allowed"] is False and usage["remaining"] == 0
+        assert usage["limit"] == main.FREE_LIMIT
+
+    @pytest.mark.asyncio
+    async def test_founder_bypass(self, limiter, monkeypatch):
+        monkeypatch.setattr(main, "UNLIMITED_ACCESS_EMAILS", ["founder@binaapp.my"])
+        for _ in range(main.FREE_LIMIT + 1):
+            await main.increment_usage("guest", "Founder@binaapp.my")
+        usage = await main.check_rate_limit("guest", "founder@binaapp.my")
+        assert usage["allowed"] and usage.get("is_founder")
+        assert (await main.check_rate_limit("guest"))["remaining"] == main.FREE_LIMIT
+
+    def test_guests_are_keyed_by_client_address(self, limiter):
+        alice = main.free_quota_key("anonymous", _request("203.0.113.1"))
+        bob = main.free_quota_key("guest", _request("203.0.113.2"))
+        assert alice == "guest:203.0.113.1" and alice != bob
+        assert main.free_quota_key("user-1", _request("203.0.113.1")) == "user-1"
@@ -0,0 +1,148 @@
+"""
+Tests for app.services.smtp_pool and the email outbox, against the local
+SMTP sink (app.services.smtp_sink): connection reuse, bounded concurrency,
+reconnect after the server drops idle sessions, refused recipients and
+the batched outbox flush.
+"""
+
+import asyncio
+from email.message import EmailMessage
+
+import aiosmtplib
+import pytest
+
+from app.services import email_outbox
+from app.services.email_service import EmailService
+from app.services.smtp_pool import SendRate, SMTPPool, close_smtp_pools
+from app.services.smtp_sink import LocalSMTPSink
+
+
+def _message(n=0, to="pelanggan@example.com"):
+    msg = EmailMessage()
+    msg["From"] = "BinaApp <noreply@binaapp.my>"
+    msg["To"] = to
+    msg["Subject"] = f"Peringatan {n}"
+    msg.set_content(f"mesej {n}")
+    return msg
+
+
+class TestSMTPPool:
+    @pytest.mark.asyncio
+    async def test_one_login_for_many_messages(self):
+        async with LocalSMTPSink() as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, "u", "p")
+            for n in range(10):
+                await pool.send(_message(n), ["pelanggan@example.com"])
+            await pool.close()
+
+        assert len(sink.messages) == 10
+        assert sink.connections == 1 and sink.logins == 1
+        assert pool.stats["reused"] == 9
+
+    @pytest.mark.asyncio
+    async def test_concurrency_bounded_by_pool_size(self):
+        async with LocalSMTPSink(delay=0.01) as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, "u", "p", size=2)
+            await asyncio.gather(*(pool.send(_message(n), ["a@example.com"]) for n in range(8)))
+            await pool.close()
+
+        assert len(sink.messages) == 8
+        assert sink.connections == 2
+
+    @pytest.mark.asyncio
+    async def test_recycles_after_max_messages(self):
+        async with LocalSMTPSink() as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, "u", "p", max_messages=3)
+            for n in range(7):
+                await pool.send(_message(n), ["a@example.com"])
+            await pool.close()
+
+        assert sink.connections == 3
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_server_drops_session(self):
+        async with LocalSMTPSink() as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, "u", "p", idle_check_seconds=0)
+            await pool.send(_message(1), ["a@example.com"])
+            await sink.drop_connections()
+            await pool.send(_message(2), ["a@example.com"])
+            await pool.close()
+
+        assert [m.message["Subject"] for m in sink.messages] == ["Peringatan 1", "Peringatan 2"]
+        assert sink.connections == 2
+
+    @pytest.mark.asyncio
+    async def test_refused_recipient_raises_and_keeps_session(self):
+        async with LocalSMTPSink(reject=["hilang@example.com"]) as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, "u", "p")
+            with pytest.raises(aiosmtplib.SMTPRecipientsRefused):
+                await pool.send(_message(1), ["hilang@example.com"])
+            await pool.send(_message(2), ["a@example.com"])
+            await pool.close()
+
+        assert len(sink.messages) == 1
+        assert sink.connections == 1
+
+    @pytest.mark.asyncio
+    async def test_send_rate_paces_after_burst(self):
+        rate = SendRate(per_minute=60 * 50, burst=2)  # 20 ms apart after 2
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await rate.take()
+        assert loop.time() - start >= 0.035
+
+
+class TestEmailService:
+    @pytest.mark.asyncio
+    async def test_send_email_goes_through_the_pool(self):
+        service = EmailService()
+        async with LocalSMTPSink() as sink:
+            for n in range(3):
+                ok = await service._send_email(
+                    f"p{n}@example.com", f"Resit {n}", "<p>terima kasih</p>",
+                    smtp_host="127.0.0.1", smtp_port=sink.port,
+                    smtp_user="dev", smtp_password="dev",
+                )
+                assert ok
+            await close_smtp_pools()
+
+        assert sink.logins == 1
+        assert [m.rcpt_tos for m in sink.messages] == [[f"p{n}@example.com"] for n in range(3)]
+
+
+class TestOutboxFlush:
+    @pytest.mark.asyncio
+    async def test_flush_sends_batches_and_records_results(self, monkeypatch):
+        rows = [
+            {"id": n, "kind": "test", "to_email": f"p{n}@example.com", "subject": f"S{n}",
+             "html_content": "<p>x</p>", "attempts": 1}
+            for n in range(5)
+        ]
+        rows[2]["to_email"] = "hilang@example.com"
+        finished = {}
+
+        async def fake_rpc(name, params):
+            if name == "claim_email_outbox":
+                batch = rows[: params["p_limit"]]
+                del rows[: params["p_limit"]]
+                return batch
+            finished[params["p_id"]] = (params["p_error"] is None, params["p_permanent"])
+
+        monkeypatch.setattr(email_outbox, "_rpc", fake_rpc)
+        monkeypatch.setitem(email_outbox._OUTBOX_STATE, "available", True)
+
+        async with LocalSMTPSink(reject=["hilang@example.com"]) as sink:
+            from app.services.email_service import email_service
+
+            monkeypatch.setattr(email_service, "smtp_host", "127.0.0.1")
+            monkeypatch.setattr(email_service, "smtp_port", sink.port)
+            monkeypatch.setattr(email_service, "smtp_user", "dev")
+            monkeypatch.setattr(email_service, "smtp_password", "dev")
+            totals = await email_outbox.flush_email_outbox(limit=2)
+            await close_smtp_pools()
+
+        assert totals == {"claimed": 5, "sent": 4, "failed": 1}
+        assert finished[2] == (False, True)
+        assert all(finished[n] == (True, False) for n in (0, 1, 3, 4))
+        assert len(sink.messages) == 4
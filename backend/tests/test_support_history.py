@@ -0,0 +1,152 @@
+"""
+Tests for app.services.support_history: the limited tail query, prompt
+assembly to the token budget, background summary refreshes (guarded write,
+one per chat at a time), chats without the migration 060 columns and
+messages_count recounted on admin replies.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.v1.endpoints import admin_dashboard
+from app.services import support_history as sh
+
+CHAT_ID = "55555555-5555-5555-5555-555555555555"
+
+
+@pytest.fixture
+def db(fake_supabase):
+    return fake_supabase({
+        "ai_support_messages": [
+            {
+                "chat_id": CHAT_ID,
+                "role": "user" if n % 2 else "assistant",
+                "content": f"mesej {n}",
+                "created_at": f"2026-10-18T04:{n:02d}:00+00:00",
+            }
+            for n in range(30)
+        ],
+    })
+
+
+def _model(reply="ringkasan baharu", delay=0.0):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), calls
+
+
+@pytest.mark.asyncio
+async def test_tail_and_count_come_from_one_limited_query(db):
+    supabase = db
+    tail, total = await sh.load_tail(supabase, {"id": CHAT_ID})
+
+    assert total == 30
+    assert [m["content"] for m in tail] == [f"mesej {n}" for n in range(30 - sh.SUPPORT_HISTORY_TAIL, 30)]
+    calls = supabase.calls["ai_support_messages"]
+    assert ("select", ("role, content",), {"count": "exact"}) in calls
+    assert ("order", ("created_at",), {"desc": True}) in calls
+    assert ("limit", (sh.SUPPORT_HISTORY_TAIL,), {}) in calls
+
+    # Summary columns present: send what the summary doesn't cover, within bounds
+    chat = {"id": CHAT_ID, "history_summarized_count": 14}
+    tail, _ = await sh.load_tail(supabase, chat)
+    assert len(tail) == sh.tail_limit(chat, 30) == min(16, sh.SUPPORT_HISTORY_TAIL + sh.SUPPORT_SUMMARY_MIN_NEW)
+    assert sh.tail_limit({**chat, "history_summarized_count": 0}, 30) == (
+        sh.SUPPORT_HISTORY_TAIL + sh.SUPPORT_SUMMARY_MIN_NEW
+    )
+    # A stale messages_count on the row is ignored
+    assert sh.tail_limit({**chat, "messages_count": 3}, 30) == sh.tail_limit(chat, 30)
+
+
+def test_history_is_assembled_to_the_token_budget():
+    tail = [{"role": "user", "content": "x" * 400} for _ in range(10)]  # 100 tokens each
+    messages = sh.build_history_messages("Pengguna tanya pesanan o1.", tail, budget_tokens=350)
+
+    assert messages[0]["role"] == "system" and "Pengguna tanya pesanan o1." in messages[0]["content"]
+    assert len(messages) == 4  # summary + the three newest that fit
+    assert sum(sh.estimate_tokens(m["content"]) for m in messages) <= 350
+
+    # An oversized newest message is cut down rather than dropped
+    only = sh.build_history_messages(None, [{"role": "user", "content": "y" * 4000}], budget_tokens=50)
+    assert only == [{"role": "user", "content": "y" * 200}]
+
+
+@pytest.mark.asyncio
+async def test_refresh_folds_old_messages_and_guards_the_write(db):
+    supabase = db
+    client, model_calls = _model()
+    summarizer = sh.HistorySummarizer(tail=12, min_new=8)
+    chat = {"id": CHAT_ID, "history_summary": "lama", "history_summarized_count": 4}
+
+    assert summarizer.schedule(supabase, client, chat, 23) is None  # only 7 new
+    task = summarizer.schedule(supabase, client, chat, 24)
+    assert await task == "ringkasan baharu"
+
+    prompt = model_calls[0]["messages"][1]["content"]
+    assert "Current summary:\nlama" in prompt
+    assert "mesej 4" in prompt and "mesej 11" in prompt and "mesej 12" not in prompt
+    assert model_calls[0]["max_tokens"] == sh.SUPPORT_SUMMARY_MAX_TOKENS
+    assert ("range", (4, 11), {}) in supabase.calls["ai_support_messages"]
+
+    update = supabase.calls["ai_support_chats"]
+    assert update[0] == ("update", ({"history_summary": "ringkasan baharu", "history_summarized_count": 12},), {})
+    assert ("eq", ("history_summarized_count", 4), {}) in update
+
+
+@pytest.mark.asyncio
+async def test_one_refresh_per_chat_and_none_without_the_columns(db):
+    supabase = db
+    client, model_calls = _model(delay=0.05)
+    summarizer = sh.HistorySummarizer(tail=12, min_new=8)
+    chat = {"id": CHAT_ID, "history_summary": None, "history_summarized_count": 0}
+
+    first = summarizer.schedule(supabase, client, chat, 30)
+    assert first is not None
+    assert summarizer.schedule(supabase, client, chat, 32) is None  # still running
+    await summarizer.drain()
+    assert len(model_calls) == 1
+    assert summarizer.schedule(supabase, client, chat, 32) is not None
+    await summarizer.drain()
+
+    # Migration 060 not applied: the row has no summary columns
+    assert summarizer.schedule(supabase, client, {"id": CHAT_ID, "messages_count": 30}, 30) is None
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_leaves_the_summary_alone(db):
+    supabase = db
+    client, _ = _model()
+
+    async def broken(**kwargs):
+        raise RuntimeError("model down")
+
+    client.chat.completions.create = broken
+    summarizer = sh.HistorySummarizer(tail=12, min_new=8)
+    task = summarizer.schedule(supabase, client, {"id": CHAT_ID, "history_summarized_count": 0}, 30)
+
+    assert await task is None
+    assert "ai_support_chats" not in supabase.calls
+
+
+@pytest.mark.asyncio
+async def test_admin_reply_recounts_messages(monkeypatch, db):
+    supabase = db
+    # The row's count is stale (a concurrent writer lost an increment).
+    supabase.tables["ai_support_chats"] = [{"id": CHAT_ID, "messages_count": 20}]
+    monkeypatch.setattr(admin_dashboard, "get_supabase_client", lambda: supabase)
+    monkeypatch.setattr(admin_dashboard, "ADMIN_EMAILS", ["admin@binaapp.my"])
+
+    await admin_dashboard.admin_respond(
+        CHAT_ID,
+        admin_dashboard.AdminChatResponse(message="Kredit RM5 telah diberi"),
+        current_user={"sub": "admin-1", "email": "admin@binaapp.my"},
+    )
+    assert supabase.tables["ai_support_chats"][0]["messages_count"] == 31
+    assert ("select", ("id",), {"count": "exact", "head": True}) in supabase.calls["ai_support_messages"]
@@ -0,0 +1,233 @@
+"""
+Tests for app.services.vision_analysis and its callers: bounded concurrent
+analysis, keys on image content, in-batch dedupe, cached answers (failures
+are not cached), image fetches held to the storage host, the support
+chatbot's multi-image path and the upload batch's fallback answer.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+from app.api.v1.endpoints.ai_chat import SUPPORT_CHAT_MAX_IMAGES, SendMessageRequest
+from app.services import vision_analysis
+from app.services.ai_chatbot_service import AIChatbotService
+from app.services.ai_response_cache import AIResponseCache
+from app.services.ai_service import AIService
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    cache = AIResponseCache(path=None)
+    monkeypatch.setattr(vision_analysis, "get_ai_response_cache", lambda: cache)
+    monkeypatch.setattr(vision_analysis, "VISION_ANALYSIS_CACHE", True)
+    return cache
+
+
+@pytest.fixture
+def images(monkeypatch):
+    """URL → image bytes; the same photo may sit behind several URLs."""
+    content = {}
+
+    async def fake_digest(client, url, hosts=None):
+        return f"sha256:{content.get(url, url)}"
+
+    monkeypatch.setattr(vision_analysis, "image_digest", fake_digest)
+    return content
+
+
+@pytest.mark.asyncio
+async def test_analyses_run_concurrently_within_the_limit(memory_cache, images):
+    in_flight, peak = 0, 0
+
+    async def analyze(url):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return f"gambar {url}"
+
+    urls = [f"https://cdn.example.com/{n}.jpg" for n in range(6)]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await vision_analysis.analyze_images(urls, analyze, function="t", concurrency=3)
+
+    assert results == [f"gambar {u}" for u in urls]
+    assert peak == 3
+    assert loop.time() - start < 0.2  # two waves, not six
+
+
+@pytest.mark.asyncio
+async def test_same_image_under_new_url_is_not_analysed_again(memory_cache, images):
+    images.update({"https://a/1.jpg": "nasi", "https://a/2.jpg": "nasi", "https://a/3.jpg": "teh"})
+    calls = []
+
+    async def analyze(url):
+        calls.append(url)
+        return f"analisis {url}"
+
+    first = await vision_analysis.analyze_images(
+        ["https://a/1.jpg", "https://a/2.jpg", "https://a/3.jpg"], analyze, function="t", prompt="p"
+    )
+    assert calls == ["https://a/1.jpg", "https://a/3.jpg"]
+    assert first[0] == first[1] == "analisis https://a/1.jpg"
+
+    images["https://b/9.jpg"] = "teh"  # re-uploaded copy
+    again = await vision_analysis.analyze_images(["https://b/9.jpg"], analyze, function="t", prompt="p")
+    assert again == ["analisis https://a/3.jpg"] and len(calls) == 2
+
+    # A different prompt is a different question
+    await vision_analysis.analyze_images(["https://b/9.jpg"], analyze, function="t", prompt="lain")
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached(memory_cache, images):
+    outcomes = [RuntimeError("timeout"), None, "berjaya"]
+    calls = 0
+
+    async def analyze(url):
+        nonlocal calls
+        calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    for expected in (None, None, "berjaya", "berjaya"):
+        assert await vision_analysis.analyze_images(["https://a/x.jpg"], analyze, function="t") == [expected]
+    assert calls == 3
+
+
+STORAGE = "https://x.supabase.co/storage/v1/object/public/chat"
+HOSTS = frozenset({"x.supabase.co"})
+
+
+@pytest.fixture
+def storage_net(monkeypatch):
+    """DNS for the fake storage host; records every request that goes out."""
+    addresses = {"x.supabase.co": ["104.18.38.10"], "evil.example.com": ["169.254.169.254"]}
+    fetched = []
+
+    async def resolve(host):
+        if host not in addresses:
+            raise OSError("unknown host")
+        return addresses[host]
+
+    def handler(request):
+        fetched.append(str(request.url))
+        if request.url.path.endswith("/ok.jpg"):
+            return httpx.Response(200, content=b"\xff\xd8gambar")
+        if request.url.path.endswith("/moved.jpg"):
+            return httpx.Response(302, headers={"location": "/storage/v1/object/public/chat/ok.jpg"})
+        if request.url.path.endswith("/away.jpg"):
+            return httpx.Response(302, headers={"location": "https://evil.example.com/latest/meta-data"})
+        return httpx.Response(404)
+
+    monkeypatch.setattr(vision_analysis, "_resolve", resolve)
+    return addresses, fetched, httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_image_digest_hashes_bytes_and_falls_back_to_url(storage_net):
+    _, _, client = storage_net
+    async with client:
+        ok = await vision_analysis.image_digest(client, f"{STORAGE}/ok.jpg", HOSTS)
+        copy = await vision_analysis.image_digest(client, f"{STORAGE}/ok.jpg?v=2", HOSTS)
+        moved = await vision_analysis.image_digest(client, f"{STORAGE}/moved.jpg", HOSTS)
+        missing = await vision_analysis.image_digest(client, f"{STORAGE}/hilang.jpg", HOSTS)
+
+    assert ok == copy == moved and ok.startswith("sha256:")
+    assert missing.startswith("url:")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", [
+    "https://evil.example.com/latest/meta-data",  # not the storage host
+    "http://x.supabase.co/storage/v1/object/public/chat/ok.jpg",  # not https
+    "https://169.254.169.254/latest/meta-data",
+])
+async def test_urls_off_the_storage_host_are_never_fetched(storage_net, url):
+    _, fetched, client = storage_net
+    async with client:
+        key = await vision_analysis.image_digest(client, url, HOSTS)
+    assert key.startswith("url:") and fetched == []
+
+
+@pytest.mark.asyncio
+async def test_storage_host_on_a_private_address_is_not_fetched(storage_net):
+    addresses, fetched, client = storage_net
+    addresses["x.supabase.co"] = ["104.18.38.10", "10.0.0.5"]
+    async with client:
+        key = await vision_analysis.image_digest(client, f"{STORAGE}/ok.jpg", HOSTS)
+    assert key.startswith("url:") and fetched == []
+
+
+@pytest.mark.asyncio
+async def test_redirect_off_the_storage_host_is_not_followed(storage_net):
+    _, fetched, client = storage_net
+    async with client:
+        key = await vision_analysis.image_digest(client, f"{STORAGE}/away.jpg", HOSTS)
+    assert key.startswith("url:")
+    assert fetched == [f"{STORAGE}/away.jpg"]
+
+
+def test_image_hosts_include_the_storage_host(monkeypatch):
+    monkeypatch.setattr(vision_analysis.settings, "SUPABASE_URL", "https://X.supabase.co")
+    monkeypatch.setenv("VISION_IMAGE_HOSTS", "cdn.binaapp.my, ")
+    assert vision_analysis.image_hosts() == {"x.supabase.co", "cdn.binaapp.my"}
+
+
+def test_images_per_message_are_capped():
+    urls = [f"{STORAGE}/{n}.jpg" for n in range(SUPPORT_CHAT_MAX_IMAGES + 1)]
+    with pytest.raises(ValidationError):
+        SendMessageRequest(message="Makanan sejuk", image_urls=urls)
+    assert SendMessageRequest(message="Makanan sejuk", image_urls=urls[:-1]).image_urls == urls[:-1]
+
+
+@pytest.mark.asyncio
+async def test_chatbot_analyses_all_images_of_a_message_at_once(memory_cache, images):
+    calls = []
+
+    async def create(model, messages, max_tokens):
+        url = messages[0]["content"][0]["image_url"]["url"]
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        content = None if "rosak" in url else f"makanan sejuk ({url[-5:]})"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    bot = AIChatbotService.__new__(AIChatbotService)
+    bot.qwen_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    urls = ["https://a/1.jpg", "https://a/2.jpg", "https://a/rosak.jpg", "https://a/4.jpg"]
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await bot.analyze_images_with_qwen(urls, "Makanan sampai sejuk")
+
+    assert loop.time() - start < 0.15
+    assert results == ["makanan sejuk (1.jpg)", "makanan sejuk (2.jpg)", None, "makanan sejuk (4.jpg)"]
+    assert sorted(calls) == sorted(urls)
+
+
+@pytest.mark.asyncio
+async def test_unanalysed_upload_gets_the_fallback_answer(memory_cache, images):
+    async def analyze_uploaded_image(url):
+        if "rosak" in url:
+            raise RuntimeError("vision down")
+        return {"suggested_name": "Nasi Lemak", "category": "food", "description": "Nasi",
+                "confidence": "high" if "1" in url else "low", "is_food": True}
+
+    service = AIService.__new__(AIService)
+    service.analyze_uploaded_image = analyze_uploaded_image
+    results = await service.analyze_images_batch(
+        [{"url": "https://a/1.jpg"}, {"url": "https://a/2.jpg"}, {"url": "https://a/rosak.jpg"}]
+    )
+
+    assert results[0]["suggested_name"] == "Nasi Lemak"
+    for result in results[1:]:
+        assert result["description"] == "Unable to analyze image"
+        assert (result["category"], result["analyzed"]) == ("unknown", True)
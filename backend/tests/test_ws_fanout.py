@@ -0,0 +1,148 @@
+"""
+Tests for app.services.ws_fanout and the chat ConnectionManager built on
+it: concurrent broadcast, one serialization per broadcast, slow-consumer
+policy and the ping/idle reaper.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.api.v1.endpoints.chat import ConnectionManager
+from app.services.ws_fanout import CLOSE_SLOW_CONSUMER, SocketReaper, SocketSender
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestBroadcast:
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_hold_up_the_others(self):
+        manager = ConnectionManager()
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=5)
+        await manager.connect(fast, "c1", "owner_1")
+        await manager.connect(slow, "c1", "customer_1")
+
+        await asyncio.wait_for(
+            manager.send_to_conversation("c1", {"type": "new_message", "message": {"id": "m1"}}),
+            timeout=0.1,
+        )
+        await _settle()
+
+        assert [json.loads(t)["message"]["id"] for t in fast.sent] == ["m1"]
+        assert slow.sent == []
+        for conv in list(manager.active_connections.values()):
+            for sender in list(conv.values()):
+                sender.close()
+
+    @pytest.mark.asyncio
+    async def test_payload_serialized_once_and_sender_excluded(self):
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(3)]
+        for i, ws in enumerate(sockets):
+            await manager.connect(ws, "c1", f"user_{i}")
+
+        await manager.send_to_conversation("c1", {"type": "typing", "is_typing": True}, exclude_user="user_0")
+        await _settle()
+
+        assert sockets[0].sent == []
+        assert sockets[1].sent[0] is sockets[2].sent[0]
+        assert json.loads(sockets[1].sent[0]) == {"type": "typing", "is_typing": True}
+
+    @pytest.mark.asyncio
+    async def test_failed_socket_is_removed(self):
+        manager = ConnectionManager()
+        await manager.connect(FakeWebSocket(fail=True), "c1", "rider_1")
+        await manager.send_to_conversation("c1", {"type": "new_message"})
+        await _settle()
+        assert manager.get_online_users("c1") == []
+
+    @pytest.mark.asyncio
+    async def test_reconnect_replaces_the_stale_socket(self):
+        manager = ConnectionManager()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(old, "c1", "owner_1")
+        await manager.connect(new, "c1", "owner_1")
+        await _settle()
+        assert old.closed_with == 1000 and new.closed_with is None
+        assert manager.get_online_users("c1") == ["owner_1"]
+
+        # The old handler's late disconnect must leave the new socket alone.
+        assert manager.disconnect("c1", "owner_1", old) is False
+        await _settle()
+        assert new.closed_with is None
+        assert manager.get_online_users("c1") == ["owner_1"]
+
+        assert manager.disconnect("c1", "owner_1", new) is True
+        await _settle()
+        assert new.closed_with == 1000
+        assert manager.get_online_users("c1") == []
+
+
+class TestSlowConsumerPolicy:
+    @pytest.mark.asyncio
+    async def test_droppable_frames_shed_before_messages(self):
+        ws = FakeWebSocket(delay=5)
+        sender = SocketSender(ws, "c1/customer_1", maxsize=4)
+        sender.offer("m0")
+        await _settle()  # writer is now stuck sending m0
+
+        assert sender.offer("m1") and sender.offer("m2")
+        assert not sender.offer("loc", droppable=True)  # half full: shed
+        assert sender.dropped == 1
+        assert sender.offer("m3") and sender.offer("m4")
+        assert not sender.closed
+
+        assert not sender.offer("m5")  # full: disconnect, client resyncs
+        await _settle()
+        assert sender.closed and ws.closed_with == CLOSE_SLOW_CONSUMER
+
+    @pytest.mark.asyncio
+    async def test_stuck_send_times_out(self):
+        ws = FakeWebSocket(delay=5)
+        closed = []
+        sender = SocketSender(ws, "c1/rider_1", on_close=closed.append, send_timeout=0.02)
+        sender.offer("m1")
+        await asyncio.sleep(0.05)
+        assert closed == [sender]
+
+
+class TestReaper:
+    @pytest.mark.asyncio
+    async def test_pings_quiet_sockets_and_closes_idle_ones(self):
+        quiet, idle = FakeWebSocket(), FakeWebSocket()
+        senders = [SocketSender(quiet, "quiet"), SocketSender(idle, "idle")]
+        senders[0].last_received -= 30
+        senders[0].last_sent -= 30
+        senders[1].last_received -= 400
+
+        SocketReaper(lambda: senders, interval=25, idle_timeout=300).sweep()
+        await _settle()
+
+        assert [json.loads(t) for t in quiet.sent] == [{"type": "ping"}]
+        assert not senders[0].closed
+        assert senders[1].closed and idle.closed_with == 1000
+        senders[0].close()
@@ -405,9 +405,13 @@ class TestZaiRateLimitAndSerialization:
         async def fake_sleep(seconds):
             sleeps.append(seconds)
 
+        async def fake_zai(prompt):
+            return "https://res.cloudinary.com/zai.png"
+
+        service._generate_image_zai = fake_zai
+        await service._generate_zai_image_serialized("one", None)
         monkeypatch.setattr(ai_service_module.asyncio, "sleep", fake_sleep)
-        service._zai_last_request_at = ai_service_module.time.monotonic()
-        await service._pace_zai_image_request()
+        await service._generate_zai_image_serialized("two", None)
 
         assert sleeps and 4.5 < sleeps[0] <= 5.0
 
@@ -0,0 +1,311 @@
+"""
+Tests for the in-process delivery-zone coverage engine
+(app.services.zone_coverage) and its wiring into the public checkout route
+GET /delivery/zones/{website_id}/cover.
+
+The parity suite builds concentric rings the way the penghantaran zone
+editor does (64-vertex turf circles around the outlet) and checks every
+sampled point against a reference find_zone_for_point: smallest active
+ring whose true geodesic circle contains the point. Points within 1% of a
+ring edge are skipped — that band is where a 64-gon and the circle it
+approximates legitimately disagree.
+"""
+
+import math
+import random
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.supabase import get_supabase_client
+from app.main import app
+from app.services.zone_coverage import (
+    ZoneCoverageIndex,
+    compile_zone,
+    find_covering_zone,
+    ring_contains,
+    zone_coverage,
+)
+
+WEBSITE_ID = "33333333-3333-3333-3333-333333333333"
+CENTER = (3.0738, 101.5183)  # Shah Alam
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def _destination(lat, lng, distance_m, bearing_deg):
+    """Great-circle destination point (same maths as @turf/destination)."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    brng = math.radians(bearing_deg)
+    d = distance_m / EARTH_RADIUS_M
+    lat2 = math.asin(math.sin(lat1) * math.cos(d) + math.cos(lat1) * math.sin(d) * math.cos(brng))
+    lng2 = lng1 + math.atan2(
+        math.sin(brng) * math.sin(d) * math.cos(lat1),
+        math.cos(d) - math.sin(lat1) * math.sin(lat2),
+    )
+    return math.degrees(lat2), math.degrees(lng2)
+
+
+def _haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _ring_polygon(lat, lng, radius_m, steps=64):
+    coords = []
+    for i in range(steps):
+        p_lat, p_lng = _destination(lat, lng, radius_m, -360 * i / steps)
+        coords.append([p_lng, p_lat])
+    coords.append(coords[0])
+    return {"type": "Polygon", "coordinates": [coords]}
+
+
+def _zone_row(zone_id, radius_m, fee_cents, active=True):
+    return {
+        "id": zone_id,
+        "website_id": WEBSITE_ID,
+        "name": f"Ring {radius_m // 1000} km",
+        "color": "#C7FF3D",
+        "fee_cents": fee_cents,
+        "min_order_cents": 2000,
+        "polygon_geojson": _ring_polygon(*CENTER, radius_m),
+        "schedule_json": {},
+        "estimated_delivery_min": 30,
+        "max_simultaneous_orders": 10,
+        "customer_notes": None,
+        "active": active,
+        "area_m2": math.pi * radius_m ** 2,
+        "inner_radius_m": 0,
+        "outer_radius_m": radius_m,
+    }
+
+
+RINGS = [  # (id, radius_m, fee_cents, active)
+    ("z-3km", 3000, 300, True),
+    ("z-5km", 5000, 500, False),
+    ("z-8km", 8000, 800, True),
+    ("z-12km", 12000, 1200, True),
+]
+
+
+class FakeZoneRpc:
+    """Supabase fake serving list_delivery_zones and a reference
+    find_zone_for_point (true circles, smallest active radius wins)."""
+
+    def __init__(self, rings=RINGS):
+        self.rings = list(rings)
+        self.calls = {"list_delivery_zones": 0, "find_zone_for_point": 0}
+
+    def rpc(self, name, params):
+        self.calls[name] += 1
+        query = MagicMock()
+        if name == "list_delivery_zones":
+            data = [_zone_row(i, r, fee, active) for i, r, fee, active in self.rings]
+        else:
+            data = self.reference(params["p_lat"], params["p_lng"], params["p_only_active"])
+        query.execute.return_value = MagicMock(data=data)
+        return query
+
+    def reference(self, lat, lng, only_active=True):
+        d = _haversine_m(CENTER[0], CENTER[1], lat, lng)
+        for zone_id, radius, fee, active in sorted(self.rings, key=lambda r: r[1]):
+            if only_active and not active:
+                continue
+            if d <= radius:
+                row = _zone_row(zone_id, radius, fee, active)
+                return [{k: row[k] for k in (
+                    "id", "name", "fee_cents", "min_order_cents", "color",
+                    "active", "estimated_delivery_min",
+                )}]
+        return []
+
+
+# =====================================================
+# Geometry
+# =====================================================
+SQUARE = ((0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0))
+
+
+class TestRingContains:
+    def test_inside_and_outside(self):
+        assert ring_contains(SQUARE, 5, 5) is True
+        assert ring_contains(SQUARE, 15, 5) is False
+
+    def test_boundary_is_reported_separately(self):
+        assert ring_contains(SQUARE, 0, 5) is None
+        assert ring_contains(SQUARE, 10, 10) is None
+
+
+class TestCompiledZone:
+    def _donut(self):
+        row = _zone_row("donut", 1000, 100)
+        row["polygon_geojson"] = {
+            "type": "Polygon",
+            "coordinates": [
+                [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+                [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]],
+            ],
+        }
+        return compile_zone(row)
+
+    def test_hole_excluded_but_its_edge_covered(self):
+        zone = self._donut()
+        assert zone.covers(lat=2, lng=2)
+        assert not zone.covers(lat=5, lng=5)
+        assert zone.covers(lat=5, lng=4)  # ST_Covers: boundary counts
+
+    def test_outer_boundary_covered(self):
+        assert self._donut().covers(lat=0, lng=5)
+
+    def test_rejects_non_polygon(self):
+        row = _zone_row("bad", 1000, 100)
+        row["polygon_geojson"] = {"type": "MultiPolygon", "coordinates": []}
+        with pytest.raises(ValueError):
+            compile_zone(row)
+
+    def test_area_falls_back_to_planar_estimate(self):
+        row = _zone_row("z", 2000, 100)
+        row["area_m2"] = None
+        zone = compile_zone(row)
+        assert zone.area_m2 == pytest.approx(math.pi * 2000 ** 2, rel=0.01)
+
+
+# =====================================================
+# Parity with find_zone_for_point
+# =====================================================
+class TestParityWithRpc:
+    def test_random_points_match_reference(self):
+        fake = FakeZoneRpc()
+        zones = sorted(
+            (compile_zone(r) for r in fake.rpc("list_delivery_zones", {}).execute().data),
+            key=lambda z: z.area_m2,
+        )
+        radii = [r for _, r, _, _ in RINGS]
+        rng = random.Random(20261018)
+        checked = 0
+        for _ in range(4000):
+            lat, lng = _destination(*CENTER, rng.uniform(0, 15000), rng.uniform(0, 360))
+            d = _haversine_m(CENTER[0], CENTER[1], lat, lng)
+            if any(abs(d - r) < 0.01 * r for r in radii):
+                continue
+            for only_active in (True, False):
+                expected = fake.reference(lat, lng, only_active)
+                got = find_covering_zone(zones, lat, lng, only_active)
+                assert (got["id"] if got else None) == (expected[0]["id"] if expected else None), (
+                    f"mismatch at ({lat}, {lng}), d={d:.0f}m, only_active={only_active}"
+                )
+                if got:
+                    assert got == expected[0]
+            checked += 1
+        assert checked > 3000
+
+    def test_inactive_ring_is_skipped(self):
+        fake = FakeZoneRpc()
+        zones = sorted(
+            (compile_zone(r) for r in fake.rpc("list_delivery_zones", {}).execute().data),
+            key=lambda z: z.area_m2,
+        )
+        lat, lng = _destination(*CENTER, 4000, 90)  # inside inactive 5 km ring
+        assert find_covering_zone(zones, lat, lng)["id"] == "z-8km"
+        assert find_covering_zone(zones, lat, lng, only_active=False)["id"] == "z-5km"
+
+
+# =====================================================
+# Index lifecycle
+# =====================================================
+class TestZoneCoverageIndex:
+    @pytest.mark.asyncio
+    async def test_loads_once_then_serves_from_memory(self):
+        fake = FakeZoneRpc()
+        index = ZoneCoverageIndex(ttl_seconds=60)
+        for bearing in range(0, 360, 10):
+            lat, lng = _destination(*CENTER, 1000, bearing)
+            assert (await index.find_zone(fake, WEBSITE_ID, lat, lng))["id"] == "z-3km"
+        assert fake.calls == {"list_delivery_zones": 1, "find_zone_for_point": 0}
+
+    @pytest.mark.asyncio
+    async def test_invalidate_reloads(self):
+        fake = FakeZoneRpc()
+        index = ZoneCoverageIndex(ttl_seconds=60)
+        lat, lng = _destination(*CENTER, 1000, 0)
+        await index.find_zone(fake, WEBSITE_ID, lat, lng)
+        fake.rings = [("z-12km", 12000, 1200, True)]
+        assert (await index.find_zone(fake, WEBSITE_ID, lat, lng))["id"] == "z-3km"  # cached
+        index.invalidate(WEBSITE_ID)
+        assert (await index.find_zone(fake, WEBSITE_ID, lat, lng))["id"] == "z-12km"
+        assert fake.calls["list_delivery_zones"] == 2
+
+    @pytest.mark.asyncio
+    async def test_bounded_to_the_most_recent_websites(self):
+        fake = FakeZoneRpc()
+        index = ZoneCoverageIndex(ttl_seconds=60, max_websites=3)
+        lat, lng = _destination(*CENTER, 1000, 0)
+        for n in range(10):
+            await index.find_zone(fake, f"site-{n}", lat, lng)
+        await index.find_zone(fake, "site-7", lat, lng)  # touch: now most recent
+        await index.find_zone(fake, "site-10", lat, lng)
+
+        assert list(index._entries) == ["site-9", "site-7", "site-10"]
+        assert set(index._load_locks) <= set(index._entries)
+        index.invalidate("site-7")
+        assert "site-7" not in index._entries and "site-7" not in index._load_locks
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_rpc_when_zones_unusable(self):
+        fake = FakeZoneRpc()
+        original = fake.rpc
+
+        def rpc(name, params):
+            query = original(name, params)
+            if name == "list_delivery_zones":
+                rows = query.execute.return_value.data
+                rows[0]["polygon_geojson"] = {"type": "MultiPolygon", "coordinates": []}
+            return query
+
+        fake.rpc = rpc
+        index = ZoneCoverageIndex(ttl_seconds=60)
+        lat, lng = _destination(*CENTER, 1000, 0)
+        assert (await index.find_zone(fake, WEBSITE_ID, lat, lng))["id"] == "z-3km"
+        assert fake.calls["find_zone_for_point"] == 1
+
+
+# =====================================================
+# Route wiring
+# =====================================================
+@pytest.fixture
+def cover_client():
+    fake = FakeZoneRpc()
+    zone_coverage.clear()
+    app.dependency_overrides[get_supabase_client] = lambda: fake
+    yield TestClient(app), fake
+    app.dependency_overrides.pop(get_supabase_client, None)
+    zone_coverage.clear()
+
+
+class TestCoverRoute:
+    def test_covered_response_and_single_load(self, cover_client):
+        client, fake = cover_client
+        url = f"/api/v1/delivery/zones/{WEBSITE_ID}/cover"
+        for distance, expected_fee in ((1000, "3.00"), (7000, "8.00"), (11000, "12.00")):
+            lat, lng = _destination(*CENTER, distance, 45)
+            resp = client.get(url, params={"lat": lat, "lng": lng})
+            assert resp.status_code == 200
+            body = resp.json()
+            assert body["covered"] is True
+            assert body["zone"]["fee"] == expected_fee
+        assert fake.calls == {"list_delivery_zones": 1, "find_zone_for_point": 0}
+
+    def test_outside_every_ring(self, cover_client):
+        client, _ = cover_client
+        lat, lng = _destination(*CENTER, 20000, 45)
+        resp = client.get(
+            f"/api/v1/delivery/zones/{WEBSITE_ID}/cover", params={"lat": lat, "lng": lng}
+        )
+        assert resp.json() == {"covered": False, "zone": None}
+
+    def test_bad_website_id_is_400(self, cover_client):
+        client, _ = cover_client
+        resp = client.get("/api/v1/delivery/zones/not-a-uuid/cover", params={"lat": 3, "lng": 101})
+        assert resp.status_code == 400